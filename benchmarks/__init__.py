@@ -0,0 +1,6 @@
+"""
+Benchmarks das rotinas de coleta/ingestão.
+
+Executar a partir da raiz do projeto, por exemplo:
+    python -m benchmarks.collection_cycle
+"""
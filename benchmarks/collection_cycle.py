@@ -0,0 +1,95 @@
+"""
+Benchmark: tempo de parede por ciclo de coleta contra o stand-in local do FortiAnalyzer.
+
+Compara a espera fixa antiga (sleep antes de ler) com FortiAnalyzerClient.wait_for_task
+(polling com backoff) e, no modo 'parallel', com o download concorrente de páginas
+(fetch_all_results), para janelas pequenas, médias e grandes. Também mostra quantas
+linhas cada estratégia leu em relação ao total da tarefa: com espera fixa, janelas
+grandes são lidas antes de o FA terminar a indexação.
+
+Uso:
+    python -m benchmarks.collection_cycle [--legacy-sleep 15] [--cycles 1]
+"""
+import argparse
+import datetime
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vpn_dashboard.settings')
+django.setup()
+
+from integrations.fortianalyzer import FortiAnalyzerClient
+from benchmarks.fa_standin import FortiAnalyzerStandIn
+
+PAGE_SIZE = 100
+
+
+def read_pages(client, tid, limit):
+    """Paginação serial, como nos coletores."""
+    rows = 0
+    offset = 0
+    while offset < limit:
+        response = client.get_task_results(tid, limit=PAGE_SIZE, offset=offset)
+        res = (response or {}).get('result') or {}
+        batch = res.get('data', []) if isinstance(res, dict) else []
+        if not batch:
+            break
+        rows += len(batch)
+        offset += len(batch)
+        if len(batch) < PAGE_SIZE:
+            break
+    return rows
+
+
+def run_cycle(client, hours, mode, legacy_sleep, fetch_limit):
+    end = datetime.datetime.now()
+    start = end - datetime.timedelta(hours=hours)
+
+    began = time.monotonic()
+    tid = client.start_log_task(log_type="event", start_time=start, end_time=end, log_filter='subtype=="vpn"')
+    if mode == 'legacy':
+        time.sleep(legacy_sleep)
+        rows = read_pages(client, tid, fetch_limit)
+    elif mode == 'adaptive':
+        info = client.wait_for_task(tid)
+        limit = min(fetch_limit, info['total']) if info['total'] is not None else fetch_limit
+        rows = read_pages(client, tid, limit)
+    else:
+        info = client.wait_for_task(tid)
+        rows = sum(1 for _ in client.fetch_all_results(tid, page_size=PAGE_SIZE, total=info['total'], limit=fetch_limit))
+    elapsed = time.monotonic() - began
+
+    status = client.check_task_status(tid) or {}
+    return elapsed, rows, status.get('total-count')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--legacy-sleep', type=float, default=15.0)
+    parser.add_argument('--cycles', type=int, default=1)
+    parser.add_argument('--rows-per-hour', type=int, default=2000)
+    parser.add_argument('--fetch-limit', type=int, default=10000)
+    parser.add_argument('--page-latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    windows = [('pequena (6 min)', 0.1), ('média (1 h)', 1), ('grande (4 h)', 4), ('dia (24 h)', 24)]
+
+    with FortiAnalyzerStandIn(rows_per_hour=args.rows_per_hour, index_base=0.4,
+                              index_per_1k_rows=0.5, page_latency=args.page_latency) as standin:
+        client = FortiAnalyzerClient(config=standin.client_config())
+        print(f"{'janela':<18} {'modo':<8} {'tempo/ciclo (s)':>16} {'linhas lidas':>13} {'total FA':>9}")
+        for label, hours in windows:
+            for mode in ('legacy', 'adaptive', 'parallel'):
+                timings = []
+                for _ in range(args.cycles):
+                    elapsed, rows, total = run_cycle(client, hours, mode, args.legacy_sleep, args.fetch_limit)
+                    timings.append(elapsed)
+                avg = sum(timings) / len(timings)
+                print(f"{label:<18} {mode:<8} {avg:>16.2f} {rows:>13} {total if total is not None else '-':>9}")
+        print(f"Pool: {client.pool_stats()} | chamadas ao FA: {standin.calls}")
+
+
+if __name__ == '__main__':
+    main()
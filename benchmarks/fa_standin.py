@@ -0,0 +1,195 @@
+"""
+Stand-in local do FortiAnalyzer (JSON-RPC /logview) para benchmarks.
+
+Simula a criação de tarefas de logsearch, a indexação progressiva (percentual e
+'total-count' crescendo com o tempo) e a paginação dos resultados. As linhas são
+geradas sob demanda a partir do índice, sem manter o conjunto em memória.
+"""
+import datetime
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+
+FA_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+VPN_ACTIONS = ['tunnel-up', 'tunnel-stats', 'tunnel-stats', 'tunnel-stats', 'tunnel-stats', 'tunnel-down', 'ssl-login-fail']
+
+
+def synthetic_vpn_log(index, ts):
+    """Log de evento VPN (SSL) no formato devolvido pelo FortiAnalyzer."""
+    user = f"usuario{index % 500:04d}"
+    action = VPN_ACTIONS[index % len(VPN_ACTIONS)]
+    tunnel = 100000 + index // len(VPN_ACTIONS)
+    return {
+        'date': ts.strftime('%Y-%m-%d'),
+        'time': ts.strftime('%H:%M:%S'),
+        'itime': ts.strftime('%Y-%m-%d %H:%M:%S'),
+        'eventtime': str(int(ts.timestamp() * 1_000_000_000) + index),
+        'logid': '0101039949' if action != 'ssl-login-fail' else '0101039426',
+        'type': 'event',
+        'subtype': 'vpn',
+        'level': 'information' if action != 'ssl-login-fail' else 'alert',
+        'action': action,
+        'user': user,
+        'remip': f"177.{(index // 250) % 250}.{index % 250}.{(index * 7) % 250 + 1}",
+        'tunnelid': str(tunnel),
+        'tunneltype': 'ssl-tunnel',
+        'duration': str((index % 3600) * 3),
+        'rcvdbyte': str(index * 1024 % 987654321),
+        'sentbyte': str(index * 2048 % 987654321),
+        'reason': 'bad-password' if action == 'ssl-login-fail' else '',
+        'srccountry': 'Brazil',
+        'srccity': 'Sao%20Paulo',
+        'devid': 'FGT80FTK22017879',
+        'vd': 'root',
+        'msg': 'SSL%20tunnel%20statistics',
+        'tz': '-0300',
+    }
+
+
+class _Task:
+    def __init__(self, tid, start, end, total, index_seconds):
+        self.tid = tid
+        self.start = start
+        self.end = end
+        self.total = total
+        self.index_seconds = index_seconds
+        self.created = time.monotonic()
+
+    def progress(self):
+        if self.index_seconds <= 0:
+            return 100, self.total
+        ratio = min((time.monotonic() - self.created) / self.index_seconds, 1.0)
+        return int(ratio * 100), int(self.total * ratio)
+
+    def row(self, index, factory):
+        # time-order desc: a linha 0 é a mais recente
+        span = (self.end - self.start).total_seconds()
+        step = span / self.total if self.total else 0
+        return factory(index, self.end - datetime.timedelta(seconds=index * step))
+
+
+class FortiAnalyzerStandIn:
+    """
+    Servidor HTTP local que responde como a API JSON-RPC do FortiAnalyzer.
+
+    rows_per_hour      : volume simulado do período consultado
+    index_base         : tempo fixo (s) de indexação de qualquer tarefa
+    index_per_1k_rows  : tempo adicional (s) de indexação a cada 1000 linhas
+    page_latency       : latência (s) de cada página de resultados
+    max_rows           : teto de linhas de uma tarefa (como o limite do FA)
+    """
+
+    def __init__(self, rows_per_hour=2000, index_base=0.3, index_per_1k_rows=0.1,
+                 page_latency=0.02, max_rows=1_000_000, row_factory=synthetic_vpn_log):
+        self.rows_per_hour = rows_per_hour
+        self.index_base = index_base
+        self.index_per_1k_rows = index_per_1k_rows
+        self.page_latency = page_latency
+        self.max_rows = max_rows
+        self.row_factory = row_factory
+        self.tasks = {}
+        self.calls = {'add': 0, 'status': 0, 'results': 0}
+        self._next_tid = 1000
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # --- ciclo de vida ---
+    def start(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                body = json.dumps(standin.dispatch(payload)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def client_config(self):
+        """Configuração equivalente a FortiAnalyzerConfig para o FortiAnalyzerClient."""
+        return SimpleNamespace(
+            host='http://127.0.0.1', port=self.port, adom='root',
+            api_token='standin', verify_ssl=False, trusted_countries='BR', is_enabled=True,
+        )
+
+    # --- JSON-RPC ---
+    def dispatch(self, payload):
+        params = (payload.get('params') or [{}])[0]
+        url = params.get('url', '')
+        method = payload.get('method')
+
+        if method == 'add' and url.endswith('/logsearch'):
+            return {'jsonrpc': '2.0', 'id': payload.get('id'), 'result': {'tid': self._create_task(params)}}
+
+        tid = int(url.rstrip('/').split('/')[-1])
+        task = self.tasks.get(tid)
+        if task is None:
+            return {'jsonrpc': '2.0', 'id': payload.get('id'), 'error': {'code': -1, 'message': 'Invalid tid'}}
+
+        percentage, available = task.progress()
+        if '/task/' in url:
+            with self._lock:
+                self.calls['status'] += 1
+            return {'jsonrpc': '2.0', 'id': payload.get('id'),
+                    'result': {'tid': tid, 'percentage': percentage, 'total-count': available}}
+
+        with self._lock:
+            self.calls['results'] += 1
+        if self.page_latency:
+            time.sleep(self.page_latency)
+        data = params.get('data') or {}
+        limit = int(data.get('limit', 100))
+        offset = int(data.get('offset', 0))
+        rows = [task.row(i, self.row_factory) for i in range(offset, min(offset + limit, available))]
+        return {'jsonrpc': '2.0', 'id': payload.get('id'), 'result': {
+            'percentage': percentage, 'return-lines': len(rows), 'total-count': available, 'data': rows,
+        }}
+
+    def _create_task(self, params):
+        time_range = params.get('time-range') or {}
+        end = datetime.datetime.strptime(time_range['end'], FA_TIME_FORMAT) if time_range.get('end') else datetime.datetime.now()
+        start = datetime.datetime.strptime(time_range['start'], FA_TIME_FORMAT) if time_range.get('start') else end - datetime.timedelta(days=1)
+        hours = max((end - start).total_seconds() / 3600.0, 0)
+        total = min(int(hours * self.rows_per_hour), self.max_rows)
+        index_seconds = self.index_base + self.index_per_1k_rows * total / 1000.0
+
+        with self._lock:
+            self._next_tid += 1
+            tid = self._next_tid
+            self.calls['add'] += 1
+            self.tasks[tid] = _Task(tid, start, end, total, index_seconds)
+        return tid
@@ -0,0 +1,95 @@
+"""
+Benchmark: custo do event_id por log, md5 do JSON ordenado (antigo) x
+security_events.fingerprint (blake2b sobre os campos de identidade).
+
+Usa os logs de exemplo do repositório: antivirus_log.json (um log de vírus do FA,
+gravado como string JSON) e fw_debug.json (registro de saúde de firewall, sem campos de
+identidade de evento; mede o custo num registro pequeno). Cada amostra é replicada com
+eventtime/sessionid distintos para conferir colisões, e uma cópia com campos voláteis
+alterados (itime, tz) mostra qual das abordagens mantém o mesmo ID.
+
+Uso:
+    python -m benchmarks.fingerprint [--rows 100000]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from security_events.fingerprint import RecentIds, fingerprint
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def md5_of_json(log, event_type=None):
+    """event_id antigo: md5 do log inteiro serializado com chaves ordenadas."""
+    return hashlib.md5(json.dumps(log, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_samples():
+    with open(os.path.join(ROOT, 'antivirus_log.json'), encoding='utf-8') as f:
+        antivirus = json.load(f)
+    if isinstance(antivirus, str):
+        antivirus = json.loads(antivirus)
+    with open(os.path.join(ROOT, 'fw_debug.json'), encoding='utf-8') as f:
+        fw_debug = json.load(f)
+    return [('antivirus_log.json', 'antivirus', antivirus), ('fw_debug.json', 'ips', fw_debug[0])]
+
+
+def variants(sample, rows):
+    """Cópias da amostra com eventtime/sessionid/id distintos (logs diferentes)."""
+    base_time = int(sample.get('eventtime') or 1770206402124643422)
+    base_session = int(sample.get('sessionid') or 865632810)
+    logs = []
+    for i in range(rows):
+        log = dict(sample)
+        log['eventtime'] = str(base_time + i * 1000)
+        log['sessionid'] = str(base_session + i)
+        log['id'] = str(i)
+        logs.append(log)
+    return logs
+
+
+def measure(func, logs, event_type):
+    began = time.perf_counter()
+    ids = [func(log, event_type) for log in logs]
+    elapsed = time.perf_counter() - began
+    return elapsed, len(set(ids))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'amostra':<20} {'método':<12} {'µs/log':>8} {'logs/s':>11} {'IDs únicos':>11} {'estável':>8}")
+    for name, event_type, sample in load_samples():
+        logs = variants(sample, args.rows)
+        # Mesmo evento reenviado pelo FA com campos voláteis diferentes
+        resent = dict(sample, itime='2026-02-04 09:05:00', tz='-0300')
+        for method, func in (('md5-json', md5_of_json), ('fingerprint', fingerprint)):
+            elapsed, unique = measure(func, logs, event_type)
+            stable = func(sample, event_type) == func(resent, event_type)
+            print(f"{name:<20} {method:<12} {elapsed / len(logs) * 1e6:>8.2f} {len(logs) / elapsed:>11,.0f} "
+                  f"{unique:>11} {'sim' if stable else 'não':>8}")
+
+    # Filtro de IDs recentes: custo da consulta e da inserção por ID
+    recent = RecentIds(capacity=50000)
+    ids = [fingerprint(log, 'antivirus') for log in variants(load_samples()[0][2], args.rows)]
+    began = time.perf_counter()
+    hits = 0
+    for event_id in ids:
+        if event_id in recent:
+            hits += 1
+        recent.add(event_id)
+    for event_id in ids[-10000:]:
+        if event_id in recent:
+            hits += 1
+    elapsed = time.perf_counter() - began
+    print(f"\nRecentIds(50000): {(len(ids) + 10000) / elapsed:,.0f} operações/s, "
+          f"{hits} repetidos reconhecidos de 10000, {len(recent)} IDs em memória")
+
+
+if __name__ == '__main__':
+    main()
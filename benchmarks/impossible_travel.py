@@ -0,0 +1,139 @@
+"""
+Benchmark: viagem impossível conexão a conexão (VPNLog.save() → assess_travel) x em lote
+(vpn_logs.travel: vetores ordenados + NumPy).
+
+Gera --sessions conexões sintéticas de --users usuários entre algumas cidades, em ordem de
+(usuário, horário). Em memória compara o Haversine por par em Python com travel_pairs +
+assess_rows sobre todas as conexões e confere que os dois marcam as mesmas viagens.
+
+Com --db-sessions > 0 grava essa quantidade num banco de teste do Django (criado e removido
+pelo benchmark) e compara _check_impossible_travel() por linha (uma consulta cada, medido em
+--per-row-sample linhas e extrapolado) com uma passada de recompute_travel().
+
+Uso:
+    python -m benchmarks.impossible_travel [--sessions 1000000] [--users 20000] [--db-sessions 100000] [--per-row-sample 2000]
+"""
+import argparse
+import datetime
+import os
+import random
+import time
+from types import SimpleNamespace
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vpn_dashboard.settings')
+django.setup()
+
+from django.db import connection
+from django.utils import timezone
+from vpn_logs.models import VPNLog, assess_travel
+from vpn_logs.travel import ROW_FIELDS, assess_rows, numpy, recompute_travel, travel_pairs
+
+CITIES = [
+    ('São Paulo', 'Brazil', 'BR', -23.55, -46.63),
+    ('Rio de Janeiro', 'Brazil', 'BR', -22.91, -43.17),
+    ('Brasília', 'Brazil', 'BR', -15.79, -47.88),
+    ('Lisbon', 'Portugal', 'PT', 38.72, -9.14),
+    ('Miami', 'United States', 'US', 25.76, -80.19),
+    ('Frankfurt', 'Germany', 'DE', 50.11, 8.68),
+]
+
+
+def synthetic_sessions(count, users, seed=7):
+    """Tuplas ROW_FIELDS ordenadas por (usuário, horário); a maioria dos usuários fica na mesma cidade."""
+    rng = random.Random(seed)
+    base = timezone.now() - datetime.timedelta(days=90)
+    per_user = max(1, count // users)
+    rows = []
+    for user_index in range(users):
+        home = CITIES[user_index % 3]
+        moment = base + datetime.timedelta(minutes=rng.randint(0, 600))
+        for _ in range(per_user if user_index < users - 1 else count - len(rows)):
+            city = home if rng.random() < 0.9 else rng.choice(CITIES)
+            moment += datetime.timedelta(minutes=rng.randint(5, 3000))
+            rows.append((len(rows) + 1, f"user{user_index:06d}", moment, city[3], city[4], city[0], city[1], city[2], False, None, None, None))
+    return rows
+
+
+def per_row(rows):
+    """Como VPNLog.save(): Haversine em Python para cada conexão contra a anterior do usuário."""
+    flagged = 0
+    previous = None
+    for row in rows:
+        current = SimpleNamespace(**dict(zip(ROW_FIELDS, row)))
+        if previous is not None and previous.user == current.user and previous.start_time < current.start_time:
+            assess_travel(previous, current)
+            flagged += current.impossible_travel
+        previous = current
+    return flagged
+
+
+def batch(rows):
+    codes, last, code = [], None, -1
+    for row in rows:
+        if row[1] != last:
+            last, code = row[1], code + 1
+        codes.append(code)
+    previous, distance, hours = travel_pairs(codes, [row[2].timestamp() for row in rows], [row[3] for row in rows], [row[4] for row in rows])
+    return sum(1 for obj in assess_rows(rows, previous, distance, hours) if obj.impossible_travel)
+
+
+def timed(function, *args):
+    began = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - began
+
+
+def database_run(rows, sample):
+    """Banco de teste: verificação por linha (amostra, extrapolada) x recompute_travel."""
+    name = connection.creation.create_test_db(verbosity=0)
+    try:
+        fields = dict.fromkeys(['impossible_travel', 'travel_speed', 'distance_km', 'travel_details'])
+        objs = []
+        for row in rows:
+            values = dict(zip(ROW_FIELDS, row))
+            values.update(fields, impossible_travel=False)
+            values['start_date'] = values['start_time'].date()
+            objs.append(VPNLog(session_id=str(values['id']), source_ip='10.0.0.1', status='tunnel-up', **values))
+        VPNLog.objects.bulk_create(objs, batch_size=2000)
+
+        logs = list(VPNLog.objects.order_by('?')[:sample])
+        began = time.perf_counter()
+        for log in logs:
+            log._check_impossible_travel()
+        per_row_elapsed = (time.perf_counter() - began) / max(len(logs), 1) * len(rows)
+
+        updated, batch_elapsed = timed(recompute_travel)
+        flagged = VPNLog.objects.filter(impossible_travel=True).count()
+        print(f"Banco ({connection.vendor}, {len(rows):,} conexões):")
+        print(f"    por linha (estimado de {len(logs)}) {per_row_elapsed:>8.1f}s   {len(rows):,} consultas")
+        print(f"    recompute_travel            {batch_elapsed:>8.1f}s   {updated:,} linhas regravadas, {flagged:,} impossíveis")
+    finally:
+        connection.creation.destroy_test_db(name, verbosity=0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--db-sessions', type=int, default=100000, help='Conexões gravadas no banco de teste (0 = não usa o banco)')
+    parser.add_argument('--per-row-sample', type=int, default=2000, help='Conexões medidas na verificação por linha')
+    args = parser.parse_args()
+
+    rows = synthetic_sessions(args.sessions, args.users)
+    print(f"{len(rows):,} conexões, {args.users:,} usuários; NumPy: {'sim' if numpy is not None else 'não (laço em Python)'}")
+
+    flagged_row, row_elapsed = timed(per_row, rows)
+    flagged_batch, batch_elapsed = timed(batch, rows)
+    print("Em memória:")
+    print(f"    por par (assess_travel)     {row_elapsed:>8.2f}s   {len(rows) / row_elapsed:>12,.0f} conexões/s")
+    print(f"    em lote (travel_pairs)      {batch_elapsed:>8.2f}s   {len(rows) / batch_elapsed:>12,.0f} conexões/s")
+    print(f"    impossíveis: {flagged_row:,} por par, {flagged_batch:,} em lote")
+
+    if args.db_sessions:
+        database_run(synthetic_sessions(args.db_sessions, max(1, args.users * args.db_sessions // args.sessions)), args.per_row_sample)
+
+
+if __name__ == '__main__':
+    main()
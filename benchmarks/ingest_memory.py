@@ -0,0 +1,116 @@
+"""
+Benchmark: pico de memória (tracemalloc) da ingestão de VPN para 10k/100k registros.
+
+Compara o fluxo antigo (lista completa de logs antes de processar) com o pipeline em
+streaming de vpn_logs.ingest (fetch → normalize → enrich → persist). Os registros vêm do
+stand-in local do FortiAnalyzer pelo FortiAnalyzerClient real; o estágio persist apenas
+descarta os registros, para medir o pipeline sem depender do banco. Também mostra após
+quanto tempo o primeiro lote chegaria ao banco.
+
+Uso:
+    python -m benchmarks.ingest_memory [--sizes 10000 100000] [--persist-batch 100]
+"""
+import argparse
+import datetime
+import os
+import time
+import tracemalloc
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vpn_dashboard.settings')
+django.setup()
+
+from integrations.fortianalyzer import FortiAnalyzerClient
+from benchmarks.fa_standin import FortiAnalyzerStandIn
+from integrations.normalizer import normalize_vpn
+from vpn_logs.ingest import VPNLogIngestor
+
+PAGE_SIZE = 100
+
+
+class DirectoryStandIn:
+    """Responde como ActiveDirectoryClient.get_user_info/get_users_info, sem rede."""
+
+    def get_user_info(self, username):
+        return {'department': 'TI', 'email': f"{username}@empresa.local", 'title': 'Analista', 'display_name': username}
+
+    def get_users_info(self, usernames):
+        return {username: self.get_user_info(username) for username in usernames}
+
+
+class DiscardingIngestor(VPNLogIngestor):
+    """Pipeline completo, mas o estágio persist só conta os registros."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.began = time.monotonic()
+        self.first_persist = None
+
+    def persist(self, batch):
+        if self.first_persist is None:
+            self.first_persist = time.monotonic() - self.began
+        return ['discarded'] * len(batch)
+
+
+def open_stream(client, total):
+    end = datetime.datetime.now()
+    start = end - datetime.timedelta(hours=1)
+    tid = client.start_log_task(log_type="event", start_time=start, end_time=end, log_filter='subtype=="vpn"')
+    info = client.wait_for_task(tid)
+    return client.fetch_all_results(tid, page_size=PAGE_SIZE, total=info['total'], limit=total)
+
+
+def run_legacy(client, total, batch_sizes):
+    began = time.monotonic()
+    logs_data = list(open_stream(client, total))
+    ad_client = DirectoryStandIn()
+    first_persist = None
+    count = 0
+    for log in logs_data:
+        record = normalize_vpn(log)
+        record.ad_info = ad_client.get_user_info(record.user)
+        if first_persist is None:
+            first_persist = time.monotonic() - began
+        count += 1
+    return count, first_persist
+
+
+def run_pipeline(client, total, batch_sizes):
+    ingestor = DiscardingIngestor(DirectoryStandIn(), batch_sizes=batch_sizes)
+    outcomes = ingestor.run(open_stream(client, total))
+    return sum(outcomes.values()), ingestor.first_persist
+
+
+def measure(func, client, total, batch_sizes):
+    tracemalloc.start()
+    began = time.monotonic()
+    count, first_persist = func(client, total, batch_sizes)
+    elapsed = time.monotonic() - began
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, peak, elapsed, first_persist
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--normalize-batch', type=int, default=500)
+    parser.add_argument('--enrich-batch', type=int, default=200)
+    parser.add_argument('--persist-batch', type=int, default=100)
+    args = parser.parse_args()
+    batch_sizes = {'normalize': args.normalize_batch, 'enrich': args.enrich_batch, 'persist': args.persist_batch}
+
+    print(f"{'registros':>10} {'modo':<9} {'pico (MiB)':>11} {'tempo (s)':>10} {'1º lote (s)':>12}")
+    for total in args.sizes:
+        with FortiAnalyzerStandIn(rows_per_hour=total, index_base=0, index_per_1k_rows=0,
+                                  page_latency=0, max_rows=total) as standin:
+            client = FortiAnalyzerClient(config=standin.client_config())
+            for mode, func in (('legacy', run_legacy), ('pipeline', run_pipeline)):
+                count, peak, elapsed, first = measure(func, client, total, batch_sizes)
+                print(f"{count:>10} {mode:<9} {peak / 2**20:>11.1f} {elapsed:>10.2f} {first:>12.2f}")
+            client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark: normalização de logs de VPN do FA em um único núcleo.
+
+Compara a normalização antiga (dateutil.parse + make_aware por linha, unquote incondicional,
+COUNTRY_MAP de 15 países, if-chain de status) com integrations.normalizer.normalize_vpn,
+que produz VPNRecord com __slots__. Os logs sintéticos são os mesmos do stand-in do
+FortiAnalyzer, espalhados ao longo de um dia e com países variados; são gerados antes da
+medição e reaproveitados em ciclo, para medir apenas a normalização.
+
+Uso:
+    python -m benchmarks.normalizer [--records 1000000] [--legacy-records 100000]
+"""
+import argparse
+import datetime
+import itertools
+import os
+import time
+import urllib.parse
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vpn_dashboard.settings')
+django.setup()
+
+from django.utils import timezone
+from dateutil.parser import parse
+
+from benchmarks.fa_standin import synthetic_vpn_log
+from integrations.countries import ISO_COUNTRIES
+from integrations.normalizer import normalize_vpn
+
+POOL_SIZE = 50000
+
+LEGACY_COUNTRY_MAP = {
+    'brazil': 'BR', 'united states': 'US', 'argentina': 'AR',
+    'mexico': 'MX', 'chile': 'CL', 'colombia': 'CO', 'peru': 'PE',
+    'paraguay': 'PY', 'uruguay': 'UY', 'canada': 'CA', 'germany': 'DE',
+    'france': 'FR', 'united kingdom': 'GB', 'spain': 'ES', 'portugal': 'PT'
+}
+
+
+def legacy_normalize(log):
+    """Normalização como era feita inline em fetch_vpn_logs_task."""
+    username = log.get('user', 'unknown')
+    if username == 'N/A':
+        username = log.get('xauthuser', 'N/A')
+    source_ip = log.get('remip')
+    if not source_ip or source_ip == '0.0.0.0':
+        source_ip = log.get('srcip', '0.0.0.0')
+    try:
+        start_time_log = parse(f"{log.get('date', '')} {log.get('time', '')}")
+        if timezone.is_naive(start_time_log):
+            start_time_log = timezone.make_aware(start_time_log)
+        start_time_log = start_time_log - datetime.timedelta(hours=1)
+    except:
+        start_time_log = timezone.now()
+    duration = int(log.get('duration', 0))
+    action = log.get('action', '')
+    if action in ('tunnel-up', 'tunnel-stats'):
+        status = 'active'
+    elif action == 'tunnel-down':
+        status = 'closed'
+    else:
+        status = 'tunnel-down'
+    fa_country = urllib.parse.unquote(str(log.get('srccountry', '') or log.get('remcountry', '')).strip())
+    fa_city = urllib.parse.unquote(str(log.get('srccity', '') or log.get('remcity', '')).strip())
+    if not fa_country or fa_country.lower() in ['reserved', 'n/a']:
+        location = ('', '', fa_city, fa_country)
+    else:
+        location = (fa_country, LEGACY_COUNTRY_MAP.get(fa_country.lower(), ''), fa_city, fa_country)
+    return {
+        'log': log, 'user': username, 'source_ip': source_ip, 'start_time': start_time_log,
+        'end_time': start_time_log + datetime.timedelta(seconds=duration), 'duration': duration,
+        'action': action, 'status': status, 'location': location, 'ad_info': {},
+    }
+
+
+def build_pool(size):
+    countries = [urllib.parse.quote(name) for name in ISO_COUNTRIES.values()] + ['Reserved']
+    start = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    pool = []
+    for index in range(size):
+        ts = start + datetime.timedelta(seconds=index * 86400 // size)
+        log = synthetic_vpn_log(index, ts)
+        log['srccountry'] = countries[index % len(countries)]
+        pool.append(log)
+    return pool
+
+
+def measure(func, pool, total):
+    logs = itertools.islice(itertools.cycle(pool), total)
+    began = time.perf_counter()
+    for log in logs:
+        func(log)
+    return time.perf_counter() - began
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--legacy-records', type=int, default=100000,
+                        help='A normalização antiga é medida numa amostra menor e extrapolada')
+    args = parser.parse_args()
+
+    pool = build_pool(min(POOL_SIZE, args.records))
+    mismatches = sum(
+        1 for log in pool[:5000]
+        if normalize_vpn(log).start_time != legacy_normalize(log)['start_time']
+    )
+
+    print(f"{'modo':<11} {'registros':>10} {'tempo (s)':>10} {'registros/min':>15}")
+    for mode, func, total in (('legacy', legacy_normalize, args.legacy_records),
+                              ('normalizer', normalize_vpn, args.records)):
+        elapsed = measure(func, pool, total)
+        print(f"{mode:<11} {total:>10} {elapsed:>10.2f} {total / elapsed * 60:>15,.0f}")
+    print(f"\nHorários divergentes entre os dois modos (amostra de 5000): {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: tamanho dos payloads brutos (raw_log) em texto, com zstd puro e com zstd +
+dicionário treinado (integrations.payloads).
+
+Gera logs sintéticos do FortiAnalyzer (os mesmos de benchmarks.security_event_layout),
+treina o dicionário em --train logs e comprime outros --rows, um payload por vez como na
+gravação das linhas. Mostra bytes médios por linha, a razão de compressão e a vazão de
+compressão/descompressão. Não usa o banco; requer o pacote zstandard.
+
+Uso:
+    python -m benchmarks.payload_compression [--rows 20000] [--train 5000] [--level 6] [--dict-size 114688]
+"""
+import argparse
+import datetime
+import json
+import time
+
+from benchmarks.security_event_layout import synthetic_log
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def payloads(start, count):
+    now = datetime.datetime.now()
+    return [
+        json.dumps(synthetic_log(index, now - datetime.timedelta(seconds=index))[1]).encode('utf-8')
+        for index in range(start, start + count)
+    ]
+
+
+def measure(label, compressor, decompressor, rows, raw_bytes):
+    began = time.perf_counter()
+    frames = [compressor.compress(row) for row in rows]
+    compress_elapsed = time.perf_counter() - began
+    began = time.perf_counter()
+    for frame in frames:
+        decompressor.decompress(frame)
+    decompress_elapsed = time.perf_counter() - began
+    size = sum(len(frame) for frame in frames)
+    print(f"{label:<18} {size / len(rows):>8.1f} B/linha   {raw_bytes / size:>5.1f}x   "
+          f"compressão {len(rows) / compress_elapsed:>10,.0f}/s   descompressão {len(rows) / decompress_elapsed:>10,.0f}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--train', type=int, default=5000, help='Logs usados no treino do dicionário')
+    parser.add_argument('--level', type=int, default=6)
+    parser.add_argument('--dict-size', type=int, default=112 * 1024)
+    args = parser.parse_args()
+
+    if zstandard is None:
+        raise SystemExit('Este benchmark requer o pacote zstandard.')
+
+    samples = payloads(0, args.train)
+    rows = payloads(args.train, args.rows)
+    raw_bytes = sum(len(row) for row in rows)
+    print(f"{args.rows} payloads, {raw_bytes / args.rows:.1f} B/linha em texto; dicionário com {args.train} amostras")
+
+    plain = zstandard.ZstdCompressor(level=args.level)
+    measure('zstd', plain, zstandard.ZstdDecompressor(), rows, raw_bytes)
+
+    dictionary = zstandard.train_dictionary(args.dict_size, samples, dict_id=32768)
+    measure(
+        'zstd + dicionário',
+        zstandard.ZstdCompressor(level=args.level, dict_data=dictionary),
+        zstandard.ZstdDecompressor(dict_data=dictionary),
+        rows, raw_bytes,
+    )
+
+
+if __name__ == '__main__':
+    main()
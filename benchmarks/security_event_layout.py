@@ -0,0 +1,178 @@
+"""
+Benchmark: SecurityEvent em uma tabela larga (layout até a migration 0011, 21 índices
+compostos) x tabela estreita + tabelas de detalhe por tipo (layout atual).
+
+Gera eventos sintéticos dos quatro tipos com security_events.ingest.build_security_event,
+grava os dois layouts com bulk_create em blocos de --chunk (uma transação por bloco, como o
+SecurityEventBulkWriter) e mostra linhas/s, quantidade de índices e o tamanho de tabelas e
+índices. O layout largo é o model histórico do estado de migrations 0011.
+
+Por padrão usa um SQLite temporário (tamanhos via dbstat). Com --database ALIAS usa um
+banco configurado em DATABASES (PostgreSQL: pg_relation_size) — precisa ser um banco de
+rascunho: as tabelas são criadas e removidas a cada layout.
+
+Uso:
+    python -m benchmarks.security_event_layout [--rows 100000] [--chunk 500] [--database ALIAS]
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vpn_dashboard.settings')
+django.setup()
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.loader import MigrationLoader
+from security_events.ingest import build_security_event
+from security_events.models import DETAIL_MODELS, SecurityEvent
+
+WIDE_STATE = ('security_events', '0011_adauthevent_security_ev_timesta_51b933_idx_and_more')
+SCRATCH_ALIAS = 'layout_bench'
+
+TYPE_FIELDS = {
+    'ips': lambda i: {'attack': f"Attack.Signature.{i % 300}", 'attackid': str(10000 + i % 300), 'cve': f"CVE-2024-{i % 900:04d}"},
+    'antivirus': lambda i: {'virus': f"W32/Agent.{i % 150}!tr", 'filename': f"setup_{i % 2000}.exe", 'checksum': f"{i:08x}" * 4},
+    'webfilter': lambda i: {'url': f"/path/{i % 5000}?q={i}", 'hostname': f"site{i % 800}.example.com", 'catdesc': f"Category {i % 40}"},
+    'app-control': lambda i: {
+        'app': f"App.{i % 500}", 'appcat': f"Cat.{i % 25}", 'apprisk': ('low', 'medium', 'high')[i % 3],
+        'hostname': f"cdn{i % 300}.example.com", 'url': f"/api/{i % 1000}", 'rcvdbyte': str(i * 37 % 900000), 'sentbyte': str(i * 11 % 90000),
+    },
+}
+TYPES = list(TYPE_FIELDS)
+
+
+def synthetic_log(index, ts):
+    event_type = TYPES[index % len(TYPES)]
+    log = {
+        'logid': '0419016384', 'devid': 'FG100FTK00000001', 'vd': 'root',
+        'date': ts.strftime('%Y-%m-%d'), 'time': ts.strftime('%H:%M:%S'),
+        'eventtime': str(int(ts.timestamp() * 1e9) + index), 'sessionid': str(900000 + index),
+        'srcip': f"10.{index % 200}.{index % 250}.{index % 240 + 1}", 'srcport': str(40000 + index % 20000),
+        'dstip': f"200.{index % 100}.{index % 50}.{index % 200 + 1}", 'dstport': '443', 'proto': '6',
+        'user': f"user{index % 3000}", 'level': ('critical', 'high', 'warning', 'notice')[index % 4],
+        'action': ('blocked', 'passthrough', 'dropped')[index % 3],
+        'srccountry': 'Brazil', 'dstcountry': 'United States',
+    }
+    log.update(TYPE_FIELDS[event_type](index))
+    return event_type, log
+
+
+def build_events(rows):
+    now = datetime.datetime.now()
+    events = []
+    for index in range(rows):
+        event_type, log = synthetic_log(index, now - datetime.timedelta(seconds=rows - index))
+        events.append(build_security_event(log, event_type))
+    return [event for event in events if event is not None]
+
+
+def wide_model():
+    state = MigrationLoader(None, ignore_no_migrations=True).project_state(WIDE_STATE)
+    return state.apps.get_model('security_events', 'SecurityEvent')
+
+
+def to_wide(model, event):
+    """Mesmo evento no layout largo: campos comuns + os do tipo numa única linha."""
+    names = [field.attname for field in model._meta.concrete_fields if not field.primary_key and field.name != 'created_at']
+    return model(**{name: getattr(event, name) for name in names})
+
+
+def scratch_database(alias):
+    """Alias configurado ou um SQLite temporário registrado como SCRATCH_ALIAS."""
+    if alias:
+        return connections[alias]
+    path = os.path.join(tempfile.mkdtemp(prefix='layout_bench_'), 'bench.sqlite3')
+    configured = connections.configure_settings({
+        DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+        SCRATCH_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+    })
+    connections.settings[SCRATCH_ALIAS] = configured[SCRATCH_ALIAS]
+    return connections[SCRATCH_ALIAS]
+
+
+def storage(connection, tables):
+    """{tabela: (bytes da tabela, bytes dos índices, quantidade de índices)}."""
+    sizes = {}
+    with connection.cursor() as cursor:
+        for table in tables:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT pg_relation_size(%s::regclass), pg_indexes_size(%s::regclass), "
+                    "(SELECT COUNT(*) FROM pg_indexes WHERE tablename = %s)", [table, table, table],
+                )
+                sizes[table] = tuple(cursor.fetchone())
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT m.type, COALESCE(SUM(s.pgsize), 0) FROM sqlite_master m "
+                    "LEFT JOIN dbstat s ON s.name = m.name WHERE m.tbl_name = %s GROUP BY m.name, m.type",
+                    [table],
+                )
+                rows = cursor.fetchall()
+                sizes[table] = (
+                    sum(size for kind, size in rows if kind == 'table'),
+                    sum(size for kind, size in rows if kind == 'index'),
+                    sum(1 for kind, _ in rows if kind == 'index'),
+                )
+            else:
+                sizes[table] = (0, 0, len(connection.introspection.get_constraints(cursor, table)))
+    return sizes
+
+
+def run_layout(connection, models, rows, chunk):
+    """Cria as tabelas, grava rows em blocos e devolve (segundos, tamanhos); remove as tabelas no fim."""
+    with connection.schema_editor() as editor:
+        for model in models:
+            editor.create_model(model)
+    try:
+        began = time.perf_counter()
+        for start in range(0, len(rows), chunk):
+            with transaction.atomic(using=connection.alias):
+                models[0].objects.using(connection.alias).bulk_create(rows[start:start + chunk])
+        elapsed = time.perf_counter() - began
+        return elapsed, storage(connection, [model._meta.db_table for model in models])
+    finally:
+        with connection.schema_editor() as editor:
+            for model in reversed(models):
+                editor.delete_model(model)
+
+
+def report(label, count, elapsed, sizes):
+    table_bytes = sum(size[0] for size in sizes.values())
+    index_bytes = sum(size[1] for size in sizes.values())
+    indexes = sum(size[2] for size in sizes.values())
+    print(f"{label:<28} {count / elapsed:>10,.0f} linhas/s   {indexes:>3} índices   "
+          f"tabelas {table_bytes / 2**20:>7.1f} MB   índices {index_bytes / 2**20:>7.1f} MB")
+    for table, (data, index, count_idx) in sizes.items():
+        print(f"    {table:<40} {data / 2**20:>7.1f} MB + {index / 2**20:>7.1f} MB em {count_idx} índices")
+    return index_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--chunk', type=int, default=500, help='Eventos por bulk_create/transação')
+    parser.add_argument('--database', help='Alias de DATABASES para um banco de rascunho (padrão: SQLite temporário)')
+    args = parser.parse_args()
+
+    connection = scratch_database(args.database)
+    print(f"Banco: {connection.vendor} ({connection.settings_dict['NAME']}), {args.rows} eventos, blocos de {args.chunk}")
+
+    wide = wide_model()
+    events = build_events(args.rows)
+    wide_rows = [to_wide(wide, event) for event in events]
+    wide_elapsed, wide_sizes = run_layout(connection, [wide], wide_rows, args.chunk)
+
+    events = build_events(args.rows)
+    slim_elapsed, slim_sizes = run_layout(connection, [SecurityEvent, *DETAIL_MODELS.values()], events, args.chunk)
+
+    wide_index = report('Tabela larga (0011)', len(wide_rows), wide_elapsed, wide_sizes)
+    slim_index = report('Estreita + detalhe por tipo', len(events), slim_elapsed, slim_sizes)
+    print(f"Inserção: {wide_elapsed / slim_elapsed:.2f}x   índices: {slim_index / max(wide_index, 1):.0%} do tamanho anterior")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Replay de linhas syslog do FortiOS contra o receptor (python manage.py syslog_receiver).
+
+Envia linhas gravadas (--file, uma por linha, ex.: test_log.txt) ou sintéticas (VPN no
+formato do stand-in do FA e o log de antivírus de antivirus_log.json, convertidos para
+key=value) o mais rápido possível ou a --rate linhas/s, por TCP ou UDP.
+
+Com --measure o receptor sobe num processo filho (um núcleo, sem banco: NullSink) em portas
+locais e o script informa linhas/s recebidas e a maior latência entre a chegada de uma
+linha e a gravação do seu lote.
+
+Uso:
+    python -m benchmarks.syslog_replay --measure [--lines 200000] [--proto tcp]
+    python -m benchmarks.syslog_replay --host 127.0.0.1 --port 5140 --file test_log.txt --repeat 1000
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import time
+import urllib.parse
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vpn_dashboard.settings')
+django.setup()
+
+from benchmarks.fa_standin import synthetic_vpn_log
+from integrations.syslog import MicroBatcher, NullSink, SyslogReceiver
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def to_kv_line(log, pri=189):
+    """dict de log do FA → linha syslog key=value do FortiOS (valores decodificados, com aspas se preciso)."""
+    parts = []
+    for key, value in log.items():
+        value = urllib.parse.unquote(str(value))
+        if not value or ' ' in value or '"' in value or '=' in value:
+            value = '"' + value.replace('"', '\\"') + '"'
+        parts.append(f"{key}={value}")
+    return f"<{pri}>" + ' '.join(parts)
+
+
+def synthetic_lines(count):
+    with open(os.path.join(ROOT, 'antivirus_log.json'), encoding='utf-8') as f:
+        antivirus = json.load(f)
+    if isinstance(antivirus, str):
+        antivirus = json.loads(antivirus)
+    now = datetime.datetime.now()
+    lines = []
+    for index in range(count):
+        ts = now - datetime.timedelta(seconds=count - index)
+        if index % 10 == 9:
+            log = dict(antivirus, date=ts.strftime('%Y-%m-%d'), time=ts.strftime('%H:%M:%S'),
+                       eventtime=str(int(ts.timestamp() * 1e9) + index), sessionid=str(index))
+        else:
+            log = synthetic_vpn_log(index, ts)
+        lines.append(to_kv_line(log))
+    return lines
+
+
+def file_lines(path, repeat):
+    with open(path, encoding='utf-8', errors='replace') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return list(itertools.chain.from_iterable(itertools.repeat(lines, repeat)))
+
+
+def send(lines, host, port, proto, rate=0):
+    """Envia as linhas e devolve o tempo gasto."""
+    began = time.perf_counter()
+    interval = 1.0 / rate if rate else 0
+    if proto == 'tcp':
+        sock = socket.create_connection((host, port))
+        if interval:
+            for i, line in enumerate(lines):
+                sock.sendall(line.encode('utf-8') + b'\n')
+                _pace(began, i, interval)
+        else:
+            for start in range(0, len(lines), 1000):
+                sock.sendall(('\n'.join(lines[start:start + 1000]) + '\n').encode('utf-8'))
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for i, line in enumerate(lines):
+            sock.sendto(line.encode('utf-8'), (host, port))
+            if interval:
+                _pace(began, i, interval)
+    sock.close()
+    return time.perf_counter() - began
+
+
+def _pace(began, index, interval):
+    delay = began + (index + 1) * interval - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _receiver_process(port, expected, batch_size, flush_interval, ready, results):
+    """Receptor com NullSink; para quando recebe as linhas esperadas ou após 3 s sem linhas novas."""
+    batcher = MicroBatcher(NullSink(), batch_size=batch_size, flush_interval=flush_interval)
+    receiver = SyslogReceiver(batcher, host='127.0.0.1', udp_port=port, tcp_port=port, stats_interval=0)
+    timings = {}
+
+    async def watch():
+        last_count, last_change = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(0.01)
+            count = batcher.stats['lines']
+            if count and 'first' not in timings:
+                timings['first'] = time.monotonic()
+            if count != last_count:
+                last_count, last_change = count, time.monotonic()
+                timings['last'] = last_change
+            if count >= expected or (count and time.monotonic() - last_change > 3):
+                receiver.stop()
+                return
+
+    async def main():
+        receiver.ready = asyncio.Event()
+        serve = asyncio.create_task(receiver.serve())
+        await receiver.ready.wait()
+        ready.set()
+        await watch()
+        await serve
+        timings['done'] = time.monotonic()
+
+    asyncio.run(main())
+    batcher.close()
+    results.put({'stats': batcher.stats, 'elapsed': timings.get('last', 0) - timings.get('first', 0),
+                 'drain': timings['done'] - timings.get('last', timings['done'])})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure(lines, proto, batch_size, flush_interval, rate):
+    port = free_port()
+    ready = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process(
+        target=_receiver_process, args=(port, len(lines), batch_size, flush_interval, ready, results)
+    )
+    child.start()
+    ready.wait(10)
+    sent = send(lines, '127.0.0.1', port, proto, rate)
+    result = results.get(timeout=120)
+    child.join()
+
+    stats = result['stats']
+    print(f"Enviadas {len(lines)} linhas por {proto} em {sent:.2f}s ({len(lines) / sent:,.0f} linhas/s)")
+    print(f"Recebidas {stats['lines']} linhas em {result['elapsed']:.2f}s "
+          f"({stats['lines'] / max(result['elapsed'], 1e-9):,.0f} linhas/s no receptor)")
+    print(f"Roteadas {stats['parsed']}, ignoradas {stats['ignored']}, inválidas {stats['invalid']}, "
+          f"lotes {stats['batches']}")
+    print(f"Maior latência chegada → gravação do lote: {stats['max_latency'] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file', help='Arquivo com linhas syslog gravadas')
+    parser.add_argument('--repeat', type=int, default=1, help='Repetições do arquivo')
+    parser.add_argument('--lines', type=int, default=200000, help='Linhas sintéticas (sem --file)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5140)
+    parser.add_argument('--proto', choices=['tcp', 'udp'], default='tcp')
+    parser.add_argument('--rate', type=int, default=0, help='Linhas/s (0 = o mais rápido possível)')
+    parser.add_argument('--measure', action='store_true', help='Sobe um receptor local sem banco e mede')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    lines = file_lines(args.file, args.repeat) if args.file else synthetic_lines(args.lines)
+    if args.measure:
+        measure(lines, args.proto, args.batch_size, args.flush_interval, args.rate)
+    else:
+        elapsed = send(lines, args.host, args.port, args.proto, args.rate)
+        print(f"Enviadas {len(lines)} linhas para {args.host}:{args.port}/{args.proto} em {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -39,11 +39,13 @@ class VPNFailureSerializer(serializers.ModelSerializer):
     ad_display_name = serializers.SerializerMethodField()
     ad_department = serializers.SerializerMethodField()
     ad_title = serializers.SerializerMethodField()
+    # Payload comprimido no banco; a API continua entregando o dict do log
+    raw_data = serializers.JSONField(read_only=True)
 
     class Meta:
         from vpn_logs.models import VPNFailure
         model = VPNFailure
-        fields = '__all__'
+        exclude = ['raw_data_legacy']
 
     def _get_ad_info(self, obj):
         if not hasattr(self, '_ad_cache'):
@@ -32,7 +32,7 @@ class UserTimelineViewSet(viewsets.ViewSet):
         ).order_by('-timestamp')[:20]
 
         # Buscar Eventos de Segurança (Todos os tipos)
-        security_events = SecurityEvent.objects.filter(
+        security_events = SecurityEvent.objects.with_details().filter(
             Q(username__iexact=username) | Q(ad_display_name__icontains=username)
         ).order_by('-timestamp')[:50]
 
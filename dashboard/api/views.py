@@ -14,6 +14,8 @@ except ImportError:
     from ..models import UserRiskScore, RiskEvent
 
 from vpn_logs.models import VPNLog, VPNFailure
+from vpn_logs.summary import filter_summaries, user_totals, with_latest
+from integrations.partitions import day_range
 from .serializers import (
     VPNLogAggregatedSerializer, 
     VPNFailureSerializer, 
@@ -32,66 +34,13 @@ class VPNLogViewSet(viewsets.ModelViewSet):
     queryset = VPNLog.objects.all()
     serializer_class = VPNLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DashboardPagination
 
     def list(self, request):
-        """Aggregated list of VPN users with performance optimization"""
-        from dashboard.models import DashboardMetric
-        
-        # Apply filters from query params
-        user_q = request.query_params.get('user_q')
-        title_q = request.query_params.get('title_q')
-        dept_q = request.query_params.get('dept_q')
-        date_str = request.query_params.get('date')
-
-        # 0. Initial Queryset for base filtering - Including all VPN types
-        base_qs = VPNLog.objects.all()
-        
-        if user_q:
-            base_qs = base_qs.filter(Q(user__icontains=user_q) | Q(ad_display_name__icontains=user_q))
-        if title_q:
-            base_qs = base_qs.filter(ad_title__icontains=title_q)
-        if dept_q:
-            base_qs = base_qs.filter(ad_department__icontains=dept_q)
-        if date_str:
-            try:
-                filter_date = datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
-                base_qs = base_qs.filter(start_date=filter_date)
-            except ValueError:
-                pass
-
-        # Optimized aggregation: grouping by user is still needed for the table
-        # We use select_related or prefetch for any related data if needed
-        # (VPNLog doesn't have many foreign keys in this list view)
-        
-        latest_log_qs = VPNLog.objects.filter(user=OuterRef('user')).order_by('-start_time')
-        
-        qs = base_qs.values(
-            'user', 
-            'ad_display_name', 
-            'ad_department', 
-            'ad_title'
-        ).annotate(
-            total_connections=Count('id'),
-            total_duration=Sum('duration'),
-            total_volume=Sum(F('bandwidth_in') + F('bandwidth_out')),
-            last_connection=Max('start_time'),
-            latest_source_ip=Subquery(latest_log_qs.values('source_ip')[:1]),
-            latest_city=Subquery(latest_log_qs.values('city')[:1]),
-            latest_country=Subquery(latest_log_qs.values('country_name')[:1]),
-            latest_country_code=Subquery(latest_log_qs.values('country_code')[:1]),
-            latest_status=Subquery(latest_log_qs.values('status')[:1]),
-            online_priority=Subquery(
-                VPNLog.objects.filter(user=OuterRef('user'))
-                .order_by('-start_time')
-                .annotate(
-                    p=Case(
-                        When(status__in=['active', 'tunnel-up'], then=Value(1)),
-                        default=Value(0),
-                        output_field=IntegerField()
-                    )
-                ).values('p')[:1]
-            )
-        )
+        """Usuários de VPN agregados a partir do resumo diário (VPNUserDailySummary), paginado"""
+        # Todos os tipos de VPN; em dias com relatório de fidelidade, só o relatório
+        summaries = filter_summaries(request.query_params)
+        qs = user_totals(summaries)
 
         ordering_param = request.query_params.get('ordering', '-last_connection')
         sort_map = {
@@ -100,14 +49,19 @@ class VPNLogViewSet(viewsets.ModelViewSet):
             'duration': 'total_duration', '-duration': '-total_duration',
             'connections': 'total_connections', '-connections': '-total_connections',
             'last_connection': 'last_connection', '-last_connection': '-last_connection',
-            'title': 'ad_title', '-title': '-ad_title',
-            'dept': 'ad_department', '-dept': '-ad_department'
+            'title': 'title_order', '-title': '-title_order',
+            'dept': 'department_order', '-dept': '-department_order'
         }
         secondary_sort = sort_map.get(ordering_param, '-last_connection')
-        qs = qs.order_by('-online_priority', secondary_sort)
+        qs = qs.order_by('-online_priority', secondary_sort, 'user')
 
-        serializer = VPNLogAggregatedSerializer(qs, many=True)
+        # IP, local, status e AD da última conexão só para os usuários da página
+        page = with_latest(self.paginate_queryset(qs), summaries)
+        serializer = VPNLogAggregatedSerializer(page, many=True)
         return Response({
+            'count': self.paginator.page.paginator.count,
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link(),
             'logs': serializer.data,
             'server_time': datetime.datetime.now().isoformat()
         })
@@ -150,7 +104,8 @@ class VPNFailureViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         # Limitar a 500 registros mais recentes (se for remover, usar paginação segura)
-        queryset = VPNFailure.objects.all().order_by('-timestamp')
+        # raw_data vai no JSON da lista (detalhe expandido na tela de força bruta)
+        queryset = VPNFailure.objects.with_payload().order_by('-timestamp')
         user = self.request.query_params.get('user')
         ip = self.request.query_params.get('ip')
         start_date = self.request.query_params.get('start_date')
@@ -159,8 +114,9 @@ class VPNFailureViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(user__icontains=user)
         if ip:
             queryset = queryset.filter(source_ip__icontains=ip)
-        if start_date:
-            queryset = queryset.filter(timestamp__date=start_date)
+        day = day_range(start_date) if start_date else None
+        if day:
+            queryset = queryset.filter(timestamp__gte=day[0], timestamp__lt=day[1])
         return queryset
 
 class UserRiskScoreViewSet(viewsets.ReadOnlyModelViewSet):
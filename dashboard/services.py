@@ -201,13 +201,19 @@ class RiskScoringService:
 
         logger.info(f"Calculados dados para {len(user_data)} usuários. Iniciando validação AD...")
 
-        for username, data in user_data.items():
-            if username.lower() in ['unknown', 'n/a']: continue
-            if re.match(r'^\d{1,3}(\.\d{1,3}){3}$', username): continue
+        candidates = [
+            username for username in user_data
+            if username.lower() not in ['unknown', 'n/a'] and not re.match(r'^\d{1,3}(\.\d{1,3}){3}$', username)
+        ]
+        # Validação AD de todos os candidatos em lote (cache em um MGET, faltas em poucas buscas LDAP)
+        ad_infos = ad_client.get_users_info({username.split('\\')[-1] for username in candidates})
+
+        for username in candidates:
+            data = user_data[username]
 
             # Validação AD (Essencial para filtrar ruído de IPs externos)
             clean_user = username.split('\\')[-1]
-            if not ad_client.get_user_info(clean_user):
+            if not ad_infos.get(clean_user):
                 # Se não está no AD e o score é alto, logamos (pode ser um admin local ou conta fake)
                 if data['score'] > 50:
                     logger.warning(f"Usuário de alto risco ({data['score']}) ignorado (Not in AD): {username}")
@@ -297,7 +303,7 @@ class MetricsService:
         from django.db.models.functions import Coalesce
         
         # Base QuerySet
-        qs = SecurityEvent.objects.filter(event_type='webfilter', date=date)
+        qs = SecurityEvent.objects.with_details('webfilter').filter(event_type='webfilter', date=date)
         
         # Volume Calculation Helper (Bytes In + Bytes Out)
         volume_expr = Coalesce(F('bytes_in'), 0) + Coalesce(F('bytes_out'), 0)
@@ -357,7 +363,7 @@ class MetricsService:
         from security_events.models import SecurityEvent
         from django.db.models import Count
         
-        qs = SecurityEvent.objects.filter(event_type='ips', date=date)
+        qs = SecurityEvent.objects.with_details('ips').filter(event_type='ips', date=date)
         
         # Severity summary - Using order_by() to clear default Meta ordering for SQL Server
         sevs = qs.values('severity').annotate(c=Count('id')).order_by()
@@ -396,7 +402,7 @@ class MetricsService:
         from security_events.models import SecurityEvent
         from django.db.models import Count
         
-        qs = SecurityEvent.objects.filter(event_type='antivirus', date=date)
+        qs = SecurityEvent.objects.with_details('antivirus').filter(event_type='antivirus', date=date)
         
         total = qs.count()
         DashboardMetric.objects.update_or_create(
@@ -427,7 +433,7 @@ class MetricsService:
         from django.db.models.functions import Coalesce
         from django.db.models import Sum, F
         
-        qs = SecurityEvent.objects.filter(event_type='app-control', date=date)
+        qs = SecurityEvent.objects.with_details('app-control').filter(event_type='app-control', date=date)
         
         total = qs.count()
         DashboardMetric.objects.update_or_create(
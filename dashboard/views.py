@@ -4,10 +4,12 @@ from django.utils.decorators import method_decorator
 from django.views.generic import ListView
 from django.utils import timezone
 from datetime import timedelta
-from vpn_logs.models import VPNLog
+from vpn_logs.models import VPNUserDailySummary
+from vpn_logs.summary import filter_summaries, user_totals, with_latest
 from integrations.models import FortiAnalyzerConfig
+from integrations.partitions import day_range
 from .utils import export_to_xlsx
-from django.db.models import Sum, Count, Max, Q, Subquery, OuterRef, IntegerField, Case, When, Value
+from django.db.models import Sum, Count, F, Q
 from django.shortcuts import render
 from django.http import HttpResponse, JsonResponse
 from django.template.loader import get_template
@@ -22,7 +24,7 @@ def portal(request):
     return render(request, 'dashboard/portal.html', {'modules': modules})
 
 class VPNLogListView(LoginRequiredMixin, ListView):
-    model = VPNLog
+    model = VPNUserDailySummary
     template_name = 'dashboard/dashboard_premium.html'
     context_object_name = 'logs'
     paginate_by = 20
@@ -33,136 +35,35 @@ class VPNLogListView(LoginRequiredMixin, ListView):
         return ['dashboard/dashboard_premium.html']
     
     def get_queryset(self):
-        # Start with base queryset
-        # Detect days that already have finalized fidelity reports
-        days_with_fidelity = VPNLog.objects.filter(
-            session_id__startswith='fidelity_'
-        ).values_list('start_date', flat=True).distinct()
-
-        # Base queryset (Strict SSL Only)
-        # Exclude regular logs for days that have fidelity logs to avoid doubling stats
-        queryset = VPNLog.objects.filter(
-            Q(raw_data__tunneltype__startswith='ssl') | 
-            Q(raw_data__vpntype__icontains='ssl')
-        ).exclude(
-            ~Q(session_id__startswith='fidelity_'),
-            start_date__in=days_with_fidelity
-        )
-        
-        # Load Trusted Countries (keeping logic if needed for future, but row coloring might need adjustment)
-        config = FortiAnalyzerConfig.load()
-        trusted_countries = [c.strip().upper() for c in config.trusted_countries.split(',')]
-        
-        # Filter Logic (Keep existing filters)
-        # 1. User Filter
-        user_q = self.request.GET.get('user_q')
-        if user_q:
-            queryset = queryset.filter(
-                Q(user__icontains=user_q) | Q(ad_display_name__icontains=user_q)
-            )
-
-        # 2. Title Filter
-        title_q = self.request.GET.get('title_q')
-        if title_q:
-            queryset = queryset.filter(ad_title__icontains=title_q)
-
-        # 3. Dept Filter
-        dept_q = self.request.GET.get('dept_q')
-        if dept_q:
-            queryset = queryset.filter(ad_department__icontains=dept_q)
-
-        # 4. General Search
-        query = self.request.GET.get('q')
-        if query:
-            queryset = queryset.filter(
-                Q(user__icontains=query) | 
-                Q(ad_department__icontains=query) |
-                Q(ad_display_name__icontains=query)
-            )
-            
-        # 5. Date Filter
-        date_str = self.request.GET.get('date')
-        if date_str:
-            try:
-                filter_date = datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
-                queryset = queryset.filter(start_date=filter_date)
-            except ValueError:
-                pass
-        
-        # --- Aggregation Logic (Group by User) ---
-        
-        # Subquery for latest connection details (for context like IP, City)
-        # We order by -start_time to get the latest.
-        # Note: This subquery is correlated to the outer query via user=OuterRef('user')
-        latest_log_qs = VPNLog.objects.filter(
-            Q(user=OuterRef('user')),
-            Q(raw_data__tunneltype__startswith='ssl') | 
-            Q(raw_data__vpntype='ssl-vpn')
-        ).order_by('-start_time')
-        
-        # Aggregation Logic
-        # 1. Clear any existing ordering which might break grouping
-        # 2. Group by user fields
-        # 3. Annotate metrics
-        qs = queryset.order_by().values(
-            'user', 
-            'ad_display_name', 
-            'ad_department', 
-            'ad_title'
-        ).annotate(
-            total_connections=Count('id'),
-            total_duration=Sum('duration'),
-            total_volume=Sum('bandwidth_in') + Sum('bandwidth_out'),
-            last_connection=Max('start_time'),
-            # Fetch details from the latest log
-            latest_source_ip=Subquery(latest_log_qs.values('source_ip')[:1]),
-            latest_city=Subquery(latest_log_qs.values('city')[:1]),
-            latest_country=Subquery(latest_log_qs.values('country_name')[:1]),
-            latest_country_code=Subquery(latest_log_qs.values('country_code')[:1])
-        )
+        # Resumo diário por usuário (vpn_logs.summary), só SSL-VPN: dias com relatório de
+        # fidelidade já contam só o relatório, sem a varredura dos session_id 'fidelity_'
+        self.summaries = filter_summaries(self.request.GET, ssl_only=True)
+        qs = user_totals(self.summaries)
 
         # Dynamic Ordering
         ordering = self.request.GET.get('ordering')
-        
-        if ordering:
-            if ordering == 'volume':
-                qs = qs.order_by('-total_volume')
-            elif ordering == '-volume':
-                qs = qs.order_by('total_volume')
-            elif ordering == 'duration':
-                 qs = qs.order_by('-total_duration')
-            elif ordering == '-duration':
-                 qs = qs.order_by('total_duration')
-            elif ordering == 'start_time': 
-                 qs = qs.order_by('-last_connection')
-            elif ordering == '-start_time':
-                 qs = qs.order_by('last_connection')
-            elif ordering == 'user':
-                 qs = qs.order_by('user')
-            elif ordering == '-user':
-                 qs = qs.order_by('-user')
-            # Add other fields as needed
-        else:
-            # Fallback ordering to avoid UnorderedObjectListWarning
-            qs = qs.order_by('-last_connection', 'user')
-            
-        return qs
+        sort_map = {
+            'volume': '-total_volume', '-volume': 'total_volume',
+            'duration': '-total_duration', '-duration': 'total_duration',
+            'start_time': '-last_connection', '-start_time': 'last_connection',
+            'user': 'user', '-user': '-user',
+            'ad_title': 'title_order', '-ad_title': '-title_order',
+            'ad_department': 'department_order', '-ad_department': '-department_order',
+        }
+        return qs.order_by(sort_map.get(ordering, '-last_connection'), 'user')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        queryset = self.get_queryset() # This re-evaluates, but necessary for stats based on filtered view if desired, though stats usually global.
-        # Actually stats in context are global usually.
-        # Let's keep existing logic but careful about queryset re-use if expensive.
-        
-        # Estatísticas (Global context relative to current filters if we reused logic properly, 
-        # but the original code did a rough count. Let's keep it simple.)
-        # Note: 'queryset' here allows filtering stats by the current search, which is good.
-        
-        context['active_users_count'] = queryset.values('user').distinct().count()
-        
-        total_in = queryset.aggregate(Sum('bandwidth_in'))['bandwidth_in__sum'] or 0
-        total_out = queryset.aggregate(Sum('bandwidth_out'))['bandwidth_out__sum'] or 0
-        total_bytes = total_in + total_out
+        # IP, local e AD da última conexão só para os usuários da página
+        context[self.context_object_name] = context['object_list'] = with_latest(context['object_list'], self.summaries)
+
+        # Estatísticas dos filtros atuais
+        totals = self.summaries.aggregate(
+            users=Count('user', distinct=True),
+            volume=Sum(F('bandwidth_in') + F('bandwidth_out')),
+        )
+        context['active_users_count'] = totals['users']
+        total_bytes = totals['volume'] or 0
         
         # Formatar volume total
         gb = total_bytes / (1024 * 1024 * 1024)
@@ -197,41 +98,12 @@ class BruteForceListView(LoginRequiredMixin, ListView):
 
 @login_required
 def export_logs_pdf(request):
-    # Reuse filtering logic manually since we are not in a ListView
-    # Reuse filtering logic manually since we are not in a ListView
-    # SSL Only
-    queryset = VPNLog.objects.filter(
-        Q(raw_data__tunneltype__startswith='ssl') | 
-        Q(raw_data__vpntype__icontains='ssl')
-    )
-    
-    # 1. Date Filter
+    # Uma linha por usuário e dia, do resumo diário (mesmos filtros da listagem, só SSL-VPN)
+    logs = filter_summaries(request.GET, ssl_only=True).order_by('-date', '-last_connection', 'user')
     date_str = request.GET.get('date')
-    if date_str:
-        queryset = queryset.filter(start_date=date_str)
-    
-    # 2. Column Filters
     user_q = request.GET.get('user_q')
-    if user_q:
-        queryset = queryset.filter(user__icontains=user_q)
-
     title_q = request.GET.get('title_q')
-    if title_q:
-        queryset = queryset.filter(ad_title__icontains=title_q)
-
     dept_q = request.GET.get('dept_q')
-    if dept_q:
-        queryset = queryset.filter(ad_department__icontains=dept_q)
-
-    # 3. Annotation (Copying logic from ListView)
-    daily_count_subquery = VPNLog.objects.filter(
-        user=OuterRef('user'), 
-        start_date=OuterRef('start_date')
-    ).order_by().values('user').annotate(count=Count('id')).values('count')
-    
-    logs = queryset.annotate(
-        daily_connection_count=Subquery(daily_count_subquery, output_field=IntegerField())
-    ).order_by('-start_time')
 
     # Prepare context
     filter_desc = []
@@ -318,44 +190,23 @@ def export_bruteforce_pdf(request):
 
 @login_required
 def export_logs_xlsx(request):
-    # SSL Only
-    queryset = VPNLog.objects.filter(
-        Q(raw_data__tunneltype__startswith='ssl') | 
-        Q(raw_data__vpntype__icontains='ssl')
-    )
-    
-    # Apply Filters (Same as PDF)
-    date_str = request.GET.get('date')
-    if date_str:
-        queryset = queryset.filter(start_date=date_str)
-        
-    user_q = request.GET.get('user_q')
-    if user_q:
-        queryset = queryset.filter(user__icontains=user_q)
-
-    title_q = request.GET.get('title_q')
-    if title_q:
-        queryset = queryset.filter(ad_title__icontains=title_q)
-
-    dept_q = request.GET.get('dept_q')
-    if dept_q:
-        queryset = queryset.filter(ad_department__icontains=dept_q)
-        
-    queryset = queryset.order_by('-start_time')
+    # Uma linha por usuário e dia, do resumo diário (mesmos filtros do PDF, só SSL-VPN)
+    queryset = filter_summaries(request.GET, ssl_only=True).order_by('-date', '-last_connection', 'user')
     
-    headers = ['Data/Hora', 'Usuário', 'Origem', 'Conectado em', 'Duração', 'Volume']
+    headers = ['Data/Hora', 'Usuário', 'Conexões', 'Origem', 'Conectado em', 'Duração', 'Volume']
     
     def format_volume(obj):
-        bytes_val = (obj.bandwidth_in or 0) + (obj.bandwidth_out or 0)
+        bytes_val = obj.total_volume
         gb = bytes_val / (1024 ** 3)
         if gb >= 1: return f"{gb:.2f} GB"
         return f"{(bytes_val / (1024 ** 2)):.2f} MB"
 
     field_mapping = [
-        lambda x: x.start_time.strftime('%d/%m/%Y %H:%M') if x.start_time else '',
+        lambda x: x.last_connection.strftime('%d/%m/%Y %H:%M') if x.last_connection else '',
         'user',
-        'source_ip',
-        'city',
+        'connections',
+        'last_source_ip',
+        'last_city',
         'duration', # You might want to format duration too if it's seconds
         format_volume
     ]
@@ -365,45 +216,22 @@ def export_logs_xlsx(request):
 
 @login_required
 def dashboard_stats_api(request):
-    # Base QuerySet for Stats - Include all VPN types
-    base_qs = VPNLog.objects.all()
-
-    # --- Apply Filters ---
+    # Base: resumo diário por usuário (vpn_logs.summary), todos os tipos de VPN
+    base_qs = filter_summaries(request.GET, with_date=False)
     user_q = request.GET.get('user_q')
-    if user_q:
-        base_qs = base_qs.filter(
-            Q(user__icontains=user_q) | Q(ad_display_name__icontains=user_q)
-        )
-
-    title_q = request.GET.get('title_q')
-    if title_q:
-        base_qs = base_qs.filter(ad_title__icontains=title_q)
-
-    dept_q = request.GET.get('dept_q')
-    if dept_q:
-        base_qs = base_qs.filter(ad_department__icontains=dept_q)
-
-    # Search Query (q)
-    query = request.GET.get('q')
-    if query:
-        base_qs = base_qs.filter(
-            Q(user__icontains=query) | 
-            Q(ad_department__icontains=query) |
-            Q(ad_display_name__icontains=query)
-        )
 
     # 1. Daily Trend (Last 30 Days)
     # Trend always shows context, so we don't apply the 'date' filter here.
     last_30_days = timezone.now().date() - timedelta(days=30)
-    daily_trend = base_qs.filter(start_date__gte=last_30_days)\
+    daily_trend = base_qs.filter(date__gte=last_30_days)\
         .order_by()\
-        .values('start_date')\
-        .annotate(count=Count('id'))\
-        .order_by('start_date')
+        .values('date')\
+        .annotate(count=Sum('connections'))\
+        .order_by('date')
         
     trend_data = [
         {
-            'date': entry['start_date'].strftime('%Y-%m-%d'),
+            'date': entry['date'].strftime('%Y-%m-%d'),
             'count': entry['count']
         } for entry in daily_trend
     ]
@@ -413,19 +241,19 @@ def dashboard_stats_api(request):
     if date_str:
         try:
             target_date = datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
-            chart_qs = base_qs.filter(start_date=target_date)
+            chart_qs = base_qs.filter(date=target_date)
         except ValueError:
             target_date = timezone.localtime(timezone.now()).date()
-            chart_qs = base_qs.filter(start_date=target_date)
+            chart_qs = base_qs.filter(date=target_date)
     else:
         target_date = timezone.localtime(timezone.now()).date()
-        chart_qs = base_qs.filter(start_date=target_date)
+        chart_qs = base_qs.filter(date=target_date)
 
     # 2. Top 5 Departments
     top_depts = chart_qs.exclude(ad_department__isnull=True).exclude(ad_department='')\
         .order_by()\
         .values('ad_department')\
-        .annotate(count=Count('id'))\
+        .annotate(count=Sum('connections'))\
         .order_by('-count')[:5]
         
     dept_data = {
@@ -437,7 +265,7 @@ def dashboard_stats_api(request):
     top_titles = chart_qs.exclude(ad_title__isnull=True).exclude(ad_title='')\
         .order_by()\
         .values('ad_title')\
-        .annotate(count=Count('id'))\
+        .annotate(count=Sum('connections'))\
         .order_by('-count')[:5]
 
     title_data = {
@@ -445,10 +273,10 @@ def dashboard_stats_api(request):
         'data': [entry['count'] for entry in top_titles]
     }
     
-    # 4. Top 5 Users by Volume
+    # 4. Top 5 Users by Volume (somando as linhas SSL e não SSL do usuário no dia)
     top_users = chart_qs.order_by()\
         .values('user')\
-        .annotate(total_bytes=Sum('bandwidth_in') + Sum('bandwidth_out'))\
+        .annotate(total_bytes=Sum(F('bandwidth_in') + F('bandwidth_out')))\
         .order_by('-total_bytes')[:5]
         
     user_data = {
@@ -457,10 +285,15 @@ def dashboard_stats_api(request):
     }
     
     # 5. Period Totals
+    totals = chart_qs.aggregate(
+        connections=Sum('connections'),
+        users=Count('user', distinct=True),
+        vol=Sum(F('bandwidth_in') + F('bandwidth_out')),
+    )
     period_stats = {
-        'total_connections': chart_qs.count(), 
-        'active_users': chart_qs.values('user').distinct().count(),
-        'total_volume_bytes': chart_qs.aggregate(vol=Sum('bandwidth_in') + Sum('bandwidth_out'))['vol'] or 0
+        'total_connections': totals['connections'] or 0,
+        'active_users': totals['users'],
+        'total_volume_bytes': totals['vol'] or 0
     }
 
     # 6. Top Brute Force Targets (Failures)
@@ -469,7 +302,8 @@ def dashboard_stats_api(request):
     if user_q:
         failure_qs = failure_qs.filter(user__icontains=user_q)
     if date_str:
-        failure_qs = failure_qs.filter(timestamp__date=target_date)
+        start, end = day_range(target_date)
+        failure_qs = failure_qs.filter(timestamp__gte=start, timestamp__lt=end)
     
     top_failures = failure_qs.values('user')\
         .annotate(count=Count('id'))\
@@ -509,7 +343,8 @@ def bruteforce_stats_api(request):
     if start_date:
         try:
             target_date = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
-            time_filter = Q(timestamp__date=target_date)
+            start, end = day_range(target_date)
+            time_filter = Q(timestamp__gte=start, timestamp__lt=end)
         except ValueError:
             time_filter = Q(timestamp__gte=timezone.now() - timedelta(hours=24))
     else:
@@ -1,4 +1,5 @@
-from ldap3 import Server, Connection, ALL
+from ldap3 import Server, Connection, ALL, NONE
+from ldap3.utils.conv import escape_filter_chars
 from .models import ActiveDirectoryConfig
 import json
 import logging
@@ -12,11 +13,29 @@ try:
 except:
     redis_client = None
 
+AD_USER_ATTRIBUTES = ['sAMAccountName', 'mail', 'department', 'displayName', 'title']
+# Nomes por filtro OR no get_users_info (mantém o filtro LDAP em tamanho razoável)
+AD_LOOKUP_CHUNK = 100
+AD_CACHE_HIT_TTL = 3600
+AD_CACHE_MISS_TTL = 600
+
+def _entry_to_info(entry):
+    return {
+        'email': str(entry.mail) if hasattr(entry, 'mail') and entry.mail else None,
+        'department': str(entry.department) if hasattr(entry, 'department') and entry.department else None,
+        'display_name': str(entry.displayName) if hasattr(entry, 'displayName') and entry.displayName else None,
+        'title': str(entry.title) if hasattr(entry, 'title') and entry.title else None
+    }
+
 class ActiveDirectoryClient:
     def __init__(self):
         self.config = ActiveDirectoryConfig.load()
 
-    def get_connection(self):
+    def get_connection(self, get_info=ALL):
+        """
+        Abre uma conexão autenticada. Buscas de usuário não precisam do schema/DSE do
+        servidor: use get_info=NONE para evitar essa leitura extra a cada conexão.
+        """
         if not self.config.server:
             return None
             
@@ -24,7 +43,7 @@ class ActiveDirectoryClient:
             self.config.server, 
             port=self.config.port, 
             use_ssl=self.config.use_ssl,
-            get_info=ALL
+            get_info=get_info
         )
         # Se for necessário autenticação
         if self.config.bind_user and self.config.bind_password:
@@ -45,50 +64,97 @@ class ActiveDirectoryClient:
         """
         if not username:
             return None
+        return self.get_users_info([username]).get(username)
+
+    def get_users_info(self, usernames, chunk_size=AD_LOOKUP_CHUNK):
+        """
+        Versão em lote de get_user_info: {username: info ou None} para cada nome informado.
+
+        Os nomes são deduplicados (sem diferenciar maiúsculas), os acertos vêm do Redis em
+        um único MGET e as faltas são resolvidas com uma busca LDAP por bloco, usando um
+        filtro OR de sAMAccountName, sobre uma única conexão. Resultados (inclusive os não
+        encontrados) voltam para o cache em um pipeline.
+        """
+        wanted = {}
+        for username in usernames:
+            if username:
+                wanted.setdefault(username.lower(), []).append(username)
+        if not wanted:
+            return {}
 
-        # 1. Tentar Cache
-        cache_key = f"ad_user:{username.lower()}"
+        found = {}
+        missing = list(wanted)
+
+        # 1. Tentar Cache (um MGET para o lote inteiro)
         if redis_client:
             try:
-                cached = redis_client.get(cache_key)
-                if cached:
-                    return json.loads(cached)
+                cached = redis_client.mget([f"ad_user:{key}" for key in missing])
+                missing = []
+                for key, value in zip(wanted, cached):
+                    if value:
+                        found[key] = json.loads(value)
+                    else:
+                        missing.append(key)
             except:
-                pass
+                missing = list(wanted)
 
-        # 2. Consultar AD
-        conn = self.get_connection()
-        if not conn:
-            return None
+        # 2. Consultar AD (uma conexão, uma busca por bloco)
+        if missing:
+            resolved = self._search_users(missing, chunk_size)
+            found.update(resolved)
 
-        search_filter = f'(&(objectClass=user)(sAMAccountName={username}))'
-        
-        try:
-            conn.search(
-                search_base=self.config.base_dn,
-                search_filter=search_filter,
-                attributes=['mail', 'department', 'displayName', 'title']
-            )
-            
-            res = None
-            if conn.entries:
-                entry = conn.entries[0]
-                res = {
-                    'email': str(entry.mail) if hasattr(entry, 'mail') and entry.mail else None,
-                    'department': str(entry.department) if hasattr(entry, 'department') and entry.department else None,
-                    'display_name': str(entry.displayName) if hasattr(entry, 'displayName') and entry.displayName else None,
-                    'title': str(entry.title) if hasattr(entry, 'title') and entry.title else None
-                }
-            
-            # 3. Salvar no Cache (mesmo se for None, para evitar negativas repetitivas, por 10min)
-            if redis_client:
+            # 3. Salvar no Cache (inclusive negativas, por 10min, para evitar buscas repetitivas)
+            if redis_client and resolved:
                 try:
-                    expiry = 3600 if res else 600
-                    redis_client.setex(cache_key, expiry, json.dumps(res))
+                    pipe = redis_client.pipeline(transaction=False)
+                    for key, res in resolved.items():
+                        expiry = AD_CACHE_HIT_TTL if res else AD_CACHE_MISS_TTL
+                        pipe.setex(f"ad_user:{key}", expiry, json.dumps(res))
+                    pipe.execute()
                 except:
                     pass
-            
-            return res
+
+        return {username: found.get(key) for key, names in wanted.items() for username in names}
+
+    def _search_users(self, keys, chunk_size):
+        """
+        Resolve nomes (minúsculos) no AD. Blocos que falham ficam de fora do resultado,
+        para não serem gravados no cache como inexistentes.
+        """
+        try:
+            conn = self.get_connection(get_info=NONE)
         except Exception as e:
-            logger.error(f"Erro ao consultar AD para {username}: {e}")
-            return None
+            logger.error(f"Erro ao conectar no AD: {e}")
+            return {}
+        if not conn:
+            return {}
+
+        resolved = {}
+        try:
+            for i in range(0, len(keys), chunk_size):
+                chunk = keys[i:i + chunk_size]
+                terms = ''.join(f'(sAMAccountName={escape_filter_chars(key)})' for key in chunk)
+                search_filter = f'(&(objectClass=user)(|{terms}))'
+                try:
+                    conn.search(
+                        search_base=self.config.base_dn,
+                        search_filter=search_filter,
+                        attributes=AD_USER_ATTRIBUTES
+                    )
+                except Exception as e:
+                    logger.error(f"Erro ao consultar AD para {len(chunk)} usuários: {e}")
+                    continue
+
+                entries = {}
+                for entry in conn.entries:
+                    account = str(entry.sAMAccountName).lower() if hasattr(entry, 'sAMAccountName') and entry.sAMAccountName else None
+                    if account and account not in entries:
+                        entries[account] = _entry_to_info(entry)
+                for key in chunk:
+                    resolved[key] = entries.get(key)
+        finally:
+            try:
+                conn.unbind()
+            except Exception:
+                pass
+        return resolved
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import FortiAnalyzerConfig, ActiveDirectoryConfig
+from .models import FortiAnalyzerConfig, ActiveDirectoryConfig, CollectionWatermark
 
 class SingletonModelAdmin(admin.ModelAdmin):
     """
@@ -37,6 +37,13 @@ class ActiveDirectoryConfigAdmin(SingletonModelAdmin):
         }),
     )
 
+@admin.register(CollectionWatermark)
+class CollectionWatermarkAdmin(admin.ModelAdmin):
+    # Apagar uma marca força a próxima coleta a refazer a janela de bootstrap
+    list_display = ('log_type', 'subtype', 'adom', 'last_timestamp', 'rows_per_hour', 'updated_at')
+    list_filter = ('log_type', 'adom')
+    readonly_fields = ('updated_at',)
+
 # Customized Group Admin to allow AD Search
 from django.contrib.auth.models import Group
 from django.contrib.auth.admin import GroupAdmin as BaseGroupAdmin
@@ -5,3 +5,7 @@ class IntegrationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'integrations'
     verbose_name = 'Integrações'
+
+    def ready(self):
+        from integrations.config_cache import watch
+        watch(self.get_model('FortiAnalyzerConfig'), self.get_model('ActiveDirectoryConfig'))
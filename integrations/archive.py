@@ -0,0 +1,492 @@
+"""
+Camada fria dos logs: dias fechados exportados para Parquet e consultados com DuckDB.
+
+    LOG_ARCHIVE['path']/<tabela>/day=AAAA-MM-DD/data.parquet   (zstd, um arquivo por dia)
+
+archive_closed_days (task diária) exporta cada dia fechado (anterior a hoje menos
+grace_days) de SecurityEvent (com os campos das tabelas de detalhe e o raw_log
+descomprimido), VPNLog, VPNFailure e ADAuthEvent. cleanup_old_logs exporta o que ainda
+faltar antes da retenção e não apaga os registros de um model cuja exportação falhou.
+Dias sem registros também ganham arquivo (vazio): a cobertura é contínua do primeiro dia
+exportado até archived_through(), sem manifesto à parte.
+
+Antes de apagar, a retenção também reexporta (refresh_before) os dias já arquivados que
+ainda têm registros no banco antes do corte: o arquivo do dia é regravado com as linhas
+atuais do banco mais as linhas antigas do arquivo que já não estão nele (por id). Assim
+registros que chegaram ou mudaram depois da primeira exportação do dia não se perdem.
+
+Consultas: TieredStats agrega um intervalo de dias somando o DuckDB para os dias
+arquivados (read_parquet com hive partitioning: o filtro por day só abre os arquivos do
+intervalo) e o banco para os dias seguintes. Só entra em cena quando o intervalo começa
+antes da janela quente (retention_days); dentro dela tudo continua vindo do banco.
+Até a retenção reexportar o dia, registros que chegarem ao banco depois da exportação não
+entram nas consultas ao arquivo: use grace_days maior que o atraso máximo da coleta.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from integrations.partitions import day_range
+from integrations.payloads import CompressedPayloadField, payload_fields
+import datetime
+import json
+import logging
+import os
+import threading
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# model → campo que define o dia do registro (day_field: DateField; senão o dia local de
+# time_field) e instante usado pela retenção (time_field)
+ARCHIVED_MODELS = {
+    'security_events.SecurityEvent': {'day_field': 'date', 'time_field': 'timestamp'},
+    'vpn_logs.VPNLog': {'time_field': 'start_time'},
+    'vpn_logs.VPNFailure': {'time_field': 'timestamp'},
+    'security_events.ADAuthEvent': {'time_field': 'timestamp'},
+}
+
+DEFAULT_ARCHIVE_SETTINGS = {
+    'enabled': False,
+    'path': 'archive',
+    'grace_days': 2,
+    'row_group_size': 100000,
+}
+
+_local = threading.local()
+
+
+def get_archive_settings(overrides=None):
+    options = dict(DEFAULT_ARCHIVE_SETTINGS)
+    options.update(getattr(settings, 'LOG_ARCHIVE', None) or {})
+    options.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return options
+
+
+def archive_enabled():
+    return bool(get_archive_settings()['enabled'])
+
+
+def get_spec(label):
+    from django.apps import apps
+    spec = dict(ARCHIVED_MODELS[label])
+    spec['label'] = label
+    spec['model'] = apps.get_model(label)
+    spec['table'] = spec['model']._meta.db_table
+    return spec
+
+
+def _day_lookup(spec, first, last=None):
+    """Filtro do ORM para os dias first..last (inclusive)."""
+    last = last or first
+    if spec.get('day_field'):
+        return {f"{spec['day_field']}__gte": first, f"{spec['day_field']}__lte": last}
+    return {f"{spec['time_field']}__gte": day_range(first)[0], f"{spec['time_field']}__lt": day_range(last)[1]}
+
+
+# --- Arquivos ---
+
+def table_dir(spec):
+    return os.path.join(str(get_archive_settings()['path']), spec['table'])
+
+
+def day_path(spec, day):
+    return os.path.join(table_dir(spec), f"day={day.isoformat()}", 'data.parquet')
+
+
+def archived_days(spec):
+    """Dias já exportados do model, em ordem."""
+    days = []
+    try:
+        names = os.listdir(table_dir(spec))
+    except FileNotFoundError:
+        return days
+    for name in names:
+        if name.startswith('day=') and os.path.exists(os.path.join(table_dir(spec), name, 'data.parquet')):
+            try:
+                days.append(datetime.date.fromisoformat(name[4:]))
+            except ValueError:
+                continue
+    return sorted(days)
+
+
+def archived_through(spec):
+    """Último dia arquivado (a exportação é contínua até ele), ou None."""
+    days = archived_days(spec)
+    return days[-1] if days else None
+
+
+# --- Exportação ---
+
+def _source(model):
+    """Queryset completo do model: payloads carregados e, em SecurityEvent, os campos de detalhe."""
+    queryset = model._default_manager.all()
+    if hasattr(queryset, 'with_payload'):
+        queryset = queryset.with_payload()
+    if hasattr(queryset, 'with_details'):
+        queryset = queryset.with_details()
+    return queryset.order_by()
+
+
+def _columns(model):
+    """[(coluna, campo)] exportados: campos concretos (sem as colunas antigas dos payloads) e detalhes."""
+    legacy = {field.legacy_field for field in payload_fields(model) if field.legacy_field}
+    columns = [(field.attname, field) for field in model._meta.concrete_fields if field.name not in legacy]
+    from security_events.models import DETAIL_MODELS, SecurityEvent
+    if model is SecurityEvent:
+        seen = {name for name, _ in columns}
+        for detail in DETAIL_MODELS.values():
+            for name in detail.FIELDS:
+                if name not in seen:
+                    seen.add(name)
+                    columns.append((name, detail._meta.get_field(name)))
+    return columns
+
+
+def _arrow_type(field):
+    internal = field.get_internal_type()
+    if isinstance(field, CompressedPayloadField) or internal == 'JSONField':
+        return pyarrow.string()
+    if internal.endswith('AutoField') or internal.endswith('IntegerField'):
+        return pyarrow.int64()
+    return {
+        'BooleanField': pyarrow.bool_(),
+        'DateField': pyarrow.date32(),
+        'DateTimeField': pyarrow.timestamp('us', tz='UTC'),
+        'FloatField': pyarrow.float64(),
+        'DecimalField': pyarrow.float64(),
+    }.get(internal, pyarrow.string())
+
+
+def _converters(model, columns):
+    """{coluna: função} para os valores que o Parquet não aceita como vêm do ORM."""
+    converters = {}
+    for name, field in columns:
+        if isinstance(field, CompressedPayloadField):
+            def convert(value, row, field=field):
+                value = field.decode(value) if value is not None else (row.get(field.legacy_field) if field.legacy_field else None)
+                return value if value is None or isinstance(value, str) else json.dumps(value)
+            converters[name] = convert
+        elif field.get_internal_type() == 'JSONField':
+            converters[name] = lambda value, row: None if value is None else json.dumps(value)
+        elif field.get_internal_type() == 'DecimalField':
+            converters[name] = lambda value, row: None if value is None else float(value)
+    return converters
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImproperlyConfigured("LOG_ARCHIVE requer o pacote pyarrow.")
+
+
+def _kept_rows(path, schema, pk, exported_ids):
+    """Linhas do arquivo atual do dia cujo id não foi exportado de novo, no schema atual."""
+    old = pyarrow.parquet.read_table(path)
+    if exported_ids:
+        ids = pyarrow.array(sorted(exported_ids), type=old.schema.field(pk).type)
+        old = old.filter(pyarrow.compute.invert(pyarrow.compute.is_in(old[pk], value_set=ids)))
+    columns = [
+        old[name].cast(field.type) if name in old.column_names else pyarrow.nulls(old.num_rows, field.type)
+        for name, field in zip(schema.names, schema)
+    ]
+    return pyarrow.Table.from_arrays(columns, schema=schema)
+
+
+def export_day(spec, day, merge=False):
+    """
+    Grava o dia em Parquet (substitui o arquivo existente) e devolve o número de linhas.
+    merge=True mantém as linhas do arquivo anterior que já não estão no banco (mesmo id:
+    vale a versão do banco).
+    """
+    _require_pyarrow()
+    model = spec['model']
+    columns = _columns(model)
+    converters = _converters(model, columns)
+    legacy = [field.legacy_field for field in payload_fields(model) if field.legacy_field]
+    schema = pyarrow.schema([(name, _arrow_type(field)) for name, field in columns])
+    size = get_archive_settings()['row_group_size']
+
+    path = day_path(spec, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    rows = 0
+    pk = model._meta.pk.attname
+    exported_ids = set()
+    queryset = _source(model).filter(**_day_lookup(spec, day)).values(*[name for name, _ in columns], *legacy)
+    writer = pyarrow.parquet.ParquetWriter(tmp, schema, compression='zstd')
+    try:
+        batch = []
+        for row in queryset.iterator(chunk_size=min(size, 10000)):
+            for name, convert in converters.items():
+                row[name] = convert(row[name], row)
+            batch.append(row)
+            if merge:
+                exported_ids.add(row[pk])
+            if len(batch) >= size:
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                rows += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+            rows += len(batch)
+        if merge and os.path.exists(path):
+            kept = _kept_rows(path, schema, pk, exported_ids)
+            if kept.num_rows:
+                writer.write_table(kept, row_group_size=size)
+                rows += kept.num_rows
+    finally:
+        writer.close()
+    os.replace(tmp, path)
+    return rows
+
+
+def _first_day(spec):
+    field = spec.get('day_field') or spec['time_field']
+    first = _source(spec['model']).order_by(field).values_list(field, flat=True).first()
+    if isinstance(first, datetime.datetime):
+        first = timezone.localtime(first).date()
+    return first
+
+
+def export_until(label, last_day):
+    """
+    Exporta os dias ainda não arquivados até last_day (inclusive), a partir do dia seguinte
+    ao último arquivado (ou do registro mais antigo). Devolve {dia: linhas}.
+    """
+    spec = get_spec(label)
+    through = archived_through(spec)
+    day = through + datetime.timedelta(days=1) if through else _first_day(spec)
+    exported = {}
+    while day is not None and day <= last_day:
+        exported[day] = export_day(spec, day)
+        day += datetime.timedelta(days=1)
+    if exported:
+        logger.info(f"{label}: {len(exported)} dias arquivados até {last_day} ({sum(exported.values())} registros)")
+    return exported
+
+
+def days_before(spec, cutoff):
+    """Dias (locais) com registros no banco anteriores a cutoff (datetime aware), em ordem."""
+    field, time_field = spec.get('day_field'), spec['time_field']
+    # Mesmo filtro da retenção (integrations.partitions.apply_retention)
+    queryset = spec['model']._default_manager.order_by().filter(**{f'{time_field}__lt': cutoff})
+    if field:
+        days = queryset.filter(**{f'{field}__lte': timezone.localtime(cutoff).date()}).values_list(field, flat=True)
+    else:
+        days = queryset.annotate(day=TruncDate(time_field)).values_list('day', flat=True)
+    return sorted(set(days.distinct()))
+
+
+def refresh_before(label, cutoff):
+    """
+    Reexporta, mesclando com o arquivo, os dias já arquivados que ainda têm registros no
+    banco antes de cutoff: o que a retenção vai apagar fica no arquivo mesmo que tenha
+    chegado ou mudado depois da exportação do dia. Devolve {dia: linhas}.
+    """
+    spec = get_spec(label)
+    through = archived_through(spec)
+    if through is None:
+        return {}
+    refreshed = {day: export_day(spec, day, merge=True) for day in days_before(spec, cutoff) if day <= through}
+    if refreshed:
+        logger.info(f"{label}: {len(refreshed)} dias arquivados reexportados antes da retenção ({sum(refreshed.values())} registros)")
+    return refreshed
+
+
+def closed_day():
+    """Último dia considerado fechado (hoje menos grace_days)."""
+    return timezone.localdate() - datetime.timedelta(days=get_archive_settings()['grace_days'])
+
+
+# --- Consultas (DuckDB) ---
+
+def _connection():
+    if duckdb is None:
+        raise ImproperlyConfigured("Consultas ao arquivo de logs requerem o pacote duckdb.")
+    if getattr(_local, 'duckdb', None) is None:
+        _local.duckdb = duckdb.connect(database=':memory:')
+    return _local.duckdb
+
+
+def cold_relation(spec):
+    """Expressão FROM do arquivo do model; a coluna day (partição) vem do caminho."""
+    pattern = os.path.join(table_dir(spec), 'day=*', 'data.parquet').replace("'", "''")
+    return f"read_parquet('{pattern}', hive_partitioning = true, union_by_name = true)"
+
+
+def cold_query(spec, sql, params=()):
+    """Executa sql (com {table} no lugar da relação do arquivo) e devolve as linhas como tuplas."""
+    return _connection().execute(sql.format(table=cold_relation(spec)), list(params)).fetchall()
+
+
+def hot_window_start():
+    """Primeiro dia garantidamente no banco pela política de retenção (None: retenção desligada)."""
+    from setup.models import DatabaseConfiguration
+    config = DatabaseConfiguration.get_active_config()
+    if not config or not config.is_retention_enabled or config.retention_days <= 0:
+        return None
+    return timezone.localdate() - datetime.timedelta(days=config.retention_days - 1)
+
+
+def _q(conditions):
+    """Q de {coluna: valor ou lista}."""
+    return Q(**{
+        f'{column}__in' if isinstance(value, (list, tuple)) else column: value
+        for column, value in (conditions or {}).items()
+    })
+
+
+def _parse_day(value):
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class TieredStats:
+    """
+    Agregações de um intervalo de dias divididas entre arquivo (dias até archived_through) e
+    banco (dias seguintes). `queryset` já traz os filtros da requisição para a parte quente;
+    `where` ({coluna: valor ou lista}) são os filtros que valem nas duas partes.
+    Sem parte fria (intervalo dentro da janela quente, arquivo desligado ou vazio) é o
+    próprio queryset, com os LIMITs no banco.
+    """
+
+    def __init__(self, label, queryset, start, end=None, where=None, cold_allowed=True):
+        self.spec = get_spec(label)
+        self.where = where or {}
+        self.hot = queryset
+        self.cold_range = None
+        start, end = _parse_day(start), _parse_day(end) or timezone.localdate()
+        hot_start = hot_window_start()
+        if not (cold_allowed and start and hot_start and start < hot_start and archive_enabled()):
+            return
+        through = archived_through(self.spec)
+        if through is None or through < start or duckdb is None:
+            return
+        self.cold_range = (start, min(end, through))
+        after = through + datetime.timedelta(days=1)
+        self.hot = queryset.filter(**_day_lookup(self.spec, after, end)) if end >= after else queryset.none()
+
+    @property
+    def uses_archive(self):
+        return self.cold_range is not None
+
+    # Parte quente (ORM)
+
+    def _hot(self, where, exclude_empty=None):
+        queryset = self.hot
+        for conditions in (self.where, where):
+            queryset = queryset.filter(_q(conditions))
+        if exclude_empty:
+            queryset = queryset.exclude(**{exclude_empty: ''})
+        return queryset
+
+    @staticmethod
+    def _hot_value(value, conditions=None):
+        condition = _q(conditions) if conditions else None
+        if value is None:
+            return Count('pk', filter=condition)
+        terms = [Coalesce(F(column), 0) for column in value]
+        return Sum(sum(terms[1:], terms[0]), filter=condition)
+
+    # Parte fria (DuckDB)
+
+    @staticmethod
+    def _cold_conditions(conditions):
+        clauses, params = [], []
+        for column, value in conditions.items():
+            if isinstance(value, (list, tuple)):
+                clauses.append(f'"{column}" IN ({", ".join("?" * len(value))})')
+                params.extend(value)
+            else:
+                clauses.append(f'"{column}" = ?')
+                params.append(value)
+        return clauses, params
+
+    def _cold_where(self, where, exclude_empty=None):
+        clauses, params = ['day BETWEEN ? AND ?'], list(self.cold_range)
+        for conditions in (self.where, where):
+            more, values = self._cold_conditions(conditions)
+            clauses += more
+            params += values
+        if exclude_empty:
+            clauses.append(f'"{exclude_empty}" <> \'\'')
+        return ' AND '.join(clauses), params
+
+    def _cold_value(self, value, conditions=None):
+        """Expressão e parâmetros da agregação (COUNT ou SUM de value), com FILTER opcional."""
+        expression = 'COUNT(*)' if value is None else 'SUM(' + ' + '.join(f'COALESCE("{column}", 0)' for column in value) + ')'
+        if not conditions:
+            return expression, []
+        clauses, params = self._cold_conditions(conditions)
+        return f"{expression} FILTER (WHERE {' AND '.join(clauses)})", params
+
+    # Agregações
+
+    def totals(self, value=None, **named):
+        """
+        {nome: COUNT (ou SUM das colunas de value)} numa consulta por parte; cada nome recebe
+        os filtros próprios ({coluna: valor ou lista}, {} para o total).
+        """
+        result = {
+            name: n or 0
+            for name, n in self._hot({}).aggregate(**{
+                name: self._hot_value(value, conditions) for name, conditions in named.items()
+            }).items()
+        }
+        if self.cold_range:
+            selects, params = [], []
+            for conditions in named.values():
+                expression, values = self._cold_value(value, conditions)
+                selects.append(expression)
+                params += values
+            clause, where_params = self._cold_where({})
+            row = cold_query(self.spec, f"SELECT {', '.join(selects)} FROM {{table}} WHERE {clause}", params + where_params)[0]
+            for name, n in zip(named, row):
+                result[name] += n or 0
+        return result
+
+    def top(self, column, value=None, limit=None, exclude_empty=False, **where):
+        """[(chave, n)] agrupando por column, do maior n para o menor."""
+        empty = column if exclude_empty else None
+        hot = self._hot(where, empty).values(column).annotate(n=self._hot_value(value)).order_by('-n')
+        if not self.cold_range:
+            hot = hot[:limit] if limit else hot
+            return [(row[column], row['n'] or 0) for row in hot]
+
+        totals = {}
+        for row in hot:
+            totals[row[column]] = totals.get(row[column], 0) + (row['n'] or 0)
+        clause, params = self._cold_where(where, empty)
+        expression, _ = self._cold_value(value)
+        for key, n in cold_query(self.spec, f'SELECT "{column}", {expression} FROM {{table}} WHERE {clause} GROUP BY 1', params):
+            totals[key] = totals.get(key, 0) + (n or 0)
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit] if limit else ranked
+
+    def latest(self, columns, order_by, limit, **where):
+        """As `limit` linhas mais recentes (por order_by, desc): primeiro o banco, depois o arquivo."""
+        rows = list(self._hot(where).order_by(f'-{order_by}').values(*columns)[:limit])
+        if self.cold_range and len(rows) < limit:
+            clause, params = self._cold_where(where)
+            select = ', '.join(f'"{column}"' for column in columns)
+            for values in cold_query(
+                self.spec, f'SELECT {select} FROM {{table}} WHERE {clause} ORDER BY "{order_by}" DESC LIMIT {limit - len(rows)}', params,
+            ):
+                rows.append(dict(zip(columns, values)))
+        return rows
@@ -0,0 +1,168 @@
+"""
+Cache em processo das configurações lidas a todo momento (FortiAnalyzerConfig,
+ActiveDirectoryConfig, DatabaseConfiguration e o .db_config.json do assistente de setup).
+
+SingletonModel.load() era um get_or_create por chamada: em cada VPNLog.save(), em cada
+FortiAnalyzerClient/ActiveDirectoryClient/RadarScanner e em listagens; o
+SetupRequiredMiddleware relia e parseava o JSON do disco a cada requisição.
+
+- get(key, loader): cópia local válida por CONFIG_CACHE['ttl'] segundos (0 desliga o cache).
+- Invalidação: post_save/post_delete dos models registrados com watch() descartam a cópia
+  local e, após o commit, publicam a chave no canal Redis CONFIG_CACHE['channel']. Cada
+  processo (web, celery, syslog_receiver, stream_writer) escuta o canal numa thread daemon,
+  iniciada no primeiro get() (de novo após um fork). Sem Redis, a TTL limita a defasagem.
+- cached_file(path, read): conteúdo do arquivo relido só quando mtime/tamanho mudam.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+import logging
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_CACHE_SETTINGS = {
+    'ttl': 300,
+    'redis_url': None,
+    'channel': 'reportvpn:config',
+}
+
+# Mensagem que descarta todas as chaves
+ALL = '*'
+
+_entries = {}
+_files = {}
+_lock = threading.Lock()
+_process = {'listener_pid': None, 'publisher': None, 'publisher_pid': None}
+
+
+def get_config_cache_settings(overrides=None):
+    options = dict(DEFAULT_CONFIG_CACHE_SETTINGS)
+    options.update(getattr(settings, 'CONFIG_CACHE', None) or {})
+    options.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return options
+
+
+def get(key, loader):
+    """Valor da chave: a cópia local, se ainda válida, ou loader() (guardado até a TTL)."""
+    options = get_config_cache_settings()
+    if options['ttl'] <= 0:
+        return loader()
+    _ensure_listener(options)
+    now = time.monotonic()
+    entry = _entries.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    value = loader()
+    _entries[key] = (now + options['ttl'], value)
+    return value
+
+
+def _drop(key):
+    if key == ALL:
+        _entries.clear()
+        _files.clear()
+    else:
+        _entries.pop(key, None)
+
+
+def invalidate(key=ALL, broadcast=True):
+    """Descarta a chave neste processo e, com broadcast, nos demais (via Redis)."""
+    _drop(key)
+    if broadcast:
+        _publish(key)
+
+
+def cached_file(path, read):
+    """read(path) guardado enquanto o arquivo não mudar (mtime e tamanho); arquivo ausente também é guardado."""
+    path = str(path)
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        signature = None
+    entry = _files.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+    value = read(path)
+    _files[path] = (signature, value)
+    return value
+
+
+def forget_file(path):
+    _files.pop(str(path), None)
+
+
+# --- Invalidação entre processos (Redis pub/sub) ---
+
+def _publish(key):
+    options = get_config_cache_settings()
+    if redis is None or not options['redis_url']:
+        return
+    try:
+        if _process['publisher'] is None or _process['publisher_pid'] != os.getpid():
+            _process['publisher'] = redis.Redis.from_url(options['redis_url'], socket_connect_timeout=1, socket_timeout=1)
+            _process['publisher_pid'] = os.getpid()
+        _process['publisher'].publish(options['channel'], key)
+    except Exception as e:
+        logger.warning(f"Cache de configuração: falha ao publicar a invalidação de {key}: {e}")
+
+
+def _ensure_listener(options):
+    if redis is None or not options['redis_url'] or _process['listener_pid'] == os.getpid():
+        return
+    with _lock:
+        if _process['listener_pid'] == os.getpid():
+            return
+        _process['listener_pid'] = os.getpid()
+        # Cópias herdadas do processo pai (fork) podem ter perdido invalidações
+        _entries.clear()
+        threading.Thread(
+            target=_listen, args=(options['redis_url'], options['channel']),
+            name='config-cache-listener', daemon=True,
+        ).start()
+
+
+def _listen(url, channel):
+    delay = 1
+    while True:
+        try:
+            pubsub = redis.Redis.from_url(url, socket_connect_timeout=5, health_check_interval=30).pubsub(
+                ignore_subscribe_messages=True
+            )
+            pubsub.subscribe(channel)
+            # Invalidações publicadas enquanto desconectado se perderam: recomeça do zero
+            invalidate(ALL, broadcast=False)
+            delay = 1
+            for message in pubsub.listen():
+                key = message.get('data')
+                _drop(key.decode() if isinstance(key, bytes) else str(key))
+        except Exception as e:
+            if delay == 1:
+                logger.warning(f"Cache de configuração: canal {channel} indisponível ({e}); só a TTL vale até reconectar.")
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+
+
+# --- Sinais ---
+
+def _invalidate_model(sender, **kwargs):
+    key = sender._meta.label
+    _drop(key)
+    # Outros processos só podem recarregar depois que a alteração estiver visível
+    transaction.on_commit(lambda: invalidate(key), using=kwargs.get('using'))
+
+
+def watch(*models):
+    """Invalida a chave model._meta.label a cada save/delete do model."""
+    for model in models:
+        uid = f'config_cache:{model._meta.label}'
+        post_save.connect(_invalidate_model, sender=model, dispatch_uid=f'{uid}:save')
+        post_delete.connect(_invalidate_model, sender=model, dispatch_uid=f'{uid}:delete')
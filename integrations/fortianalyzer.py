@@ -1,27 +1,106 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from .models import FortiAnalyzerConfig
 
 # Desativa avisos de requisições HTTPS não verificadas (comum em redes internas)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+logger = logging.getLogger(__name__)
+
+# Timeouts (segundos) por tipo de chamada JSON-RPC
+DEFAULT_TIMEOUTS = {
+    'start': 90,     # criação da tarefa de logsearch
+    'status': 15,    # consulta de progresso
+    'results': 90,   # download de uma página de resultados
+    'wait': 180,     # prazo máximo aguardando o FA concluir a indexação de uma tarefa
+}
+
 class FortiAnalyzerClient:
-    def __init__(self):
-        self.config = FortiAnalyzerConfig.load()
+    def __init__(self, config=None, pool_size=None, timeouts=None):
+        self.config = config or FortiAnalyzerConfig.load()
         if self.config.api_token:
             self.config.api_token = self.config.api_token.strip()
-            
+
+        self.pool_size = pool_size or getattr(settings, 'FORTIANALYZER_POOL_SIZE', 8)
+        self.max_concurrency = getattr(settings, 'FORTIANALYZER_MAX_CONCURRENCY', 4)
+        self.timeouts = {
+            **DEFAULT_TIMEOUTS,
+            **getattr(settings, 'FORTIANALYZER_TIMEOUTS', {}),
+            **(timeouts or {}),
+        }
+        self._session = None
+        self._adapter = None
+        self._session_lock = threading.Lock()
+
     def get_session(self):
+        """
+        Retorna a sessão HTTP persistente do cliente.
+        A sessão é criada uma única vez e reaproveita as conexões TCP/TLS (keep-alive)
+        entre as chamadas, em vez de refazer o handshake a cada página.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def _build_session(self):
         session = requests.Session()
         session.verify = self.config.verify_ssl
         session.headers.update({
             'Content-Type': 'application/json',
             'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
             'Authorization': f'Bearer {self.config.api_token}'
         })
+        # Um único host (FA), mas várias conexões simultâneas para o download paralelo de páginas
+        self._adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+        session.mount('https://', self._adapter)
+        session.mount('http://', self._adapter)
         return session
 
+    def connection_key(self):
+        """Parâmetros que, se alterados, exigem uma nova sessão HTTP."""
+        return (self.config.host, self.config.port, self.config.api_token, self.config.verify_ssl)
+
+    def pool_stats(self):
+        """
+        Contadores do pool de conexões.
+        'misses' = conexões novas abertas (handshake TCP/TLS), 'hits' = requisições que reaproveitaram uma conexão.
+        """
+        stats = {'requests': 0, 'hits': 0, 'misses': 0, 'pool_size': self.pool_size}
+        if self._adapter is None:
+            return stats
+
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['requests'] += pool.num_requests
+            stats['misses'] += pool.num_connections
+        stats['hits'] = max(stats['requests'] - stats['misses'], 0)
+        return stats
+
+    def adopt_session(self, other):
+        """Passa a usar a sessão (e o pool de conexões) de other, um cliente do mesmo FA."""
+        with other._session_lock:
+            self._session, self._adapter = other._session, other._adapter
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+            self._adapter = None
+
     def start_log_task(self, log_type="event", start_time=None, end_time=None, limit=100, log_filter=None):
         """
         Inicia uma tarefa de busca de logs no FortiAnalyzer (Log View API v3).
@@ -82,7 +161,7 @@ class FortiAnalyzerClient:
         
         try:
             session = self.get_session()
-            response = session.post(url, json=payload, timeout=90)
+            response = session.post(url, json=payload, timeout=self.timeouts['start'])
             response.raise_for_status()
             result = response.json()
             
@@ -123,7 +202,7 @@ class FortiAnalyzerClient:
         
         try:
             session = self.get_session()
-            response = session.post(url, json=payload, timeout=15)
+            response = session.post(url, json=payload, timeout=self.timeouts['status'])
             result = response.json()
             
             # Parse result for status
@@ -163,8 +242,196 @@ class FortiAnalyzerClient:
         
         try:
             session = self.get_session()
-            response = session.post(url, json=payload, timeout=90)
+            response = session.post(url, json=payload, timeout=self.timeouts['results'])
             return response.json()
         except Exception as e:
             print(f"Erro ao baixar resultados da task {tid}: {e}")
             return None
+
+    def wait_for_task(self, tid, timeout=None, initial_delay=0.5, max_delay=5.0, min_rows=None):
+        """
+        Aguarda a tarefa de logsearch consultando o progresso com backoff exponencial,
+        em vez de dormir um tempo fixo antes de ler os resultados.
+
+        Retorna assim que o FA reporta 100% (ou, se 'min_rows' for informado, assim que
+        houver ao menos essa quantidade de linhas disponíveis) ou quando o prazo expira.
+        Retorno: {'tid', 'done', 'percentage', 'total', 'elapsed'}; 'total' pode ser None
+        se o FA não informar a contagem.
+        """
+        if not tid:
+            return None
+
+        started = time.monotonic()
+        deadline = started + (timeout if timeout is not None else self.timeouts['wait'])
+        delay = initial_delay
+        percentage, total = 0, None
+
+        while True:
+            status = self.check_task_status(tid)
+            if status is None or ('percentage' not in status and 'progress-percent' not in status):
+                # Endpoint de task indisponível: o próprio logsearch informa o progresso
+                status = result_payload(self.get_task_results(tid, limit=1, offset=0))
+
+            percentage, total = parse_progress(status)
+            if percentage >= 100:
+                break
+            if min_rows and total is not None and total >= min_rows:
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+        if percentage >= 100 and total is None:
+            # Algumas versões só devolvem a contagem junto dos resultados
+            _, total = parse_progress(result_payload(self.get_task_results(tid, limit=1, offset=0)))
+
+        return {
+            'tid': tid,
+            'done': percentage >= 100,
+            'percentage': percentage,
+            'total': total,
+            'elapsed': round(time.monotonic() - started, 3),
+        }
+
+    def fetch_page(self, tid, limit, offset, retries=3, backoff=1.0):
+        """
+        Baixa uma página de resultados com novas tentativas próprias.
+        Retorna a lista de linhas ou None se todas as tentativas falharem.
+        """
+        for attempt in range(retries):
+            response = self.get_task_results(tid, limit=limit, offset=offset)
+            if response is not None and 'error' not in response:
+                return extract_rows(response)
+            if attempt < retries - 1:
+                time.sleep(backoff * (2 ** attempt))
+        return None
+
+    def fetch_all_results(self, tid, page_size=100, max_concurrency=None, total=None, limit=None):
+        """
+        Gera as linhas de uma tarefa concluída, página a página e na ordem do FA.
+
+        Com 'total' conhecido (ver wait_for_task) as páginas são independentes e são baixadas
+        em paralelo por um pool limitado a 'max_concurrency' threads, com no máximo esse
+        número de páginas adiantadas em memória. Sem 'total', a paginação é serial até a
+        primeira página incompleta. 'limit' limita a quantidade de linhas lidas.
+
+        Retorno do gerador (valor de 'yield from'): False se alguma página falhou mesmo após
+        as novas tentativas, ou seja, a leitura da tarefa ficou com lacunas; True se completa.
+        """
+        if not tid:
+            return False
+
+        if total is None:
+            offset = 0
+            while limit is None or offset < limit:
+                size = page_size if limit is None else min(page_size, limit - offset)
+                rows = self.fetch_page(tid, size, offset)
+                if rows is None:
+                    logger.error(f"Página offset={offset} da task {tid} falhou após novas tentativas; leitura interrompida.")
+                    return False
+                if not rows:
+                    return True
+                yield from rows
+                offset += len(rows)
+                if len(rows) < size:
+                    return True
+            return True
+
+        if limit is not None:
+            total = min(total, limit)
+        offsets = iter(range(0, total, page_size))
+        workers = max(1, max_concurrency or self.max_concurrency)
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"fa-{tid}")
+        pending = deque()
+
+        def submit_next():
+            offset = next(offsets, None)
+            if offset is not None:
+                size = min(page_size, total - offset)
+                pending.append((offset, pool.submit(self.fetch_page, tid, size, offset)))
+
+        complete = True
+        try:
+            for _ in range(workers):
+                submit_next()
+            while pending:
+                offset, future = pending.popleft()
+                rows = future.result()
+                submit_next()
+                if rows is None:
+                    complete = False
+                    logger.error(f"Página offset={offset} da task {tid} falhou após novas tentativas; seguindo para as próximas.")
+                    continue
+                yield from rows
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        return complete
+
+
+def extract_rows(response):
+    """Extrai a lista de logs ('data') de uma resposta de get_task_results."""
+    if isinstance(response, list):
+        return response
+    if not isinstance(response, dict):
+        return []
+    payload = result_payload(response)
+    if payload is not None:
+        return payload.get('data', []) or []
+    return response.get('data', []) or []
+
+
+def result_payload(response):
+    """Extrai o dicionário 'result' de uma resposta JSON-RPC (pode vir como lista ou dict)."""
+    if not isinstance(response, dict):
+        return None
+    res = response.get('result')
+    if isinstance(res, list):
+        return res[0] if res and isinstance(res[0], dict) else None
+    return res if isinstance(res, dict) else None
+
+
+def parse_progress(status):
+    """Retorna (percentual, total de linhas) a partir do status/resultado de uma tarefa."""
+    if not status:
+        return 0, None
+
+    try:
+        percentage = int(status.get('percentage', status.get('progress-percent', 0)) or 0)
+    except (TypeError, ValueError):
+        percentage = 0
+
+    total = status.get('total-count', status.get('matched-logs'))
+    try:
+        total = int(total) if total is not None else None
+    except (TypeError, ValueError):
+        total = None
+    return percentage, total
+
+
+# Cliente compartilhado por processo (worker Celery), criado sob demanda
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def get_fortianalyzer_client():
+    """
+    Retorna o cliente FortiAnalyzer compartilhado do processo atual.
+    Todas as coletas do mesmo worker usam o mesmo pool de conexões. A cada chamada o cliente
+    é trocado por um novo com a configuração recarregada, sem mexer no anterior (outras
+    threads podem estar no meio de uma tarefa ou do download paralelo de páginas com ele):
+    com o mesmo host/porta/token/verificação SSL o novo herda a sessão; senão abre outra, e a
+    antiga é fechada pela coleta de lixo quando ninguém mais a usa.
+    """
+    global _shared_client
+    config = FortiAnalyzerConfig.load()
+
+    with _shared_client_lock:
+        client = FortiAnalyzerClient(config=config)
+        previous = _shared_client
+        if previous is not None and previous.connection_key() == client.connection_key():
+            client.adopt_session(previous)
+        _shared_client = client
+        return client
@@ -0,0 +1,50 @@
+import datetime
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from integrations.archive import (
+    ARCHIVED_MODELS, archived_days, closed_day, day_path, export_until, get_archive_settings, get_spec, pyarrow,
+)
+
+
+class Command(BaseCommand):
+    help = 'Exporta para Parquet os dias fechados das tabelas de log ainda não arquivados (camada fria)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models', nargs='+', choices=list(ARCHIVED_MODELS), default=list(ARCHIVED_MODELS),
+            help='Models a exportar (padrão: todos)',
+        )
+        parser.add_argument('--until', help='Último dia a exportar, AAAA-MM-DD (padrão: hoje menos grace_days)')
+        parser.add_argument('--status', action='store_true', help='Mostra o que já foi arquivado e encerra')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Arquivo: {get_archive_settings()['path']}")
+
+        if options['status']:
+            for label in options['models']:
+                spec = get_spec(label)
+                days = archived_days(spec)
+                if not days:
+                    self.stdout.write(f"{label}: nada arquivado")
+                    continue
+                size = sum(os.path.getsize(day_path(spec, day)) for day in days)
+                self.stdout.write(f"{label}: {len(days)} dias ({days[0]} .. {days[-1]}), {size / 1024 / 1024:.1f} MB")
+            return
+
+        if pyarrow is None:
+            raise CommandError('O pacote pyarrow não está instalado.')
+
+        if options['until']:
+            try:
+                last_day = datetime.date.fromisoformat(options['until'])
+            except ValueError:
+                raise CommandError(f"Data inválida em --until: {options['until']}")
+        else:
+            last_day = closed_day()
+
+        for label in options['models']:
+            exported = export_until(label, last_day)
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: {len(exported)} dias exportados até {last_day} ({sum(exported.values())} registros)"
+            ))
@@ -0,0 +1,125 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from integrations.models import PayloadDictionary
+from integrations.payloads import (
+    active_dictionary_id, decompress, frame_dictionary_id, get_payload_settings, payload_fields,
+    payload_models, reset_dictionaries, train_dictionary, zstandard,
+)
+
+# Faixa de dict_id livre para uso privado (0-32767 é reservada pelo formato zstd)
+FIRST_DICT_ID = 32768
+
+
+class Command(BaseCommand):
+    help = 'Treina o dicionário zstd dos payloads brutos e reescreve em blocos as linhas ainda não comprimidas'
+
+    def add_arguments(self, parser):
+        labels = [model._meta.label for model in payload_models()]
+        parser.add_argument('--models', nargs='+', choices=labels, default=labels, help='Models a processar (padrão: todos)')
+        parser.add_argument('--train', action='store_true', help='Treina um novo dicionário antes de reescrever')
+        parser.add_argument('--samples', type=int, default=20000, help='Payloads de exemplo para o treino (os mais recentes)')
+        parser.add_argument('--dict-size', type=int, help='Tamanho do dicionário em bytes')
+        parser.add_argument('--chunk', type=int, help='Linhas por bloco/transação')
+        parser.add_argument(
+            '--recompress',
+            action='store_true',
+            help='Reescreve também payloads já comprimidos com outro dicionário (ou sem dicionário)',
+        )
+        parser.add_argument('--status', action='store_true', help='Mostra o que falta reescrever e encerra')
+
+    def handle(self, *args, **options):
+        models = [model for model in payload_models() if model._meta.label in options['models']]
+
+        if options['status']:
+            self.stdout.write(f"Dicionário ativo: {active_dictionary_id() or 'nenhum'}")
+            for model in models:
+                for field in payload_fields(model):
+                    pending = model._base_manager.filter(**{f'{field.legacy_field}__isnull': False}).count() if field.legacy_field else 0
+                    done = model._base_manager.filter(**{f'{field.attname}__isnull': False}).count()
+                    self.stdout.write(f"{model._meta.label}.{field.name}: {done} comprimidas, {pending} na coluna antiga")
+            return
+
+        if zstandard is None:
+            raise CommandError('O pacote zstandard não está instalado: os payloads seriam gravados sem compressão.')
+
+        if options['train']:
+            self.train(models, options['samples'], options['dict_size'])
+
+        chunk = options['chunk'] or get_payload_settings()['rewrite_chunk']
+        # 0 = frames zstd sem dicionário
+        active = active_dictionary_id() or 0
+        for model in models:
+            for field in payload_fields(model):
+                rewritten = self.rewrite(model, field, chunk, active if options['recompress'] else None)
+                self.stdout.write(self.style.SUCCESS(f"{model._meta.label}.{field.name}: {rewritten} linhas reescritas"))
+
+        self.stdout.write(
+            "O espaço das colunas antigas só volta ao sistema depois de VACUUM (SQLite) ou "
+            "VACUUM FULL/pg_repack (PostgreSQL)."
+        )
+
+    def train(self, models, samples, dict_size):
+        """Treina o dicionário com os payloads mais recentes de cada model e o torna o ativo."""
+        per_model = max(1, samples // len(models))
+        payloads = []
+        for model in models:
+            for field in payload_fields(model):
+                names = [field.attname] + ([field.legacy_field] if field.legacy_field else [])
+                rows = model._base_manager.order_by('-pk').values_list(*names)[:per_model]
+                for stored, *legacy in rows:
+                    if stored is not None:
+                        payloads.append(decompress(stored))
+                    elif legacy and legacy[0] is not None:
+                        payloads.append(field.dump_payload(legacy[0]))
+        if not payloads:
+            raise CommandError('Nenhum payload para treinar o dicionário.')
+
+        dict_id = max(PayloadDictionary.objects.aggregate(last=Max('dict_id'))['last'] or 0, FIRST_DICT_ID - 1) + 1
+        try:
+            data = train_dictionary(payloads, dict_id, dict_size)
+        except zstandard.ZstdError as exc:
+            raise CommandError(f"Falha no treino do dicionário ({len(payloads)} amostras): {exc}")
+        PayloadDictionary.objects.create(dict_id=dict_id, data=data, samples=len(payloads))
+        reset_dictionaries()
+        self.stdout.write(self.style.SUCCESS(f"Dicionário {dict_id}: {len(data)} bytes, {len(payloads)} amostras"))
+        self.stdout.write("Reinicie os workers (celery, stream_writer, syslog) para que comprimam com o novo dicionário.")
+
+    def rewrite(self, model, field, chunk, recompress_to=None):
+        """
+        Percorre a tabela pelo pk em blocos de chunk linhas, uma transação por bloco:
+        comprime o conteúdo da coluna antiga e a anula; com recompress_to, recomprime os
+        payloads cujo frame não usa esse dicionário.
+        """
+        manager = model._base_manager
+        legacy = field.legacy_field
+        columns = ['pk', field.attname] + ([legacy] if legacy else [])
+        last_pk, rewritten = None, 0
+        while True:
+            queryset = manager.order_by('pk').only(*columns)
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            if recompress_to is None:
+                if not legacy:
+                    break
+                queryset = queryset.filter(**{f'{legacy}__isnull': False})
+            rows = list(queryset[:chunk])
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+
+            changed = []
+            for row in rows:
+                stored = row.__dict__[field.attname]
+                from_legacy = legacy is not None and getattr(row, legacy) is not None
+                if from_legacy or (stored is not None and frame_dictionary_id(stored) != recompress_to):
+                    # O descriptor devolve o payload decodificado (ou o da coluna antiga)
+                    setattr(row, field.attname, getattr(row, field.attname))
+                    changed.append(row)
+            if changed:
+                with transaction.atomic(using=manager.db):
+                    manager.bulk_update(changed, [field.name])
+                    if legacy:
+                        manager.filter(pk__in=[row.pk for row in changed]).update(**{legacy: None})
+                rewritten += len(changed)
+        return rewritten
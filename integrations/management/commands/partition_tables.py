@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from integrations.partitions import (
+    PARTITIONED_MODELS, conversion_plan, convert_table, ensure_partitions, get_partition_settings,
+    get_spec, is_partitioned, list_partitions, partitioning_supported,
+)
+
+
+class Command(BaseCommand):
+    help = 'Converte as tabelas de log em tabelas particionadas por data (PostgreSQL) e cria partições futuras'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models', nargs='+', choices=list(PARTITIONED_MODELS), default=list(PARTITIONED_MODELS),
+            help='Models a converter (padrão: todos)',
+        )
+        parser.add_argument('--interval', choices=['month', 'day'], help='Uma partição por mês ou por dia')
+        parser.add_argument('--ahead', type=int, help='Períodos futuros criados com antecedência')
+        parser.add_argument('--status', action='store_true', help='Mostra as partições existentes e encerra')
+        parser.add_argument('--dry-run', action='store_true', help='Mostra o SQL da conversão sem executar')
+        parser.add_argument(
+            '--keep-legacy',
+            action='store_true',
+            help='Mantém a tabela original renomeada para <tabela>_legacy',
+        )
+
+    def handle(self, *args, **options):
+        if not partitioning_supported():
+            raise CommandError('Particionamento declarativo requer PostgreSQL 11 ou superior.')
+
+        config = get_partition_settings({'interval': options.get('interval'), 'ahead': options.get('ahead')})
+        for label in options['models']:
+            spec = get_spec(label)
+            table = spec['table']
+
+            if options['status']:
+                partitions = list_partitions(table) if is_partitioned(table) else []
+                self.stdout.write(f"{table}: " + (
+                    f"{len(partitions)} partições ({partitions[0][0]} .. {partitions[-1][0]})" if partitions
+                    else "não particionada"
+                ))
+                continue
+
+            if is_partitioned(table):
+                created = ensure_partitions(spec, ahead=config['ahead'])
+                self.stdout.write(f"{table}: já particionada; partições criadas: {created or 'nenhuma'}")
+                continue
+
+            if options['dry_run']:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"-- {table} (por {spec['column']}, {config['interval']})"))
+                for statement in conversion_plan(spec, config['interval'], config['ahead']):
+                    self.stdout.write(statement + ';')
+                continue
+
+            self.stdout.write(f"Convertendo {table} (bloqueia a tabela durante a cópia)...")
+            convert_table(spec, config['interval'], config['ahead'], keep_legacy=options['keep_legacy'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{table}: particionada por {spec['column']} ({len(list_partitions(table))} partições)"
+            ))
+
+        if not options['status'] and not options['dry_run']:
+            self.stdout.write("Reinicie os workers (celery, stream_writer, syslog) para que detectem as tabelas particionadas.")
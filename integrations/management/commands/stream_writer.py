@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from integrations.streams import DATA_TYPES, StreamConsumer, StreamWriterPool, get_stream_settings, stream_lag
+import json
+import signal
+
+
+class Command(BaseCommand):
+    help = 'Writer do buffer Redis Streams: grava no banco os registros enviados pelos coletores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--types', nargs='+', choices=DATA_TYPES, default=list(DATA_TYPES),
+            help='Tipos de dado drenados por este processo (padrão: todos)',
+        )
+        parser.add_argument('--batch-size', type=int, help='Entradas lidas por lote (padrão: LOG_STREAMS["batch_size"])')
+        parser.add_argument('--consumer', type=str, help='Nome do consumidor no grupo (padrão: host-pid)')
+        parser.add_argument('--once', action='store_true', help='Drena o que houver e encerra')
+        parser.add_argument('--lag', action='store_true', help='Mostra o atraso por tipo de dado e encerra')
+        parser.add_argument(
+            '--requeue-dead',
+            action='store_true',
+            help='Devolve aos streams as entradas descartadas (:dead) e encerra',
+        )
+
+    def handle(self, *args, **options):
+        if options['lag']:
+            self.stdout.write(json.dumps(stream_lag(options['types']), indent=2))
+            return
+
+        if options['requeue_dead']:
+            for data_type in options['types']:
+                moved = StreamConsumer(data_type).requeue_dead()
+                self.stdout.write(f"{data_type}: {moved} entradas devolvidas ao stream")
+            return
+
+        pool = StreamWriterPool(
+            options['types'], consumer=options.get('consumer'),
+            options={'batch_size': options.get('batch_size')},
+        )
+        config = get_stream_settings({'batch_size': options.get('batch_size')})
+        self.stdout.write(self.style.SUCCESS(
+            f"Stream writer ({pool.consumers[0].consumer}) no grupo {config['group']}: "
+            f"{', '.join(options['types'])}, lotes de até {config['batch_size']}"
+        ))
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: pool.stop())
+        stats = pool.run(once=options['once'])
+        self.stdout.write(f"Encerrado: {stats}")
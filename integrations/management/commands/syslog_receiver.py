@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from integrations.streams import get_stream_buffer
+from integrations.syslog import MicroBatcher, NullSink, SyslogReceiver, SyslogSink, get_syslog_settings
+import asyncio
+import signal
+
+
+class Command(BaseCommand):
+    help = 'Recebe logs do FortiGate/FortiAnalyzer via syslog (UDP/TCP) e grava em micro-lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, help='Endereço de escuta (padrão: SYSLOG_RECEIVER["host"])')
+        parser.add_argument('--udp-port', type=int, help='Porta UDP (0 desativa)')
+        parser.add_argument('--tcp-port', type=int, help='Porta TCP (0 desativa)')
+        parser.add_argument('--batch-size', type=int, help='Linhas por micro-lote')
+        parser.add_argument('--flush-interval', type=float, help='Idade máxima (s) de uma linha em buffer')
+        parser.add_argument('--stats-interval', type=int, default=60, help='Intervalo (s) do log de estatísticas')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Interpreta e roteia as linhas sem gravar no banco',
+        )
+
+    def handle(self, *args, **options):
+        config = get_syslog_settings({
+            'host': options.get('host'),
+            'udp_port': options.get('udp_port'),
+            'tcp_port': options.get('tcp_port'),
+            'batch_size': options.get('batch_size'),
+            'flush_interval': options.get('flush_interval'),
+        })
+        sink = NullSink() if options['dry_run'] else SyslogSink(buffer=get_stream_buffer())
+        batcher = MicroBatcher(sink, batch_size=config['batch_size'], flush_interval=config['flush_interval'])
+        receiver = SyslogReceiver(
+            batcher, host=config['host'], udp_port=config['udp_port'], tcp_port=config['tcp_port'],
+            stats_interval=options['stats_interval'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Syslog receiver em {config['host']} (udp={config['udp_port']}, tcp={config['tcp_port']}), "
+            f"lotes de {config['batch_size']} linhas / {config['flush_interval']}s"
+            + (" [dry-run]" if options['dry_run'] else "")
+        ))
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, receiver.stop)
+            await receiver.serve()
+
+        try:
+            asyncio.run(main())
+        finally:
+            batcher.close()
+        self.stdout.write(f"Encerrado: {batcher.stats}")
@@ -0,0 +1,29 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0013_delete_dataretentionconfig'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('log_type', models.CharField(max_length=50)),
+                ('subtype', models.CharField(max_length=50)),
+                ('adom', models.CharField(default='root', max_length=100)),
+                ('last_timestamp', models.DateTimeField(blank=True, help_text='Último horário de log (relógio do FA) ingerido', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': "Marca d'água de Coleta",
+                'verbose_name_plural': "Marcas d'água de Coleta",
+                'unique_together': {('log_type', 'subtype', 'adom')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0014_collectionwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectionwatermark',
+            name='rows_per_hour',
+            field=models.FloatField(blank=True, help_text='Taxa de linhas/hora aprendida nas coletas anteriores (planejamento de janelas)', null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0015_collectionwatermark_rows_per_hour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayloadDictionary',
+            fields=[
+                ('dict_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('samples', models.PositiveIntegerField(default=0, help_text='Payloads usados no treino')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Dicionário de Compressão',
+                'verbose_name_plural': 'Dicionários de Compressão',
+            },
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.db.models import Q
+from django.utils import timezone
+from integrations import config_cache
+import copy
 import logging
 
 logger = logging.getLogger(__name__)
@@ -37,6 +40,11 @@ class SingletonModel(models.Model):
 
     @classmethod
     def load(cls):
+        # Cópia do cache em processo (integrations.config_cache), invalidado a cada save
+        return copy.copy(config_cache.get(cls._meta.label, cls._load_from_db))
+
+    @classmethod
+    def _load_from_db(cls):
         obj, created = cls.objects.get_or_create(pk=1)
         return obj
 
@@ -76,3 +84,71 @@ class ActiveDirectoryConfig(SingletonModel):
         verbose_name = "Configuração Active Directory"
         verbose_name_plural = "Configuração Active Directory"
 
+
+class CollectionWatermark(models.Model):
+    """
+    Marca d'água da coleta via API: último timestamp do FortiAnalyzer já ingerido
+    por tipo/subtipo de log e ADOM. Cada coleta consulta apenas o delta desde a marca
+    (menos uma pequena sobreposição) e só avança a marca depois de gravar o lote.
+    """
+    log_type = models.CharField(max_length=50)
+    subtype = models.CharField(max_length=50)
+    adom = models.CharField(max_length=100, default="root")
+    last_timestamp = models.DateTimeField(null=True, blank=True, help_text="Último horário de log (relógio do FA) ingerido")
+    rows_per_hour = models.FloatField(null=True, blank=True, help_text="Taxa de linhas/hora aprendida nas coletas anteriores (planejamento de janelas)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.log_type}/{self.subtype}@{self.adom}: {self.last_timestamp}"
+
+    class Meta:
+        verbose_name = "Marca d'água de Coleta"
+        verbose_name_plural = "Marcas d'água de Coleta"
+        unique_together = ('log_type', 'subtype', 'adom')
+
+    @classmethod
+    def for_stream(cls, log_type, subtype, adom):
+        obj, created = cls.objects.get_or_create(log_type=log_type, subtype=subtype, adom=adom or 'root')
+        return obj
+
+    def advance(self, timestamp):
+        """
+        Avança a marca de forma atômica e monotônica: um UPDATE condicional garante que
+        uma execução concorrente ou atrasada nunca faça a marca recuar.
+        """
+        if timestamp is None:
+            return False
+        updated = type(self).objects.filter(pk=self.pk).filter(
+            Q(last_timestamp__isnull=True) | Q(last_timestamp__lt=timestamp)
+        ).update(last_timestamp=timestamp, updated_at=timezone.now())
+        if updated:
+            self.last_timestamp = timestamp
+        return bool(updated)
+
+    def learn_rate(self, observed, weight=0.5):
+        """Atualiza a taxa de linhas/hora com média móvel exponencial da taxa observada."""
+        if observed is None:
+            return
+        if self.rows_per_hour:
+            observed = weight * observed + (1 - weight) * self.rows_per_hour
+        self.rows_per_hour = observed
+        type(self).objects.filter(pk=self.pk).update(rows_per_hour=observed)
+
+
+class PayloadDictionary(models.Model):
+    """
+    Dicionário zstd dos payloads brutos comprimidos (integrations.payloads), treinado em
+    amostras dos logs do FortiAnalyzer por python manage.py compress_payloads --train.
+    O frame de cada payload guarda o dict_id: os dicionários antigos nunca são removidos.
+    """
+    dict_id = models.PositiveIntegerField(primary_key=True)
+    data = models.BinaryField()
+    samples = models.PositiveIntegerField(default=0, help_text="Payloads usados no treino")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Dicionário {self.dict_id} ({len(self.data or b'')} bytes)"
+
+    class Meta:
+        verbose_name = "Dicionário de Compressão"
+        verbose_name_plural = "Dicionários de Compressão"
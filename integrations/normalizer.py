@@ -0,0 +1,243 @@
+"""
+Normalização dos logs brutos do FortiAnalyzer, compartilhada pelos coletores de VPN,
+eventos de segurança, relatório de fidelidade e scripts de reparo.
+
+- Data/hora: o formato fixo 'YYYY-MM-DD' + 'HH:MM:SS' é lido por fatiamento, e a conversão
+  para o fuso local (make_aware) é feita uma vez por hora do relógio e reaproveitada;
+  dateutil só entra para formatos fora do padrão.
+- País → código ISO pela tabela completa de integrations.countries; URL-decoding apenas
+  quando há '%' no valor, com cache por par (país, cidade).
+- Ação e severidade por consulta a dicionário.
+- Logs de VPN viram VPNRecord (__slots__) em uma única passada.
+"""
+from functools import lru_cache
+from django.utils import timezone
+from dateutil.parser import parse
+from integrations.countries import COUNTRY_CODES
+import datetime
+import urllib.parse
+
+# O relógio do FA está 1 hora à frente do horário local
+FA_CLOCK_SKEW = datetime.timedelta(hours=1)
+
+UNKNOWN_PLACES = ('', 'reserved', 'n/a')
+
+SEVERITY_LEVELS = {
+    'emergency': 'critical', 'alert': 'critical', 'critical': 'critical',
+    'error': 'high',
+    'warning': 'medium',
+    'notice': 'low',
+}
+
+# Actions do log bruto normalizadas para casar com os filtros do App/FrontEnd
+SECURITY_ACTIONS = {
+    'accept': 'passthrough', 'passthrough': 'passthrough', 'allowed': 'passthrough', 'ip-conn': 'passthrough',
+    'close': 'passthrough', 'client-rst': 'passthrough', 'server-rst': 'passthrough', 'timeout': 'passthrough',
+    'deny': 'blocked', 'block': 'blocked', 'blocked': 'blocked', 'clear_session': 'blocked', 'reset': 'blocked',
+}
+
+VPN_STATUS = {'tunnel-up': 'active', 'tunnel-stats': 'active', 'tunnel-down': 'closed'}
+
+_HOUR_CACHE_LIMIT = 20000
+_hour_cache = {}
+
+
+# --- Data e hora ---
+
+def _local_hour(date_str, hour):
+    """Início da hora no fuso local (aware), calculado uma vez por (data, hora)."""
+    key = (date_str, hour)
+    base = _hour_cache.get(key)
+    if base is None:
+        if len(_hour_cache) >= _HOUR_CACHE_LIMIT:
+            _hour_cache.clear()
+        base = timezone.make_aware(datetime.datetime(
+            int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]), hour
+        ))
+        _hour_cache[key] = base
+    return base
+
+
+def parse_fa_datetime(date_str, time_str):
+    """
+    'YYYY-MM-DD', 'HH:MM:SS' do FA → datetime aware no fuso local (TIME_ZONE), sem a correção
+    do relógio do FA. None se o valor não puder ser interpretado.
+    """
+    if date_str and time_str and len(date_str) == 10 and len(time_str) == 8 and time_str[2] == ':' and time_str[5] == ':':
+        try:
+            return _local_hour(date_str, int(time_str[0:2])) + datetime.timedelta(
+                minutes=int(time_str[3:5]), seconds=int(time_str[6:8])
+            )
+        except (TypeError, ValueError):
+            pass
+    try:
+        dt = parse(f"{date_str or ''} {time_str or ''}")
+    except Exception:
+        return None
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def parse_fa_timestamp(value):
+    """'YYYY-MM-DD HH:MM:SS' (date e time juntos) → datetime aware no fuso local, ou None."""
+    if not value:
+        return None
+    date_str, _, time_str = str(value).partition(' ')
+    return parse_fa_datetime(date_str, time_str)
+
+
+def log_timestamp(log):
+    """Horário do evento já corrigido pelo relógio do FA; agora se o log não tiver data válida."""
+    dt = parse_fa_datetime(log.get('date', ''), log.get('time', ''))
+    if dt is None:
+        return timezone.now()
+    return dt - FA_CLOCK_SKEW
+
+
+# --- Texto, países e mapeamentos ---
+
+@lru_cache(maxsize=8192)
+def _unquote(value):
+    return urllib.parse.unquote(value)
+
+
+def decode(value):
+    """Valor do FA como texto limpo; URL-decoding só quando necessário."""
+    value = str(value or '').strip()
+    return _unquote(value) if '%' in value else value
+
+
+def country_code(country_name):
+    """Código ISO 3166-1 alfa-2 do nome de país reportado pelo FA ('' se desconhecido)."""
+    if not country_name:
+        return ''
+    return COUNTRY_CODES.get(country_name.lower(), '')
+
+
+def known_place(value):
+    return value if value.lower() not in UNKNOWN_PLACES else ''
+
+
+@lru_cache(maxsize=8192)
+def _location(raw_country, raw_city):
+    fa_country = decode(raw_country)
+    fa_city = decode(raw_city)
+    if not fa_country or fa_country.lower() in UNKNOWN_PLACES:
+        return '', '', fa_city, fa_country
+    return fa_country, country_code(fa_country), fa_city, fa_country
+
+
+def location(log, prefix='src', fallback='rem'):
+    """
+    (país, código ISO, cidade, país bruto) reportados pelo FortiGate, descartando 'reserved'
+    e 'n/a'. Por padrão srccountry/srccity, com remcountry/remcity como alternativa.
+    """
+    raw_country = log.get(f'{prefix}country', '') or (log.get(f'{fallback}country', '') if fallback else '')
+    raw_city = log.get(f'{prefix}city', '') or (log.get(f'{fallback}city', '') if fallback else '')
+    return _location(str(raw_country), str(raw_city))
+
+
+def severity(log):
+    """Severidade do evento a partir do level do FA."""
+    return SEVERITY_LEVELS.get(str(log.get('level', '')).lower(), 'info')
+
+
+def security_action(log, event_type):
+    raw_action = str(log.get('action', '')).lower()
+    action = SECURITY_ACTIONS.get(raw_action, raw_action)
+    if action == 'passthrough' and event_type == 'app-control':
+        return 'pass'
+    return action
+
+
+def to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# --- VPN ---
+
+def derive_session_id(log):
+    session_id = str(log.get('sessionid') or '')
+    if not session_id or session_id == '0' or session_id.lower() == 'none':
+        session_id = str(log.get('tunnelid') or '')
+    if not session_id or session_id == '0' or session_id.lower() == 'none':
+        session_id = f"{log.get('date', '')}-{log.get('time', '')}-{log.get('user', '')}"
+    return session_id
+
+
+class VPNRecord:
+    """Log de VPN normalizado, usado pelos estágios de vpn_logs.ingest."""
+
+    __slots__ = (
+        'log', 'session_id', 'user', 'source_ip', 'start_time', 'end_time', 'duration',
+        'action', 'status', 'country_name', 'country_code', 'city', 'raw_country', 'ad_info',
+    )
+
+    def __init__(self, log, session_id, user, source_ip, start_time, end_time, duration,
+                 action, status, country_name, country_code, city, raw_country, ad_info=None):
+        self.log = log
+        self.session_id = session_id
+        self.user = user
+        self.source_ip = source_ip
+        self.start_time = start_time
+        self.end_time = end_time
+        self.duration = duration
+        self.action = action
+        self.status = status
+        self.country_name = country_name
+        self.country_code = country_code
+        self.city = city
+        self.raw_country = raw_country
+        self.ad_info = ad_info if ad_info is not None else {}
+
+    def to_dict(self):
+        """dict serializável em JSON (buffer de integrations.streams); datas em ISO 8601."""
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['start_time'] = self.start_time.isoformat()
+        data['end_time'] = self.end_time.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['start_time'] = datetime.datetime.fromisoformat(data['start_time'])
+        data['end_time'] = datetime.datetime.fromisoformat(data['end_time'])
+        return cls(**data)
+
+    def __repr__(self):
+        return f"<VPNRecord {self.action} {self.session_id} {self.user}@{self.source_ip} {self.start_time}>"
+
+
+def normalize_vpn(log):
+    """Converte um log bruto de VPN do FA em VPNRecord."""
+    username = log.get('user', 'unknown')
+    if username == 'N/A':
+        username = log.get('xauthuser', 'N/A')
+
+    source_ip = log.get('remip')
+    if not source_ip or source_ip == '0.0.0.0':
+        source_ip = log.get('srcip', '0.0.0.0')
+
+    start_time = log_timestamp(log)
+    duration = int(log.get('duration', 0))
+    action = log.get('action', '')
+    country_name, code, city, raw_country = location(log)
+    return VPNRecord(
+        log=log,
+        session_id=derive_session_id(log),
+        user=username,
+        source_ip=source_ip,
+        start_time=start_time,
+        end_time=start_time + datetime.timedelta(seconds=duration),
+        duration=duration,
+        action=action,
+        status=VPN_STATUS.get(action, 'tunnel-down'),
+        country_name=country_name,
+        country_code=code,
+        city=city,
+        raw_country=raw_country,
+    )
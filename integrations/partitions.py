@@ -0,0 +1,395 @@
+"""
+Particionamento por data das tabelas de log (PostgreSQL) e retenção.
+
+As tabelas de log podem ser convertidas (python manage.py partition_tables) em
+tabelas particionadas por faixa (PARTITION BY RANGE), uma partição por mês ou por dia:
+
+    security_events_securityevent   date
+    vpn_logs_vpnlog                 start_date
+    vpn_logs_vpnfailure             timestamp (sem coluna de data; fronteiras à meia-noite local)
+    security_events_adauthevent     timestamp
+    security_events_*detail         date (detalhe por tipo de SecurityEvent, mesma data do evento)
+
+Consultas filtradas pela coluna de partição têm partition pruning do próprio PostgreSQL.
+maintain_partitions (task diária) cria as partições dos próximos períodos; a retenção
+(apply_retention) desanexa e remove partições inteiras já vencidas e apaga em blocos só o
+que sobra na partição que cruza o corte. Sem particionamento (SQLite, SQL Server ou tabela
+não convertida) a retenção é só o DELETE em blocos, cada um em sua transação.
+
+Restrição do PostgreSQL: chaves únicas precisam incluir a coluna de partição. O id vira
+(id, coluna) e os campos unique (event_id, session_id) ficam únicos por partição; o upsert
+por session_id do VPNLogBulkWriter dá lugar ao caminho SELECT + bulk_create/bulk_update.
+O id continua único por vir de uma só sequência, mas nada no banco impede o mesmo
+session_id/event_id em duas partições (ex.: duas gravações concorrentes do mesmo evento com
+datas diferentes): maintain_partitions procura essas duplicatas (cross_partition_duplicates)
+e as registra no log de erro.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from functools import lru_cache
+import datetime
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# model → coluna de partição e instante usado no corte da retenção
+PARTITIONED_MODELS = {
+    'security_events.SecurityEvent': {'column': 'date', 'time_field': 'timestamp'},
+    'vpn_logs.VPNLog': {'column': 'start_date', 'time_field': 'start_time'},
+    'vpn_logs.VPNFailure': {'column': 'timestamp', 'time_field': 'timestamp'},
+    'security_events.ADAuthEvent': {'column': 'timestamp', 'time_field': 'timestamp'},
+    'security_events.IPSDetail': {'column': 'date', 'time_field': 'date'},
+    'security_events.AntivirusDetail': {'column': 'date', 'time_field': 'date'},
+    'security_events.WebFilterDetail': {'column': 'date', 'time_field': 'date'},
+    'security_events.AppControlDetail': {'column': 'date', 'time_field': 'date'},
+}
+
+DEFAULT_PARTITION_SETTINGS = {
+    'interval': 'month',
+    'ahead': 3,
+    'delete_chunk': 5000,
+}
+
+_NAME_RE = re.compile(r'_p(\d{6}|\d{8})$')
+
+
+def get_partition_settings(overrides=None):
+    options = dict(DEFAULT_PARTITION_SETTINGS)
+    options.update(getattr(settings, 'LOG_PARTITIONS', None) or {})
+    options.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return options
+
+
+def day_range(day):
+    """
+    (início, fim) em datetimes locais da data (date ou 'YYYY-MM-DD'), para filtrar colunas
+    timestamp por faixa (timestamp__gte/__lt) em vez de timestamp__date, que não permite
+    pruning nem uso de índice. None se a data for inválida.
+    """
+    if isinstance(day, str):
+        try:
+            day = datetime.date.fromisoformat(day[:10])
+        except ValueError:
+            return None
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+
+
+# --- Períodos ---
+
+def period_start(day, interval):
+    return day.replace(day=1) if interval == 'month' else day
+
+
+def next_period(day, interval):
+    if interval == 'month':
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return day + datetime.timedelta(days=1)
+
+
+def iter_periods(first_day, last_day, interval):
+    """Início de cada período de first_day até o que contém last_day."""
+    current = period_start(first_day, interval)
+    while current <= last_day:
+        yield current
+        current = next_period(current, interval)
+
+
+def partition_name(table, start, interval):
+    return f"{table}_p{start:%Y%m}" if interval == 'month' else f"{table}_p{start:%Y%m%d}"
+
+
+def _bound(spec, day):
+    """Literal da fronteira: a data, ou a meia-noite local para colunas timestamp."""
+    if spec['column'] == 'timestamp':
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min)).isoformat()
+    return day.isoformat()
+
+
+# --- Introspecção ---
+
+def partitioning_supported():
+    """PostgreSQL 11+ (índices em tabelas particionadas)."""
+    return connection.vendor == 'postgresql' and connection.pg_version >= 110000
+
+
+def get_spec(label):
+    spec = dict(PARTITIONED_MODELS[label])
+    spec['model'] = apps.get_model(label)
+    spec['table'] = spec['model']._meta.db_table
+    return spec
+
+
+def all_specs():
+    return [get_spec(label) for label in PARTITIONED_MODELS]
+
+
+def is_partitioned(table):
+    if not partitioning_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND c.relnamespace = 'public'::regnamespace",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+@lru_cache(maxsize=None)
+def is_partitioned_cached(table):
+    """is_partitioned uma vez por processo (a conversão exige reiniciar os workers)."""
+    try:
+        return is_partitioned(table)
+    except Exception:
+        return False
+
+
+def list_partitions(table):
+    """[(nome, início do período, intervalo)] das partições de período, em ordem."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = _NAME_RE.search(name)
+        if not match:
+            continue
+        digits = match.group(1)
+        if len(digits) == 6:
+            partitions.append((name, datetime.date(int(digits[:4]), int(digits[4:]), 1), 'month'))
+        else:
+            partitions.append((name, datetime.date(int(digits[:4]), int(digits[4:6]), int(digits[6:])), 'day'))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def table_interval(table, default=None):
+    """Intervalo usado na conversão da tabela (pelo nome das partições existentes)."""
+    partitions = list_partitions(table)
+    return partitions[-1][2] if partitions else (default or get_partition_settings()['interval'])
+
+
+# --- Criação e remoção de partições ---
+
+def create_partition_sql(spec, start, interval):
+    end = next_period(start, interval)
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(spec["table"], start, interval)}" '
+        f'PARTITION OF "{spec["table"]}" FOR VALUES FROM (\'{_bound(spec, start)}\') TO (\'{_bound(spec, end)}\')'
+    )
+
+
+def ensure_partitions(spec, ahead=None):
+    """
+    Cria as partições que faltam do período atual até `ahead` períodos à frente.
+    Devolve os nomes criados.
+    """
+    options = get_partition_settings({'ahead': ahead})
+    table = spec['table']
+    interval = table_interval(table)
+    today = timezone.localdate()
+    last = today
+    for _ in range(options['ahead']):
+        last = next_period(period_start(last, interval), interval)
+
+    existing = {name for name, _, _ in list_partitions(table)}
+    first = period_start(today, interval)
+    created = []
+    for start in iter_periods(first, last, interval):
+        name = partition_name(table, start, interval)
+        if name in existing:
+            continue
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(create_partition_sql(spec, start, interval))
+            created.append(name)
+        except Exception as e:
+            # Ex.: linhas do período já caíram na partição default
+            logger.error(f"Falha ao criar a partição {name}: {e}")
+    return created
+
+
+def drop_partitions_before(spec, cutoff):
+    """
+    Desanexa e remove as partições inteiramente anteriores a cutoff (date). Devolve
+    (partições removidas, linhas estimadas por pg_class.reltuples).
+    """
+    table = spec['table']
+    dropped, rows = 0, 0
+    for name, start, interval in list_partitions(table):
+        if next_period(start, interval) > cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = %s", [name])
+            rows += cursor.fetchone()[0]
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+        dropped += 1
+        logger.info(f"Partição {name} removida (retenção até {cutoff}).")
+    return dropped, rows
+
+
+def chunked_delete(queryset, chunk_size=None):
+    """
+    DELETE em blocos de chunk_size ids, cada um em sua transação: sem uma transação enorme
+    nem bloqueio longo da tabela. Devolve o total removido.
+    """
+    chunk_size = chunk_size or get_partition_settings()['delete_chunk']
+    model = queryset.model
+    total = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return total
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(pk__in=ids).delete()
+        total += deleted
+
+
+def apply_retention(label, cutoff):
+    """
+    Remove os registros do model anteriores a cutoff (datetime aware). Partições vencidas
+    são removidas inteiras; o restante (ou tudo, sem particionamento) em blocos.
+    Devolve o número de registros removidos (estimado nas partições).
+    """
+    spec = get_spec(label)
+    column = spec['column']
+    cutoff_day = timezone.localtime(cutoff).date()
+    removed = 0
+    if is_partitioned(spec['table']):
+        _, removed = drop_partitions_before(spec, cutoff_day)
+    lookup = {f"{spec['time_field']}__lt": cutoff}
+    if column != spec['time_field']:
+        # A coluna de data restringe a busca (e o pruning) às partições antigas
+        lookup[f'{column}__lte'] = cutoff_day
+    return removed + chunked_delete(spec['model'].objects.filter(**lookup))
+
+
+def unique_columns(spec):
+    """Colunas unique do model (fora o id autoincremento) que o banco só garante por partição."""
+    return [
+        field.column for field in spec['model']._meta.concrete_fields
+        if field.unique and field.get_internal_type() not in ('AutoField', 'BigAutoField', 'SmallAutoField')
+    ]
+
+
+def cross_partition_duplicates(spec, sample=10):
+    """
+    {coluna: (chaves repetidas, amostra)} dos valores unique presentes em mais de uma linha
+    da tabela particionada, que a chave (campo, coluna de partição) não barra.
+    """
+    table = spec['table']
+    found = {}
+    for column in unique_columns(spec):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT "{column}" FROM "{table}" GROUP BY "{column}" HAVING COUNT(*) > 1'
+            )
+            keys = [row[0] for row in cursor.fetchall()]
+        if keys:
+            found[column] = (len(keys), keys[:sample])
+            logger.error(
+                f"{table}: {len(keys)} valores de {column} repetidos em partições diferentes "
+                f"(ex.: {keys[:sample]})."
+            )
+    return found
+
+
+# --- Conversão (python manage.py partition_tables) ---
+
+def _legacy_name(name):
+    return f"{name[:55]}_legacy"
+
+
+def conversion_plan(spec, interval, ahead):
+    """
+    SQL que converte a tabela em particionada, na ordem de execução (uma transação):
+    renomeia a atual (e seus índices) para *_legacy, cria a tabela particionada com as
+    mesmas colunas, as partições do mês/dia da linha mais antiga até `ahead` períodos à
+    frente e uma partição default, copia os dados, recria chave primária e índices com a
+    coluna de partição nas chaves únicas e remove a tabela antiga.
+    """
+    table, column = spec['table'], spec['column']
+    pk = spec['model']._meta.pk.column
+    legacy = _legacy_name(table)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND schemaname = 'public'", [table])
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = %s", [table, pk]
+        )
+        identity = (cursor.fetchone() or [''])[0]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [table, pk])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'SELECT MIN("{column}") FROM "{table}"')
+        oldest = cursor.fetchone()[0]
+
+    today = timezone.localdate()
+    if oldest is None:
+        first = today
+    elif isinstance(oldest, datetime.datetime):
+        first = timezone.localtime(oldest).date()
+    else:
+        first = oldest
+    last = today
+    for _ in range(ahead):
+        last = next_period(period_start(last, interval), interval)
+
+    sql = [f'ALTER TABLE "{table}" RENAME TO "{legacy}"']
+    sql += [f'ALTER INDEX "{name}" RENAME TO "{_legacy_name(name)}"' for name, _ in indexes]
+    sql.append(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING STORAGE INCLUDING COMMENTS) '
+        f'PARTITION BY RANGE ("{column}")'
+    )
+    # id: a identity/serial da tabela antiga continua gerando os ids da nova
+    if identity:
+        seq = f"{table[:50]}_id_seq_p"
+        sql += [
+            f'CREATE SEQUENCE "{seq}" OWNED BY "{table}"."id"',
+            f'SELECT setval(\'"{seq}"\', COALESCE((SELECT MAX(id) FROM "{legacy}"), 0) + 1, false)',
+            f'ALTER TABLE "{table}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{seq}"\')',
+        ]
+    elif sequence:
+        sql.append(f'ALTER SEQUENCE {sequence} OWNED BY "{table}"."id"')
+
+    sql += [create_partition_sql(spec, start, interval) for start in iter_periods(first, last, interval)]
+    sql.append(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+    if column != spec['time_field']:
+        # Linhas antigas sem a coluna de data preenchida iriam para a partição default
+        sql.append(
+            f'UPDATE "{legacy}" SET "{column}" = ("{spec["time_field"]}" AT TIME ZONE \'{settings.TIME_ZONE}\')::date '
+            f'WHERE "{column}" IS NULL'
+        )
+    sql.append(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+
+    sql.append(f'ALTER TABLE "{table}" ADD PRIMARY KEY ("{pk}", "{column}")')
+    for name, definition in indexes:
+        if name == f"{table}_pkey":
+            continue
+        if definition.startswith('CREATE UNIQUE INDEX'):
+            # Único apenas por partição: (campo, coluna de partição)
+            definition = re.sub(r'\((.*)\)$', lambda m: f'({m.group(1)}, "{column}")', definition)
+        # Mesmo nome de tabela: a definição capturada já aponta para a tabela particionada
+        sql.append(definition)
+    sql.append(f'DROP TABLE "{legacy}"')
+    sql.append(f'ANALYZE "{table}"')
+    return sql
+
+
+def convert_table(spec, interval, ahead, keep_legacy=False):
+    """Executa conversion_plan numa transação; devolve as instruções executadas."""
+    sql = conversion_plan(spec, interval, ahead)
+    if keep_legacy:
+        sql = [statement for statement in sql if not statement.startswith('DROP TABLE')]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for statement in sql:
+            cursor.execute(statement)
+    is_partitioned_cached.cache_clear()
+    return sql
@@ -0,0 +1,285 @@
+"""
+Payloads brutos comprimidos (SecurityEvent.raw_log, VPNLog.raw_data, VPNFailure.raw_data).
+
+O log completo do FortiAnalyzer costuma ser maior que todas as outras colunas da linha
+juntas. CompressedTextField / CompressedJSONField gravam o payload numa coluna binária
+como um frame zstd comprimido com o dicionário treinado em amostras dos próprios logs
+(PayloadDictionary): logs pequenos e muito repetitivos (mesmas chaves, mesmos devid/vd)
+comprimem bem com dicionário e mal sem ele.
+
+- Leitura preguiçosa: do banco vem só o frame (EncodedPayload); a descompressão acontece no
+  primeiro acesso ao atributo e o resultado fica na instância. Salvar uma instância sem ler
+  o payload regrava os mesmos bytes, sem recomprimir.
+- Fora das listagens: os managers de PayloadQuerySet adiam (defer) os campos de payload;
+  quem precisa deles na lista usa .with_payload(). Numa instância sem o payload carregado o
+  acesso faz uma consulta só para ele.
+- Dicionários: o frame traz o dict_id, então todos os dicionários já usados continuam
+  válidos; os novos payloads usam o mais recente. Sem dicionário treinado comprime com zstd
+  puro; sem o pacote zstandard grava o texto sem compressão (a leitura detecta pelo magic).
+- Migração: a coluna antiga fica como legacy_field (db_column original) e é lida enquanto a
+  nova estiver vazia. python manage.py compress_payloads treina o dicionário e reescreve as
+  linhas antigas em blocos.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+import json
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+DEFAULT_PAYLOAD_SETTINGS = {
+    'level': 6,
+    'dictionary_size': 112 * 1024,
+    'rewrite_chunk': 2000,
+}
+
+_local = threading.local()
+_dictionaries = {'loaded': False, 'by_id': {}, 'active': None}
+_dictionaries_lock = threading.Lock()
+
+
+def get_payload_settings(overrides=None):
+    options = dict(DEFAULT_PAYLOAD_SETTINGS)
+    options.update(getattr(settings, 'PAYLOAD_COMPRESSION', None) or {})
+    options.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return options
+
+
+class EncodedPayload(bytes):
+    """Payload como veio do banco (frame zstd ou texto), ainda não decodificado."""
+
+
+def _load_dictionaries(force=False):
+    """{dict_id: ZstdCompressionDict} de PayloadDictionary, carregado uma vez por processo."""
+    if _dictionaries['loaded'] and not force:
+        return _dictionaries
+    from integrations.models import PayloadDictionary
+    with _dictionaries_lock:
+        rows = list(PayloadDictionary.objects.order_by('dict_id').values_list('dict_id', 'data'))
+        _dictionaries['by_id'] = {
+            dict_id: zstandard.ZstdCompressionDict(bytes(data)) for dict_id, data in rows
+        } if zstandard is not None else {}
+        _dictionaries['active'] = rows[-1][0] if rows and zstandard is not None else None
+        _dictionaries['loaded'] = True
+    return _dictionaries
+
+
+def reset_dictionaries():
+    """Força a releitura dos dicionários (depois de treinar um novo)."""
+    _dictionaries['loaded'] = False
+
+
+def active_dictionary_id():
+    return _load_dictionaries()['active']
+
+
+def _compressor():
+    dict_id = active_dictionary_id()
+    cached = getattr(_local, 'compressor', None)
+    if cached is None or cached[0] != dict_id:
+        dictionary = _dictionaries['by_id'].get(dict_id)
+        level = get_payload_settings()['level']
+        compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary) if dictionary else zstandard.ZstdCompressor(level=level)
+        cached = _local.compressor = (dict_id, compressor)
+    return cached[1]
+
+
+def _decompressor(dict_id):
+    decompressors = _local.__dict__.setdefault('decompressors', {})
+    if dict_id not in decompressors:
+        dictionary = None
+        if dict_id:
+            dictionary = _load_dictionaries()['by_id'].get(dict_id)
+            if dictionary is None:
+                # Dicionário treinado depois que este processo carregou a lista
+                dictionary = _load_dictionaries(force=True)['by_id'].get(dict_id)
+            if dictionary is None:
+                raise ImproperlyConfigured(f"Dicionário de payload {dict_id} não encontrado em PayloadDictionary.")
+        decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary) if dictionary else zstandard.ZstdDecompressor()
+    return decompressors[dict_id]
+
+
+def compress(data):
+    """bytes → frame zstd (com o dicionário ativo); sem zstandard devolve os próprios bytes."""
+    if zstandard is None:
+        return data
+    return _compressor().compress(data)
+
+
+def decompress(data):
+    """Inverso de compress; aceita também payloads gravados sem compressão."""
+    data = bytes(data)
+    if not data.startswith(ZSTD_MAGIC):
+        return data
+    if zstandard is None:
+        raise ImproperlyConfigured("Payload comprimido com zstd: instale o pacote zstandard.")
+    return _decompressor(zstandard.get_frame_parameters(data).dict_id).decompress(data)
+
+
+def frame_dictionary_id(data):
+    """dict_id do frame (0 = zstd sem dicionário, None = sem compressão)."""
+    data = bytes(data)
+    if not data.startswith(ZSTD_MAGIC) or zstandard is None:
+        return None
+    return zstandard.get_frame_parameters(data).dict_id
+
+
+def train_dictionary(samples, dict_id, size=None):
+    """Treina um dicionário zstd (bytes) a partir de payloads de exemplo (bytes)."""
+    if zstandard is None:
+        raise ImproperlyConfigured("Treinar o dicionário de payloads requer o pacote zstandard.")
+    size = size or get_payload_settings()['dictionary_size']
+    return zstandard.train_dictionary(size, list(samples), dict_id=dict_id).as_bytes()
+
+
+class PayloadDescriptor:
+    """
+    Atributo do campo na instância: descomprime no primeiro acesso, busca sozinho o payload
+    adiado e cai na coluna antiga (legacy_field) enquanto a linha não foi reescrita.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        field, data = self.field, instance.__dict__
+        if field.attname not in data:
+            self._fetch(instance)
+        value = data[field.attname]
+        if isinstance(value, EncodedPayload):
+            value = data[field.attname] = field.decode(value)
+        if value is None and field.legacy_field:
+            return getattr(instance, field.legacy_field)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def _fetch(self, instance):
+        """Uma consulta para o payload (e a coluna antiga, se também adiada) de uma instância salva."""
+        field = self.field
+        if instance.pk is None:
+            instance.__dict__[field.attname] = None
+            return
+        names = [field.attname]
+        if field.legacy_field and field.legacy_field not in instance.__dict__:
+            names.append(field.legacy_field)
+        row = (
+            type(instance)._base_manager.db_manager(instance._state.db)
+            .filter(pk=instance.pk).values_list(*names).get()
+        )
+        instance.__dict__.update(zip(names, row))
+
+
+class CompressedPayloadField(models.BinaryField):
+    """Coluna binária com o payload comprimido; subclasses definem dump_payload/load_payload."""
+
+    descriptor_class = PayloadDescriptor
+
+    def __init__(self, *args, legacy_field=None, **kwargs):
+        self.legacy_field = legacy_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.legacy_field:
+            kwargs['legacy_field'] = self.legacy_field
+        return name, path, args, kwargs
+
+    def dump_payload(self, value):
+        raise NotImplementedError
+
+    def load_payload(self, data):
+        raise NotImplementedError
+
+    def encode(self, value):
+        return compress(self.dump_payload(value))
+
+    def decode(self, data):
+        return self.load_payload(decompress(data))
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else EncodedPayload(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None or isinstance(value, bytes):
+            return value
+        if isinstance(value, memoryview):
+            return bytes(value)
+        return self.encode(value)
+
+    def value_to_string(self, obj):
+        return self.to_string(self.value_from_object(obj))
+
+    def to_string(self, value):
+        raise NotImplementedError
+
+
+class CompressedTextField(CompressedPayloadField):
+    """Texto (str) comprimido."""
+
+    def dump_payload(self, value):
+        return str(value).encode('utf-8')
+
+    def load_payload(self, data):
+        return data.decode('utf-8')
+
+    def to_python(self, value):
+        return value
+
+    def to_string(self, value):
+        return value
+
+
+class CompressedJSONField(CompressedPayloadField):
+    """Valor JSON (dict/list) comprimido; a coluna guarda o JSON compacto."""
+
+    def dump_payload(self, value):
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def load_payload(self, data):
+        return json.loads(data)
+
+    def to_python(self, value):
+        return json.loads(value) if isinstance(value, str) else value
+
+    def to_string(self, value):
+        return json.dumps(value)
+
+
+def payload_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, CompressedPayloadField)]
+
+
+def payload_models():
+    """Models com campos de payload comprimido."""
+    from django.apps import apps
+    return [model for model in apps.get_models() if payload_fields(model)]
+
+
+class PayloadQuerySet(models.QuerySet):
+
+    def with_payload(self):
+        """Volta a carregar os payloads (e as colunas antigas) adiados pelo manager padrão."""
+        return self.defer(None)
+
+
+class PayloadManager(models.Manager.from_queryset(PayloadQuerySet)):
+    """Manager padrão dos models com payload: as listagens não leem a coluna do payload."""
+
+    def get_queryset(self):
+        deferred = []
+        for field in payload_fields(self.model):
+            deferred.append(field.name)
+            if field.legacy_field:
+                deferred.append(field.legacy_field)
+        return super().get_queryset().defer(*deferred)
@@ -0,0 +1,52 @@
+"""
+Pipeline de ingestão em streaming (fetch → normalize → enrich → persist).
+
+Cada estágio recebe lotes (listas) e devolve um iterável com os itens do próximo estágio.
+O pipeline reagrupa os itens no tamanho de lote de cada estágio, então a memória ocupada
+fica limitada aos lotes em trânsito, independente do tamanho da janela consultada, e os
+primeiros lotes são gravados enquanto as páginas seguintes ainda estão sendo baixadas.
+"""
+from itertools import islice
+
+
+def batched(iterable, size):
+    """Agrupa um iterável em listas de até 'size' itens."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Stage:
+    """Estágio do pipeline: aplica 'func' a lotes de 'batch_size' itens."""
+
+    def __init__(self, name, func, batch_size=500):
+        self.name = name
+        self.func = func
+        self.batch_size = max(1, int(batch_size))
+        self.items = 0
+        self.batches = 0
+
+    def __call__(self, stream):
+        for batch in batched(stream, self.batch_size):
+            self.items += len(batch)
+            self.batches += 1
+            result = self.func(batch)
+            if result:
+                yield from result
+
+    def __repr__(self):
+        return f"<Stage {self.name}: {self.items} itens em {self.batches} lotes de {self.batch_size}>"
+
+
+def run_pipeline(source, stages):
+    """
+    Encadeia os estágios sobre a fonte e devolve o gerador final (preguiçoso).
+    Quem consome o gerador dirige o pipeline inteiro.
+    """
+    stream = iter(source)
+    for stage in stages:
+        stream = stage(stream)
+    return stream
@@ -0,0 +1,376 @@
+"""
+Buffer durável entre os coletores e a gravação no banco, em Redis Streams.
+
+Com LOG_STREAMS['enabled'] os coletores (polling do FA e receptor syslog) param depois de
+normalizar e enriquecer: os registros vão para um stream por tipo de dado e um pool de
+writers (python manage.py stream_writer, em quantos processos/nós for preciso) grava no
+banco. Um banco lento deixa de segurar a paginação do FA e o lock da coleta: os registros
+esperam no stream.
+
+    {prefix}:vpn, {prefix}:ips, ...   um stream por tipo; cada entrada = um registro JSON
+    grupo {group}                     todos os writers; cada entrada vai para um só writer
+
+Entrega ao menos uma vez: o writer só confirma (XACK, e XDEL para o stream não crescer)
+depois que o lote foi gravado. Entradas de um writer que caiu ficam pendentes e são
+retomadas por outro com XAUTOCLAIM após claim_idle_ms; a gravação é idempotente (upsert
+por session_id, event_id único), então reprocessar não duplica. Um lote que falha por
+outro motivo que não a conexão com o banco é retentado até max_deliveries vezes e então
+vai para {prefix}:{tipo}:dead.
+"""
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections
+import json
+import logging
+import os
+import socket
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DATA_TYPES = ('vpn', 'ips', 'antivirus', 'webfilter', 'app-control')
+
+DEFAULT_STREAM_SETTINGS = {
+    'enabled': False,
+    'url': 'redis://redis:6379/2',
+    'prefix': 'ingest',
+    'group': 'db-writers',
+    'batch_size': 2000,
+    'block_ms': 5000,
+    'claim_idle_ms': 60000,
+    'max_deliveries': 5,
+}
+
+
+def get_stream_settings(overrides=None):
+    options = dict(DEFAULT_STREAM_SETTINGS)
+    options.update(getattr(settings, 'LOG_STREAMS', None) or {})
+    options.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return options
+
+
+def stream_key(data_type, prefix=None):
+    return f"{prefix or get_stream_settings()['prefix']}:{data_type}"
+
+
+def _connect(url):
+    if redis is None:
+        raise RuntimeError("Pacote redis não instalado: LOG_STREAMS requer redis-py.")
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+def _entry_age(entry_id):
+    """Idade (s) de uma entrada a partir do seu ID (<ms>-<seq>)."""
+    return max(0.0, time.time() - int(entry_id.split('-', 1)[0]) / 1000)
+
+
+class StreamBuffer:
+    """Lado dos coletores: acrescenta registros normalizados ao stream do tipo de dado."""
+
+    def __init__(self, client=None, options=None):
+        self.options = get_stream_settings(options)
+        self.client = client or _connect(self.options['url'])
+
+    def append(self, data_type, records, chunk_size=1000):
+        """records: dicts serializáveis (VPNRecord.to_dict, event_to_dict). Devolve quantos entraram."""
+        key = stream_key(data_type, self.options['prefix'])
+        count = 0
+        pipe = self.client.pipeline(transaction=False)
+        for record in records:
+            pipe.xadd(key, {'r': json.dumps(record, default=str)})
+            count += 1
+            if count % chunk_size == 0:
+                pipe.execute()
+        pipe.execute()
+        return count
+
+
+def get_stream_buffer():
+    """StreamBuffer quando o buffer está ativado nas configurações, senão None (gravação direta)."""
+    if not get_stream_settings()['enabled']:
+        return None
+    return StreamBuffer()
+
+
+class StreamConsumer:
+    """
+    Um writer do grupo para um tipo de dado. read() devolve o próximo lote, nesta ordem:
+    entradas pendentes deste consumidor (reinício com o mesmo nome ou lote que falhou),
+    entradas paradas de outros consumidores (XAUTOCLAIM) e entradas novas ('>').
+    """
+
+    def __init__(self, data_type, client=None, consumer=None, options=None):
+        self.options = get_stream_settings(options)
+        self.client = client or _connect(self.options['url'])
+        self.data_type = data_type
+        self.key = stream_key(data_type, self.options['prefix'])
+        self.dead_key = f"{self.key}:dead"
+        self.group = self.options['group']
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        # Há entradas pendentes deste consumidor a reler (início do processo ou lote que falhou)
+        self.reread_pending = True
+        self._claim_cursor = '0-0'
+        self._last_claim = 0.0
+
+    def ensure_group(self):
+        try:
+            self.client.xgroup_create(self.key, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read(self, block_ms=None):
+        """Lista de (id, registro) do próximo lote; vazia quando não há nada a gravar."""
+        count = self.options['batch_size']
+        if self.reread_pending:
+            entries = self._read_group('0', count)
+            if entries:
+                return entries
+            self.reread_pending = False
+
+        entries = self._claim(count)
+        if entries:
+            return entries
+
+        block = self.options['block_ms'] if block_ms is None else block_ms
+        return self._read_group('>', count, block or None)
+
+    def _read_group(self, start, count, block=None):
+        response = self.client.xreadgroup(self.group, self.consumer, {self.key: start}, count=count, block=block)
+        entries = response[0][1] if response else []
+        # Entradas já removidas do stream aparecem como (id, None/{}) no histórico do PEL
+        stale = [entry_id for entry_id, fields in entries if not fields]
+        if stale:
+            self.client.xack(self.key, self.group, *stale)
+        return [(entry_id, json.loads(fields['r'])) for entry_id, fields in entries if fields]
+
+    def _claim(self, count):
+        """XAUTOCLAIM das entradas ociosas há mais de claim_idle_ms (writers que caíram)."""
+        idle = self.options['claim_idle_ms']
+        if time.monotonic() - self._last_claim < idle / 1000 / 2 and self._claim_cursor == '0-0':
+            return []
+        self._last_claim = time.monotonic()
+        response = self.client.xautoclaim(self.key, self.group, self.consumer, idle, start_id=self._claim_cursor, count=count)
+        self._claim_cursor, entries = response[0], response[1]
+        deleted = response[2] if len(response) > 2 else []
+        if deleted:
+            logger.warning(f"{self.key}: {len(deleted)} entradas pendentes já não existiam no stream.")
+        if entries:
+            logger.warning(f"{self.key}: {len(entries)} entradas retomadas de writers parados.")
+        return [(entry_id, json.loads(fields['r'])) for entry_id, fields in entries if fields]
+
+    def ack(self, entry_ids):
+        """Confirma e remove do stream as entradas gravadas."""
+        if not entry_ids:
+            return
+        pipe = self.client.pipeline(transaction=True)
+        pipe.xack(self.key, self.group, *entry_ids)
+        pipe.xdel(self.key, *entry_ids)
+        pipe.execute()
+
+    def retry_later(self):
+        """Lote não gravado: volta a ser lido (pendente deste consumidor) na próxima leitura."""
+        self.reread_pending = True
+
+    def dead_letter(self, entries, error):
+        """Move para o stream de descarte as entradas que excederam max_deliveries."""
+        pipe = self.client.pipeline(transaction=True)
+        for entry_id, record in entries:
+            pipe.xadd(self.dead_key, {'r': json.dumps(record, default=str), 'id': entry_id, 'error': str(error)[:500]})
+        pipe.xack(self.key, self.group, *[entry_id for entry_id, _ in entries])
+        pipe.xdel(self.key, *[entry_id for entry_id, _ in entries])
+        pipe.execute()
+
+    def delivery_counts(self, entry_ids):
+        """{id: vezes entregue} das entradas pendentes (XPENDING)."""
+        if not entry_ids:
+            return {}
+        pending = self.client.xpending_range(self.key, self.group, min=min(entry_ids), max=max(entry_ids), count=len(entry_ids))
+        return {item['message_id']: item['times_delivered'] for item in pending}
+
+    def requeue_dead(self):
+        """Devolve ao stream principal as entradas descartadas; retorna quantas."""
+        moved = 0
+        while True:
+            entries = self.client.xrange(self.dead_key, count=1000)
+            if not entries:
+                return moved
+            pipe = self.client.pipeline(transaction=True)
+            for entry_id, fields in entries:
+                pipe.xadd(self.key, {'r': fields['r']})
+            pipe.xdel(self.dead_key, *[entry_id for entry_id, _ in entries])
+            pipe.execute()
+            moved += len(entries)
+
+
+class RecordWriter:
+    """
+    Grava os registros de um tipo pelo mesmo caminho dos coletores: VPNLogIngestor.persist
+    para VPN e SecurityEventBulkWriter para os eventos de segurança. O ingestor de VPN é
+    recriado a cada recycle_seconds, como no receptor syslog.
+    """
+
+    def __init__(self, data_type, recycle_seconds=600):
+        self.data_type = data_type
+        self.recycle_seconds = recycle_seconds
+        self._target = None
+        self._started = 0
+
+    def _get_target(self):
+        if self.data_type != 'vpn':
+            if self._target is None:
+                from security_events.fingerprint import recent_ids
+                from security_events.writers import SecurityEventBulkWriter
+                self._target = SecurityEventBulkWriter(
+                    chunk_size=getattr(settings, 'SECURITY_EVENTS_WRITE_CHUNK', 500),
+                    recent=recent_ids(self.data_type, getattr(settings, 'SECURITY_EVENTS_RECENT_IDS', 50000)),
+                )
+        elif self._target is None or time.monotonic() - self._started > self.recycle_seconds:
+            from vpn_logs.ingest import VPNLogIngestor
+            self._target = VPNLogIngestor(ad_client=None)
+            self._started = time.monotonic()
+        return self._target
+
+    def write(self, records):
+        """Grava o lote; devolve quantos registros entraram no banco."""
+        target = self._get_target()
+        if self.data_type == 'vpn':
+            from integrations.normalizer import VPNRecord
+            outcomes = target.persist([VPNRecord.from_dict(record) for record in records])
+            return sum(1 for outcome in outcomes if outcome in ('created', 'updated', 'failure'))
+
+        from security_events.ingest import event_from_dict
+        return target.write([event_from_dict(record) for record in records])
+
+
+class StreamWriterPool:
+    """
+    Laço de um processo writer sobre um ou mais tipos de dado. Cada processo é um
+    consumidor do grupo; o paralelismo vem de rodar vários processos (ou nós).
+    """
+
+    def __init__(self, data_types=DATA_TYPES, client=None, consumer=None, options=None):
+        self.options = get_stream_settings(options)
+        client = client or _connect(self.options['url'])
+        self.consumers = [StreamConsumer(t, client=client, consumer=consumer, options=self.options) for t in data_types]
+        self.writers = {t: RecordWriter(t) for t in data_types}
+        self.stats = {t: {'batches': 0, 'written': 0, 'read': 0, 'retries': 0, 'dead': 0} for t in data_types}
+        self._running = False
+
+    def run(self, once=False):
+        """Drena os streams até stop() (ou, com once, até não haver mais nada a ler)."""
+        for consumer in self.consumers:
+            consumer.ensure_group()
+        # Com vários tipos no mesmo processo nenhuma leitura bloqueia: o laço dorme quando todos estão vazios
+        block = 0 if (once or len(self.consumers) > 1) else None
+        self._running = True
+        backoff = 1
+        while self._running:
+            busy = False
+            for consumer in self.consumers:
+                busy = self.drain_once(consumer, block_ms=block) or busy
+            if busy:
+                backoff = 1
+                continue
+            if once:
+                break
+            if any(consumer.reread_pending for consumer in self.consumers):
+                # Lote não gravado: espera crescente antes de reler as pendentes
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            elif block == 0:
+                time.sleep(1)
+        return self.stats
+
+    def stop(self):
+        self._running = False
+
+    def drain_once(self, consumer, block_ms=None):
+        """Lê, grava e confirma um lote; devolve True se gravou algo."""
+        entries = consumer.read(block_ms=block_ms)
+        if not entries:
+            return False
+        stats = self.stats[consumer.data_type]
+        stats['read'] += len(entries)
+        close_old_connections()
+        try:
+            written = self.writers[consumer.data_type].write([record for _, record in entries])
+        except (OperationalError, InterfaceError) as e:
+            # Banco fora do ar/lento: as entradas continuam pendentes e serão relidas
+            logger.error(f"{consumer.key}: banco indisponível, lote de {len(entries)} mantido no stream ({e})")
+            stats['retries'] += 1
+            consumer.retry_later()
+            return False
+        except Exception as e:
+            logger.error(f"{consumer.key}: falha ao gravar lote de {len(entries)} ({e})", exc_info=True)
+            stats['retries'] += 1
+            counts = consumer.delivery_counts([entry_id for entry_id, _ in entries])
+            if any(counts.get(entry_id, 0) >= self.options['max_deliveries'] for entry_id, _ in entries):
+                # Lote esgotou as tentativas: grava um a um e descarta apenas os registros que falham
+                self._write_individually(consumer, entries)
+                return True
+            consumer.retry_later()
+            return False
+
+        consumer.ack([entry_id for entry_id, _ in entries])
+        stats['batches'] += 1
+        stats['written'] += written
+        logger.debug(f"{consumer.key}: lote de {len(entries)} gravado ({written} novos)")
+        return True
+
+    def _write_individually(self, consumer, entries):
+        stats = self.stats[consumer.data_type]
+        writer = self.writers[consumer.data_type]
+        dead = []
+        for entry_id, record in entries:
+            try:
+                stats['written'] += writer.write([record])
+                consumer.ack([entry_id])
+            except Exception as e:
+                dead.append((entry_id, record, e))
+        if dead:
+            consumer.dead_letter([(entry_id, record) for entry_id, record, _ in dead], dead[0][2])
+            stats['dead'] += len(dead)
+            logger.error(f"{consumer.key}: {len(dead)} entradas movidas para {consumer.dead_key} ({dead[0][2]})")
+
+
+def stream_lag(data_types=DATA_TYPES, client=None):
+    """
+    Atraso por tipo de dado:
+        length   entradas no stream (não gravadas: as gravadas são removidas)
+        lag      entradas ainda não entregues a nenhum writer
+        pending  entregues e ainda não confirmadas
+        oldest_seconds  idade da entrada mais antiga não gravada
+        consumers, dead
+    """
+    options = get_stream_settings()
+    client = client or _connect(options['url'])
+    result = {}
+    for data_type in data_types:
+        key = stream_key(data_type, options['prefix'])
+        info = {'length': 0, 'lag': 0, 'pending': 0, 'oldest_seconds': 0.0, 'consumers': 0, 'dead': 0}
+        pipe = client.pipeline(transaction=False)
+        pipe.exists(key)
+        pipe.xlen(key)
+        pipe.xrange(key, count=1)
+        pipe.xlen(f"{key}:dead")
+        exists, info['length'], oldest, info['dead'] = pipe.execute()
+        if exists:
+            group = next((g for g in client.xinfo_groups(key) if g['name'] == options['group']), None)
+            if group:
+                info['pending'] = group['pending']
+                info['consumers'] = group['consumers']
+                # 'lag' existe a partir do Redis 7; None quando não pode ser calculado
+                info['lag'] = group.get('lag')
+                if info['lag'] is None:
+                    info['lag'] = max(0, info['length'] - info['pending'])
+            else:
+                info['lag'] = info['length']
+        if oldest:
+            info['oldest_seconds'] = round(_entry_age(oldest[0][0]), 1)
+        result[data_type] = info
+    return result
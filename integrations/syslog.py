@@ -0,0 +1,379 @@
+"""
+Recepção de logs por syslog (FortiGate/FortiAnalyzer log forwarding), em tempo real.
+
+Linhas key=value do FortiOS chegam por UDP (um datagrama por linha) ou TCP (uma linha por
+'\\n' ou com octet-counting, RFC 6587), são lidas por um tokenizador de uma passada e
+roteadas por type/subtype para o mesmo caminho de gravação dos coletores por polling:
+
+    vpn                       → vpn_logs.ingest.VPNLogIngestor
+    ips/antivirus/webfilter   → security_events.ingest + SecurityEventBulkWriter
+    app-control (traffic)     → idem
+
+ou, com LOG_STREAMS ativado, para os streams Redis de integrations.streams.
+
+Cada fluxo acumula as linhas em micro-lotes, gravados quando atingem batch_size linhas ou
+quando a linha mais antiga completa flush_interval segundos. A gravação roda numa thread
+por fluxo (o ORM é síncrono), fora do loop de eventos que continua recebendo.
+
+Uso: python manage.py syslog_receiver (ver integrations/management/commands).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSLOG_SETTINGS = {
+    'host': '0.0.0.0',
+    'udp_port': 5140,
+    'tcp_port': 5140,
+    'batch_size': 500,
+    'flush_interval': 0.5,
+}
+
+# (type, subtype) do FortiOS → fluxo (mesmos nomes dos coletores por polling)
+ROUTES = {
+    ('event', 'vpn'): 'vpn',
+    ('utm', 'ips'): 'ips',
+    ('utm', 'virus'): 'antivirus',
+    ('utm', 'webfilter'): 'webfilter',
+}
+STREAMS = ('vpn', 'ips', 'antivirus', 'webfilter', 'app-control')
+# Resultados do ingestor de VPN contados como gravados ('queued' = enviado ao buffer Redis)
+WRITTEN_OUTCOMES = ('created', 'updated', 'failure', 'queued')
+# Mesmo critério do filtro do polling de App Control sobre os logs de tráfego
+NOISE_APPS = ('', 'unscanned', 'unknown')
+
+
+def get_syslog_settings(overrides=None):
+    options = dict(DEFAULT_SYSLOG_SETTINGS)
+    options.update(getattr(settings, 'SYSLOG_RECEIVER', None) or {})
+    options.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return options
+
+
+# --- Parser ---
+
+def parse_kv(line):
+    """
+    Linha key=value do FortiOS → dict de strings, em uma passada da esquerda para a direita.
+    Ignora o prefixo <PRI> e qualquer cabeçalho syslog antes do primeiro par; valores entre
+    aspas podem conter espaços e aspas escapadas (\\").
+    """
+    line = line.rstrip('\r\n')
+    n = len(line)
+    pos = 0
+    if line.startswith('<'):
+        pos = line.find('>') + 1
+    eq = line.find('=', pos)
+    if eq < 0:
+        return {}
+    # Início da primeira chave: depois do último espaço antes do primeiro '='
+    pos = line.rfind(' ', pos, eq) + 1 or pos
+
+    log = {}
+    while eq >= 0:
+        key = line[pos:eq]
+        start = eq + 1
+        if start < n and line[start] == '"':
+            end = line.find('"', start + 1)
+            while end > 0 and line[end - 1] == '\\':
+                end = line.find('"', end + 1)
+            if end < 0:
+                end = n
+            value = line[start + 1:end]
+            if '\\' in value:
+                value = value.replace('\\"', '"')
+            pos = end + 1
+        else:
+            end = line.find(' ', start)
+            if end < 0:
+                end = n
+            value = line[start:end]
+            pos = end
+        log[key] = value
+        while pos < n and line[pos] == ' ':
+            pos += 1
+        eq = line.find('=', pos)
+    return log
+
+
+def route(log):
+    """Fluxo do log, ou None para os tipos que não são coletados."""
+    stream = ROUTES.get((log.get('type'), log.get('subtype')))
+    if stream is None and log.get('type') == 'traffic' and str(log.get('app', '')).lower() not in NOISE_APPS:
+        stream = 'app-control'
+    return stream
+
+
+# --- Gravação ---
+
+class SyslogSink:
+    """
+    Grava os micro-lotes pelo mesmo caminho dos coletores. O ingestor de VPN (índices de
+    sessões ativas e de falhas) é recriado a cada recycle_seconds para limitar a memória e
+    ressincronizar com o banco.
+    """
+
+    def __init__(self, ad_client=None, recycle_seconds=600, buffer=None):
+        from integrations.ad import ActiveDirectoryClient
+        self.ad_client = ad_client or ActiveDirectoryClient()
+        self.buffer = buffer
+        self.recycle_seconds = recycle_seconds
+        self._ingestor = None
+        self._ingestor_started = 0
+        self._writers = {}
+
+    def _vpn_ingestor(self):
+        from vpn_logs.ingest import VPNLogIngestor
+        if self._ingestor is None or time.monotonic() - self._ingestor_started > self.recycle_seconds:
+            self._ingestor = VPNLogIngestor(self.ad_client, buffer=self.buffer)
+            self._ingestor_started = time.monotonic()
+        return self._ingestor
+
+    def _security_writer(self, stream):
+        from security_events.fingerprint import recent_ids
+        from security_events.writers import SecurityEventBulkWriter
+        writer = self._writers.get(stream)
+        if writer is None:
+            writer = self._writers[stream] = SecurityEventBulkWriter(
+                chunk_size=getattr(settings, 'SECURITY_EVENTS_WRITE_CHUNK', 500),
+                recent=recent_ids(stream, getattr(settings, 'SECURITY_EVENTS_RECENT_IDS', 50000)),
+            )
+        return writer
+
+    def write(self, stream, logs):
+        """Grava um micro-lote; devolve quantos registros entraram no banco."""
+        close_old_connections()
+        if stream == 'vpn':
+            ingestor = self._vpn_ingestor()
+            # outcomes do ingestor é cumulativo entre os lotes
+            before = sum(ingestor.outcomes[k] for k in WRITTEN_OUTCOMES)
+            outcomes = ingestor.run(iter(logs))
+            return sum(outcomes[k] for k in WRITTEN_OUTCOMES) - before
+
+        from security_events.ingest import build_security_event, event_to_dict
+        ad_infos = self.ad_client.get_users_info({log.get('user') for log in logs if log.get('user')})
+        events = [build_security_event(log, stream, ad_infos) for log in logs]
+        events = [event for event in events if event is not None]
+        if self.buffer:
+            return self.buffer.append(stream, [event_to_dict(event) for event in events])
+        return self._security_writer(stream).write(events)
+
+
+class NullSink:
+    """Descarta os lotes (medição do receptor sem banco: --dry-run e benchmark)."""
+
+    def write(self, stream, logs):
+        return 0
+
+
+# --- Micro-lotes ---
+
+class _StreamBuffer:
+    __slots__ = ('logs', 'first_arrival', 'executor', 'pending')
+
+    def __init__(self, stream):
+        self.logs = []
+        self.first_arrival = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'syslog-{stream}')
+        self.pending = 0
+
+
+class MicroBatcher:
+    """
+    Buffers por fluxo com política de flush por tamanho ou idade. Os lotes de um mesmo fluxo
+    são gravados em ordem (uma thread por fluxo); fluxos diferentes gravam em paralelo.
+    """
+
+    def __init__(self, sink, batch_size=500, flush_interval=0.5, max_pending=20):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Lotes aguardando gravação por fluxo antes de descartar (banco não acompanha a entrada)
+        self.max_pending = max_pending
+        self.buffers = {stream: _StreamBuffer(stream) for stream in STREAMS}
+        self.stats = {'lines': 0, 'parsed': 0, 'ignored': 0, 'invalid': 0, 'batches': 0,
+                      'written': 0, 'dropped': 0, 'errors': 0, 'max_latency': 0.0}
+        self._tasks = set()
+
+    def add_line(self, line):
+        self.stats['lines'] += 1
+        try:
+            log = parse_kv(line)
+        except Exception:
+            log = None
+        if not log:
+            self.stats['invalid'] += 1
+            return
+        stream = route(log)
+        if stream is None:
+            self.stats['ignored'] += 1
+            return
+        self.stats['parsed'] += 1
+        buffer = self.buffers[stream]
+        if not buffer.logs:
+            buffer.first_arrival = time.monotonic()
+        buffer.logs.append(log)
+        if len(buffer.logs) >= self.batch_size:
+            self.flush(stream)
+
+    def flush(self, stream):
+        buffer = self.buffers[stream]
+        if not buffer.logs:
+            return
+        logs, arrival = buffer.logs, buffer.first_arrival
+        buffer.logs, buffer.first_arrival = [], None
+        if buffer.pending >= self.max_pending:
+            self.stats['dropped'] += len(logs)
+            logger.error(f"Syslog {stream}: {buffer.pending} lotes aguardando gravação; {len(logs)} linhas descartadas.")
+            return
+        buffer.pending += 1
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(self._write(stream, buffer, logs, arrival))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, stream, buffer, logs, arrival):
+        loop = asyncio.get_running_loop()
+        try:
+            written = await loop.run_in_executor(buffer.executor, self.sink.write, stream, logs)
+            self.stats['written'] += written or 0
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Syslog {stream}: erro ao gravar lote de {len(logs)} linhas: {e}", exc_info=True)
+        finally:
+            buffer.pending -= 1
+            self.stats['batches'] += 1
+            latency = time.monotonic() - arrival
+            if latency > self.stats['max_latency']:
+                self.stats['max_latency'] = latency
+
+    def flush_expired(self):
+        now = time.monotonic()
+        for stream, buffer in self.buffers.items():
+            if buffer.logs and now - buffer.first_arrival >= self.flush_interval:
+                self.flush(stream)
+
+    async def drain(self):
+        """Grava tudo o que está em buffer e espera as gravações em andamento."""
+        for stream in self.buffers:
+            self.flush(stream)
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def close(self):
+        for buffer in self.buffers.values():
+            buffer.executor.shutdown(wait=True)
+
+
+# --- Transporte ---
+
+class SyslogUDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    def datagram_received(self, data, addr):
+        text = data.decode('utf-8', errors='replace')
+        for line in text.splitlines():
+            if line:
+                self.batcher.add_line(line)
+
+
+class SyslogTCPProtocol(asyncio.Protocol):
+    """Quadros separados por '\\n' ou com octet-counting ('<tamanho> <mensagem>')."""
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.buffer = b''
+
+    def data_received(self, data):
+        buffer = self.buffer + data
+        pos = 0
+        n = len(buffer)
+        while pos < n:
+            if buffer[pos:pos + 1].isdigit():
+                space = buffer.find(b' ', pos)
+                if space < 0:
+                    break
+                length = buffer[pos:space]
+                if length.isdigit():
+                    end = space + 1 + int(length)
+                    if end > n:
+                        break
+                    self._line(buffer[space + 1:end])
+                    pos = end
+                    continue
+            end = buffer.find(b'\n', pos)
+            if end < 0:
+                break
+            self._line(buffer[pos:end])
+            pos = end + 1
+        self.buffer = buffer[pos:]
+
+    def _line(self, raw):
+        line = raw.decode('utf-8', errors='replace').strip()
+        if line:
+            self.batcher.add_line(line)
+
+    def connection_lost(self, exc):
+        if self.buffer.strip():
+            self._line(self.buffer)
+        self.buffer = b''
+
+
+class SyslogReceiver:
+    """Escuta UDP e/ou TCP e alimenta o MicroBatcher; stats_interval em segundos (0 desliga)."""
+
+    def __init__(self, batcher, host='0.0.0.0', udp_port=5140, tcp_port=5140, stats_interval=60):
+        self.batcher = batcher
+        self.host = host
+        self.udp_port = udp_port
+        self.tcp_port = tcp_port
+        self.stats_interval = stats_interval
+        self._stopping = None
+        self.ready = None
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        transports = []
+        server = None
+        if self.udp_port:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: SyslogUDPProtocol(self.batcher), local_addr=(self.host, self.udp_port)
+            )
+            transports.append(transport)
+        if self.tcp_port:
+            server = await loop.create_server(lambda: SyslogTCPProtocol(self.batcher), self.host, self.tcp_port)
+        logger.info(f"Syslog receiver escutando em {self.host} (udp={self.udp_port or '-'}, tcp={self.tcp_port or '-'}).")
+        if self.ready is not None:
+            self.ready.set()
+
+        tick = min(self.batcher.flush_interval / 2, 0.25)
+        last_stats = time.monotonic()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=tick)
+                except asyncio.TimeoutError:
+                    pass
+                self.batcher.flush_expired()
+                if self.stats_interval and time.monotonic() - last_stats >= self.stats_interval:
+                    last_stats = time.monotonic()
+                    logger.info(f"Syslog: {self.batcher.stats}")
+        finally:
+            for transport in transports:
+                transport.close()
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+            await self.batcher.drain()
+            logger.info(f"Syslog receiver encerrado: {self.batcher.stats}")
+
+    def stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
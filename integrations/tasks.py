@@ -11,9 +11,10 @@ def cleanup_old_logs():
     Deleta registros de logs mais antigos que o período de retenção configurado.
     """
     from setup.models import DatabaseConfiguration
-    from vpn_logs.models import VPNLog, VPNFailure
-    from security_events.models import SecurityEvent, ADAuthEvent
     from dashboard.models import DashboardMetric
+    from integrations.partitions import apply_retention, chunked_delete
+    from vpn_logs.models import VPNUserDailySummary
+    from security_events.models import DETAIL_MODELS
     
     config = DatabaseConfiguration.get_active_config()
     
@@ -30,23 +31,115 @@ def cleanup_old_logs():
     logger.info(f"Iniciando limpeza de logs anteriores a {cutoff_date} ({days} dias).")
     
     try:
-        # VPN
-        vpn_del, _ = VPNLog.objects.filter(start_time__lt=cutoff_date).delete()
-        vpnf_del, _ = VPNFailure.objects.filter(timestamp__lt=cutoff_date).delete()
-        
-        # Security
-        sec_del, _ = SecurityEvent.objects.filter(timestamp__lt=cutoff_date).delete()
-        ad_del, _ = ADAuthEvent.objects.filter(timestamp__lt=cutoff_date).delete()
-        
+        # Camada fria: o que vai sair do banco é exportado antes; model cuja exportação falhou
+        # fica de fora desta limpeza
+        archived = archive_before_retention(cutoff_date)
+
+        def retain(label):
+            return apply_retention(label, cutoff_date) if archived.get(label, True) else 0
+
+        # Tabelas de log: partições vencidas removidas inteiras (PostgreSQL particionado),
+        # o restante em DELETEs em blocos (ver integrations.partitions)
+        vpn_del = retain('vpn_logs.VPNLog')
+        vpnf_del = retain('vpn_logs.VPNFailure')
+        sec_del = retain('security_events.SecurityEvent')
+        # Detalhes por tipo: o DELETE dos eventos já os leva em cascata; aqui saem as
+        # partições vencidas (eventos removidos por partição não passam pela cascata)
+        if archived.get('security_events.SecurityEvent', True):
+            for model in DETAIL_MODELS.values():
+                apply_retention(model._meta.label, cutoff_date)
+        ad_del = retain('security_events.ADAuthEvent')
+
         # Dashboard Summary
-        dash_del, _ = DashboardMetric.objects.filter(date__lt=cutoff_date.date()).delete()
+        dash_del = chunked_delete(DashboardMetric.objects.filter(date__lt=cutoff_date.date()))
+        # Resumo diário de VPN acompanha os logs que ficam no banco
+        summary_del = 0
+        if archived.get('vpn_logs.VPNLog', True):
+            summary_del = chunked_delete(VPNUserDailySummary.objects.filter(date__lt=cutoff_date.date()))
         
-        total = vpn_del + vpnf_del + sec_del + ad_del + dash_del
+        total = vpn_del + vpnf_del + sec_del + ad_del + dash_del + summary_del
         msg = (f"Limpeza concluída. Removidos: {vpn_del} VPNLogs, {vpnf_del} VPNFailures, "
-               f"{sec_del} SecurityEvents, {ad_del} ADAuthEvents, {dash_del} Metrics. Total: {total}")
+               f"{sec_del} SecurityEvents, {ad_del} ADAuthEvents, {dash_del} Metrics, "
+               f"{summary_del} VPN Summaries. Total: {total}")
         logger.info(msg)
         return msg
         
     except Exception as e:
         logger.error(f"Erro durante a limpeza de logs: {e}")
         return f"Erro: {str(e)}"
+
+
+def archive_before_retention(cutoff_date, labels=None):
+    """
+    Exporta para Parquet (LOG_ARCHIVE) os dias até o do corte da retenção e reexporta os
+    dias já arquivados que ainda têm registros a apagar. Devolve {label: exportou}; vazio
+    com o arquivamento desativado. labels restringe aos models informados.
+    """
+    from integrations.archive import ARCHIVED_MODELS, archive_enabled, export_until, refresh_before
+
+    if not archive_enabled():
+        return {}
+    last_day = timezone.localtime(cutoff_date).date()
+    archived = {}
+    for label in labels or ARCHIVED_MODELS:
+        try:
+            refresh_before(label, cutoff_date)
+            export_until(label, last_day)
+            archived[label] = True
+        except Exception as e:
+            logger.error(f"Falha ao arquivar {label} até {last_day}; registros mantidos no banco: {e}")
+            archived[label] = False
+    return archived
+
+
+@shared_task(name='integrations.tasks.archive_closed_days')
+def archive_closed_days():
+    """
+    Exporta para Parquet os dias fechados (hoje menos LOG_ARCHIVE['grace_days']) ainda não
+    arquivados de cada tabela de log (ver integrations.archive).
+    """
+    from integrations.archive import ARCHIVED_MODELS, archive_enabled, closed_day, export_until
+
+    if not archive_enabled():
+        return "Arquivamento desativado"
+
+    last_day = closed_day()
+    exported = {}
+    for label in ARCHIVED_MODELS:
+        try:
+            exported[label] = sum(export_until(label, last_day).values())
+        except Exception as e:
+            logger.error(f"Erro ao arquivar {label}: {e}")
+            exported[label] = f"Erro: {e}"
+    msg = f"Arquivamento até {last_day}: {exported}"
+    logger.info(msg)
+    return msg
+
+
+@shared_task(name='integrations.tasks.maintain_partitions')
+def maintain_partitions():
+    """
+    Cria com antecedência as partições dos próximos períodos (LOG_PARTITIONS['ahead']) das
+    tabelas de log já particionadas e verifica se algum session_id/event_id aparece em mais
+    de uma partição (a unicidade no banco é só por partição). Sem efeito fora do PostgreSQL
+    ou antes da conversão (python manage.py partition_tables).
+    """
+    from integrations.partitions import (
+        all_specs, cross_partition_duplicates, ensure_partitions, is_partitioned, partitioning_supported,
+    )
+
+    if not partitioning_supported():
+        return "Particionamento indisponível neste banco"
+
+    created, duplicates = {}, {}
+    for spec in all_specs():
+        if is_partitioned(spec['table']):
+            created[spec['table']] = ensure_partitions(spec)
+            found = cross_partition_duplicates(spec)
+            if found:
+                duplicates[spec['table']] = {column: count for column, (count, _) in found.items()}
+    msg = f"Partições criadas: {created}"
+    if duplicates:
+        msg += f" | Chaves repetidas entre partições: {duplicates}"
+    logger.info(msg)
+    return msg
@@ -1,3 +1,965 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from integrations import archive, config_cache, fortianalyzer, partitions, payloads, streams, syslog
+from integrations.models import CollectionWatermark, FortiAnalyzerConfig, PayloadDictionary
+from integrations.watermarks import WatermarkTracker
+from integrations.windows import WindowPlanner
+from integrations.tasks import cleanup_old_logs
+from security_events.models import IPSDetail, SecurityEvent
+from setup.models import DatabaseConfiguration
+from vpn_logs.models import VPNFailure, VPNLog
+from vpn_logs.writers import VPNLogBulkWriter
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def local(*args):
+    return timezone.make_aware(datetime.datetime(*args))
+
+
+def fa_log(ts, **fields):
+    """Log do FA com date/time no relógio do FA."""
+    ts = timezone.localtime(ts)
+    return {'date': ts.strftime('%Y-%m-%d'), 'time': ts.strftime('%H:%M:%S'), **fields}
+
+
+class FakeFAClient:
+    """
+    FortiAnalyzer em memória para os coletores: cada tarefa conta as linhas de [início, fim)
+    e fetch_all_results devolve até limit delas, das mais novas para as mais antigas.
+    fail: janelas cujo start_log_task não devolve TID; unfinished: janelas que não concluem.
+    """
+
+    def __init__(self, times, fail=(), unfinished=(), adom='root'):
+        self.times = sorted(times, reverse=True)
+        self.fail = set(fail)
+        self.unfinished = set(unfinished)
+        self.config = types.SimpleNamespace(adom=adom)
+        self.started = []
+        self.fetched = []
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def start_log_task(self, log_type, start_time, end_time, limit=None, log_filter=None):
+        with self._lock:
+            self.started.append((log_type, log_filter, start_time, end_time))
+            if (start_time, end_time) in self.fail:
+                return None
+            tid = len(self.started)
+            self._tasks[tid] = ((start_time, end_time), [t for t in self.times if start_time <= t < end_time])
+        return tid
+
+    def wait_for_task(self, tid, min_rows=None):
+        window, rows = self._tasks[tid]
+        done = window not in self.unfinished
+        return {'tid': tid, 'total': len(rows), 'done': done, 'percentage': 100 if done else 40}
+
+    def fetch_all_results(self, tid, page_size=100, total=None, limit=None):
+        window, rows = self._tasks[tid]
+        self.fetched.append(window)
+        for ts in rows[:limit]:
+            yield fa_log(ts)
+        return True
+
+    def pool_stats(self):
+        return {}
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'particionamento declarativo só no PostgreSQL')
+class PartitionTests(TestCase):
+    """Conversão, partições futuras e retenção contra um PostgreSQL de verdade (DDL na transação do teste)."""
+
+    def setUp(self):
+        today = timezone.localdate()
+        self.this_month = today.replace(day=1)
+        self.old_month = (self.this_month - datetime.timedelta(days=1)).replace(day=1)
+        self.older_month = (self.old_month - datetime.timedelta(days=1)).replace(day=1)
+
+        def vpn(session_id, day):
+            start = local(day.year, day.month, day.day, 10)
+            return VPNLog.objects.create(session_id=session_id, user='ana', source_ip='198.51.100.1', start_time=start, status='closed', duration=60, raw_data={})
+
+        self.rows = [vpn('older', self.older_month), vpn('old-1', self.old_month), vpn('old-20', self.old_month.replace(day=20)), vpn('now', today)]
+        for event_id, day in (('e-older', self.older_month), ('e-now', today)):
+            SecurityEvent.objects.create(
+                event_id=event_id, event_type='ips', timestamp=local(day.year, day.month, day.day, 10), date=day,
+                src_ip='203.0.113.5', dst_ip='10.0.0.8', attack_name='SQL.Injection',
+            )
+
+    def tearDown(self):
+        partitions.is_partitioned_cached.cache_clear()
+
+    def convert(self, *labels):
+        call_command('partition_tables', models=list(labels), interval='month', ahead=2, stdout=open('/dev/null', 'w'))
+
+    def test_conversion_keeps_rows_ids_and_unique_keys(self):
+        self.convert('vpn_logs.VPNLog', 'security_events.SecurityEvent', 'security_events.IPSDetail')
+
+        for table in ('vpn_logs_vpnlog', 'security_events_securityevent', 'security_events_ipsdetail'):
+            self.assertTrue(partitions.is_partitioned(table))
+        names = [name for name, _, _ in partitions.list_partitions('vpn_logs_vpnlog')]
+        self.assertEqual(names[0], partitions.partition_name('vpn_logs_vpnlog', self.older_month, 'month'))
+        self.assertEqual(len(names), 5)  # três meses com dados + dois à frente
+
+        self.assertEqual(sorted(VPNLog.objects.values_list('pk', 'session_id')), sorted((row.pk, row.session_id) for row in self.rows))
+        self.assertEqual(SecurityEvent.objects.with_details('ips').filter(attack_name='SQL.Injection').count(), 2)
+
+        # A sequência continua depois do maior id copiado
+        new = VPNLog.objects.create(session_id='after', user='ana', source_ip='198.51.100.1', start_time=timezone.now(), status='active', raw_data={})
+        self.assertGreater(new.pk, max(row.pk for row in self.rows))
+
+        # session_id continua único dentro da partição
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            VPNLog.objects.create(session_id='now', user='bia', source_ip='198.51.100.2', start_time=self.rows[-1].start_time, status='active', raw_data={})
+
+    def test_writer_falls_back_from_upsert_on_partitioned_table(self):
+        from vpn_logs.tests import SESSION_BATCH
+        from integrations.normalizer import normalize_vpn
+
+        self.convert('vpn_logs.VPNLog')
+        partitions.is_partitioned_cached.cache_clear()
+        writer = VPNLogBulkWriter()
+        self.assertFalse(writer.use_upsert)
+        records = [normalize_vpn(log) for log in SESSION_BATCH[:3]]
+        self.assertEqual(writer.write(records), {'101': 'created', '102': 'created'})
+        self.assertEqual(writer.write(records), {'101': 'updated', '102': 'updated'})
+        self.assertEqual(VPNLog.objects.filter(session_id__in=['101', '102']).count(), 2)
+
+    def test_ensure_partitions_creates_future_periods(self):
+        self.convert('vpn_logs.VPNLog')
+        created = partitions.ensure_partitions(partitions.get_spec('vpn_logs.VPNLog'), ahead=4)
+        self.assertEqual(len(created), 2)
+        self.assertEqual(partitions.ensure_partitions(partitions.get_spec('vpn_logs.VPNLog'), ahead=4), [])
+
+    def test_maintenance_reports_keys_repeated_across_partitions(self):
+        from integrations.tasks import maintain_partitions
+
+        self.convert('vpn_logs.VPNLog', 'security_events.SecurityEvent', 'security_events.IPSDetail')
+        spec = partitions.get_spec('vpn_logs.VPNLog')
+        self.assertEqual(partitions.unique_columns(spec), ['session_id'])
+        self.assertEqual(partitions.unique_columns(partitions.get_spec('security_events.IPSDetail')), ['event_id'])
+        self.assertEqual(partitions.cross_partition_duplicates(spec), {})
+
+        # Outra data, outra partição: a chave (session_id, start_date) aceita a repetição
+        older = self.older_month
+        VPNLog.objects.create(session_id='now', user='bia', source_ip='198.51.100.2', start_time=local(older.year, older.month, older.day, 11), status='closed', raw_data={})
+        with self.assertLogs('integrations.partitions', 'ERROR'):
+            self.assertEqual(partitions.cross_partition_duplicates(spec), {'session_id': (1, ['now'])})
+        with self.assertLogs('integrations.partitions', 'ERROR'):
+            self.assertIn("'vpn_logs_vpnlog': {'session_id': 1}", maintain_partitions())
+        self.assertEqual(partitions.cross_partition_duplicates(partitions.get_spec('security_events.SecurityEvent')), {})
+
+    def test_retention_drops_old_partitions_and_trims_the_boundary(self):
+        self.convert('vpn_logs.VPNLog', 'security_events.SecurityEvent', 'security_events.IPSDetail')
+        cutoff = local(self.old_month.year, self.old_month.month, 10)
+
+        partitions.apply_retention('vpn_logs.VPNLog', cutoff)
+        partitions.apply_retention('security_events.SecurityEvent', cutoff)
+        partitions.apply_retention('security_events.IPSDetail', cutoff)
+
+        # Mês mais antigo: partição removida inteira; mês do corte: só as linhas antes dele
+        names = [name for name, _, _ in partitions.list_partitions('vpn_logs_vpnlog')]
+        self.assertNotIn(partitions.partition_name('vpn_logs_vpnlog', self.older_month, 'month'), names)
+        self.assertIn(partitions.partition_name('vpn_logs_vpnlog', self.old_month, 'month'), names)
+        self.assertEqual(sorted(VPNLog.objects.values_list('session_id', flat=True)), ['now', 'old-20'])
+        self.assertEqual(list(SecurityEvent.objects.values_list('event_id', flat=True)), ['e-now'])
+        self.assertEqual(list(IPSDetail.objects.values_list('event_id', flat=True)), ['e-now'])
+
+
+def failure_log(n):
+    return {
+        'type': 'event', 'subtype': 'vpn', 'action': 'ssl-login-fail', 'devid': 'FG200FTK00000001',
+        'vd': 'root', 'user': f'user{n % 37}', 'remip': f'203.0.113.{n % 250}', 'reason': 'sslvpn_login_unknown_user',
+        'msg': f'SSL user failed to logged in ({n})', 'tunneltype': 'ssl-web', 'itime': 1773100000 + n,
+    }
+
+
+@unittest.skipIf(payloads.zstandard is None, 'requer o pacote zstandard')
+class PayloadTests(TestCase):
+    """Ida e volta dos payloads comprimidos: gravação, coluna antiga, dicionários e compress_payloads."""
+
+    def setUp(self):
+        self.reset()
+
+    def tearDown(self):
+        self.reset()
+
+    def reset(self):
+        # Cada teste recomeça sem dicionários nem (de)compressores em cache, como um processo novo
+        payloads.reset_dictionaries()
+        payloads._local.__dict__.clear()
+
+    def failure(self, n, **fields):
+        return VPNFailure.objects.create(user=f'user{n}', source_ip='203.0.113.9', timestamp=timezone.now(), raw_data=failure_log(n), **fields)
+
+    def compress(self, **options):
+        call_command('compress_payloads', stdout=open('/dev/null', 'w'), **options)
+        self.reset()
+
+    def stored(self, model, pk, column='raw_data'):
+        return model._base_manager.filter(pk=pk).values_list(column, flat=True).get()
+
+    def test_compressed_write_and_read(self):
+        row = self.failure(1)
+        event = SecurityEvent.objects.create(
+            event_id='e-1', event_type='ips', timestamp=timezone.now(), date=timezone.localdate(),
+            src_ip='203.0.113.5', dst_ip='10.0.0.8', raw_log='date=2026-03-10 type="utm" msg="ação"',
+        )
+
+        self.assertTrue(self.stored(VPNFailure, row.pk).startswith(payloads.ZSTD_MAGIC))
+        self.assertIsNone(self.stored(VPNFailure, row.pk, 'raw_data_legacy'))
+        self.assertEqual(payloads.frame_dictionary_id(self.stored(VPNFailure, row.pk)), 0)
+
+        # Adiado na listagem: o acesso busca e descomprime; with_payload traz na mesma consulta
+        listed = VPNFailure.objects.get(pk=row.pk)
+        self.assertIn('raw_data', listed.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertEqual(listed.raw_data, failure_log(1))
+        with self.assertNumQueries(0):
+            self.assertEqual(listed.raw_data, failure_log(1))
+        loaded = VPNFailure.objects.with_payload().get(pk=row.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(loaded.raw_data, failure_log(1))
+        self.assertEqual(SecurityEvent.objects.with_payload().get(pk=event.pk).raw_log, 'date=2026-03-10 type="utm" msg="ação"')
+
+        # Salvar sem ler o payload regrava os mesmos bytes
+        before = self.stored(VPNFailure, row.pk)
+        untouched = VPNFailure.objects.with_payload().get(pk=row.pk)
+        untouched.reason = 'bad-password'
+        untouched.save()
+        self.assertEqual(bytes(self.stored(VPNFailure, row.pk)), bytes(before))
+
+    def test_reads_fall_back_to_legacy_field(self):
+        row = self.failure(2)
+        log = VPNLog.objects.create(session_id='s-1', user='ana', source_ip='198.51.100.1', start_time=timezone.now(), status='active', raw_data={'tunneltype': 'ssl-tunnel'})
+        VPNFailure.objects.filter(pk=row.pk).update(raw_data=None, raw_data_legacy={'antigo': True})
+        VPNLog.objects.filter(pk=log.pk).update(raw_data=None, raw_data_legacy={'antigo': True})
+
+        self.assertEqual(VPNFailure.objects.get(pk=row.pk).raw_data, {'antigo': True})
+        self.assertEqual(VPNFailure.objects.with_payload().get(pk=row.pk).raw_data, {'antigo': True})
+        self.assertEqual(VPNLog.objects.get(pk=log.pk).raw_data, {'antigo': True})
+
+        # Um valor novo vai para a coluna comprimida e passa a ter precedência
+        row = VPNFailure.objects.get(pk=row.pk)
+        row.raw_data = {'novo': True}
+        row.save()
+        self.assertEqual(VPNFailure.objects.get(pk=row.pk).raw_data, {'novo': True})
+
+    def test_dictionary_rotation_keeps_old_frames_readable(self):
+        rows = [self.failure(n) for n in range(300)]
+
+        self.compress(models=['vpn_logs.VPNFailure'], train=True, dict_size=4096, recompress=True)
+        first = PayloadDictionary.objects.get()
+        self.assertEqual(first.dict_id, 32768)
+        self.assertEqual(payloads.frame_dictionary_id(self.stored(VPNFailure, rows[0].pk)), first.dict_id)
+
+        # Um segundo dicionário passa a ser o ativo; os frames do primeiro continuam legíveis
+        self.compress(models=['vpn_logs.VPNFailure'], train=True, dict_size=4096)
+        self.assertEqual(payloads.active_dictionary_id(), first.dict_id + 1)
+        newer = self.failure(1000)
+        self.assertEqual(payloads.frame_dictionary_id(self.stored(VPNFailure, newer.pk)), first.dict_id + 1)
+        self.reset()
+        self.assertEqual(VPNFailure.objects.get(pk=rows[0].pk).raw_data, failure_log(0))
+        self.assertEqual(VPNFailure.objects.get(pk=newer.pk).raw_data, failure_log(1000))
+
+        # --recompress leva tudo para o dicionário ativo
+        self.compress(models=['vpn_logs.VPNFailure'], recompress=True)
+        stored = VPNFailure._base_manager.values_list('raw_data', flat=True)
+        self.assertEqual({payloads.frame_dictionary_id(data) for data in stored}, {first.dict_id + 1})
+        self.assertEqual(VPNFailure.objects.get(pk=rows[-1].pk).raw_data, failure_log(299))
+
+    def test_compress_payloads_clears_legacy_column(self):
+        rows = [self.failure(n) for n in range(5)]
+        log = VPNLog.objects.create(session_id='s-2', user='ana', source_ip='198.51.100.1', start_time=timezone.now(), status='active', raw_data={})
+        for row in rows:
+            VPNFailure.objects.filter(pk=row.pk).update(raw_data=None, raw_data_legacy=failure_log(row.pk))
+        VPNLog.objects.filter(pk=log.pk).update(raw_data=None, raw_data_legacy={'tunneltype': 'ssl-tunnel'})
+
+        self.compress(chunk=2)
+
+        self.assertFalse(VPNFailure._base_manager.filter(raw_data_legacy__isnull=False).exists())
+        self.assertFalse(VPNFailure._base_manager.filter(raw_data__isnull=True).exists())
+        self.assertEqual([row.raw_data for row in VPNFailure.objects.order_by('pk')], [failure_log(row.pk) for row in rows])
+        self.assertIsNone(self.stored(VPNLog, log.pk, 'raw_data_legacy'))
+        self.assertEqual(VPNLog.objects.get(pk=log.pk).raw_data, {'tunneltype': 'ssl-tunnel'})
+
+
+@override_settings(CONFIG_CACHE={'ttl': 300, 'redis_url': '', 'channel': 'test:config'})
+class ConfigCacheTests(TestCase):
+    """Cópia em processo das configurações: TTL, invalidação pelos sinais e pelo canal Redis."""
+
+    label = FortiAnalyzerConfig._meta.label
+
+    def setUp(self):
+        self.reset()
+        self.addCleanup(self.reset)
+
+    def reset(self):
+        config_cache._entries.clear()
+        config_cache._files.clear()
+        config_cache._process.update(listener_pid=None, publisher=None, publisher_pid=None)
+
+    def use_fake_redis(self):
+        """Troca o módulo redis por um fakeredis com servidor próprio; devolve um cliente dele."""
+        server = fakeredis.FakeServer()
+        fake = types.SimpleNamespace(Redis=types.SimpleNamespace(from_url=lambda url, **kwargs: fakeredis.FakeRedis(server=server)))
+        patcher = mock.patch.object(config_cache, 'redis', fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settings = override_settings(CONFIG_CACHE={'ttl': 300, 'redis_url': 'redis://fake:6379/0', 'channel': 'test:config'})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        return fakeredis.FakeRedis(server=server)
+
+    def wait_until(self, condition, timeout=2):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('condição não atingida a tempo')
+            time.sleep(0.01)
+
+    def test_ttl_expiry(self):
+        loads = []
+        loader = lambda: loads.append(1) or len(loads)
+
+        with mock.patch.object(config_cache.time, 'monotonic', return_value=1000.0):
+            self.assertEqual(config_cache.get('chave', loader), 1)
+            self.assertEqual(config_cache.get('chave', loader), 1)
+        with mock.patch.object(config_cache.time, 'monotonic', return_value=1299.0):
+            self.assertEqual(config_cache.get('chave', loader), 1)
+        with mock.patch.object(config_cache.time, 'monotonic', return_value=1300.0):
+            self.assertEqual(config_cache.get('chave', loader), 2)
+
+        with override_settings(CONFIG_CACHE={'ttl': 0}):
+            self.assertEqual(config_cache.get('chave', loader), 3)
+            self.assertEqual(config_cache.get('chave', loader), 4)
+
+    def test_save_drops_the_local_copy(self):
+        FortiAnalyzerConfig.objects.create(pk=1, host='https://fa-1', api_token='t')
+        self.assertEqual(FortiAnalyzerConfig.load().host, 'https://fa-1')
+
+        # Sem sinal (update direto) a cópia local continua valendo até a TTL
+        FortiAnalyzerConfig.objects.filter(pk=1).update(host='https://fa-2')
+        with self.assertNumQueries(0):
+            self.assertEqual(FortiAnalyzerConfig.load().host, 'https://fa-1')
+
+        config = FortiAnalyzerConfig.objects.get(pk=1)
+        config.host = 'https://fa-3'
+        config.save()
+        self.assertNotIn(self.label, config_cache._entries)
+        self.assertEqual(FortiAnalyzerConfig.load().host, 'https://fa-3')
+
+        FortiAnalyzerConfig.objects.get(pk=1).delete()
+        self.assertNotIn(self.label, config_cache._entries)
+
+    @unittest.skipIf(fakeredis is None, 'requer o pacote fakeredis')
+    def test_publishes_only_after_commit(self):
+        client = self.use_fake_redis()
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe('test:config')
+        config = FortiAnalyzerConfig.load()
+
+        # Transação desfeita: nada é publicado
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                config.save()
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertIsNone(pubsub.get_message(timeout=0.1))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            config.save()
+            self.assertIsNone(pubsub.get_message(timeout=0.1))
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(pubsub.get_message(timeout=1)['data'], self.label.encode())
+
+    @unittest.skipIf(fakeredis is None, 'requer o pacote fakeredis')
+    def test_listener_drops_keys_published_by_other_processes(self):
+        client = self.use_fake_redis()
+        # Ao se inscrever o listener descarta tudo (invalidações perdidas enquanto desconectado)
+        config_cache.get('outra', lambda: 'valor')
+        self.wait_until(lambda: 'outra' not in config_cache._entries)
+        self.assertEqual(client.pubsub_numsub('test:config')[0][1], 1)
+
+        config_cache.get(self.label, lambda: 'antigo')
+        config_cache.get('outra', lambda: 'valor')
+        client.publish('test:config', self.label)
+        self.wait_until(lambda: self.label not in config_cache._entries)
+        self.assertIn('outra', config_cache._entries)
+
+        client.publish('test:config', config_cache.ALL)
+        self.wait_until(lambda: not config_cache._entries)
+
+    def test_load_returns_a_copy(self):
+        first = FortiAnalyzerConfig.load()
+        first.host = 'https://alterado'
+        with self.assertNumQueries(0):
+            second = FortiAnalyzerConfig.load()
+        self.assertIsNot(first, second)
+        self.assertNotEqual(second.host, 'https://alterado')
+        self.assertEqual(second.pk, first.pk)
+
+
+class WatermarkTests(TestCase):
+    """Janela incremental, avanço só com a coleta completa e UPDATE condicional da marca."""
+
+    def tracker(self):
+        return WatermarkTracker('event', 'vpn', 'root', bootstrap=datetime.timedelta(days=365), overlap=datetime.timedelta(minutes=10))
+
+    def test_window_from_bootstrap_then_from_the_mark(self):
+        now = local(2026, 3, 10, 12, 0)
+        tracker = self.tracker()
+        self.assertEqual(tracker.window(now), (now - datetime.timedelta(days=365), now))
+
+        CollectionWatermark.objects.filter(log_type='event', subtype='vpn').update(last_timestamp=local(2026, 3, 10, 11, 0))
+        self.assertEqual(self.tracker().window(now), (local(2026, 3, 10, 10, 50), now))
+
+    def test_commit_advances_to_the_newest_row_read(self):
+        tracker = self.tracker()
+        tracker.window(local(2026, 3, 10, 12, 0))
+        rows = list(tracker.observe(fa_log(local(2026, 3, 10, 11, m)) for m in (5, 40, 20)))
+        self.assertEqual(len(rows), 3)
+        with self.assertLogs('integrations.watermarks', 'WARNING'):
+            self.assertTrue(tracker.commit(truncated=True))
+        self.assertEqual(CollectionWatermark.objects.get().last_timestamp, local(2026, 3, 10, 11, 40))
+
+        # Log com horário além do fim da janela (relógio adiantado) é limitado ao fim
+        tracker = self.tracker()
+        tracker.window(local(2026, 3, 10, 12, 0))
+        list(tracker.observe([fa_log(local(2026, 3, 10, 12, 30))]))
+        tracker.commit()
+        self.assertEqual(CollectionWatermark.objects.get().last_timestamp, local(2026, 3, 10, 12, 0))
+
+    def test_incomplete_or_empty_collection_keeps_the_mark(self):
+        tracker = self.tracker()
+        tracker.window(local(2026, 3, 10, 12, 0))
+        list(tracker.observe([fa_log(local(2026, 3, 10, 11, 5))]))
+        with self.assertLogs('integrations.watermarks', 'WARNING'):
+            self.assertFalse(tracker.commit(complete=False))
+        self.assertIsNone(CollectionWatermark.objects.get().last_timestamp)
+
+        tracker = self.tracker()
+        tracker.window(local(2026, 3, 10, 12, 0))
+        self.assertFalse(tracker.commit())
+        self.assertIsNone(CollectionWatermark.objects.get().last_timestamp)
+
+    def test_advance_never_moves_the_mark_back(self):
+        mark = CollectionWatermark.for_stream('event', 'vpn', None)
+        self.assertEqual(mark.adom, 'root')
+        self.assertFalse(mark.advance(None))
+        self.assertTrue(mark.advance(local(2026, 3, 10, 11, 0)))
+
+        # Outra execução (instância carregada antes) que leu menos não faz a marca recuar
+        stale = CollectionWatermark.objects.get(pk=mark.pk)
+        self.assertTrue(mark.advance(local(2026, 3, 10, 11, 30)))
+        self.assertFalse(stale.advance(local(2026, 3, 10, 11, 10)))
+        self.assertFalse(mark.advance(local(2026, 3, 10, 11, 30)))
+        self.assertEqual(stale.last_timestamp, local(2026, 3, 10, 11, 0))
+        self.assertEqual(CollectionWatermark.objects.get().last_timestamp, local(2026, 3, 10, 11, 30))
+
+    def test_learn_rate_is_a_moving_average(self):
+        mark = CollectionWatermark.for_stream('event', 'vpn', 'root')
+        mark.learn_rate(None)
+        mark.learn_rate(100.0)
+        mark.learn_rate(300.0)
+        self.assertEqual(CollectionWatermark.objects.get().rows_per_hour, 200.0)
+
+
+class WindowPlannerTests(TestCase):
+    """Bissecção das janelas que passam do teto, janela mínima e falhas de tarefa."""
+
+    start = local(2026, 3, 10, 0, 0)
+    end = local(2026, 3, 11, 0, 0)
+
+    def planner(self, client, **kwargs):
+        kwargs.setdefault('row_cap', 10)
+        return WindowPlanner(client, 'event', 'subtype=="vpn"', max_concurrency=2, **kwargs)
+
+    def read(self, planner):
+        with mock.patch('integrations.windows.time.sleep'):
+            return list(planner.iter_rows(self.start, self.end))
+
+    def test_window_over_the_cap_is_split_until_every_row_is_read(self):
+        times = [self.start + datetime.timedelta(minutes=30 * i + 7) for i in range(48)]
+        client = FakeFAClient(times)
+        planner = self.planner(client)
+        rows = self.read(planner)
+
+        self.assertEqual(len(rows), 48)
+        self.assertEqual(len({(row['date'], row['time']) for row in rows}), 48)
+        self.assertEqual(planner.stats['truncated'], 0)
+        self.assertEqual(planner.stats['matched'], 48)
+        self.assertGreater(planner.stats['splits'], 0)
+        # Só as janelas dentro do teto são lidas, e elas cobrem o dia sem sobreposição
+        fetched = sorted(client.fetched)
+        self.assertEqual(fetched[0][0], self.start)
+        self.assertEqual(fetched[-1][1], self.end)
+        self.assertTrue(all(a[1] == b[0] for a, b in zip(fetched, fetched[1:])))
+        self.assertEqual(planner.stats['windows'], len(fetched))
+
+    def test_min_window_stops_the_split_and_counts_the_truncation(self):
+        burst = [self.start + datetime.timedelta(hours=9, seconds=i) for i in range(25)]
+        planner = self.planner(FakeFAClient(burst), min_window=datetime.timedelta(hours=6))
+        with self.assertLogs('integrations.windows', 'WARNING'):
+            rows = self.read(planner)
+
+        # 06:00-12:00 não pode mais ser dividida (3h < 6h): lê o teto e registra a perda
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(planner.stats['truncated'], 1)
+        self.assertEqual(planner.stats['failed'], 0)
+
+    def test_failed_or_unfinished_tasks_count_as_failed(self):
+        noon = self.start + datetime.timedelta(hours=12)
+        times = [self.start + datetime.timedelta(hours=h, minutes=5) for h in range(24)]
+        client = FakeFAClient(times, fail={(self.start, noon)}, unfinished={(noon, self.end)})
+        # 5 linhas/h em 24h: duas janelas de 12h
+        planner = self.planner(client, row_cap=100, rows_per_hour=5)
+        with self.assertLogs('integrations.windows', 'ERROR'):
+            rows = self.read(planner)
+
+        self.assertEqual(rows, [])
+        self.assertEqual(planner.stats['failed'], 2)
+        self.assertEqual(planner.stats['windows'], 0)
+        # Três tentativas de criar a tarefa da janela que falha
+        self.assertEqual(sum(1 for *_, s, e in client.started if (s, e) == (self.start, noon)), 3)
+
+    def test_rows_per_hour_sizes_the_initial_windows(self):
+        self.assertEqual(self.planner(None).plan(self.start, self.end), [(self.start, self.end)])
+        # 24h x 10 linhas/h = 240 linhas; cada janela mira 70% do teto de 10 → 35 janelas
+        windows = self.planner(None, rows_per_hour=10).plan(self.start, self.end)
+        self.assertEqual(len(windows), 35)
+        self.assertEqual((windows[0][0], windows[-1][1]), (self.start, self.end))
+        # Limitadas pela janela mínima e por MAX_INITIAL_WINDOWS
+        self.assertEqual(len(self.planner(None, rows_per_hour=10, min_window=datetime.timedelta(hours=8)).plan(self.start, self.end)), 3)
+        self.assertEqual(len(self.planner(None, rows_per_hour=10000).plan(self.start, self.end)), 64)
+        self.assertEqual(self.planner(None).plan(self.end, self.start), [])
+
+        planner = self.planner(FakeFAClient([]), rows_per_hour=10)
+        self.assertEqual(self.read(planner), [])
+        self.assertEqual(planner.stats['windows'], 35)
+        self.assertEqual(planner.observed_rate(self.start, self.end), 0)
+
+
+@override_settings(CONFIG_CACHE={'ttl': 0})
+class SharedClientTests(TestCase):
+    """Troca do cliente FortiAnalyzer compartilhado quando a configuração muda."""
+
+    def setUp(self):
+        FortiAnalyzerConfig.objects.create(pk=1, host='https://fa-1', api_token=' t ', adom='root')
+        patcher = mock.patch.object(fortianalyzer, '_shared_client', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def update(self, **fields):
+        config = FortiAnalyzerConfig.objects.get(pk=1)
+        for name, value in fields.items():
+            setattr(config, name, value)
+        config.save()
+
+    def test_same_connection_keeps_the_session(self):
+        first = fortianalyzer.get_fortianalyzer_client()
+        session = first.get_session()
+        self.assertEqual(first.config.api_token, 't')
+
+        self.update(adom='outro')
+        second = fortianalyzer.get_fortianalyzer_client()
+        self.assertIsNot(second, first)
+        self.assertIs(second.get_session(), session)
+        self.assertEqual(second.config.adom, 'outro')
+        # O cliente em uso por outra thread não muda de configuração no meio do caminho
+        self.assertEqual(first.config.adom, 'root')
+
+    def test_connection_change_leaves_the_old_client_untouched(self):
+        first = fortianalyzer.get_fortianalyzer_client()
+        session = first.get_session()
+
+        self.update(host='https://fa-2')
+        second = fortianalyzer.get_fortianalyzer_client()
+        self.assertIsNot(second.get_session(), session)
+        self.assertEqual(second.config.host, 'https://fa-2')
+        self.assertIs(first._session, session)
+        self.assertEqual(first.config.host, 'https://fa-1')
+        self.assertIs(fortianalyzer._shared_client, second)
+
+
+@unittest.skipIf(archive.pyarrow is None or archive.duckdb is None, 'requer os pacotes pyarrow e duckdb')
+@override_settings(CONFIG_CACHE={'ttl': 0, 'redis_url': ''})
+class ArchiveTests(TestCase):
+    """Exportação para Parquet, consultas que cruzam arquivo e banco e a retenção com a camada fria."""
+
+    label = 'security_events.SecurityEvent'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(LOG_ARCHIVE={'enabled': True, 'path': directory.name, 'grace_days': 2, 'row_group_size': 100000})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch('setup.middleware.is_setup_complete', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        DatabaseConfiguration.objects.create(
+            db_type='postgresql', host='db', port=5432, database_name='vpn', username='vpn',
+            encrypted_password='', is_configured=True, retention_days=30,
+        )
+        self.today = timezone.localdate()
+        self.day1 = self.today - datetime.timedelta(days=40)
+        self.day2 = self.today - datetime.timedelta(days=39)
+        self.hot_day = self.today - datetime.timedelta(days=1)
+        self.events = [
+            self.event('a-1', self.day1, 'SQL.Injection', 'critical'),
+            self.event('a-2', self.day1, 'SQL.Injection', 'critical'),
+            self.event('b-1', self.day2, 'XSS', 'high'),
+            self.event('a-3', self.hot_day, 'SQL.Injection', 'high'),
+        ]
+
+    def event(self, event_id, day, attack, severity, hour=10):
+        return SecurityEvent.objects.create(
+            event_id=event_id, event_type='ips', timestamp=local(day.year, day.month, day.day, hour), date=day,
+            severity=severity, src_ip='203.0.113.5', dst_ip='10.0.0.8', attack_name=attack,
+            raw_log='{"attack": "%s"}' % attack,
+        )
+
+    def cold(self, sql, *params):
+        return archive.cold_query(archive.get_spec(self.label), sql, params)
+
+    def test_export_writes_one_file_per_day_with_details_and_payload(self):
+        self.assertEqual(archive.export_until(self.label, self.day2), {self.day1: 2, self.day2: 1})
+        spec = archive.get_spec(self.label)
+        self.assertEqual(archive.archived_days(spec), [self.day1, self.day2])
+        self.assertEqual(
+            self.cold('SELECT day, event_id, attack_name, raw_log FROM {table} ORDER BY event_id'),
+            [(self.day1, 'a-1', 'SQL.Injection', '{"attack": "SQL.Injection"}'),
+             (self.day1, 'a-2', 'SQL.Injection', '{"attack": "SQL.Injection"}'),
+             (self.day2, 'b-1', 'XSS', '{"attack": "XSS"}')],
+        )
+        # Continua do dia seguinte ao último arquivado; dia sem registros também ganha arquivo
+        self.assertEqual(archive.export_until(self.label, self.day2 + datetime.timedelta(days=1)), {self.day2 + datetime.timedelta(days=1): 0})
+
+    def test_stats_add_the_archive_to_the_hot_window(self):
+        archive.export_until(self.label, self.day2)
+        partitions.apply_retention(self.label, local(self.day2.year, self.day2.month, self.day2.day) + datetime.timedelta(days=1))
+        self.assertEqual(SecurityEvent.objects.count(), 1)
+
+        queryset = SecurityEvent.objects.with_details('ips').filter(event_type='ips')
+        stats = archive.TieredStats(self.label, queryset, self.day1.isoformat(), self.today.isoformat(), {'event_type': 'ips'})
+        self.assertTrue(stats.uses_archive)
+        self.assertEqual(stats.totals(total={}, critical={'severity': 'critical'}), {'total': 4, 'critical': 2})
+        self.assertEqual(stats.top('attack_name'), [('SQL.Injection', 3), ('XSS', 1)])
+        self.assertEqual(stats.top('attack_name', limit=1, severity='high'), [('SQL.Injection', 1)])
+        self.assertEqual([row['severity'] for row in stats.latest(('severity',), 'timestamp', 10)], ['high', 'high', 'critical', 'critical'])
+
+        # Intervalo dentro da janela quente: só o banco
+        self.assertFalse(archive.TieredStats(self.label, queryset, self.hot_day.isoformat()).uses_archive)
+
+        response = self.client.get('/api/security-events/ips/stats/', {'start_date': self.day1.isoformat(), 'end_date': self.today.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['total_events'], data['critical_events'], data['high_events']), (4, 2, 2))
+        self.assertEqual(data['top_attacks'], [{'attack_name': 'SQL.Injection', 'count': 3}, {'attack_name': 'XSS', 'count': 1}])
+        # Filtro que o arquivo não conhece: só o banco
+        response = self.client.get('/api/security-events/ips/stats/', {'start_date': self.day1.isoformat(), 'search': 'SQL'})
+        self.assertEqual(response.json()['total_events'], 1)
+
+    def test_retention_keeps_late_and_changed_rows_of_archived_days(self):
+        archive.export_until(self.label, self.day2)
+        # Depois da exportação: um registro atrasado, um alterado e um já removido do banco
+        self.event('a-late', self.day1, 'SQL.Injection', 'low', hour=23)
+        SecurityEvent.objects.filter(event_id='a-2').update(severity='medium')
+        SecurityEvent.objects.filter(event_id='b-1').delete()
+
+        self.assertIn('Limpeza concluída', cleanup_old_logs())
+        self.assertEqual(list(SecurityEvent.objects.values_list('event_id', flat=True)), ['a-3'])
+        self.assertEqual(
+            self.cold('SELECT event_id, severity FROM {table} ORDER BY event_id'),
+            [('a-1', 'critical'), ('a-2', 'medium'), ('a-late', 'low'), ('b-1', 'high')],
+        )
+
+    def test_retention_skips_a_model_whose_export_failed(self):
+        # Anterior também ao corte de 180 dias do comando cleanup_logs
+        old = timezone.localtime() - datetime.timedelta(days=200)
+        VPNLog.objects.create(session_id='old', user='ana', source_ip='198.51.100.1', start_time=old, status='closed', raw_data={})
+
+        def refresh(label, cutoff):
+            if label == 'vpn_logs.VPNLog':
+                raise OSError('disco cheio')
+            return {}
+
+        with mock.patch('integrations.archive.refresh_before', side_effect=refresh), \
+                self.assertLogs('integrations.tasks', 'ERROR'):
+            cleanup_old_logs()
+        self.assertTrue(VPNLog.objects.filter(session_id='old').exists())
+        self.assertEqual(list(SecurityEvent.objects.values_list('event_id', flat=True)), ['a-3'])
+        self.assertEqual(archive.archived_days(archive.get_spec('vpn_logs.VPNLog')), [])
+
+        # cleanup_logs (comando) também não apaga sem exportar
+        with mock.patch('integrations.archive.refresh_before', side_effect=refresh), \
+                self.assertLogs('integrations.tasks', 'ERROR'):
+            call_command('cleanup_logs', stdout=open('/dev/null', 'w'))
+        self.assertTrue(VPNLog.objects.filter(session_id='old').exists())
+
+        call_command('cleanup_logs', stdout=open('/dev/null', 'w'))
+        self.assertFalse(VPNLog.objects.filter(session_id='old').exists())
+        spec = archive.get_spec('vpn_logs.VPNLog')
+        self.assertEqual(archive.cold_query(spec, 'SELECT session_id FROM {table}'), [('old',)])
+
+
+class FlakyWriter:
+    """Writer de teste: falha o lote inteiro se algum registro tiver 'bad'."""
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, records):
+        if any(record.get('bad') for record in records):
+            raise ValueError('registro inválido')
+        self.written.extend(records)
+        return len(records)
+
+
+@unittest.skipIf(fakeredis is None, 'requer o pacote fakeredis')
+@override_settings(LOG_STREAMS={'enabled': True, 'prefix': 'test', 'group': 'writers', 'batch_size': 10, 'block_ms': 0, 'claim_idle_ms': 60000, 'max_deliveries': 3})
+class StreamTests(TestCase):
+    """Buffer Redis Streams: retentativas até o descarte, XAUTOCLAIM e medição do atraso."""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.buffer = streams.StreamBuffer(client=self.redis)
+
+    def pool(self, consumer='w1', **options):
+        pool = streams.StreamWriterPool(('ips',), client=self.redis, consumer=consumer, options=options)
+        pool.writers['ips'] = FlakyWriter()
+        for item in pool.consumers:
+            item.ensure_group()
+        return pool
+
+    def test_failing_batch_is_retried_then_written_one_by_one(self):
+        self.buffer.append('ips', [{'n': 1}, {'n': 2, 'bad': True}, {'n': 3}])
+        pool = self.pool()
+        consumer = pool.consumers[0]
+
+        with self.assertLogs('integrations.streams', 'ERROR'):
+            # Entregas 1 e 2: o lote volta a ficar pendente
+            for _ in range(2):
+                self.assertFalse(pool.drain_once(consumer, block_ms=0))
+                self.assertTrue(consumer.reread_pending)
+            self.assertEqual(self.redis.xpending('test:ips', 'writers')['pending'], 3)
+            # Entrega 3 (max_deliveries): grava um a um e descarta só o registro que falha
+            self.assertTrue(pool.drain_once(consumer, block_ms=0))
+
+        self.assertEqual(pool.writers['ips'].written, [{'n': 1}, {'n': 3}])
+        self.assertEqual(pool.stats['ips'], {'batches': 0, 'written': 2, 'read': 9, 'retries': 3, 'dead': 1})
+        self.assertEqual(self.redis.xlen('test:ips'), 0)
+        self.assertEqual(self.redis.xpending('test:ips', 'writers')['pending'], 0)
+        (_, fields), = self.redis.xrange('test:ips:dead')
+        self.assertEqual((json.loads(fields['r']), fields['error']), ({'n': 2, 'bad': True}, 'registro inválido'))
+
+        # requeue_dead devolve o registro ao stream principal
+        self.assertEqual(consumer.requeue_dead(), 1)
+        self.assertEqual(self.redis.xlen('test:ips'), 1)
+        self.assertEqual(self.redis.xlen('test:ips:dead'), 0)
+
+    def test_database_outage_keeps_the_batch_without_counting_towards_dead_letter(self):
+        self.buffer.append('ips', [{'n': 1}])
+        pool = self.pool()
+        consumer = pool.consumers[0]
+        with mock.patch.object(pool.writers['ips'], 'write', side_effect=OperationalError('fora do ar')), \
+                self.assertLogs('integrations.streams', 'ERROR'):
+            for _ in range(4):
+                self.assertFalse(pool.drain_once(consumer, block_ms=0))
+        self.assertEqual(self.redis.xlen('test:ips:dead'), 0)
+        self.assertTrue(pool.drain_once(consumer, block_ms=0))
+        self.assertEqual(pool.writers['ips'].written, [{'n': 1}])
+
+    def test_idle_entries_of_another_consumer_are_claimed(self):
+        self.buffer.append('ips', [{'n': n} for n in range(4)])
+        crashed = streams.StreamConsumer('ips', client=self.redis, consumer='w1')
+        crashed.ensure_group()
+        self.assertEqual(len(crashed.read(block_ms=0)), 4)  # lido e nunca confirmado
+
+        pool = self.pool(consumer='w2', claim_idle_ms=50)
+        time.sleep(0.1)
+        with self.assertLogs('integrations.streams', 'WARNING'):
+            self.assertTrue(pool.drain_once(pool.consumers[0], block_ms=0))
+        self.assertEqual(pool.writers['ips'].written, [{'n': n} for n in range(4)])
+        self.assertEqual(self.redis.xlen('test:ips'), 0)
+        self.assertEqual(self.redis.xpending('test:ips', 'writers')['pending'], 0)
+
+        # Dentro de claim_idle_ms nada é retomado
+        self.buffer.append('ips', [{'n': 9}])
+        crashed.reread_pending = False
+        self.assertEqual(len(crashed.read(block_ms=0)), 1)
+        other = self.pool(consumer='w3')
+        self.assertFalse(other.drain_once(other.consumers[0], block_ms=0))
+
+    def test_stream_lag_and_pending_counts(self):
+        self.assertEqual(streams.stream_lag(('ips',), client=self.redis)['ips'], {
+            'length': 0, 'lag': 0, 'pending': 0, 'oldest_seconds': 0.0, 'consumers': 0, 'dead': 0,
+        })
+        self.buffer.append('ips', [{'n': n} for n in range(5)])
+        consumer = streams.StreamConsumer('ips', client=self.redis, consumer='w1', options={'batch_size': 2})
+        consumer.ensure_group()
+        entries = consumer.read(block_ms=0)
+
+        info = streams.stream_lag(('ips',), client=self.redis)['ips']
+        self.assertEqual((info['length'], info['lag'], info['pending'], info['consumers'], info['dead']), (5, 3, 2, 1, 0))
+        self.assertGreaterEqual(info['oldest_seconds'], 0)
+
+        consumer.ack([entry_id for entry_id, _ in entries])
+        info = streams.stream_lag(('ips',), client=self.redis)['ips']
+        self.assertEqual((info['length'], info['lag'], info['pending']), (3, 3, 0))
+
+
+SYSLOG_VPN = (
+    'date=2026-03-10 time=11:00:00 devname="FG200F" devid="FG200FTK00000001" type="event" subtype="vpn" '
+    'action="tunnel-up" tunneltype="ssl-tunnel" tunnelid=4242 remip=200.10.0.1 user="ana" '
+    'srccountry="Brazil" duration=0 sentbyte=0 rcvdbyte=0 msg="SSL tunnel established"'
+)
+SYSLOG_IPS = (
+    'date=2026-03-10 time=11:05:00 devid="FG200FTK00000001" vd="root" type="utm" subtype="ips" sessionid=9001 '
+    'srcip=203.0.113.5 srcport=51000 dstip=10.0.0.8 dstport=443 proto=6 attack="HTTP.URI.SQL.Injection" '
+    'attackid=15621 level="alert" action="dropped" msg="web_misc: \\"quoted\\" value"'
+)
+
+
+class RecordingSink:
+    """Sink de teste: guarda os lotes recebidos por fluxo."""
+
+    def __init__(self, fail=()):
+        self.batches = []
+        self.fail = set(fail)
+
+    def write(self, stream, logs):
+        if stream in self.fail:
+            raise RuntimeError('banco fora do ar')
+        self.batches.append((stream, [log.get('n') or log.get('subtype') for log in logs]))
+        return len(logs)
+
+
+class SyslogTests(TestCase):
+    """Parser key=value com cabeçalhos syslog, roteamento por tipo e micro-lotes."""
+
+    def test_parses_fortigate_lines_with_or_without_syslog_header(self):
+        plain = syslog.parse_kv(SYSLOG_VPN)
+        rfc3164 = syslog.parse_kv(f'<189>Mar 10 11:00:00 fw01 {SYSLOG_VPN}\r\n')
+        rfc5424 = syslog.parse_kv(f'<189>1 2026-03-10T11:00:00-03:00 fw01 - - - - {SYSLOG_VPN}')
+        self.assertEqual(plain, rfc3164)
+        self.assertEqual(plain, rfc5424)
+        self.assertEqual(plain['date'], '2026-03-10')
+        self.assertEqual(plain['msg'], 'SSL tunnel established')
+        self.assertEqual((plain['user'], plain['tunnelid'], plain['remip']), ('ana', '4242', '200.10.0.1'))
+
+        self.assertEqual(syslog.parse_kv(SYSLOG_IPS)['msg'], 'web_misc: "quoted" value')
+        self.assertEqual(syslog.parse_kv('a="sem fim'), {'a': 'sem fim'})
+        self.assertEqual(syslog.parse_kv('<14>Mar 10 11:00:00 fw01 sem pares'), {})
+
+    def test_parsed_lines_go_through_the_shared_normalizers(self):
+        from integrations.normalizer import normalize_vpn
+        from security_events.ingest import build_security_event
+
+        record = normalize_vpn(syslog.parse_kv(f'<189>Mar 10 11:00:00 fw01 {SYSLOG_VPN}'))
+        self.assertEqual((record.user, record.source_ip, record.status), ('ana', '200.10.0.1', 'active'))
+        self.assertEqual(timezone.localtime(record.start_time), local(2026, 3, 10, 10, 0))  # relógio do FA
+
+        event = build_security_event(syslog.parse_kv(SYSLOG_IPS), 'ips')
+        self.assertEqual((event.attack_name, event.src_ip, event.severity), ('HTTP.URI.SQL.Injection', '203.0.113.5', 'critical'))
+
+    def test_route_by_type_and_subtype(self):
+        self.assertEqual(syslog.route({'type': 'event', 'subtype': 'vpn'}), 'vpn')
+        self.assertEqual(syslog.route({'type': 'utm', 'subtype': 'ips'}), 'ips')
+        self.assertEqual(syslog.route({'type': 'utm', 'subtype': 'virus'}), 'antivirus')
+        self.assertEqual(syslog.route({'type': 'utm', 'subtype': 'webfilter'}), 'webfilter')
+        self.assertEqual(syslog.route({'type': 'traffic', 'subtype': 'forward', 'app': 'BitTorrent'}), 'app-control')
+        self.assertIsNone(syslog.route({'type': 'traffic', 'subtype': 'forward', 'app': 'Unknown'}))
+        self.assertIsNone(syslog.route({'type': 'event', 'subtype': 'system'}))
+
+    def test_sink_writes_vpn_and_security_events(self):
+        from vpn_logs.tests import StaticADClient
+
+        # Chamado direto, sem o executor: as threads não enxergam a transação do TestCase
+        sink = syslog.SyslogSink(ad_client=StaticADClient())
+        vpn = syslog.parse_kv(f'<189>Mar 10 11:00:00 fw01 {SYSLOG_VPN}')
+        ips = syslog.parse_kv(f'<190>1 2026-03-10T11:05:00Z fw01 - - - - {SYSLOG_IPS}')
+        # close_old_connections fecharia a conexão da transação do teste (autocommit desligado)
+        with mock.patch('integrations.syslog.close_old_connections'):
+            self.assertEqual(sink.write(syslog.route(vpn), [vpn]), 1)
+            self.assertEqual(sink.write(syslog.route(ips), [ips]), 1)
+
+        log = VPNLog.objects.get()
+        self.assertEqual((log.user, log.status, log.ad_department), ('ana', 'active', 'TI'))
+        self.assertEqual(SecurityEvent.objects.with_details('ips').get().attack_name, 'HTTP.URI.SQL.Injection')
+
+    def test_micro_batches_flush_by_size_age_and_drain(self):
+        sink = RecordingSink()
+        batcher = syslog.MicroBatcher(sink, batch_size=3, flush_interval=0.05)
+        line = 'type="utm" subtype="ips" n={}'
+
+        async def run():
+            for n in range(4):
+                batcher.add_line(line.format(n))
+            batcher.add_line('type="event" subtype="vpn" n=v')
+            batcher.add_line('lixo sem pares')
+            await asyncio.sleep(0)
+            # Por tamanho: o quarto IPS e o VPN ainda esperam
+            self.assertEqual(batcher.buffers['ips'].logs[0]['n'], '3')
+            batcher.flush_expired()
+            self.assertEqual(len(batcher.buffers['vpn'].logs), 1)
+            await asyncio.sleep(0.06)
+            batcher.flush_expired()
+            batcher.add_line(line.format(9))
+            await batcher.drain()
+        try:
+            asyncio.run(run())
+        finally:
+            batcher.close()
+
+        # Cada fluxo grava em ordem no seu executor; entre fluxos não há ordem garantida
+        self.assertEqual([batch for stream, batch in sink.batches if stream == 'ips'], [['0', '1', '2'], ['3'], ['9']])
+        self.assertEqual([batch for stream, batch in sink.batches if stream == 'vpn'], [['v']])
+        stats = batcher.stats
+        self.assertEqual((stats['lines'], stats['parsed'], stats['invalid'], stats['batches'], stats['written']), (7, 6, 1, 4, 6))
+
+    def test_write_errors_and_backlog(self):
+        sink = RecordingSink(fail={'webfilter'})
+        batcher = syslog.MicroBatcher(sink, batch_size=1, max_pending=1)
+
+        async def run():
+            with self.assertLogs('integrations.syslog', 'ERROR'):
+                batcher.add_line('type="utm" subtype="webfilter" n=1')
+                # Um lote ainda aguardando gravação: o próximo é descartado
+                batcher.add_line('type="utm" subtype="webfilter" n=2')
+                await batcher.drain()
+        try:
+            asyncio.run(run())
+        finally:
+            batcher.close()
+        self.assertEqual((batcher.stats['errors'], batcher.stats['dropped'], batcher.stats['written']), (1, 1, 0))
+
+    def test_tcp_framing(self):
+        sink = RecordingSink()
+        batcher = syslog.MicroBatcher(sink, batch_size=100)
+        protocol = syslog.SyslogTCPProtocol(batcher)
+        framed = b'type="utm" subtype="ips" n=1'
+        protocol.data_received(b'%d %s' % (len(framed), framed[:10]))
+        protocol.data_received(framed[10:] + b'type="utm" subtype="ips" n=2\ntype="utm" ')
+        protocol.data_received(b'subtype="ips" n=3')
+        protocol.connection_lost(None)
+        self.assertEqual([log['n'] for log in batcher.buffers['ips'].logs], ['1', '2', '3'])
+        batcher.close()
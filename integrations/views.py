@@ -51,3 +51,18 @@ def search_ad_groups(request):
                 return JsonResponse({'results': results})
 
         return JsonResponse({'error': str(e)}, status=500)
+
+
+@user_passes_test(lambda u: u.is_staff)
+def stream_lag_api(request):
+    """
+    Atraso do buffer Redis Streams por tipo de dado (ver integrations.streams.stream_lag).
+    Returns: JSON {enabled, streams: {tipo: {length, lag, pending, oldest_seconds, consumers, dead}}}
+    """
+    from .streams import get_stream_settings, stream_lag
+
+    enabled = get_stream_settings()['enabled']
+    try:
+        return JsonResponse({'enabled': enabled, 'streams': stream_lag()})
+    except Exception as e:
+        return JsonResponse({'enabled': enabled, 'error': str(e)}, status=503)
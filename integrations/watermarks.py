@@ -0,0 +1,79 @@
+"""
+Coleta incremental por marca d'água (CollectionWatermark).
+
+Uso nos coletores:
+    tracker = WatermarkTracker('event', 'vpn', adom, bootstrap=timedelta(days=365))
+    start, end = tracker.window()
+    ... fa_client.start_log_task(start_time=start, end_time=end) ...
+    for log in tracker.observe(fa_client.fetch_all_results(...)): ...
+    tracker.commit()   # somente depois de o lote estar gravado
+"""
+from django.conf import settings
+from django.utils import timezone
+from integrations.models import CollectionWatermark
+from integrations.normalizer import parse_fa_timestamp
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WatermarkTracker:
+    """Calcula a janela de consulta a partir da marca e acompanha o maior timestamp lido."""
+
+    def __init__(self, log_type, subtype, adom, bootstrap, overlap=None):
+        self.mark = CollectionWatermark.for_stream(log_type, subtype, adom)
+        self.bootstrap = bootstrap
+        if overlap is None:
+            overlap = datetime.timedelta(minutes=getattr(settings, 'COLLECTION_WATERMARK_OVERLAP_MINUTES', 10))
+        self.overlap = overlap
+        self.start = None
+        self.end = None
+        self.rows = 0
+        self._max_seen = ''
+
+    def window(self, now=None):
+        """(início, fim) da consulta: delta desde a marca, ou a janela de bootstrap na primeira execução."""
+        self.end = timezone.localtime(now or timezone.now())
+        if self.mark.last_timestamp:
+            self.start = min(self.mark.last_timestamp - self.overlap, self.end)
+        else:
+            self.start = self.end - self.bootstrap
+        return self.start, self.end
+
+    def observe(self, stream):
+        """Repassa os logs sem alterá-los, registrando o maior 'date time' visto."""
+        for log in stream:
+            self.rows += 1
+            # 'YYYY-MM-DD' + 'HH:MM:SS' ordena lexicograficamente: comparação de string basta
+            ts = f"{log.get('date', '')} {log.get('time', '')}"
+            if ts > self._max_seen:
+                self._max_seen = ts
+            yield log
+
+    @property
+    def max_timestamp(self):
+        if not self._max_seen.strip():
+            return None
+        ts = parse_fa_timestamp(self._max_seen)
+        if ts is not None and self.end is not None and ts > self.end:
+            ts = self.end
+        return ts
+
+    def commit(self, truncated=False, complete=True):
+        """
+        Avança a marca para o maior timestamp ingerido. Chamar só após a gravação do lote.
+        complete=False (alguma janela não pôde ser consultada) mantém a marca onde está.
+        """
+        if not complete:
+            logger.warning(f"Coleta {self.mark.log_type}/{self.mark.subtype} incompleta; marca d'água mantida em {self.mark.last_timestamp}.")
+            return False
+        if truncated:
+            logger.warning(
+                f"Coleta {self.mark.log_type}/{self.mark.subtype} atingiu o limite de linhas do FA "
+                f"entre {self.start} e {self.end}: parte dos registros da janela não foi lida."
+            )
+        new_mark = self.max_timestamp
+        if self.mark.advance(new_mark):
+            logger.info(f"Marca d'água {self.mark.log_type}/{self.mark.subtype}@{self.mark.adom} avançou para {new_mark} ({self.rows} linhas).")
+            return True
+        return False
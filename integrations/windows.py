@@ -0,0 +1,142 @@
+"""
+Planejador de janelas de consulta ao FortiAnalyzer.
+
+Divide o período pedido em janelas dimensionadas pela taxa de linhas/hora aprendida
+nas coletas anteriores e bisseca recursivamente qualquer janela cuja tarefa ultrapasse
+o teto de linhas, para que um dia movimentado seja lido por completo em vez de truncado.
+As tarefas das janelas irmãs são criadas e aguardadas em paralelo; as linhas de cada
+janela concluída são repassadas em streaming enquanto as demais ainda indexam.
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.conf import settings
+import datetime
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cada janela planejada mira esta fração do teto, deixando folga para picos
+TARGET_FILL = 0.7
+MAX_INITIAL_WINDOWS = 64
+
+
+class WindowPlanner:
+    """
+    fa_client      : FortiAnalyzerClient compartilhado
+    log_type       : logtype da busca (event, ips, virus...)
+    log_filter     : filtro da busca
+    row_cap        : teto de linhas lidas por janela (limite da consulta)
+    rows_per_hour  : taxa estimada (CollectionWatermark.rows_per_hour); None = desconhecida
+    min_window     : janela mínima; abaixo dela não há mais bissecção e a leitura é truncada
+    """
+
+    def __init__(self, fa_client, log_type, log_filter, row_cap, rows_per_hour=None,
+                 min_window=datetime.timedelta(minutes=1), page_size=100, max_concurrency=None,
+                 start_retries=3):
+        self.fa_client = fa_client
+        self.log_type = log_type
+        self.log_filter = log_filter
+        self.row_cap = row_cap
+        self.rows_per_hour = rows_per_hour
+        self.min_window = min_window
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency or getattr(settings, 'FORTIANALYZER_MAX_CONCURRENCY', 4)
+        self.start_retries = start_retries
+        self.stats = {'windows': 0, 'splits': 0, 'failed': 0, 'truncated': 0, 'matched': 0}
+
+    # --- Planejamento ---
+
+    def plan(self, start, end):
+        """Janelas iniciais de tamanho igual, dimensionadas pela taxa aprendida."""
+        span_hours = (end - start).total_seconds() / 3600.0
+        if span_hours <= 0:
+            return []
+        count = 1
+        if self.rows_per_hour:
+            expected = self.rows_per_hour * span_hours
+            count = math.ceil(expected / (self.row_cap * TARGET_FILL))
+            max_by_width = max(1, int((end - start) / self.min_window))
+            count = max(1, min(count, MAX_INITIAL_WINDOWS, max_by_width))
+        step = (end - start) / count
+        return [(start + step * i, end if i == count - 1 else start + step * (i + 1)) for i in range(count)]
+
+    def observed_rate(self, start, end):
+        """Linhas/hora efetivamente encontradas no período (após a execução)."""
+        span_hours = (end - start).total_seconds() / 3600.0
+        if span_hours <= 0:
+            return None
+        return self.stats['matched'] / span_hours
+
+    # --- Execução ---
+
+    def _probe(self, window):
+        """Cria a tarefa da janela e aguarda até concluir ou até o teto ser ultrapassado."""
+        s, e = window
+        tid = None
+        for attempt in range(self.start_retries):
+            try:
+                tid = self.fa_client.start_log_task(
+                    log_type=self.log_type, start_time=s, end_time=e,
+                    limit=self.row_cap, log_filter=self.log_filter
+                )
+                if tid: break
+            except Exception as ex:
+                logger.warning(f"Tentativa {attempt+1} falhou para janela {s} - {e}: {ex}")
+            if attempt < self.start_retries - 1:
+                time.sleep(2 ** attempt)
+        if not tid:
+            return window, None
+        # min_rows: assim que o total passa do teto a janela já pode ser bissectada
+        return window, self.fa_client.wait_for_task(tid, min_rows=self.row_cap + 1)
+
+    def _over_cap(self, info):
+        return info['total'] is not None and info['total'] > self.row_cap
+
+    def iter_rows(self, start, end):
+        """Gera as linhas de todas as janelas de [start, end], bissectando as que estouram o teto."""
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='fa-window')
+        try:
+            pending = {executor.submit(self._probe, w) for w in self.plan(start, end)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window, info = future.result()
+                    s, e = window
+                    if info is None:
+                        self.stats['failed'] += 1
+                        logger.error(f"Falha ao obter TID do FA para a janela {s} - {e}.")
+                        continue
+
+                    if self._over_cap(info):
+                        if (e - s) / 2 >= self.min_window:
+                            self.stats['splits'] += 1
+                            mid = s + (e - s) / 2
+                            logger.info(f"Janela {s} - {e} passou do teto ({info['total']} > {self.row_cap}); bissectando.")
+                            pending.add(executor.submit(self._probe, (s, mid)))
+                            pending.add(executor.submit(self._probe, (mid, e)))
+                            continue
+                        # Janela mínima ainda acima do teto: lê o que couber e registra a perda
+                        self.stats['truncated'] += 1
+                        logger.warning(f"Janela mínima {s} - {e} com {info['total']} linhas; lendo apenas {self.row_cap}.")
+                        if not info['done']:
+                            info = self.fa_client.wait_for_task(info['tid'])
+
+                    if not info['done']:
+                        # Prazo esgotado com o FA ainda indexando: o total é parcial e ler a
+                        # janela deixaria a marca d'água passar por linhas ainda não indexadas
+                        self.stats['failed'] += 1
+                        logger.error(f"Tarefa {info['tid']} da janela {s} - {e} não concluiu no prazo ({info['percentage']}%).")
+                        continue
+
+                    self.stats['windows'] += 1
+                    self.stats['matched'] += info['total'] or 0
+                    complete = yield from self.fa_client.fetch_all_results(
+                        info['tid'], page_size=self.page_size, total=info['total'], limit=self.row_cap
+                    )
+                    if not complete:
+                        # Páginas perdidas: a marca d'água não pode passar desta janela
+                        self.stats['failed'] += 1
+                        logger.error(f"Janela {s} - {e} lida com lacunas (páginas falharam).")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -9,7 +9,7 @@ django.setup()
 from vpn_logs.models import VPNLog
 from django.utils import timezone
 
-logs = VPNLog.objects.filter(user__icontains='rafaelasamc').order_by('-start_time')[:5]
+logs = VPNLog.objects.with_payload().filter(user__icontains='rafaelasamc').order_by('-start_time')[:5]
 
 print("--- RECENT LOGS FOR RAFAELASAMC ---")
 for log in logs:
@@ -1,38 +1,40 @@
 import os
 import django
-import urllib.parse
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vpn_dashboard.settings')
 django.setup()
 
+from django.db.models import Q
 from vpn_logs.models import VPNLog
+from integrations.normalizer import known_place, location
+from vpn_logs.summary import deferred_summary_refresh
+from vpn_logs.travel import deferred_travel_check
 
 def repair_geoip():
     # Pega logs sem país definido
-    logs = VPNLog.objects.filter(country_name='') | VPNLog.objects.filter(country_name__isnull=True)
+    logs = VPNLog.objects.with_payload().filter(Q(country_name='') | Q(country_name__isnull=True))
     print(f"Reparando GeoIP para {logs.count()} logs...")
     
     count = 0
-    for log in logs:
-        raw = log.raw_data
-        if not raw:
-            continue
+    # Viagem impossível e resumo diário recalculados em lote no fim, não a cada log.save()
+    with deferred_travel_check(), deferred_summary_refresh():
+        for log in logs:
+            raw = log.raw_data
+            if not raw:
+                continue
             
-        # Tenta extrair do log bruto guardado pelo coletor
-        country = urllib.parse.unquote(str(raw.get('remcountry', raw.get('srccountry', '')))).strip()
-        city = urllib.parse.unquote(str(raw.get('remcity', raw.get('srccity', '')))).strip()
-        
-        if country and country.lower() not in ['reserved', 'n/a']:
-            log.country_name = country
-            log.city = city if city.lower() not in ['reserved', 'n/a'] else ''
-            
-            # Tentar mapear código do país (simplificado)
-            COUNTRY_MAP = {'brazil': 'BR', 'united states': 'US', 'argentina': 'AR', 'mexico': 'MX'}
-            log.country_code = COUNTRY_MAP.get(country.lower(), '')
-            
-            log.save()
-            count += 1
-            print(f"Atualizado {log.user}: {country} - {city}")
+            # Tenta extrair do log bruto guardado pelo coletor (remcountry/remcity, depois srccountry/srccity)
+            country, country_code, city, _ = location(raw, 'rem', fallback='src')
+
+            if country:
+                log.country_name = country
+                log.city = known_place(city)
+                # Código ISO pela tabela completa do normalizador
+                log.country_code = country_code
+
+                log.save()
+                count += 1
+                print(f"Atualizado {log.user}: {country} - {city}")
 
     print(f"Reparo finalizado. {count} registros atualizados.")
 
@@ -0,0 +1,253 @@
+"""
+Ingestão em lote dos eventos de autenticação do AD (POST /api/security-events/ad-auth/ingest/).
+
+Os encaminhadores de eventos do Windows enviam milhares de logons por minuto. Em vez de um
+ADAuthEventSerializer + save() por item, o corpo é lido como:
+
+    Content-Type: application/x-ndjson (um objeto JSON por linha) ou application/json
+    Content-Encoding: gzip | zstd (opcional)
+
+cada linha passa por uma validação leve (clean_row) e as válidas são gravadas com
+bulk_create em blocos de AD_INGEST_CHUNK: o custo da requisição cresce com o número de
+blocos, não de linhas. Com ?async=1 (ou Prefer: respond-async) o corpo ainda comprimido
+fica no cache e a gravação vai para ingest_ad_auth_events_task (resposta 202 + batch_id).
+"""
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from integrations.pipeline import batched
+from .models import ADAuthEvent
+import gzip
+import ipaddress
+import json
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-seq')
+SUPPORTED_ENCODINGS = ('', 'identity', 'gzip', 'x-gzip', 'zstd', 'x-zstd')
+MAX_REPORTED_ERRORS = 20
+
+_STATUSES = {value for value, _ in ADAuthEvent.STATUS_CHOICES}
+_TEXT_FIELDS = {
+    name: ADAuthEvent._meta.get_field(name).max_length
+    for name in ('workstation', 'ad_department', 'ad_title', 'ad_display_name')
+}
+_USERNAME_MAX = ADAuthEvent._meta.get_field('username').max_length
+
+
+class PayloadError(ValueError):
+    """Corpo que não pode ser lido (codificação, tamanho ou formato); vira resposta 4xx."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_payload_bytes():
+    return getattr(settings, 'AD_INGEST_MAX_BYTES', 200 * 1024 * 1024)
+
+
+def decompress(stream, encoding):
+    """
+    Lê o corpo (file-like) descomprimindo gzip/zstd em fluxo. O tamanho descomprimido é
+    limitado por AD_INGEST_MAX_BYTES (proteção contra bombas de compressão).
+    """
+    limit = max_payload_bytes()
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        reader = stream
+    elif encoding in ('gzip', 'x-gzip'):
+        reader = gzip.GzipFile(fileobj=stream)
+    elif encoding in ('zstd', 'x-zstd'):
+        if zstandard is None:
+            raise PayloadError("Content-Encoding zstd requer o pacote zstandard no servidor.", status=415)
+        reader = zstandard.ZstdDecompressor().stream_reader(stream)
+    else:
+        raise PayloadError(f"Content-Encoding não suportado: {encoding}", status=415)
+
+    try:
+        body = reader.read(limit + 1)
+    except Exception as e:
+        # OSError/EOFError do gzip, zstandard.ZstdError
+        raise PayloadError(f"Corpo {encoding} inválido: {e}")
+    if len(body) > limit:
+        raise PayloadError(f"Corpo descomprimido excede {limit} bytes.", status=413)
+    return body
+
+
+def iter_items(body, content_type):
+    """
+    Itens (dicts) do corpo já descomprimido. NDJSON: linhas em branco são ignoradas e uma
+    linha inválida vira um item None (rejeitado e reportado com seu número de linha).
+    JSON: lista de objetos ou objeto único.
+    """
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        for line in body.splitlines():
+            line = line.strip().lstrip(b'\x1e')  # json-seq (RFC 7464)
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+        return
+
+    try:
+        data = json.loads(body) if body else []
+    except ValueError as e:
+        raise PayloadError(f"JSON inválido: {e}")
+    yield from (data if isinstance(data, list) else [data])
+
+
+def clean_row(item):
+    """
+    Validação leve de um item → ADAuthEvent não salvo (ValueError com o motivo se inválido).
+    Mesmas regras do ADAuthEventSerializer para os campos gravados; campos desconhecidos,
+    id e created_at são ignorados.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("objeto JSON esperado")
+
+    username = item.get('username')
+    if not isinstance(username, str) or not username.strip():
+        raise ValueError("username obrigatório")
+    if len(username) > _USERNAME_MAX:
+        raise ValueError(f"username excede {_USERNAME_MAX} caracteres")
+
+    status = item.get('status')
+    if status not in _STATUSES:
+        raise ValueError(f"status inválido: {status!r}")
+
+    try:
+        event_id = int(item.get('event_id'))
+    except (TypeError, ValueError):
+        raise ValueError(f"event_id inválido: {item.get('event_id')!r}")
+
+    raw_timestamp = item.get('timestamp')
+    timestamp = parse_datetime(raw_timestamp) if isinstance(raw_timestamp, str) else None
+    if timestamp is None:
+        raise ValueError(f"timestamp inválido: {raw_timestamp!r}")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+
+    src_ip = item.get('src_ip') or None
+    if src_ip is not None:
+        try:
+            src_ip = str(ipaddress.ip_address(str(src_ip).strip()))
+        except ValueError:
+            raise ValueError(f"src_ip inválido: {src_ip!r}")
+
+    fields = {}
+    for name, max_length in _TEXT_FIELDS.items():
+        value = item.get(name) or ''
+        if not isinstance(value, str):
+            value = str(value)
+        if len(value) > max_length:
+            raise ValueError(f"{name} excede {max_length} caracteres")
+        fields[name] = value
+
+    message = item.get('message') or ''
+    return ADAuthEvent(
+        username=username, status=status, event_id=event_id, timestamp=timestamp,
+        src_ip=src_ip, message=message if isinstance(message, str) else str(message), **fields
+    )
+
+
+class ADAuthBulkIngestor:
+    """Valida e grava os itens em blocos de chunk_size; stats acumula entre chamadas."""
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or getattr(settings, 'AD_INGEST_CHUNK', 1000)
+        self.stats = {'received': 0, 'created': 0, 'rejected': 0, 'chunks': 0}
+        self.errors = []
+
+    def ingest(self, items):
+        for chunk in batched(self._clean(items), self.chunk_size):
+            ADAuthEvent.objects.bulk_create(chunk, batch_size=self.chunk_size)
+            self.stats['chunks'] += 1
+            self.stats['created'] += len(chunk)
+        return self.stats
+
+    def _clean(self, items):
+        for line, item in enumerate(items, start=1):
+            self.stats['received'] += 1
+            try:
+                yield clean_row(item)
+            except ValueError as e:
+                self.stats['rejected'] += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({'line': line, 'error': str(e)})
+
+    def result(self):
+        return dict(self.stats, errors=self.errors)
+
+
+def ingest_payload(body, content_type):
+    """Grava um corpo já descomprimido; devolve stats + primeiros erros."""
+    ingestor = ADAuthBulkIngestor()
+    ingestor.ingest(iter_items(body, content_type))
+    logger.info(f"Ingestão AD: {ingestor.stats}")
+    return ingestor.result()
+
+
+# --- Modo assíncrono (202 + batch_id) ---
+
+PAYLOAD_TTL = 60 * 60
+
+
+def _payload_key(batch_id):
+    return f"ad_ingest:payload:{batch_id}"
+
+
+def status_key(batch_id):
+    return f"ad_ingest:status:{batch_id}"
+
+
+def enqueue_payload(stream, encoding, content_type):
+    """
+    Guarda o corpo ainda comprimido no cache e agenda ingest_ad_auth_events_task.
+    Devolve o batch_id; o andamento fica em cache sob status_key(batch_id).
+    """
+    from django.core.cache import cache
+    from .tasks import ingest_ad_auth_events_task
+    import uuid
+
+    limit = max_payload_bytes()
+    raw = stream.read(limit + 1)
+    if len(raw) > limit:
+        raise PayloadError(f"Corpo excede {limit} bytes.", status=413)
+    if (encoding or '').strip().lower() not in SUPPORTED_ENCODINGS:
+        raise PayloadError(f"Content-Encoding não suportado: {encoding}", status=415)
+
+    batch_id = uuid.uuid4().hex
+    cache.set(_payload_key(batch_id), {'body': raw, 'encoding': encoding, 'content_type': content_type}, PAYLOAD_TTL)
+    cache.set(status_key(batch_id), {'state': 'queued', 'bytes': len(raw)}, PAYLOAD_TTL)
+    ingest_ad_auth_events_task.delay(batch_id)
+    return batch_id
+
+
+def process_queued_payload(batch_id):
+    """Executado pela task: lê o corpo do cache, grava e registra o resultado."""
+    from django.core.cache import cache
+    import io
+
+    payload = cache.get(_payload_key(batch_id))
+    if payload is None:
+        result = {'state': 'failed', 'error': 'Lote expirado ou inexistente.'}
+    else:
+        cache.set(status_key(batch_id), {'state': 'running', 'bytes': len(payload['body'])}, PAYLOAD_TTL)
+        try:
+            body = decompress(io.BytesIO(payload['body']), payload['encoding'])
+            result = dict(ingest_payload(body, payload['content_type']), state='done')
+        except PayloadError as e:
+            result = {'state': 'failed', 'error': str(e)}
+        cache.delete(_payload_key(batch_id))
+    cache.set(status_key(batch_id), result, PAYLOAD_TTL)
+    return result
@@ -1,13 +1,44 @@
 """Security Events Admin"""
 from django.contrib import admin
-from .models import SecurityEvent, ADAuthEvent
+from .models import SecurityEvent, ADAuthEvent, IPSDetail, AntivirusDetail, WebFilterDetail, AppControlDetail
+
+
+class DetailInline(admin.StackedInline):
+    """Linha de detalhe do tipo do evento (só a do tipo aparece preenchida)."""
+    extra = 0
+    max_num = 1
+    can_delete = False
+
+
+class IPSDetailInline(DetailInline):
+    model = IPSDetail
+    verbose_name_plural = 'IPS'
+
+
+class AntivirusDetailInline(DetailInline):
+    model = AntivirusDetail
+    verbose_name_plural = 'Antivirus'
+
+
+class WebFilterDetailInline(DetailInline):
+    model = WebFilterDetail
+    verbose_name_plural = 'Web Filter'
+
+
+class AppControlDetailInline(DetailInline):
+    model = AppControlDetail
+    verbose_name_plural = 'App Control'
 
 
 @admin.register(SecurityEvent)
 class SecurityEventAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'event_type', 'severity', 'username', 'src_ip', 'dst_ip', 'action')
     list_filter = ('event_type', 'severity', 'date', 'action', 'src_country')
-    search_fields = ('src_ip', 'dst_ip', 'username', 'attack_name', 'virus_name', 'url', 'ad_display_name', 'user_department')
+    search_fields = (
+        'src_ip', 'dst_ip', 'username', 'ipsdetail__attack_name', 'antivirusdetail__virus_name',
+        'webfilterdetail__url', 'ad_display_name', 'user_department',
+    )
+    inlines = [IPSDetailInline, AntivirusDetailInline, WebFilterDetailInline, AppControlDetailInline]
     date_hierarchy = 'timestamp'
     readonly_fields = ('event_id', 'created_at', 'raw_log')
     
@@ -21,17 +52,8 @@ class SecurityEventAdmin(admin.ModelAdmin):
         ('Usuário', {
             'fields': ('username', 'user_email', 'user_department')
         }),
-        ('IPS', {
-            'fields': ('attack_name', 'attack_id', 'cve'),
-            'classes': ('collapse',)
-        }),
-        ('Antivirus', {
-            'fields': ('virus_name', 'file_name', 'file_hash'),
-            'classes': ('collapse',)
-        }),
-        ('Web Filter', {
-            'fields': ('url', 'category', 'action'),
-            'classes': ('collapse',)
+        ('Ação', {
+            'fields': ('action',)
         }),
         ('Metadados', {
             'fields': ('raw_log', 'created_at'),
@@ -39,6 +61,13 @@ class SecurityEventAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_inline_instances(self, request, obj=None):
+        # Só o detalhe do tipo do evento; num evento novo a linha é criada (vazia) pelo save()
+        return [
+            inline for inline in super().get_inline_instances(request, obj)
+            if obj is not None and inline.model.EVENT_TYPE == obj.event_type
+        ]
+
 @admin.register(ADAuthEvent)
 class ADAuthEventAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'username', 'status', 'workstation', 'src_ip', 'event_id')
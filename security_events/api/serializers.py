@@ -4,13 +4,12 @@ from rest_framework import serializers
 from security_events.models import SecurityEvent, ADAuthEvent
 
 
-class SecurityEventSerializer(serializers.ModelSerializer):
-    """Serializer for SecurityEvent model with all fields"""
+class SecurityEventListSerializer(serializers.ModelSerializer):
+    """Serializer for SecurityEvent lists (sem details: não carrega o raw_log de cada linha)"""
     
     # Add display fields for better frontend rendering
     severity_display = serializers.CharField(source='get_severity_display', read_only=True)
     action_display = serializers.SerializerMethodField()
-    details = serializers.SerializerMethodField()
     
     class Meta:
         model = SecurityEvent
@@ -23,7 +22,6 @@ class SecurityEventSerializer(serializers.ModelSerializer):
             'cve',
             'virus_name', 'file_name', 'file_hash',
             'app_name', 'app_category', 'app_risk', 'bytes_in', 'bytes_out',
-            'details'
         ]
     
     def get_action_display(self, obj):
@@ -34,6 +32,15 @@ class SecurityEventSerializer(serializers.ModelSerializer):
             return 'Permitido'
         return obj.action or 'N/A'
 
+
+class SecurityEventSerializer(SecurityEventListSerializer):
+    """Serializer for SecurityEvent model with all fields (details vem do raw_log)"""
+
+    details = serializers.SerializerMethodField()
+
+    class Meta(SecurityEventListSerializer.Meta):
+        fields = SecurityEventListSerializer.Meta.fields + ['details']
+
     def get_details(self, obj):
         """Extract additional details from raw_log"""
         if not obj.raw_log:
@@ -3,11 +3,14 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Sum, F, Q, Case, When, Value, IntegerField
-from django.db.models.functions import Coalesce
+from django.db.models import Sum, F, Q
+from django.core.exceptions import FieldDoesNotExist
 from security_events.models import SecurityEvent, ADAuthEvent
-from .serializers import SecurityEventSerializer, ADAuthEventSerializer
+from .serializers import SecurityEventSerializer, SecurityEventListSerializer, ADAuthEventSerializer
 from django.utils import timezone
+from integrations.archive import TieredStats
+from integrations.partitions import day_range
+import io
 
 
 class SecurityEventPagination(PageNumberPagination):
@@ -17,7 +20,52 @@ class SecurityEventPagination(PageNumberPagination):
     max_page_size = 200
 
 
-class WebFilterViewSet(viewsets.ReadOnlyModelViewSet):
+class ArchiveStatsMixin:
+    """
+    Stats com intervalo (start_date/end_date) que começam antes da janela quente somam os
+    dias já removidos do banco a partir do arquivo Parquet (integrations.archive).
+    Só os parâmetros de archive_filters (igualdade) valem no arquivo; com qualquer outro
+    filtro na requisição (busca, icontains...) os números vêm só do banco.
+    """
+    archive_label = 'security_events.SecurityEvent'
+    archive_where = {}
+    archive_filters = ()
+    NON_FILTER_PARAMS = {'start_date', 'end_date', 'page', 'page_size', 'format', 'ordering'}
+
+    def tiered_stats(self):
+        params = self.request.query_params
+        queryset = self.filter_queryset(self.get_queryset())
+        where, cold_allowed = dict(self.archive_where), True
+        for name, value in params.items():
+            if name in self.NON_FILTER_PARAMS or not value:
+                continue
+            if name not in self.archive_filters:
+                cold_allowed = False
+                continue
+            try:
+                value = queryset.model._meta.get_field(name).to_python(value)
+            except FieldDoesNotExist:
+                pass  # campo das tabelas de detalhe (texto)
+            where[name] = value
+        return TieredStats(self.archive_label, queryset, params.get('start_date'), params.get('end_date'), where, cold_allowed)
+
+
+class EventDetailsMixin:
+    """
+    A lista usa SecurityEventListSerializer, sem o campo details: só o retrieve de um evento
+    lê (e descomprime) o raw_log. Os modais de detalhe das telas buscam o evento completo.
+    """
+    event_type = None
+
+    def get_serializer_class(self):
+        return SecurityEventSerializer if self.action == 'retrieve' else SecurityEventListSerializer
+
+    def events(self):
+        queryset = SecurityEvent.objects.with_details(self.event_type).filter(event_type=self.event_type)
+        return queryset.with_payload() if self.action == 'retrieve' else queryset
+
+
+class WebFilterViewSet(EventDetailsMixin, ArchiveStatsMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for webfilter security events
     
@@ -28,13 +76,12 @@ class WebFilterViewSet(viewsets.ReadOnlyModelViewSet):
     - url: Search in URL field
     - department: Filter by user department
     """
-    serializer_class = SecurityEventSerializer
+    event_type = 'webfilter'
     pagination_class = SecurityEventPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     
-    # Define filterable fields
+    # Define filterable fields (category, da tabela de detalhe, é filtrada em get_queryset)
     filterset_fields = {
-        'category': ['exact'],
         'action': ['exact'],
         'severity': ['exact'],
         'user_department': ['exact', 'icontains'],
@@ -47,16 +94,23 @@ class WebFilterViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['timestamp', 'severity', 'category']
     ordering = ['-timestamp']  # Default ordering
 
+    archive_where = {'event_type': 'webfilter'}
+    archive_filters = ('action', 'severity', 'user_department', 'category')
+
     
     def get_queryset(self):
         """Return webfilter events only"""
-        queryset = SecurityEvent.objects.filter(event_type='webfilter')
+        queryset = self.events()
         
         # Additional custom filters
+        category = self.request.query_params.get('category', None)
         username_q = self.request.query_params.get('username', None)
         url_q = self.request.query_params.get('url', None)
         department_q = self.request.query_params.get('department', None)
         
+        if category:
+            queryset = queryset.filter(category=category)
+
         if username_q:
             queryset = queryset.filter(
                 Q(username__icontains=username_q) | 
@@ -93,11 +147,6 @@ class WebFilterViewSet(viewsets.ReadOnlyModelViewSet):
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
         
-        from django.db.models.functions import Coalesce
-        
-        # Helper for real-time volume
-        vol_expr = Coalesce(F('bytes_in'), 0) + Coalesce(F('bytes_out'), 0)
-
         # Se não houver filtro de data, pegamos os últimos 7 dias das métricas
         if not start_date and not end_date:
             metrics_qs = DashboardMetric.objects.filter(group='webfilter')
@@ -127,28 +176,23 @@ class WebFilterViewSet(viewsets.ReadOnlyModelViewSet):
                 'top_users': list(top_users)
             })
 
-        # Se houver filtro, usamos a lógica original (o índice composto ajudará aqui)
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Stats por Volume
-        total_vol = queryset.aggregate(v=Sum(vol_expr))['v'] or 0
-        blocked = queryset.filter(action__in=['block', 'blocked'])
-        allowed = queryset.filter(action__in=['pass', 'allowed', 'passthrough'])
-        
-        blocked_vol = blocked.aggregate(v=Sum(vol_expr))['v'] or 0
-        allowed_vol = allowed.aggregate(v=Sum(vol_expr))['v'] or 0
-        
-        top_categories = blocked.values('category').annotate(volume=Sum(vol_expr)).order_by('-volume')[:10]
-        top_sites = blocked.values('hostname').annotate(volume=Sum(vol_expr), url=F('hostname')).order_by('-volume')[:10]
-        top_users = blocked.values('username').annotate(volume=Sum(vol_expr)).order_by('-volume')[:10]
-        
+        # Se houver filtro, usamos a lógica original (o índice composto ajudará aqui); dias
+        # anteriores à janela quente vêm do arquivo Parquet
+        stats = self.tiered_stats()
+        volume = ('bytes_in', 'bytes_out')
+        blocked = ['block', 'blocked']
+        totals = stats.totals(
+            volume,
+            total_volume={},
+            blocked_volume={'action': blocked},
+            allowed_volume={'action': ['pass', 'allowed', 'passthrough']},
+        )
+
         return Response({
-            'total_volume': total_vol,
-            'blocked_volume': blocked_vol,
-            'allowed_volume': allowed_vol,
-            'top_categories': list(top_categories),
-            'top_sites': list(top_sites),
-            'top_users': list(top_users)
+            **totals,
+            'top_categories': [{'category': key, 'volume': v} for key, v in stats.top('category', volume, 10, action=blocked)],
+            'top_sites': [{'hostname': key, 'url': key, 'volume': v} for key, v in stats.top('hostname', volume, 10, action=blocked)],
+            'top_users': [{'username': key, 'volume': v} for key, v in stats.top('username', volume, 10, action=blocked)],
         })
 
     @action(detail=False, methods=['get'])
@@ -160,11 +204,11 @@ class WebFilterViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(categories)
 
 
-class IPSViewSet(viewsets.ReadOnlyModelViewSet):
+class IPSViewSet(EventDetailsMixin, ArchiveStatsMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for IPS security events
     """
-    serializer_class = SecurityEventSerializer
+    event_type = 'ips'
     pagination_class = SecurityEventPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     
@@ -182,9 +226,12 @@ class IPSViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['timestamp', 'severity', 'attack_name']
     ordering = ['-timestamp']
 
+    archive_where = {'event_type': 'ips'}
+    archive_filters = ('severity', 'action', 'src_country')
+
     def get_queryset(self):
         """Return IPS events only"""
-        queryset = SecurityEvent.objects.filter(event_type='ips')
+        queryset = self.events()
         
         # Date filtering
         start_date = self.request.query_params.get('start_date', None)
@@ -238,41 +285,33 @@ class IPSViewSet(viewsets.ReadOnlyModelViewSet):
                 'severity_dist': list(severity_dist)
             })
 
-        # Real-time fallback
-        from django.db.models import Case, When, IntegerField
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        agg = queryset.aggregate(
-            total_events=Count('id'),
-            critical_events=Count(Case(When(severity='critical', then=1), output_field=IntegerField())),
-            high_events=Count(Case(When(severity='high', then=1), output_field=IntegerField())),
-        )
-        
-        top_attacks = queryset.values('attack_name').annotate(count=Count('id')).order_by('-count')[:10]
-        top_sources = queryset.values('src_ip').annotate(count=Count('id')).order_by('-count')[:10]
-        severity_dist = queryset.values('severity').annotate(count=Count('id')).order_by('-count')
-        
+        # Real-time fallback (dias anteriores à janela quente: arquivo Parquet)
+        stats = self.tiered_stats()
+        agg = stats.totals(total_events={}, critical_events={'severity': 'critical'}, high_events={'severity': 'high'})
+
         return Response({
             **agg,
-            'top_attacks': list(top_attacks),
-            'top_sources': list(top_sources),
-            'severity_dist': list(severity_dist)
+            'top_attacks': [{'attack_name': key, 'count': n} for key, n in stats.top('attack_name', limit=10)],
+            'top_sources': [{'src_ip': key, 'count': n} for key, n in stats.top('src_ip', limit=10)],
+            'severity_dist': [{'severity': key, 'count': n} for key, n in stats.top('severity')],
         })
 
-class AntivirusViewSet(viewsets.ReadOnlyModelViewSet):
+class AntivirusViewSet(EventDetailsMixin, ArchiveStatsMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for Antivirus events
     """
-    serializer_class = SecurityEventSerializer
+    event_type = 'antivirus'
     pagination_class = SecurityEventPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['severity', 'action', 'username', 'src_country']
     search_fields = ['virus_name', 'file_name', 'file_hash', 'src_ip', 'username']
     ordering_fields = ['timestamp', 'severity']
     ordering = ['-timestamp']
+    archive_where = {'event_type': 'antivirus'}
+    archive_filters = ('severity', 'action', 'username', 'src_country')
 
     def get_queryset(self):
-        queryset = SecurityEvent.objects.filter(event_type='antivirus')
+        queryset = self.events()
         
         # Date filtering
         start_date = self.request.query_params.get('start_date')
@@ -291,7 +330,6 @@ class AntivirusViewSet(viewsets.ReadOnlyModelViewSet):
         from dashboard.models import DashboardMetric
         from django.db.models import Sum
         
-        queryset = self.filter_queryset(self.get_queryset())
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
 
@@ -320,38 +358,39 @@ class AntivirusViewSet(viewsets.ReadOnlyModelViewSet):
                 'severity_dist': list(severity_dist)
             })
 
-        total_events = queryset.count()
-        agg = queryset.aggregate(
-            critical_events=Count(Case(When(severity='critical', then=1), output_field=IntegerField())),
-            high_events=Count(Case(When(severity='high', then=1), output_field=IntegerField())),
-        )
-        top_viruses = queryset.values('virus_name').annotate(count=Count('id')).order_by('-count')[:10]
-        top_users = queryset.exclude(username='').values('username').annotate(count=Count('id')).order_by('-count')[:10]
-        severity_dist = queryset.values('severity').annotate(count=Count('id')).order_by('-count')
+        # Dias anteriores à janela quente: arquivo Parquet
+        stats = self.tiered_stats()
+        agg = stats.totals(total_events={}, critical_events={'severity': 'critical'}, high_events={'severity': 'high'})
 
         return Response({
-            'total_events': total_events,
-            'critical_events': agg['critical_events'],
-            'high_events': agg['high_events'],
-            'top_viruses': list(top_viruses),
-            'top_users': list(top_users),
-            'severity_dist': list(severity_dist)
+            **agg,
+            'top_viruses': [{'virus_name': key, 'count': n} for key, n in stats.top('virus_name', limit=10)],
+            'top_users': [{'username': key, 'count': n} for key, n in stats.top('username', limit=10, exclude_empty=True)],
+            'severity_dist': [{'severity': key, 'count': n} for key, n in stats.top('severity')],
         })
 
-class AppControlViewSet(viewsets.ReadOnlyModelViewSet):
+class AppControlViewSet(EventDetailsMixin, ArchiveStatsMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for App Control events
     """
-    serializer_class = SecurityEventSerializer
+    event_type = 'app-control'
     pagination_class = SecurityEventPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['action', 'app_category', 'app_risk', 'username']
+    filterset_fields = ['action', 'username']  # app_category e app_risk: get_queryset
     search_fields = ['app_name', 'username', 'src_ip', 'dst_ip']
     ordering_fields = ['timestamp', 'bytes_total']
     ordering = ['-timestamp']
+    archive_where = {'event_type': 'app-control'}
+    archive_filters = ('action', 'username', 'app_category', 'app_risk')
 
     def get_queryset(self):
-        queryset = SecurityEvent.objects.filter(event_type='app-control')
+        queryset = self.events()
+
+        # Campos da tabela de detalhe (fora do filterset_fields, que só aceita campos do model)
+        for field in ('app_category', 'app_risk'):
+            value = self.request.query_params.get(field)
+            if value:
+                queryset = queryset.filter(**{field: value})
         
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
@@ -395,27 +434,18 @@ class AppControlViewSet(viewsets.ReadOnlyModelViewSet):
                 'top_categories': list(top_categories)
             })
 
-        queryset = self.filter_queryset(self.get_queryset())
-        total_events = queryset.count()
-        
-        # Real-time Volume Query
-        vol_expr = Coalesce(F('bytes_in'), 0) + Coalesce(F('bytes_out'), 0)
-        
-        top_apps = queryset.exclude(app_name='').values('app_name').annotate(volume=Sum(vol_expr)).order_by('-volume')[:10]
-        top_categories = queryset.exclude(app_category='').values('app_category').annotate(volume=Sum(vol_expr)).order_by('-volume')[:10]
-        
-        top_users = queryset.exclude(username='').values('username').annotate(
-            volume=Sum(vol_expr)
-        ).order_by('-volume')[:10]
+        # Real-time Volume Query (dias anteriores à janela quente: arquivo Parquet)
+        stats = self.tiered_stats()
+        volume = ('bytes_in', 'bytes_out')
 
         return Response({
-            'total_events': total_events,
-            'top_apps': list(top_apps),
-            'top_users': list(top_users),
-            'top_categories': list(top_categories)
+            **stats.totals(total_events={}),
+            'top_apps': [{'app_name': key, 'volume': v} for key, v in stats.top('app_name', volume, 10, exclude_empty=True)],
+            'top_users': [{'username': key, 'volume': v} for key, v in stats.top('username', volume, 10, exclude_empty=True)],
+            'top_categories': [{'app_category': key, 'volume': v} for key, v in stats.top('app_category', volume, 10, exclude_empty=True)],
         })
 
-class ADAuthEventViewSet(viewsets.ModelViewSet):
+class ADAuthEventViewSet(ArchiveStatsMixin, viewsets.ModelViewSet):
     """
     API endpoint for AD Authentication events
     """
@@ -426,6 +456,8 @@ class ADAuthEventViewSet(viewsets.ModelViewSet):
     search_fields = ['username', 'workstation', 'src_ip', 'message']
     ordering_fields = ['timestamp']
     ordering = ['-timestamp']
+    archive_label = 'security_events.ADAuthEvent'
+    archive_filters = ('status', 'event_id', 'username')
 
     def get_queryset(self):
         queryset = ADAuthEvent.objects.all()
@@ -433,10 +465,13 @@ class ADAuthEventViewSet(viewsets.ModelViewSet):
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
         
-        if start_date:
-            queryset = queryset.filter(timestamp__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(timestamp__date__lte=end_date)
+        # Faixas de timestamp (e não timestamp__date): usam o índice e o pruning de partições
+        start_range = day_range(start_date) if start_date else None
+        end_range = day_range(end_date) if end_date else None
+        if start_range:
+            queryset = queryset.filter(timestamp__gte=start_range[0])
+        if end_range:
+            queryset = queryset.filter(timestamp__lt=end_range[1])
             
         return queryset.order_by('-timestamp')
 
@@ -464,51 +499,68 @@ class ADAuthEventViewSet(viewsets.ModelViewSet):
                 'recent_auth_events': [] # Dynamic
             })
 
-        queryset = self.filter_queryset(self.get_queryset())
-        total_events = queryset.count()
-        failed_logins = queryset.filter(status='failed').count()
-        locked_accounts = queryset.filter(status='locked').count()
-        
-        # Top Users with Failed Logins
-        top_failed_users = queryset.filter(status='failed').exclude(username='').values('username').annotate(
-             count=Count('id')
-        ).order_by('-count')[:20]
-
-        # Top Workstations with failed logins
-        top_failed_workstations = queryset.filter(status='failed').exclude(workstation='').values('workstation').annotate(
-            count=Count('id')
-        ).order_by('-count')[:20]
-
-        recent_events = list(queryset.order_by('-timestamp')[:500].values('timestamp', 'status'))
+        # Dias anteriores à janela quente: arquivo Parquet
+        stats = self.tiered_stats()
+        agg = stats.totals(total_events={}, failed_logins={'status': 'failed'}, locked_accounts={'status': 'locked'})
 
+        # Top Users / Workstations with Failed Logins
+        top_failed_users = stats.top('username', limit=20, exclude_empty=True, status='failed')
+        top_failed_workstations = stats.top('workstation', limit=20, exclude_empty=True, status='failed')
 
         return Response({
-            'total_events': total_events,
-            'failed_logins': failed_logins,
-            'locked_accounts': locked_accounts,
-            'top_failed_users': list(top_failed_users),
-            'top_failed_workstations': list(top_failed_workstations),
-            'recent_auth_events': recent_events
+            **agg,
+            'top_failed_users': [{'username': key, 'count': n} for key, n in top_failed_users],
+            'top_failed_workstations': [{'workstation': key, 'count': n} for key, n in top_failed_workstations],
+            'recent_auth_events': stats.latest(('timestamp', 'status'), 'timestamp', 500),
         })
         
     @action(detail=False, methods=['post'])
     def ingest(self, request):
         """
-        Recebe eventos de logon (via script de Powershell/WMI/Syslog)
-        Payload esperado: list de dicts ou dict unico
+        Recebe eventos de logon (via script de Powershell/WMI/Syslog/Windows Event Forwarding)
+        Payload: list de dicts, dict unico ou NDJSON (Content-Type: application/x-ndjson),
+        opcionalmente comprimido (Content-Encoding: gzip ou zstd).
+        Com ?async=1 ou Prefer: respond-async responde 202 com batch_id e grava em background.
+        Ver security_events.ad_ingest.
         """
-        data = request.data
-        if not isinstance(data, list):
-            data = [data]
-            
-        created_count = 0
-        for item in data:
-            serializer = self.get_serializer(data=item)
-            if serializer.is_valid():
-                serializer.save()
-                created_count += 1
-                
-        return Response({"status": "Success", "created": created_count}, status=201)
+        from security_events import ad_ingest
+
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '')
+        content_type = request.content_type
+        run_async = (
+            request.query_params.get('async') in ('1', 'true', 'True')
+            or 'respond-async' in request.META.get('HTTP_PREFER', '')
+        )
+
+        try:
+            if run_async:
+                batch_id = ad_ingest.enqueue_payload(request.stream or io.BytesIO(), encoding, content_type)
+                return Response({"status": "Accepted", "batch_id": batch_id}, status=202)
+
+            if encoding or content_type.split(';')[0].strip().lower() in ad_ingest.NDJSON_TYPES:
+                body = ad_ingest.decompress(request.stream or io.BytesIO(), encoding)
+                result = ad_ingest.ingest_payload(body, content_type)
+            else:
+                # JSON/form sem compressão: parsers do DRF, como antes
+                data = request.data
+                ingestor = ad_ingest.ADAuthBulkIngestor()
+                ingestor.ingest(data if isinstance(data, list) else [data])
+                result = ingestor.result()
+        except ad_ingest.PayloadError as e:
+            return Response({"status": "Error", "error": str(e)}, status=e.status)
+
+        return Response(dict(result, status="Success"), status=201)
+
+    @action(detail=False, methods=['get'], url_path=r'ingest/(?P<batch_id>[0-9a-f]{32})')
+    def ingest_status(self, request, batch_id=None):
+        """Andamento de um lote enviado com ?async=1 (queued, running, done ou failed)."""
+        from django.core.cache import cache
+        from security_events.ad_ingest import status_key
+
+        result = cache.get(status_key(batch_id))
+        if result is None:
+            return Response({"batch_id": batch_id, "state": "unknown"}, status=404)
+        return Response(dict(result, batch_id=batch_id))
 
 # =========================================================
 # RADAR AD (Auditoria de Postura LDAP - Módulo 3 Novo)
@@ -0,0 +1,187 @@
+"""
+Identidade (event_id) dos eventos de segurança coletados do FortiAnalyzer.
+
+O event_id era o md5 do log inteiro serializado com json.dumps(sort_keys=True): caro (a
+serialização ordenada domina o custo) e instável, já que qualquer campo volátil que o FA
+acrescente ou altere num reenvio (itime, tz, campos de enriquecimento...) gera outro ID e
+uma duplicata. Aqui o ID é um blake2b de 128 bits sobre uma tupla fixa de campos de
+identidade por tipo de evento.
+
+RecentIds guarda, por processo do coletor, os IDs gravados nas últimas coletas: os logs
+repetidos pela sobreposição das janelas são descartados antes de chegar ao banco.
+
+Troca de formato: os eventos gravados antes têm o md5 como event_id, e a primeira coleta
+depois da troca relê a sobreposição da marca d'água com o ID novo. refingerprint_events
+(migration 0014 e python manage.py refingerprint_events) recalcula o ID dessas linhas a partir
+do log bruto gravado: renomeia o evento e o detalhe ou, se o ID novo já existir, remove a cópia
+antiga.
+"""
+from django.db import DEFAULT_DB_ALIAS, transaction
+from hashlib import blake2b, md5
+from integrations.normalizer import FA_CLOCK_SKEW, decode
+import datetime
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Campos comuns a todos os tipos: origem (dispositivo/VDOM), tipo de log, instante e sessão
+COMMON_FIELDS = ('logid', 'devid', 'vd', 'eventtime', 'sessionid', 'srcip', 'srcport', 'dstip', 'dstport', 'proto')
+
+# Campos que distinguem eventos diferentes dentro da mesma sessão
+TYPE_FIELDS = {
+    'ips': ('attackid', 'attack'),
+    'antivirus': ('virusid', 'virus', 'filename', 'checksum'),
+    'webfilter': ('url', 'hostname', 'catdesc'),
+    'app-control': ('appid', 'app', 'hostname', 'url'),
+}
+
+SEPARATOR = '\x1f'
+
+
+def identity_fields(event_type):
+    return COMMON_FIELDS + TYPE_FIELDS.get(event_type, ())
+
+
+def fingerprint(log, event_type):
+    """
+    event_id (32 caracteres hex) do log. Sem eventtime (logs antigos do FA) o instante
+    vem de itime ou de date/time.
+    """
+    values = [event_type]
+    for name in identity_fields(event_type):
+        value = log.get(name)
+        if name == 'eventtime' and not value:
+            value = log.get('itime') or f"{log.get('date', '')} {log.get('time', '')}"
+        # Decodificado: o FA devolve valores URL-encoded e o syslog do FortiGate, os originais
+        values.append(decode(value))
+    return blake2b(SEPARATOR.join(values).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class RecentIds:
+    """
+    Conjunto aproximadamente LRU de IDs já gravados, com memória limitada: duas gerações
+    de sets; quando a atual atinge capacity/2 ela vira a anterior e a mais antiga é
+    descartada. Um ID esquecido apenas volta a ser conferido no banco.
+    """
+
+    def __init__(self, capacity=50000):
+        self.generation_size = max(1, capacity // 2)
+        self._current = set()
+        self._previous = set()
+
+    def __contains__(self, event_id):
+        return event_id in self._current or event_id in self._previous
+
+    def __len__(self):
+        return len(self._current) + len(self._previous)
+
+    def add(self, event_id):
+        if event_id in self._current:
+            return
+        self._current.add(event_id)
+        if len(self._current) >= self.generation_size:
+            self._previous = self._current
+            self._current = set()
+
+    def update(self, event_ids):
+        for event_id in event_ids:
+            self.add(event_id)
+
+
+# Um filtro por fluxo (subtipo) e processo do worker; sobrevive entre execuções da task
+_recent_filters = {}
+
+
+def recent_ids(stream, capacity=50000):
+    recent = _recent_filters.get(stream)
+    if recent is None:
+        recent = _recent_filters[stream] = RecentIds(capacity)
+    return recent
+
+
+# --- Troca do formato do event_id ---
+
+def legacy_fingerprint(log):
+    """event_id antigo: md5 do log inteiro serializado com as chaves ordenadas."""
+    return md5(json.dumps(log, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def overlap_windows(watermark_model=None, overlap=None):
+    """
+    {event_type: início} do trecho que a próxima coleta de cada subtipo relê: a marca d'água
+    (relógio do FA) menos a sobreposição, no horário corrigido de SecurityEvent.timestamp.
+    """
+    from django.conf import settings
+    if watermark_model is None:
+        from integrations.models import CollectionWatermark as watermark_model
+    if overlap is None:
+        overlap = datetime.timedelta(minutes=getattr(settings, 'COLLECTION_WATERMARK_OVERLAP_MINUTES', 10))
+    windows = {}
+    for subtype, mark in watermark_model.objects.filter(
+        subtype__in=list(TYPE_FIELDS), last_timestamp__isnull=False
+    ).values_list('subtype', 'last_timestamp'):
+        since = mark - overlap - FA_CLOCK_SKEW
+        windows[subtype] = min(since, windows.get(subtype, since))
+    return windows
+
+
+def refingerprint_events(windows, chunk_size=500, using=None, event_model=None, detail_models=None):
+    """
+    Recalcula o event_id dos eventos de cada tipo com timestamp >= windows[tipo] a partir do
+    raw_log. Linhas com o ID antigo (legacy_fingerprint) são renomeadas (evento e detalhe); se o
+    ID novo já existe, a linha antiga é removida. As demais ficam como estão. event_model/detail_models: os models atuais ou os históricos de uma migration.
+    Devolve {'checked', 'renamed', 'merged'}.
+    """
+    if event_model is None:
+        from .models import DETAIL_MODELS, SecurityEvent as event_model
+        detail_models = DETAIL_MODELS
+    using = using or DEFAULT_DB_ALIAS
+    events = event_model._base_manager.db_manager(using)
+    stats = {'checked': 0, 'renamed': 0, 'merged': 0}
+
+    for event_type, since in windows.items():
+        detail = (detail_models or {}).get(event_type)
+        last_pk = 0
+        while True:
+            rows = list(
+                events.filter(event_type=event_type, timestamp__gte=since, pk__gt=last_pk)
+                .order_by('pk').only('pk', 'event_id', 'event_type', 'raw_log', 'raw_log_legacy')[:chunk_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+            stats['checked'] += len(rows)
+            changes = []
+            for row in rows:
+                try:
+                    log = json.loads(row.raw_log or '')
+                except (TypeError, ValueError):
+                    continue
+                # Só linhas com o ID antigo daquele mesmo log (não os uuid dos alertas de força bruta)
+                if isinstance(log, dict) and row.event_id == legacy_fingerprint(log):
+                    changes.append((row.pk, row.event_id, fingerprint(log, event_type)))
+            if changes:
+                _apply_changes(events, detail, changes, using, stats)
+
+    logger.info(f"event_id recalculado: {stats}")
+    return stats
+
+
+def _apply_changes(events, detail, changes, using, stats):
+    taken = set(events.filter(event_id__in=[new for _, _, new in changes]).values_list('event_id', flat=True))
+    duplicates = []
+    with transaction.atomic(using=using):
+        for pk, old, new in changes:
+            if new in taken:
+                duplicates.append(pk)
+                continue
+            events.filter(pk=pk).update(event_id=new)
+            if detail is not None:
+                detail._base_manager.db_manager(using).filter(event_id=old).update(event_id=new)
+            taken.add(new)
+            stats['renamed'] += 1
+        if duplicates:
+            # A coleta já gravou o evento com o ID novo: a cópia antiga sai junto com o detalhe
+            events.filter(pk__in=duplicates).delete()
+            stats['merged'] += len(duplicates)
@@ -0,0 +1,145 @@
+"""
+Mapeamento de um log do FortiAnalyzer (IPS, Antivirus, WebFilter, App Control) para SecurityEvent.
+
+Só monta as instâncias, sem tocar no banco: a gravação em lote fica com
+security_events.writers.SecurityEventBulkWriter. Os campos de cada tipo (attack_name, url,
+category...) são propriedades de SecurityEvent guardadas na linha de detalhe do tipo, que o
+bulk_create grava junto com o evento.
+"""
+from integrations.normalizer import location, log_timestamp, security_action, severity, to_int
+from .fingerprint import fingerprint
+from .models import DETAIL_MODELS, SecurityEvent
+import json
+import urllib.parse
+
+
+def build_security_event(log, event_type, ad_infos=None, event_id=None):
+    """
+    SecurityEvent (não salvo) para o log, ou None quando o log deve ser descartado
+    (ruído genérico de rede no App Control).
+    ad_infos: {username: info} já resolvido para o lote (ActiveDirectoryClient.get_users_info).
+    """
+    # Mapeamento básico de campos
+    username = log.get('user', '')
+    src_ip = log.get('srcip', '0.0.0.0')
+    dst_ip = log.get('dstip', '0.0.0.0')
+
+    # Já corrigido pelo relógio do FA (1 hora à frente)
+    timestamp = log_timestamp(log)
+
+    # Criar instância básica
+    event = SecurityEvent(
+        event_id=event_id or fingerprint(log, event_type),
+        event_type=event_type,
+        severity=severity(log),
+        timestamp=timestamp,
+        date=timestamp.date(),
+        src_ip=src_ip,
+        dst_ip=dst_ip,
+        src_port=int(log.get('srcport', 0)) if log.get('srcport') else None,
+        dst_port=int(log.get('dstport', 0)) if log.get('dstport') else None,
+        username=username,
+        raw_log=json.dumps(log)
+    )
+
+    # Enriquecimento AD
+    if username and ad_infos:
+        ad_info = ad_infos.get(username)
+        if ad_info:
+            event.user_email = ad_info.get('email', '')
+            event.user_department = ad_info.get('department', '')
+            event.ad_title = ad_info.get('title', '')
+            event.ad_display_name = ad_info.get('display_name', '')
+
+    # Enriquecimento de Países usando nativamente os logs do FortiGate
+    fa_src_country = location(log, 'src', fallback=None)[0]
+    fa_dst_country = location(log, 'dst', fallback=None)[0]
+
+    if fa_src_country:
+        event.src_country = fa_src_country
+
+    if fa_dst_country:
+        event.dst_country = fa_dst_country
+
+    # Normaliza actions do Log Bruto para casar com os Filtros do App/FrontEnd
+    event.action = security_action(log, event_type)
+
+    # Campos específicos por subtipo
+    if event_type == 'ips':
+        event.attack_name = log.get('attack', '')
+        event.attack_id = log.get('attackid', '')
+        event.cve = log.get('cve', '')
+    elif event_type == 'antivirus':
+        event.virus_name = log.get('virus', '')
+        event.file_name = log.get('filename', '')
+        event.file_hash = log.get('checksum', '')
+    elif event_type == 'webfilter':
+        event.url = urllib.parse.unquote(log.get('url', ''))
+        event.category = log.get('catdesc', '')
+    elif event_type == 'app-control':
+        app_raw = str(log.get('app', '')).strip()
+        cat_raw = str(log.get('appcat', '')).strip()
+
+        # Ignorar ruídos de rede genérica do Fortigate para limpar o painel AppControl
+        if app_raw.lower() in ['', 'unscanned', 'unknown'] and cat_raw.lower() in ['', 'unscanned', 'unknown']:
+            return None
+
+        if not app_raw and cat_raw:
+            app_raw = cat_raw # fallback nome=categoria
+        elif not app_raw or app_raw.lower() == 'unscanned':
+            app_raw = "Tráfego Genérico"
+
+        if not cat_raw or cat_raw.lower() == 'unscanned':
+            cat_raw = "Geral"
+
+        event.app_name = app_raw
+        event.app_category = cat_raw
+        event.app_risk = str(log.get('apprisk', 'low'))
+
+        # URL/Hostname extraction for App Control
+        hostname = log.get('hostname', '')
+        url_path = log.get('url', '')
+        if hostname:
+            event.url = f"{hostname}{url_path}" if url_path else hostname
+        elif url_path:
+            event.url = url_path
+
+        # Bytes conversion (ensure 0 instead of None if we want data to show in charts)
+        # Note: UTM logs might not have bytes, but we try to capture them if present
+        event.bytes_in = to_int(log.get('rcvdbyte', 0))
+        event.bytes_out = to_int(log.get('sentbyte', 0))
+
+    return event
+
+
+# Campos gravados pela coleta (o id e created_at ficam com o banco)
+_EVENT_FIELDS = [
+    field for field in SecurityEvent._meta.concrete_fields
+    if not field.primary_key and field.name != 'created_at'
+]
+
+
+def _detail_fields(event_type):
+    """Campos da tabela de detalhe do tipo (vazio para tipos sem detalhe)."""
+    model = DETAIL_MODELS.get(event_type)
+    return [model._meta.get_field(name) for name in model.FIELDS] if model else []
+
+
+def event_to_dict(event):
+    """SecurityEvent não salvo → dict serializável em JSON (buffer de integrations.streams)."""
+    detail = event.get_detail(create=True)
+    values = [(field, event) for field in _EVENT_FIELDS]
+    values += [(field, detail) for field in _detail_fields(event.event_type)]
+    return {
+        field.attname: field.value_to_string(obj) if getattr(obj, field.attname) is not None else None
+        for field, obj in values
+    }
+
+
+def event_from_dict(data):
+    """Inverso de event_to_dict: SecurityEvent não salvo, pronto para SecurityEventBulkWriter."""
+    fields = _EVENT_FIELDS + _detail_fields(data.get('event_type'))
+    return SecurityEvent(**{
+        field.attname: field.to_python(data[field.attname])
+        for field in fields if field.attname in data
+    })
@@ -9,13 +9,13 @@ class Command(BaseCommand):
         parser.add_argument(
             '--sync',
             action='store_true',
-            help='Executar de forma síncrona (sem Celery)',
+            help='Executar de forma síncrona (sem Celery), um subtipo após o outro',
         )
 
     def handle(self, *args, **options):
         if options['sync']:
             self.stdout.write('Executando fetch_security_events_task de forma síncrona...')
-            result = fetch_security_events_task()
+            result = fetch_security_events_task(parallel=False)
             self.stdout.write(self.style.SUCCESS(f'Resultado: {result}'))
         else:
             self.stdout.write('Disparando tarefa fetch_security_events_task no Celery...')
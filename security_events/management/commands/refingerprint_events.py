@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from security_events.fingerprint import TYPE_FIELDS, overlap_windows, refingerprint_events
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o event_id (formato atual) dos eventos de segurança gravados com o md5 antigo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, help='Eventos das últimas N horas de todos os tipos (padrão: a sobreposição da marca d\'água de cada subtipo)')
+        parser.add_argument('--chunk', type=int, default=500, help='Eventos por bloco')
+
+    def handle(self, *args, **options):
+        if options['hours']:
+            since = timezone.now() - datetime.timedelta(hours=options['hours'])
+            windows = {event_type: since for event_type in TYPE_FIELDS}
+        else:
+            windows = overlap_windows()
+        if not windows:
+            self.stdout.write('Nenhuma marca d\'água de eventos de segurança: nada a recalcular.')
+            return
+        for event_type, since in sorted(windows.items()):
+            self.stdout.write(f"{event_type}: desde {timezone.localtime(since)}")
+        stats = refingerprint_events(windows, chunk_size=options['chunk'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['checked']} eventos verificados: {stats['renamed']} renomeados, {stats['merged']} cópias antigas removidas"
+        ))
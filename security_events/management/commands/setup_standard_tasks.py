@@ -102,4 +102,50 @@ class Command(BaseCommand):
         else:
             self.stdout.write(f"Task already exists: {retention_task.name}")
 
+        # 6. Partition Maintenance (Daily at 01:30) - cria partições futuras das tabelas de log
+        crontab_0130, created = CrontabSchedule.objects.get_or_create(
+            minute='30',
+            hour='1',
+            day_of_week='*',
+            day_of_month='*',
+            month_of_year='*',
+        )
+
+        partitions_task, created = PeriodicTask.objects.get_or_create(
+            name='Manutenção de Partições de Logs',
+            defaults={
+                'task': 'integrations.tasks.maintain_partitions',
+                'crontab': crontab_0130,
+                'enabled': True,
+                'description': 'Cria antecipadamente as partições por data das tabelas de log (PostgreSQL particionado)'
+            }
+        )
+        if created:
+            self.stdout.write(self.style.SUCCESS(f"Created task: {partitions_task.name}"))
+        else:
+            self.stdout.write(f"Task already exists: {partitions_task.name}")
+
+        # 7. Log Archive (Daily at 01:00) - exporta os dias fechados para Parquet antes da retenção (02:00)
+        crontab_0100, created = CrontabSchedule.objects.get_or_create(
+            minute='0',
+            hour='1',
+            day_of_week='*',
+            day_of_month='*',
+            month_of_year='*',
+        )
+
+        archive_task, created = PeriodicTask.objects.get_or_create(
+            name='Arquivamento de Logs em Parquet',
+            defaults={
+                'task': 'integrations.tasks.archive_closed_days',
+                'crontab': crontab_0100,
+                'enabled': True,
+                'description': 'Exporta os dias fechados das tabelas de log para Parquet (LOG_ARCHIVE); sem efeito com o arquivamento desativado'
+            }
+        )
+        if created:
+            self.stdout.write(self.style.SUCCESS(f"Created task: {archive_task.name}"))
+        else:
+            self.stdout.write(f"Task already exists: {archive_task.name}")
+
         self.stdout.write(self.style.SUCCESS("Standard tasks setup completed."))
@@ -0,0 +1,250 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Campos de cada tabela de detalhe, copiados da tabela larga antes da remoção das colunas
+DETAIL_COPIES = [
+    ('security_events_ipsdetail', 'ips', ['attack_name', 'attack_id', 'cve', 'url']),
+    ('security_events_antivirusdetail', 'antivirus', ['virus_name', 'file_name', 'file_hash']),
+    ('security_events_webfilterdetail', 'webfilter', ['url', 'hostname', 'category', 'bytes_in', 'bytes_out']),
+    ('security_events_appcontroldetail', 'app-control', ['app_name', 'app_category', 'app_risk', 'url', 'bytes_in', 'bytes_out']),
+]
+EVENTS = 'security_events_securityevent'
+
+
+def copy_sql(table, event_type, columns):
+    names = ', '.join(columns)
+    return (
+        f"INSERT INTO {table} (event_id, date, {names}) "
+        f"SELECT event_id, date, {names} FROM {EVENTS} WHERE event_type = '{event_type}'"
+    )
+
+
+def copy_back_sql(table, event_type, columns):
+    assignments = ', '.join(
+        f"{column} = (SELECT d.{column} FROM {table} d WHERE d.event_id = {EVENTS}.event_id)" for column in columns
+    )
+    return (
+        f"UPDATE {EVENTS} SET {assignments} "
+        f"WHERE event_type = '{event_type}' AND event_id IN (SELECT event_id FROM {table})"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('security_events', '0011_adauthevent_security_ev_timesta_51b933_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AntivirusDetail',
+            fields=[
+                ('event', models.OneToOneField(db_column='event_id', db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='%(class)s', serialize=False, to='security_events.securityevent', to_field='event_id')),
+                ('date', models.DateField()),
+                ('virus_name', models.CharField(blank=True, max_length=500)),
+                ('file_name', models.CharField(blank=True, max_length=500)),
+                ('file_hash', models.CharField(blank=True, max_length=128)),
+            ],
+            options={
+                'verbose_name': 'Detalhe Antivirus',
+                'verbose_name_plural': 'Detalhes Antivirus',
+            },
+        ),
+        migrations.CreateModel(
+            name='AppControlDetail',
+            fields=[
+                ('event', models.OneToOneField(db_column='event_id', db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='%(class)s', serialize=False, to='security_events.securityevent', to_field='event_id')),
+                ('date', models.DateField()),
+                ('app_name', models.CharField(blank=True, max_length=255)),
+                ('app_category', models.CharField(blank=True, max_length=255)),
+                ('app_risk', models.CharField(blank=True, max_length=50)),
+                ('url', models.TextField(blank=True)),
+                ('bytes_in', models.BigIntegerField(blank=True, null=True)),
+                ('bytes_out', models.BigIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Detalhe App Control',
+                'verbose_name_plural': 'Detalhes App Control',
+            },
+        ),
+        migrations.CreateModel(
+            name='IPSDetail',
+            fields=[
+                ('event', models.OneToOneField(db_column='event_id', db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='%(class)s', serialize=False, to='security_events.securityevent', to_field='event_id')),
+                ('date', models.DateField()),
+                ('attack_name', models.CharField(blank=True, max_length=500)),
+                ('attack_id', models.CharField(blank=True, max_length=100)),
+                ('cve', models.CharField(blank=True, max_length=100)),
+                ('url', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Detalhe IPS',
+                'verbose_name_plural': 'Detalhes IPS',
+            },
+        ),
+        migrations.CreateModel(
+            name='WebFilterDetail',
+            fields=[
+                ('event', models.OneToOneField(db_column='event_id', db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='%(class)s', serialize=False, to='security_events.securityevent', to_field='event_id')),
+                ('date', models.DateField()),
+                ('url', models.TextField(blank=True)),
+                ('hostname', models.CharField(blank=True, max_length=255)),
+                ('category', models.CharField(blank=True, max_length=255)),
+                ('bytes_in', models.BigIntegerField(blank=True, null=True)),
+                ('bytes_out', models.BigIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Detalhe Web Filter',
+                'verbose_name_plural': 'Detalhes Web Filter',
+            },
+        ),
+        migrations.RunSQL(
+            [copy_sql(*copy) for copy in DETAIL_COPIES],
+            reverse_sql=[copy_back_sql(*copy) for copy in DETAIL_COPIES],
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_timesta_215529_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_f1d113_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_f687f2_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_0c94d7_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_92fb43_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_354c85_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_b99c83_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_6b7020_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_4ac639_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_7651c8_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_60938b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='securityevent',
+            name='security_ev_event_t_47e51a_idx',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='app_category',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='app_name',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='app_risk',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='attack_id',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='attack_name',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='bytes_in',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='bytes_out',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='category',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='cve',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='file_hash',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='file_name',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='hostname',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='url',
+        ),
+        migrations.RemoveField(
+            model_name='securityevent',
+            name='virus_name',
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='event_type',
+            field=models.CharField(choices=[('ips', 'IPS'), ('antivirus', 'Antivirus'), ('webfilter', 'Web Filter'), ('app-control', 'App Control')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='severity',
+            field=models.CharField(choices=[('critical', 'Crítico'), ('high', 'Alto'), ('medium', 'Médio'), ('low', 'Baixo'), ('info', 'Informativo')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='securityevent',
+            name='username',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='antivirusdetail',
+            index=models.Index(fields=['date', 'virus_name'], name='security_ev_date_45f253_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appcontroldetail',
+            index=models.Index(fields=['date', 'app_name'], name='security_ev_date_89150f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appcontroldetail',
+            index=models.Index(fields=['date', 'app_category'], name='security_ev_date_43f611_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ipsdetail',
+            index=models.Index(fields=['date', 'attack_name'], name='security_ev_date_5a62cb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webfilterdetail',
+            index=models.Index(fields=['date', 'category'], name='security_ev_date_fe949e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webfilterdetail',
+            index=models.Index(fields=['date', 'hostname'], name='security_ev_date_0f705a_idx'),
+        ),
+    ]
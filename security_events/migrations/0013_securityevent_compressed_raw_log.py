@@ -0,0 +1,35 @@
+# Generated by Django on 2026-10-18
+
+import integrations.payloads
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    raw_log passa a ser comprimido (coluna raw_log_z). A coluna de texto antiga continua como
+    raw_log_legacy, anulável, e é esvaziada em blocos por python manage.py compress_payloads —
+    nada de reescrever a tabela inteira dentro da migration.
+    """
+
+    dependencies = [
+        ('integrations', '0016_payloaddictionary'),
+        ('security_events', '0012_slim_securityevent_detail_tables'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='securityevent',
+            name='raw_log',
+            field=models.TextField(blank=True, db_column='raw_log', editable=False, null=True),
+        ),
+        migrations.RenameField(
+            model_name='securityevent',
+            old_name='raw_log',
+            new_name='raw_log_legacy',
+        ),
+        migrations.AddField(
+            model_name='securityevent',
+            name='raw_log',
+            field=integrations.payloads.CompressedTextField(db_column='raw_log_z', legacy_field='raw_log_legacy', null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations
+
+
+def refingerprint_overlap(apps, schema_editor):
+    from security_events.fingerprint import overlap_windows, refingerprint_events
+    from security_events.models import DETAIL_MODELS
+
+    windows = overlap_windows(watermark_model=apps.get_model('integrations', 'CollectionWatermark'))
+    if not windows:
+        return
+    refingerprint_events(
+        windows, using=schema_editor.connection.alias,
+        event_model=apps.get_model('security_events', 'SecurityEvent'),
+        detail_models={
+            event_type: apps.get_model('security_events', model.__name__)
+            for event_type, model in DETAIL_MODELS.items()
+        },
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Eventos gravados com o event_id antigo (md5 do log) dentro da sobreposição que a próxima
+    coleta relê passam para o formato atual (security_events.fingerprint), para que não sejam
+    inseridos de novo. Fora da sobreposição: python manage.py refingerprint_events --hours N.
+    """
+    atomic = False
+
+    dependencies = [
+        ('integrations', '0016_payloaddictionary'),
+        ('security_events', '0013_securityevent_compressed_raw_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(refingerprint_overlap, migrations.RunPython.noop),
+    ]
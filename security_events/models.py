@@ -1,18 +1,98 @@
 """Security Events Models"""
-from django.db import models
+from collections import defaultdict
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from integrations.payloads import CompressedTextField, PayloadManager, PayloadQuerySet
+
+
+# Tabelas de detalhe por tipo de evento ({event_type: model}), preenchido no fim do módulo
+DETAIL_MODELS = {}
+
+
+def detail_field(name):
+    """
+    Campo específico de um tipo (attack_name, url, ...) que saiu de SecurityEvent para a
+    tabela de detalhe do tipo. Lido/gravado na linha de detalhe do evento, com o valor
+    padrão do campo nos tipos que não o têm.
+    """
+    def getter(event):
+        detail = event.get_detail()
+        if detail is None or name not in detail.FIELDS:
+            return _detail_default(name)
+        return getattr(detail, name)
+
+    def setter(event, value):
+        detail = event.get_detail(create=True)
+        if detail is not None and name in detail.FIELDS:
+            setattr(detail, name, value)
+
+    return property(getter, setter)
+
+
+def _detail_default(name):
+    for model in DETAIL_MODELS.values():
+        if name in model.FIELDS:
+            return model._meta.get_field(name).get_default()
+    return None
+
+
+class SecurityEventQuerySet(PayloadQuerySet):
+
+    def with_details(self, *event_types):
+        """
+        Camada de compatibilidade com o layout antigo (uma tabela larga): anota os campos
+        das tabelas de detalhe com os nomes de antes (attack_name, url, category, ...), que
+        voltam a valer em filter(), values(), order_by() e nas instâncias.
+        Um LEFT JOIN por tabela de detalhe dos tipos pedidos (sem tipos: todas).
+        """
+        paths = defaultdict(list)
+        for event_type, model in DETAIL_MODELS.items():
+            if event_types and event_type not in event_types:
+                continue
+            for name in model.FIELDS:
+                paths[name].append(F(f"{model._meta.model_name}__{name}"))
+        return self.annotate(**{
+            name: refs[0] if len(refs) == 1 else Coalesce(*refs)
+            for name, refs in paths.items()
+        })
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False, **kwargs):
+        """bulk_create que grava também as linhas de detalhe dos eventos, na mesma transação."""
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = super().bulk_create(objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts, **kwargs)
+            details = defaultdict(list)
+            for event in objs:
+                detail = event.get_detail(create=True)
+                if detail is not None:
+                    detail.event_id, detail.date = event.event_id, event.date
+                    details[type(detail)].append(detail)
+            for model, rows in details.items():
+                model.objects.using(self.db).bulk_create(rows, batch_size=batch_size, ignore_conflicts=ignore_conflicts)
+        return created
 
 
 class SecurityEvent(models.Model):
-    """Model for security events from FortiAnalyzer"""
-    
+    """
+    Model for security events from FortiAnalyzer
+
+    Tabela "quente" e estreita: só os campos comuns a todos os tipos (tipo, severidade,
+    instante, origem/destino, usuário). Os campos de cada tipo ficam em IPSDetail,
+    AntivirusDetail, WebFilterDetail e AppControlDetail (uma linha por evento, ligada pelo
+    event_id), cada uma com os índices que o seu dashboard usa. Os nomes antigos continuam
+    disponíveis como propriedades (event.attack_name) e, nas consultas, via
+    SecurityEvent.objects.with_details().
+    """
+
     EVENT_TYPES = [
         ('ips', 'IPS'),
         ('antivirus', 'Antivirus'),
         ('webfilter', 'Web Filter'),
         ('app-control', 'App Control'),
     ]
-    
+
     SEVERITY_LEVELS = [
         ('critical', 'Crítico'),
         ('high', 'Alto'),
@@ -20,93 +100,78 @@ class SecurityEvent(models.Model):
         ('low', 'Baixo'),
         ('info', 'Informativo'),
     ]
-    
+
     # Identificação
     event_id = models.CharField(max_length=100, unique=True, db_index=True)
-    event_type = models.CharField(max_length=20, choices=EVENT_TYPES, db_index=True)
-    severity = models.CharField(max_length=20, choices=SEVERITY_LEVELS, db_index=True)
-    
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    severity = models.CharField(max_length=20, choices=SEVERITY_LEVELS)
+
     # Temporal
     timestamp = models.DateTimeField(db_index=True)
     date = models.DateField(db_index=True)
-    
+
     # Origem e Destino
     src_ip = models.GenericIPAddressField()
     dst_ip = models.GenericIPAddressField()
     src_port = models.IntegerField(null=True, blank=True)
     dst_port = models.IntegerField(null=True, blank=True)
-    
+
     # Geolocalização
     src_country = models.CharField(max_length=100, blank=True)
     dst_country = models.CharField(max_length=100, blank=True)
-    
+
     # Usuário
-    username = models.CharField(max_length=255, blank=True, db_index=True)
+    username = models.CharField(max_length=255, blank=True)
     user_email = models.EmailField(blank=True)
     user_department = models.CharField(max_length=255, blank=True)
     ad_title = models.CharField(max_length=255, blank=True, verbose_name="Cargo (AD)")
     ad_display_name = models.CharField(max_length=255, blank=True, verbose_name="Nome de Exibição (AD)")
-    
-    # IPS Específico
-    attack_name = models.CharField(max_length=500, blank=True)
-    attack_id = models.CharField(max_length=100, blank=True)
-    cve = models.CharField(max_length=100, blank=True)
-    
-    # Antivirus Específico
-    virus_name = models.CharField(max_length=500, blank=True)
-    file_name = models.CharField(max_length=500, blank=True)
-    file_hash = models.CharField(max_length=128, blank=True)
-    
-    # Web Filter Específico
-    url = models.TextField(blank=True)
-    hostname = models.CharField(max_length=255, blank=True, db_index=True)
-    category = models.CharField(max_length=255, blank=True)
+
     action = models.CharField(max_length=50)  # blocked, allowed, monitored
-    
-    # App Control Específico
-    app_name = models.CharField(max_length=255, blank=True)
-    app_category = models.CharField(max_length=255, blank=True)
-    app_risk = models.CharField(max_length=50, blank=True)
-    bytes_in = models.BigIntegerField(null=True, blank=True)
-    bytes_out = models.BigIntegerField(null=True, blank=True)
-    
-    # Metadados
-    raw_log = models.TextField()
+
+    # Metadados: log bruto comprimido (integrations.payloads), fora das listagens por padrão;
+    # raw_log_legacy é a coluna de texto antiga, lida até compress_payloads reescrever a linha
+    raw_log = CompressedTextField(db_column='raw_log_z', null=True, legacy_field='raw_log_legacy')
+    raw_log_legacy = models.TextField(db_column='raw_log', null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
+    # Campos por tipo (tabelas de detalhe), com os nomes do layout antigo
+    attack_name = detail_field('attack_name')
+    attack_id = detail_field('attack_id')
+    cve = detail_field('cve')
+    virus_name = detail_field('virus_name')
+    file_name = detail_field('file_name')
+    file_hash = detail_field('file_hash')
+    url = detail_field('url')
+    hostname = detail_field('hostname')
+    category = detail_field('category')
+    app_name = detail_field('app_name')
+    app_category = detail_field('app_category')
+    app_risk = detail_field('app_risk')
+    bytes_in = detail_field('bytes_in')
+    bytes_out = detail_field('bytes_out')
+
+    objects = PayloadManager.from_queryset(SecurityEventQuerySet)()
+
     class Meta:
         ordering = ['-timestamp']
         indexes = [
+            models.Index(fields=['event_type', '-timestamp']),
             models.Index(fields=['event_type', 'date', 'severity']),
             models.Index(fields=['event_type', 'date', 'action']),
-            models.Index(fields=['event_type', 'date', 'app_category']),
             models.Index(fields=['event_type', 'date', 'username']),
             models.Index(fields=['username', 'date']),
-            models.Index(fields=['-timestamp']),
-            models.Index(fields=['event_type', 'date', 'attack_name']),
-            models.Index(fields=['event_type', 'date', 'virus_name']),
-            models.Index(fields=['event_type', 'date', 'hostname']),
-            models.Index(fields=['event_type', 'date', 'category']),
             models.Index(fields=['event_type', 'date', 'src_ip']),
             models.Index(fields=['event_type', 'date', 'dst_ip']),
-            models.Index(fields=['event_type', 'date', 'app_name']),
-            models.Index(fields=['event_type', 'date', 'app_risk']),
-            models.Index(fields=['event_type', '-timestamp']),
-            
-            # Novos índices focados em Busch Livre (Full Search Options)
             models.Index(fields=['event_type', 'date', 'src_country']),
-            models.Index(fields=['event_type', 'date', 'cve']),
-            models.Index(fields=['event_type', 'date', 'file_name']),
-            models.Index(fields=['event_type', 'date', 'file_hash']),
-            models.Index(fields=['event_type', 'date', 'ad_display_name']),
             models.Index(fields=['event_type', 'date', 'user_department']),
         ]
         verbose_name = 'Evento de Segurança'
         verbose_name_plural = 'Eventos de Segurança'
-    
+
     def __str__(self):
         return f"{self.get_event_type_display()} - {self.severity} - {self.timestamp}"
-    
+
     def get_severity_color(self):
         """Return color class for severity level"""
         colors = {
@@ -118,6 +183,137 @@ class SecurityEvent(models.Model):
         }
         return colors.get(self.severity, 'secondary')
 
+    def get_detail(self, create=False):
+        """
+        Linha de detalhe do tipo do evento (None para tipos sem detalhe). Vem do cache
+        (select_related, with_details ou atribuição anterior), do banco (uma consulta) ou,
+        em eventos novos e com create=True, é criada sem salvar.
+        """
+        model = DETAIL_MODELS.get(self.event_type)
+        if model is None:
+            return None
+        related = model._meta.get_field('event').remote_field
+        detail = related.get_cached_value(self, default=None)
+        if detail is None and not related.is_cached(self) and not (create or self._state.adding):
+            detail = model.objects.filter(event_id=self.event_id).first()
+            related.set_cached_value(self, detail)
+        if detail is None and (create or self._state.adding):
+            detail = model(event_id=self.event_id, date=self.date)
+            related.set_cached_value(self, detail)
+        return detail
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        # Evento novo sempre leva a sua linha de detalhe; um existente, só a que foi carregada
+        detail = None
+        if adding:
+            detail = self.get_detail()
+        elif kwargs.get('update_fields') is None and self.event_type in DETAIL_MODELS:
+            related = DETAIL_MODELS[self.event_type]._meta.get_field('event').remote_field
+            detail = related.get_cached_value(self, default=None)
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+            if detail is not None:
+                detail.event_id, detail.date = self.event_id, self.date
+                detail.save(using=kwargs.get('using'), force_insert=adding)
+
+
+class SecurityEventDetail(models.Model):
+    """
+    Campos específicos de um tipo de evento, uma linha por SecurityEvent. A ligação é pelo
+    event_id (sem FK no banco: com a tabela de eventos particionada o event_id só é único
+    junto com a data). A data repete a do evento para o particionamento e a retenção.
+    """
+    EVENT_TYPE = None
+    FIELDS = ()
+
+    event = models.OneToOneField(
+        SecurityEvent, to_field='event_id', db_column='event_id', primary_key=True,
+        on_delete=models.CASCADE, db_constraint=False, related_name='%(class)s',
+    )
+    date = models.DateField()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.EVENT_TYPE} {self.event_id}"
+
+
+class IPSDetail(SecurityEventDetail):
+    EVENT_TYPE = 'ips'
+    FIELDS = ('attack_name', 'attack_id', 'cve', 'url')
+
+    attack_name = models.CharField(max_length=500, blank=True)
+    attack_id = models.CharField(max_length=100, blank=True)
+    cve = models.CharField(max_length=100, blank=True)
+    url = models.TextField(blank=True)  # descrição dos alertas de força bruta (vpn_logs.bruteforce)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'attack_name']),
+        ]
+        verbose_name = 'Detalhe IPS'
+        verbose_name_plural = 'Detalhes IPS'
+
+
+class AntivirusDetail(SecurityEventDetail):
+    EVENT_TYPE = 'antivirus'
+    FIELDS = ('virus_name', 'file_name', 'file_hash')
+
+    virus_name = models.CharField(max_length=500, blank=True)
+    file_name = models.CharField(max_length=500, blank=True)
+    file_hash = models.CharField(max_length=128, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'virus_name']),
+        ]
+        verbose_name = 'Detalhe Antivirus'
+        verbose_name_plural = 'Detalhes Antivirus'
+
+
+class WebFilterDetail(SecurityEventDetail):
+    EVENT_TYPE = 'webfilter'
+    FIELDS = ('url', 'hostname', 'category', 'bytes_in', 'bytes_out')
+
+    url = models.TextField(blank=True)
+    hostname = models.CharField(max_length=255, blank=True)
+    category = models.CharField(max_length=255, blank=True)
+    bytes_in = models.BigIntegerField(null=True, blank=True)
+    bytes_out = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'category']),
+            models.Index(fields=['date', 'hostname']),
+        ]
+        verbose_name = 'Detalhe Web Filter'
+        verbose_name_plural = 'Detalhes Web Filter'
+
+
+class AppControlDetail(SecurityEventDetail):
+    EVENT_TYPE = 'app-control'
+    FIELDS = ('app_name', 'app_category', 'app_risk', 'url', 'bytes_in', 'bytes_out')
+
+    app_name = models.CharField(max_length=255, blank=True)
+    app_category = models.CharField(max_length=255, blank=True)
+    app_risk = models.CharField(max_length=50, blank=True)
+    url = models.TextField(blank=True)
+    bytes_in = models.BigIntegerField(null=True, blank=True)
+    bytes_out = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'app_name']),
+            models.Index(fields=['date', 'app_category']),
+        ]
+        verbose_name = 'Detalhe App Control'
+        verbose_name_plural = 'Detalhes App Control'
+
+
+DETAIL_MODELS.update({model.EVENT_TYPE: model for model in (IPSDetail, AntivirusDetail, WebFilterDetail, AppControlDetail)})
+
 
 class ADAuthEvent(models.Model):
     """Model for Active Directory Authentication Events (Logon/Logoff/Lockout)"""
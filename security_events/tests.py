@@ -1,3 +1,568 @@
-from django.test import TestCase
+import collections
+import datetime
+import gzip
+import io
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from integrations.models import CollectionWatermark
+from integrations.normalizer import FA_CLOCK_SKEW
+from integrations.models import FortiAnalyzerConfig
+from integrations.tests import FakeFAClient, fa_log
+from security_events import ad_ingest, fingerprint as fingerprint_module, tasks
+from security_events.fingerprint import fingerprint, legacy_fingerprint, overlap_windows, refingerprint_events
+from security_events.ingest import build_security_event
+from security_events.models import ADAuthEvent, AntivirusDetail, AppControlDetail, IPSDetail, SecurityEvent, WebFilterDetail
+from vpn_dashboard.celery import app as celery_app
+from vpn_logs.tests import StaticADClient
+
+
+def ips_log(minute, attack='HTTP.URI.SQL.Injection', sessionid='9001'):
+    """Log IPS do FA às 10:minute (relógio do FA)."""
+    return {
+        'logid': '0419016384', 'devid': 'FG100F0000000001', 'vd': 'root', 'date': '2026-03-10',
+        'time': f'10:{minute:02d}:00', 'sessionid': sessionid, 'srcip': '203.0.113.5', 'srcport': '51000',
+        'dstip': '10.0.0.8', 'dstport': '443', 'proto': '6', 'attack': attack, 'attackid': '15621',
+        'severity': 'high', 'action': 'dropped', 'itime': str(1773147600 + minute * 60),
+    }
+
+
+class RefingerprintTests(TestCase):
+    """Eventos gravados com o md5 antigo na sobreposição relida pela primeira coleta."""
+
+    def store(self, log, event_id):
+        event = build_security_event(log, 'ips', event_id=event_id)
+        event.save()
+        return event
+
+    def setUp(self):
+        self.old = [ips_log(minute, sessionid=str(9000 + minute)) for minute in (1, 50, 55)]
+        for log in self.old:
+            self.store(log, legacy_fingerprint(log))
+        # Já recoletado com o ID novo antes da correção (duplicata)
+        self.store(self.old[2], fingerprint(self.old[2], 'ips'))
+        # Alerta de força bruta: uuid e log que não é JSON
+        SecurityEvent.objects.create(
+            event_id='alert-1', event_type='ips', timestamp=timezone.now(), date=timezone.now().date(),
+            src_ip='203.0.113.5', dst_ip='0.0.0.0', raw_log="{'user': 'ana'}",
+        )
+        CollectionWatermark.objects.create(
+            log_type='ips', subtype='ips', adom='root',
+            last_timestamp=timezone.make_aware(datetime.datetime(2026, 3, 10, 10, 58)),
+        )
+
+    def test_overlap_window_follows_watermark(self):
+        windows = overlap_windows(overlap=datetime.timedelta(minutes=10))
+        self.assertEqual(windows, {'ips': timezone.make_aware(datetime.datetime(2026, 3, 10, 10, 48)) - FA_CLOCK_SKEW})
+
+    def test_overlap_rows_get_the_current_id(self):
+        stats = refingerprint_events(overlap_windows(overlap=datetime.timedelta(minutes=10)))
+        self.assertEqual((stats['renamed'], stats['merged']), (1, 1))
+
+        ids = set(SecurityEvent.objects.values_list('event_id', flat=True))
+        self.assertEqual(ids, {
+            legacy_fingerprint(self.old[0]),  # fora da sobreposição: mantém o ID
+            fingerprint(self.old[1], 'ips'),
+            fingerprint(self.old[2], 'ips'),
+            'alert-1',
+        })
+        # O detalhe acompanha o evento renomeado; o da cópia removida vai junto
+        self.assertEqual(IPSDetail.objects.get(event_id=fingerprint(self.old[1], 'ips')).attack_name, 'HTTP.URI.SQL.Injection')
+        self.assertEqual(set(IPSDetail.objects.values_list('event_id', flat=True)), ids)
+
+        # Segunda passada não muda nada
+        self.assertEqual(refingerprint_events(overlap_windows()), {'checked': 3, 'renamed': 0, 'merged': 0})
+
+    def test_command_with_hours_covers_every_type(self):
+        call_command('refingerprint_events', hours=24 * 365 * 5, stdout=open('/dev/null', 'w'))
+        self.assertFalse(SecurityEvent.objects.filter(event_id=legacy_fingerprint(self.old[0])).exists())
+        self.assertTrue(SecurityEvent.objects.filter(event_id=fingerprint(self.old[0], 'ips')).exists())
+
+
+class EventListAPITests(TestCase):
+    """A lista não lê o raw_log; o retrieve de um evento traz o details."""
+
+    def setUp(self):
+        patcher = mock.patch('setup.middleware.is_setup_complete', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.event = build_security_event(ips_log(5), 'ips', event_id='ips-1')
+        self.event.raw_log = json.dumps(dict(ips_log(5), msg='web_misc%3A%20SQL', policyid='7'))
+        self.event.save()
+
+    def test_list_skips_the_payload(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/security-events/ips/', {'start_date': '2026-03-10'})
+        self.assertEqual(response.status_code, 200)
+        row, = response.json()['results']
+        self.assertEqual(row['attack_name'], 'HTTP.URI.SQL.Injection')
+        self.assertNotIn('details', row)
+        self.assertFalse(any('raw_log' in query['sql'] for query in queries))
+
+    def test_retrieve_has_details(self):
+        response = self.client.get(f'/api/security-events/ips/{self.event.pk}/')
+        self.assertEqual(response.status_code, 200)
+        details = response.json()['details']
+        self.assertEqual((details['msg'], details['policyid']), ('web_misc: SQL', '7'))
+        self.assertEqual(self.client.get(f'/api/security-events/antivirus/{self.event.pk}/').status_code, 404)
+
+
+# Um evento de cada tipo com os campos específicos no layout antigo (tabela larga)
+TYPED_FIELDS = {
+    'ips': {'attack_name': 'SQL.Injection', 'attack_id': '15621', 'cve': 'CVE-2024-0001', 'url': '/login'},
+    'antivirus': {'virus_name': 'EICAR_TEST_FILE', 'file_name': 'eicar.com', 'file_hash': 'abc123'},
+    'webfilter': {'url': '/jogo', 'hostname': 'games.example', 'category': 'Games', 'bytes_in': 100, 'bytes_out': 20},
+    'app-control': {'app_name': 'BitTorrent', 'app_category': 'P2P', 'app_risk': 'high', 'url': '/announce', 'bytes_in': 5, 'bytes_out': 7},
+}
+DETAIL_OF = {'ips': IPSDetail, 'antivirus': AntivirusDetail, 'webfilter': WebFilterDetail, 'app-control': AppControlDetail}
+API_ROUTES = {'ips': 'ips', 'antivirus': 'antivirus', 'webfilter': 'webfilter', 'app-control': 'app-control'}
+
+
+def common_fields(event_type, prefix):
+    moment = timezone.make_aware(datetime.datetime(2026, 3, 10, 9, 30))
+    return {
+        'event_id': f'{prefix}-{event_type}', 'event_type': event_type, 'severity': 'high', 'timestamp': moment,
+        'date': moment.date(), 'src_ip': '203.0.113.5', 'dst_ip': '10.0.0.8', 'username': 'ana', 'action': 'blocked',
+    }
+
+
+class DetailTableTests(TestCase):
+    """Campos por tipo nas tabelas de detalhe, com o acesso pelos nomes do layout antigo."""
+
+    def setUp(self):
+        patcher = mock.patch('setup.middleware.is_setup_complete', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_all(self):
+        # Construtor antigo (campos do tipo como kwargs) e bulk_create dos coletores
+        for event_type, fields in TYPED_FIELDS.items():
+            SecurityEvent(**common_fields(event_type, 'one'), **fields).save()
+        SecurityEvent.objects.bulk_create([
+            SecurityEvent(**common_fields(event_type, 'bulk'), **fields) for event_type, fields in TYPED_FIELDS.items()
+        ])
+
+    def test_each_type_writes_its_own_detail_row(self):
+        self.create_all()
+        for event_type, fields in TYPED_FIELDS.items():
+            model = DETAIL_OF[event_type]
+            self.assertEqual(sorted(model.objects.values_list('event_id', flat=True)), [f'bulk-{event_type}', f'one-{event_type}'])
+            for prefix in ('one', 'bulk'):
+                detail = model.objects.get(event_id=f'{prefix}-{event_type}')
+                self.assertEqual({name: getattr(detail, name) for name in fields}, fields)
+                self.assertEqual(detail.date, datetime.date(2026, 3, 10))
+
+    def test_properties_read_and_write_the_detail(self):
+        self.create_all()
+        event = SecurityEvent.objects.get(event_id='one-antivirus')
+        with self.assertNumQueries(1):
+            self.assertEqual((event.virus_name, event.file_name), ('EICAR_TEST_FILE', 'eicar.com'))
+        # Campo de outro tipo: o valor padrão, sem consulta
+        with self.assertNumQueries(0):
+            self.assertEqual(event.attack_name, '')
+            self.assertIsNone(event.bytes_in)
+
+        event.virus_name = 'Trojan.Generic'
+        event.attack_name = 'ignorado'
+        event.save()
+        self.assertEqual(AntivirusDetail.objects.get(event_id='one-antivirus').virus_name, 'Trojan.Generic')
+        self.assertFalse(IPSDetail.objects.filter(event_id='one-antivirus').exists())
+
+        # Remover o evento leva a linha de detalhe junto
+        SecurityEvent.objects.filter(event_id='one-antivirus').delete()
+        self.assertFalse(AntivirusDetail.objects.filter(event_id='one-antivirus').exists())
+
+    def test_with_details_exposes_the_old_names(self):
+        self.create_all()
+        for event_type, fields in TYPED_FIELDS.items():
+            queryset = SecurityEvent.objects.with_details(event_type).filter(event_type=event_type)
+            rows = list(queryset.values('event_id', *fields).order_by('event_id'))
+            self.assertEqual(rows, [dict(fields, event_id=f'{prefix}-{event_type}') for prefix in ('bulk', 'one')])
+            name, value = next(iter(fields.items()))
+            self.assertEqual(queryset.filter(**{name: value}).count(), 2)
+            with self.assertNumQueries(1):
+                events = list(queryset)
+                self.assertEqual([getattr(event, name) for event in events], [value, value])
+
+        # Sem tipos: todas as tabelas; url vem de IPS, Web Filter ou App Control
+        urls = dict(SecurityEvent.objects.with_details().filter(event_id__startswith='one-').values_list('event_type', 'url'))
+        self.assertEqual(urls, {'ips': '/login', 'antivirus': None, 'webfilter': '/jogo', 'app-control': '/announce'})
+
+    def test_api_lists_serve_the_type_fields(self):
+        self.create_all()
+        for event_type, fields in TYPED_FIELDS.items():
+            response = self.client.get(f'/api/security-events/{API_ROUTES[event_type]}/', {'start_date': '2026-03-10', 'end_date': '2026-03-10'})
+            self.assertEqual(response.status_code, 200)
+            results = response.json()['results']
+            self.assertEqual(sorted(row['id'] for row in results), sorted(
+                SecurityEvent.objects.filter(event_type=event_type).values_list('id', flat=True)
+            ))
+            # hostname não faz parte do serializer
+            expected = {name: value for name, value in fields.items() if name != 'hostname'}
+            for row in results:
+                self.assertEqual({name: row[name] for name in expected}, expected)
+
+        response = self.client.get('/api/security-events/webfilter/', {'category': 'Games', 'start_date': '2026-03-10'})
+        self.assertEqual(response.json()['count'], 2)
+        response = self.client.get('/api/security-events/app-control/', {'app_risk': 'low', 'start_date': '2026-03-10'})
+        self.assertEqual(response.json()['count'], 0)
+
+
+class DetailTablesMigrationTests(TransactionTestCase):
+    """0012 copia os campos de cada tipo da tabela larga para as tabelas de detalhe."""
+
+    before = [('security_events', '0011_adauthevent_security_ev_timesta_51b933_idx_and_more')]
+    after = [('security_events', '0012_slim_securityevent_detail_tables')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_per_type_data_survives_the_copy(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldEvent = executor.loader.project_state(self.before).apps.get_model('security_events', 'SecurityEvent')
+        for event_type, fields in TYPED_FIELDS.items():
+            OldEvent.objects.create(**common_fields(event_type, 'old'), **fields)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        for event_type, fields in TYPED_FIELDS.items():
+            detail = apps.get_model('security_events', DETAIL_OF[event_type].__name__).objects.get(event_id=f'old-{event_type}')
+            self.assertEqual({name: getattr(detail, name) for name in fields}, fields)
+            self.assertEqual(detail.date, datetime.date(2026, 3, 10))
+        self.assertEqual(apps.get_model('security_events', 'IPSDetail').objects.count(), 1)
+
+        # E de volta: o reverse_sql devolve os valores à tabela larga
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldEvent = executor.loader.project_state(self.before).apps.get_model('security_events', 'SecurityEvent')
+        for event_type, fields in TYPED_FIELDS.items():
+            self.assertEqual(OldEvent.objects.filter(event_id=f'old-{event_type}').values(*fields).get(), fields)
+
+
+def ad_row(n, **fields):
+    row = {'username': f'user{n}', 'status': 'failed', 'event_id': 4625,
+           'timestamp': '2026-03-10T10:00:00-03:00', 'src_ip': '10.0.0.%d' % (n % 250 + 1), 'workstation': 'PC01'}
+    row.update(fields)
+    return row
+
+
+def ndjson(rows):
+    return b''.join(json.dumps(row).encode() + b'\n' for row in rows)
+
+
+class ADIngestTests(TestCase):
+    """Leitura do corpo (compressão, limites, NDJSON/JSON) e validação das linhas."""
+
+    def test_decompress(self):
+        body = ndjson([ad_row(1), ad_row(2)])
+        self.assertEqual(ad_ingest.decompress(io.BytesIO(body), ''), body)
+        self.assertEqual(ad_ingest.decompress(io.BytesIO(gzip.compress(body)), 'gzip'), body)
+        if ad_ingest.zstandard is not None:
+            compressed = ad_ingest.zstandard.ZstdCompressor().compress(body)
+            self.assertEqual(ad_ingest.decompress(io.BytesIO(compressed), 'zstd'), body)
+
+        with self.assertRaises(ad_ingest.PayloadError) as error:
+            ad_ingest.decompress(io.BytesIO(body), 'br')
+        self.assertEqual(error.exception.status, 415)
+        with self.assertRaises(ad_ingest.PayloadError) as error:
+            ad_ingest.decompress(io.BytesIO(b'nao e gzip'), 'gzip')
+        self.assertEqual(error.exception.status, 400)
+
+    @override_settings(AD_INGEST_MAX_BYTES=1000)
+    def test_decompressed_size_is_capped(self):
+        # Cabe comprimido, estoura descomprimido
+        bomb = gzip.compress(b' ' * 5000)
+        self.assertLess(len(bomb), 1000)
+        with self.assertRaises(ad_ingest.PayloadError) as error:
+            ad_ingest.decompress(io.BytesIO(bomb), 'gzip')
+        self.assertEqual(error.exception.status, 413)
+        self.assertEqual(len(ad_ingest.decompress(io.BytesIO(b' ' * 1000), '')), 1000)
+
+    def test_iter_items(self):
+        body = b'{"a": 1}\n\n{quebrado\n\x1e{"a": 2}\r\n'
+        self.assertEqual(list(ad_ingest.iter_items(body, 'application/x-ndjson; charset=utf-8')), [{'a': 1}, None, {'a': 2}])
+        self.assertEqual(list(ad_ingest.iter_items(b'[{"a": 1}, {"a": 2}]', 'application/json')), [{'a': 1}, {'a': 2}])
+        self.assertEqual(list(ad_ingest.iter_items(b'{"a": 1}', 'application/json')), [{'a': 1}])
+        self.assertEqual(list(ad_ingest.iter_items(b'', 'application/json')), [])
+        with self.assertRaises(ad_ingest.PayloadError):
+            list(ad_ingest.iter_items(b'[{"a": 1}', 'application/json'))
+
+    def test_bad_ndjson_lines_are_reported_by_line_number(self):
+        body = ndjson([ad_row(1)]) + b'{quebrado\n' + ndjson([ad_row(2, status='talvez'), ad_row(3)])
+        result = ad_ingest.ingest_payload(body, 'application/x-ndjson')
+        self.assertEqual((result['received'], result['created'], result['rejected']), (4, 2, 2))
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3])
+        self.assertEqual(result['errors'][0]['error'], 'objeto JSON esperado')
+        self.assertEqual(set(ADAuthEvent.objects.values_list('username', flat=True)), {'user1', 'user3'})
+
+    def test_clean_row(self):
+        event = ad_ingest.clean_row(ad_row(1, timestamp='2026-03-10T10:00:00', event_id='4625', src_ip=' 10.0.0.9 ',
+                                           id=99, extra='ignorado', message=None, ad_title=7))
+        self.assertEqual((event.username, event.event_id, event.src_ip, event.message, event.ad_title), ('user1', 4625, '10.0.0.9', '', '7'))
+        self.assertIsNone(event.pk)
+        self.assertTrue(timezone.is_aware(event.timestamp))
+        self.assertIsNone(ad_ingest.clean_row(ad_row(1, src_ip='')).src_ip)
+
+        invalid = {
+            'username': ad_row(1, username='  '),
+            'status': ad_row(1, status='ok'),
+            'event_id': ad_row(1, event_id='x'),
+            'timestamp': ad_row(1, timestamp='ontem'),
+            'src_ip': ad_row(1, src_ip='10.0.0.300'),
+            'workstation': ad_row(1, workstation='x' * 1000),
+        }
+        for field, row in invalid.items():
+            with self.subTest(field=field), self.assertRaisesRegex(ValueError, field):
+                ad_ingest.clean_row(row)
+        with self.assertRaises(ValueError):
+            ad_ingest.clean_row(['lista'])
+
+    @override_settings(AD_INGEST_CHUNK=2)
+    def test_bulk_ingestor_writes_in_chunks(self):
+        ingestor = ad_ingest.ADAuthBulkIngestor()
+        with self.assertNumQueries(3):
+            ingestor.ingest([ad_row(n) for n in range(5)])
+        self.assertEqual(ingestor.result(), {'received': 5, 'created': 5, 'rejected': 0, 'chunks': 3, 'errors': []})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ADIngestAPITests(TestCase):
+    """POST /api/security-events/ad-auth/ingest/ com corpos comprimidos e o modo assíncrono."""
+
+    url = '/api/security-events/ad-auth/ingest/'
+
+    def setUp(self):
+        patcher = mock.patch('setup.middleware.is_setup_complete', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body, encoding='', content_type='application/x-ndjson', **extra):
+        if encoding:
+            extra['HTTP_CONTENT_ENCODING'] = encoding
+        return self.client.post(self.url, data=body, content_type=content_type, **extra)
+
+    def test_gzip_ndjson(self):
+        response = self.post(gzip.compress(ndjson([ad_row(n) for n in range(3)]) + b'{quebrado\n'), 'gzip')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data['status'], data['created'], data['rejected']), ('Success', 3, 1))
+        self.assertEqual(data['errors'], [{'line': 4, 'error': 'objeto JSON esperado'}])
+        self.assertEqual(ADAuthEvent.objects.count(), 3)
+
+    def test_zstd_json_array(self):
+        if ad_ingest.zstandard is None:
+            self.skipTest('zstandard não instalado')
+        body = ad_ingest.zstandard.ZstdCompressor().compress(json.dumps([ad_row(1), ad_row(2)]).encode())
+        response = self.post(body, 'zstd', content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['created']), (201, 2))
+
+    def test_plain_json_still_goes_through_drf_parsers(self):
+        response = self.client.post(self.url, data=ad_row(1), content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['created']), (201, 1))
+
+    def test_payload_errors(self):
+        response = self.post(ndjson([ad_row(1)]), 'br')
+        self.assertEqual((response.status_code, response.json()['status']), (415, 'Error'))
+        with override_settings(AD_INGEST_MAX_BYTES=1000):
+            self.assertEqual(self.post(gzip.compress(ndjson([ad_row(n) for n in range(50)])), 'gzip').status_code, 413)
+            self.assertEqual(self.post(gzip.compress(ndjson([ad_row(1)])), 'br', QUERY_STRING='async=1').status_code, 415)
+        self.assertFalse(ADAuthEvent.objects.exists())
+
+    def test_async_returns_batch_id_and_status(self):
+        body = gzip.compress(ndjson([ad_row(n) for n in range(4)]) + b'[]\n')
+        with mock.patch('security_events.tasks.ingest_ad_auth_events_task.delay') as delay:
+            response = self.client.post(self.url + '?async=1', data=body, content_type='application/x-ndjson',
+                                        HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 202)
+        batch_id = response.json()['batch_id']
+        delay.assert_called_once_with(batch_id)
+        self.assertFalse(ADAuthEvent.objects.exists())
+
+        status_url = f'{self.url}{batch_id}/'
+        self.assertEqual(self.client.get(status_url).json(), {'state': 'queued', 'bytes': len(body), 'batch_id': batch_id})
+
+        # Mesmo caminho do worker, executado aqui
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        from security_events.tasks import ingest_ad_auth_events_task
+        ingest_ad_auth_events_task.delay(batch_id)
+
+        status = self.client.get(status_url).json()
+        self.assertEqual((status['state'], status['created'], status['rejected']), ('done', 4, 1))
+        self.assertEqual(status['errors'], [{'line': 5, 'error': 'objeto JSON esperado'}])
+        self.assertEqual(ADAuthEvent.objects.count(), 4)
+
+        # O corpo sai do cache depois de gravado: reprocessar falha em vez de duplicar
+        self.assertEqual(ad_ingest.process_queued_payload(batch_id)['state'], 'failed')
+        self.assertEqual(ADAuthEvent.objects.count(), 4)
+
+    def test_prefer_respond_async_and_unknown_batch(self):
+        with mock.patch('security_events.tasks.ingest_ad_auth_events_task.delay'):
+            response = self.post(ndjson([ad_row(1)]), HTTP_PREFER='respond-async')
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(f'{self.url}{"0" * 32}/')
+        self.assertEqual((response.status_code, response.json()['state']), (404, 'unknown'))
+
+
+# Campos de cada logtype consultado pelos subtipos (SUBTYPES)
+SUBTYPE_FIELDS = {
+    'ips': {'type': 'utm', 'subtype': 'ips', 'attack': 'SQL.Injection', 'attackid': '15621', 'action': 'dropped'},
+    'virus': {'type': 'utm', 'subtype': 'virus', 'virus': 'EICAR_TEST_FILE', 'filename': 'eicar.com', 'action': 'blocked'},
+    'webfilter': {'type': 'utm', 'subtype': 'webfilter', 'url': '/jogo', 'catdesc': 'Games', 'action': 'blocked'},
+    'traffic': {'type': 'traffic', 'subtype': 'forward', 'app': 'BitTorrent', 'appcat': 'P2P', 'action': 'accept'},
+}
+
+
+class SubtypeFAClient(FakeFAClient):
+    """FakeFAClient com linhas próprias por logtype, cada uma um log completo do subtipo."""
+
+    def __init__(self, times_by_type):
+        super().__init__([])
+        self.times_by_type = {log_type: sorted(times, reverse=True) for log_type, times in times_by_type.items()}
+        self.fail_types = set()
+        self.broken_types = set()
+        self.types = {}
+
+    def start_log_task(self, log_type, start_time, end_time, limit=None, log_filter=None):
+        if log_type in self.fail_types:
+            raise ConnectionError('FA fora do ar')
+        with self._lock:
+            self.started.append((log_type, log_filter, start_time, end_time))
+            tid = len(self.started)
+            times = self.times_by_type.get(log_type, [])
+            self._tasks[tid] = ((start_time, end_time), [t for t in times if start_time <= t < end_time])
+            self.types[tid] = log_type
+        return tid
+
+    def fetch_all_results(self, tid, page_size=100, total=None, limit=None):
+        window, rows = self._tasks[tid]
+        self.fetched.append(window)
+        fields = SUBTYPE_FIELDS[self.types[tid]]
+        if self.types[tid] in self.broken_types:
+            raise ValueError('resposta inesperada do FA')
+        for ts in rows[:limit]:
+            yield fa_log(ts, srcip='10.0.0.5', dstip='203.0.113.9', sessionid=str(int(ts.timestamp())), **fields)
+        return True
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   CONFIG_CACHE={'ttl': 0, 'redis_url': ''})
+class SecurityEventsTaskTests(TestCase):
+    """Chord de coleta por subtipo (Celery eager) contra um FA falso."""
+
+    ROWS = {'ips': 7, 'virus': 3, 'webfilter': 5, 'traffic': 4}
+
+    def setUp(self):
+        now = timezone.now().replace(microsecond=0)
+        self.client_fa = SubtypeFAClient({
+            log_type: [now - datetime.timedelta(minutes=10 * i + 1) for i in range(n)] for log_type, n in self.ROWS.items()
+        })
+        for patcher in (
+            mock.patch('security_events.tasks.get_fortianalyzer_client', return_value=self.client_fa),
+            mock.patch('security_events.tasks.ActiveDirectoryClient', StaticADClient),
+            # IDs já gravados ficam no processo entre as coletas: cada teste começa do zero
+            mock.patch.dict(fingerprint_module._recent_filters, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        self.collected = collections.Counter()
+        collect = tasks._collect_subtype
+
+        def counting_collect(subtype, fa_client, ad_client):
+            self.collected[subtype['name']] += 1
+            return collect(subtype, fa_client, ad_client)
+
+        patcher = mock.patch('security_events.tasks._collect_subtype', side_effect=counting_collect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def summary(self, logs):
+        line, = [line for line in logs.output if 'Coleta de eventos de segurança concluída' in line]
+        return line.split('concluída: ', 1)[1]
+
+    def counts(self):
+        return dict(collections.Counter(SecurityEvent.objects.values_list('event_type', flat=True)))
+
+    def test_chord_collects_each_subtype_once_and_totals_them(self):
+        with self.assertLogs('security_events.tasks', 'INFO') as logs:
+            result = tasks.fetch_security_events_task.apply().get()
+
+        self.assertTrue(result.startswith('Dispatched 4 subtypes (chord '))
+        self.assertEqual(self.collected, {'ips': 1, 'antivirus': 1, 'webfilter': 1, 'app-control': 1})
+        self.assertEqual(self.summary(logs), str({
+            'ips': 'Imported 7 events', 'antivirus': 'Imported 3 events',
+            'webfilter': 'Imported 5 events', 'app-control': 'Imported 4 events',
+        }))
+        self.assertEqual(self.counts(), {'ips': 7, 'antivirus': 3, 'webfilter': 5, 'app-control': 4})
+        self.assertEqual({log_type for log_type, *_ in self.client_fa.started}, set(self.ROWS))
+        self.assertEqual(CollectionWatermark.objects.count(), 4)
+
+        # Os locks de cada subtipo foram liberados: a próxima coleta só traz a sobreposição
+        self.assertFalse(any(tasks.cache.get(f"fetch_security_events_lock_{s['name']}") for s in tasks.SUBTYPES))
+        tasks.fetch_security_events_task.apply().get()
+        self.assertEqual(SecurityEvent.objects.count(), 19)
+
+    def test_sequential_run_returns_the_combined_summary(self):
+        result = tasks.fetch_security_events_task.apply(kwargs={'parallel': False}).get()
+        summary = json.loads(result.removeprefix('Coleta concluída: '))
+        self.assertEqual(summary, {
+            'ips': 'Imported 7 events', 'antivirus': 'Imported 3 events',
+            'webfilter': 'Imported 5 events', 'app-control': 'Imported 4 events',
+        })
+        self.assertEqual(sum(self.collected.values()), 4)
+
+    def test_target_subtype(self):
+        result = tasks.fetch_security_events_task.apply(kwargs={'target_subtype': 'webfilter'}).get()
+        self.assertEqual(result, 'Coleta concluída: {"webfilter": "Imported 5 events"}')
+        self.assertEqual(self.collected, {'webfilter': 1})
+        self.assertEqual({log_type for log_type, *_ in self.client_fa.started}, {'webfilter'})
+        self.assertEqual(tasks.fetch_appcontrol_task.apply().get(), 'Coleta concluída: {"app-control": "Imported 4 events"}')
+
+        self.assertEqual(tasks.fetch_security_events_task(target_subtype='dns'), 'Invalid target_subtype: dns')
+        self.assertEqual(tasks.fetch_security_subtype_task('dns'), {'dns': 'Invalid target_subtype: dns'})
+
+    def test_subtype_lock_only_blocks_the_same_subtype(self):
+        tasks.cache.add('fetch_security_events_lock_ips', 'true', tasks.LOCK_EXPIRE)
+        with self.assertLogs('security_events.tasks', 'WARNING'):
+            self.assertEqual(tasks.fetch_security_events_task(target_subtype='ips'), 'Locked')
+            result = tasks.fetch_security_events_task(parallel=False)
+        summary = json.loads(result.removeprefix('Coleta concluída: '))
+        self.assertEqual(summary['ips'], 'Locked')
+        self.assertEqual(summary['antivirus'], 'Imported 3 events')
+        self.assertNotIn('ips', self.collected)
+        # O lock de outra coleta não é liberado por quem não o pegou
+        self.assertEqual(tasks.cache.get('fetch_security_events_lock_ips'), 'true')
+
+    def test_subtype_failures_do_not_break_the_chord(self):
+        self.client_fa.fail_types = {'virus'}
+        self.client_fa.broken_types = {'webfilter'}
+        with mock.patch('integrations.windows.time.sleep'), self.assertLogs('integrations.windows', 'WARNING'), \
+                self.assertLogs('security_events.tasks', 'INFO') as logs:
+            tasks.fetch_security_events_task.apply().get()
+        self.assertEqual(self.summary(logs), str({
+            'ips': 'Imported 7 events', 'antivirus': 'Failed to start task',
+            'webfilter': 'Error: resposta inesperada do FA', 'app-control': 'Imported 4 events',
+        }))
+        self.assertIsNone(tasks.cache.get('fetch_security_events_lock_antivirus'))
+        self.assertIsNone(tasks.cache.get('fetch_security_events_lock_webfilter'))
+        self.assertEqual(self.counts(), {'ips': 7, 'app-control': 4})
+
+    def test_disabled_collection(self):
+        config = FortiAnalyzerConfig.load()
+        config.is_enabled = False
+        with mock.patch('integrations.models.sync_celery_tasks'):
+            config.save()
+        self.assertEqual(tasks.fetch_security_events_task.apply().get(), 'Disabled')
+        self.assertEqual(tasks.fetch_security_events_task(target_subtype='ips'), 'Disabled')
+        self.assertFalse(self.collected)
@@ -27,7 +27,7 @@ def index(request):
     search = request.GET.get('search', '')
     
     # Base queryset
-    events = SecurityEvent.objects.filter(timestamp__gte=start_date)
+    events = SecurityEvent.objects.with_details().filter(timestamp__gte=start_date)
     
     # Apply filters
     if event_type:
@@ -116,7 +116,7 @@ def antivirus_react_dashboard(request):
     search = request.GET.get('search', '')
     
     # Base queryset - only IPS events
-    events = SecurityEvent.objects.filter(
+    events = SecurityEvent.objects.with_details('ips').filter(
         event_type='ips',
         timestamp__gte=start_date
     )
@@ -193,7 +193,7 @@ def antivirus_dashboard(request):
     search = request.GET.get('search', '')
     
     # Base queryset - only antivirus events
-    events = SecurityEvent.objects.filter(
+    events = SecurityEvent.objects.with_details('antivirus').filter(
         event_type='antivirus',
         timestamp__gte=start_date
     )
@@ -271,7 +271,7 @@ def webfilter_dashboard(request):
     ordering = request.GET.get('ordering', '-timestamp')
     
     # Base queryset - only webfilter events
-    events = SecurityEvent.objects.filter(
+    events = SecurityEvent.objects.with_details('webfilter').filter(
         event_type='webfilter',
         timestamp__gte=start_date
     )
@@ -384,7 +384,7 @@ def export_events_pdf(request):
     severity = request.GET.get('severity', '')
     search = request.GET.get('search', '')
     
-    events = SecurityEvent.objects.filter(timestamp__gte=start_date).order_by('-timestamp')
+    events = SecurityEvent.objects.with_details().filter(timestamp__gte=start_date).order_by('-timestamp')
     
     if event_type:
         events = events.filter(event_type=event_type)
@@ -444,7 +444,7 @@ def export_events_csv(request):
     severity = request.GET.get('severity', '')
     search = request.GET.get('search', '')
     
-    events = SecurityEvent.objects.filter(timestamp__gte=start_date).order_by('-timestamp')
+    events = SecurityEvent.objects.with_details().filter(timestamp__gte=start_date).order_by('-timestamp')
     
     if event_type:
         events = events.filter(event_type=event_type)
@@ -495,7 +495,7 @@ def export_events_csv(request):
 def export_webfilter_xlsx(request):
     """Export Webfilter events to XLSX"""
     # Base queryset
-    events = SecurityEvent.objects.filter(event_type='webfilter')
+    events = SecurityEvent.objects.with_details('webfilter').filter(event_type='webfilter')
     
     # Filters matching API/React Dashboard
     username_q = request.GET.get('username')
@@ -551,7 +551,7 @@ def export_webfilter_xlsx(request):
 def export_webfilter_pdf(request):
     """Export Webfilter events to PDF"""
     # Reuse filter logic (Copy-paste for now to keep independent)
-    events = SecurityEvent.objects.filter(event_type='webfilter')
+    events = SecurityEvent.objects.with_details('webfilter').filter(event_type='webfilter')
     
     username_q = request.GET.get('username')
     if username_q:
@@ -0,0 +1,99 @@
+"""
+Gravação em lote de SecurityEvent.
+
+Substitui o exists() + save() por log (duas idas ao banco cada) por blocos de chunk_size
+eventos: um SELECT ... IN com os event_id do bloco separa as duplicatas já gravadas e o
+restante vai em um único INSERT com ON CONFLICT DO NOTHING (bulk_create com
+ignore_conflicts) nos bancos que suportam. Nos demais (SQL Server) o INSERT em lote é
+tentado dentro de um savepoint e, se alguma linha violar a unicidade (coleta concorrente),
+o bloco é regravado linha a linha. As linhas de detalhe por tipo (IPSDetail, ...) vão no
+mesmo bulk_create/save, na mesma transação (ver SecurityEventQuerySet.bulk_create).
+
+Com um filtro RecentIds (security_events.fingerprint) os IDs gravados em coletas
+anteriores do mesmo processo são descartados antes mesmo do SELECT.
+"""
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from .models import SecurityEvent
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SecurityEventBulkWriter:
+    """
+    Grava blocos de SecurityEvent não salvos (ver security_events.ingest).
+    chunk_size: eventos por INSERT; stats acumula inserted/duplicates/errors da execução.
+    recent: filtro de IDs recentes opcional; só recebe IDs confirmados no banco.
+    """
+
+    def __init__(self, chunk_size=500, recent=None):
+        self.chunk_size = chunk_size
+        self.recent = recent
+        self.ignore_conflicts = connection.features.supports_ignore_conflicts
+        self.stats = {'chunks': 0, 'inserted': 0, 'duplicates': 0, 'filtered': 0, 'errors': 0}
+
+    def write(self, events):
+        """Grava os eventos em blocos e devolve quantos foram inseridos."""
+        inserted = 0
+        for start in range(0, len(events), self.chunk_size):
+            inserted += self._write_chunk(events[start:start + self.chunk_size])
+        return inserted
+
+    def _write_chunk(self, chunk):
+        # Duplicatas dentro do próprio bloco (mesmo log repetido na sobreposição de janelas)
+        unique = {}
+        filtered = 0
+        for event in chunk:
+            if self.recent is not None and event.event_id in self.recent:
+                filtered += 1
+                continue
+            unique.setdefault(event.event_id, event)
+
+        existing = set()
+        if unique:
+            existing = set(
+                SecurityEvent.objects.filter(event_id__in=list(unique)).values_list('event_id', flat=True)
+            )
+        new = [event for event_id, event in unique.items() if event_id not in existing]
+
+        errors = 0
+        if new:
+            try:
+                with transaction.atomic():
+                    SecurityEvent.objects.bulk_create(new, ignore_conflicts=self.ignore_conflicts)
+            except DatabaseError as e:
+                # Conflito de unicidade sem ON CONFLICT, ou uma linha inválida derrubando o bloco
+                logger.warning(f"Bulk insert de {len(new)} eventos falhou ({e}); gravando linha a linha.")
+                new, errors = self._write_rows(new)
+
+        inserted = len(new)
+        duplicates = len(chunk) - inserted - errors
+        if self.recent is not None:
+            self.recent.update(existing)
+            self.recent.update(event.event_id for event in new)
+        self.stats['chunks'] += 1
+        self.stats['filtered'] += filtered
+        self.stats['inserted'] += inserted
+        self.stats['duplicates'] += duplicates
+        self.stats['errors'] += errors
+        logger.debug(
+            f"SecurityEvent: bloco de {len(chunk)} → {inserted} inseridos, {duplicates} duplicados "
+            f"({filtered} pelo filtro de recentes), {errors} erros."
+        )
+        return inserted
+
+    def _write_rows(self, events):
+        """Fallback: um INSERT por evento, cada um no seu savepoint. Retorna (inseridos, erros)."""
+        inserted, errors = [], 0
+        for event in events:
+            try:
+                with transaction.atomic():
+                    event.save(force_insert=True)
+                inserted.append(event)
+            except IntegrityError:
+                # Gravado por outra coleta entre o SELECT e o INSERT: conta como duplicata
+                pass
+            except Exception as e:
+                logger.error(f"Error saving event {event.event_id}: {e}")
+                errors += 1
+        return inserted, errors
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class SetupConfig(AppConfig):
     name = 'setup'
+
+    def ready(self):
+        from integrations.config_cache import watch
+        watch(self.get_model('DatabaseConfiguration'))
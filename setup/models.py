@@ -1,6 +1,8 @@
 from django.db import models
 from cryptography.fernet import Fernet
 from django.conf import settings
+from integrations import config_cache
+import copy
 import os
 
 
@@ -64,8 +66,9 @@ class DatabaseConfiguration(models.Model):
     
     @classmethod
     def get_active_config(cls):
-        """Get the active database configuration"""
-        return cls.objects.filter(is_configured=True).first()
+        """Get the active database configuration (cached per process, see integrations.config_cache)"""
+        config = config_cache.get(cls._meta.label, lambda: cls.objects.filter(is_configured=True).first())
+        return copy.copy(config) if config is not None else None
     
     def to_dict(self):
         """Convert to dictionary for settings.py"""
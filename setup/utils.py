@@ -1,6 +1,8 @@
 """Utility functions for database setup"""
 import psycopg2
 from psycopg2 import OperationalError as PgOperationalError
+from integrations.config_cache import cached_file, forget_file
+import copy
 import json
 import os
 from pathlib import Path
@@ -194,14 +196,26 @@ def save_database_config(config_dict, base_dir):
         config_file = Path(base_dir) / '.db_config.json'
         with open(config_file, 'w') as f:
             json.dump(config_dict, f, indent=2)
+        forget_file(config_file)
         return True, "Configuration saved successfully"
     except Exception as e:
         return False, f"Failed to save configuration: {str(e)}"
 
 
+def _read_database_config(config_file):
+    try:
+        if os.path.exists(config_file):
+            with open(config_file, 'r') as f:
+                return json.load(f)
+        return None
+    except Exception:
+        return None
+
+
 def load_database_config(base_dir):
     """
     Load database configuration from .db_config.json
+    (parsed again only when the file changes, see integrations.config_cache.cached_file)
     
     Args:
         base_dir: Base directory path
@@ -209,14 +223,8 @@ def load_database_config(base_dir):
     Returns:
         dict or None: Configuration dictionary or None if not found
     """
-    try:
-        config_file = Path(base_dir) / '.db_config.json'
-        if config_file.exists():
-            with open(config_file, 'r') as f:
-                return json.load(f)
-        return None
-    except Exception:
-        return None
+    config = cached_file(Path(base_dir) / '.db_config.json', _read_database_config)
+    return copy.deepcopy(config)
 
 
 def is_setup_complete(base_dir):
@@ -229,5 +237,5 @@ def is_setup_complete(base_dir):
     Returns:
         bool: True if setup is complete
     """
-    config = load_database_config(base_dir)
+    config = cached_file(Path(base_dir) / '.db_config.json', _read_database_config)
     return config is not None and config.get('setup_complete', False)
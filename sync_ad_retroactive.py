@@ -5,6 +5,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vpn_dashboard.settings')
 django.setup()
 
 from vpn_logs.models import VPNLog
+from vpn_logs.summary import deferred_summary_refresh
 from integrations.ad import ActiveDirectoryClient
 
 def sync_ad_retroactive():
@@ -15,25 +16,27 @@ def sync_ad_retroactive():
     print(f"Encontrados {logs.count()} registros para atualizar.")
     
     updated = 0
-    for log in logs:
-        if not log.user or log.user.lower() == 'unknown':
-            continue
+    # Resumo diário recalculado uma vez no fim, não a cada log.save()
+    with deferred_summary_refresh():
+        for log in logs:
+            if not log.user or log.user.lower() == 'unknown':
+                continue
             
-        clean_user = log.user.split('\\')[-1]
-        print(f"Sincronizando: {clean_user}...", end=' ')
+            clean_user = log.user.split('\\')[-1]
+            print(f"Sincronizando: {clean_user}...", end=' ')
         
-        info = ad.get_user_info(clean_user)
-        if info:
-            log.ad_department = info.get('department')
-            log.ad_title = info.get('title')
-            log.ad_display_name = info.get('display_name')
-            log.ad_email = info.get('email')
-            log.save()
-            updated += 1
-            print("OK")
-        else:
-            print("Não encontrado no AD")
-            
+            info = ad.get_user_info(clean_user)
+            if info:
+                log.ad_department = info.get('department')
+                log.ad_title = info.get('title')
+                log.ad_display_name = info.get('display_name')
+                log.ad_email = info.get('email')
+                log.save()
+                updated += 1
+                print("OK")
+            else:
+                print("Não encontrado no AD")
+
     print(f"Processo finalizado. {updated} registros atualizados.")
 
 if __name__ == "__main__":
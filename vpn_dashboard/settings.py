@@ -243,6 +243,109 @@ CELERY_BEAT_SCHEDULE = {
         # Agendado para rodar diariamente às 00:05
         'schedule': __import__('celery.schedules').schedules.crontab(minute=5, hour=0),
     },
+    'Revisão do Resumo Diário VPN': {
+        'task': 'vpn_logs.tasks.rebuild_vpn_daily_summaries',
+        # Depois do relatório de fidelidade: recalcula os últimos dias do resumo por inteiro
+        'schedule': __import__('celery.schedules').schedules.crontab(minute=30, hour=0),
+    },
+}
+
+# FortiAnalyzer JSON-RPC client (pool de conexões compartilhado por processo worker)
+FORTIANALYZER_POOL_SIZE = config('FORTIANALYZER_POOL_SIZE', default=8, cast=int)
+# Páginas de resultados baixadas em paralelo por tarefa (deve ser <= FORTIANALYZER_POOL_SIZE)
+FORTIANALYZER_MAX_CONCURRENCY = config('FORTIANALYZER_MAX_CONCURRENCY', default=4, cast=int)
+FORTIANALYZER_TIMEOUTS = {
+    'start': config('FORTIANALYZER_TIMEOUT_START', default=90, cast=int),
+    'status': config('FORTIANALYZER_TIMEOUT_STATUS', default=15, cast=int),
+    'results': config('FORTIANALYZER_TIMEOUT_RESULTS', default=90, cast=int),
+    'wait': config('FORTIANALYZER_TIMEOUT_WAIT', default=180, cast=int),
+}
+
+# Coleta incremental: sobreposição (min) aplicada sobre a marca d'água de cada tipo de log,
+# para cobrir logs indexados com atraso pelo FortiAnalyzer (duplicatas são descartadas).
+COLLECTION_WATERMARK_OVERLAP_MINUTES = config('COLLECTION_WATERMARK_OVERLAP_MINUTES', default=10, cast=int)
+
+# Tamanho dos lotes de cada estágio do pipeline de ingestão (normalize → enrich → persist).
+# Lotes menores reduzem a memória por worker e antecipam a primeira gravação no banco.
+INGEST_BATCH_SIZES = {
+    'normalize': config('INGEST_BATCH_NORMALIZE', default=500, cast=int),
+    'enrich': config('INGEST_BATCH_ENRICH', default=200, cast=int),
+    'persist': config('INGEST_BATCH_PERSIST', default=100, cast=int),
+    # Linhas por INSERT/UPDATE em lote de VPNLog
+    'write_chunk': config('INGEST_WRITE_CHUNK', default=300, cast=int),
+}
+
+# Eventos de segurança por INSERT em lote (duplicatas descartadas pelo banco via ON CONFLICT)
+SECURITY_EVENTS_WRITE_CHUNK = config('SECURITY_EVENTS_WRITE_CHUNK', default=500, cast=int)
+# IDs de eventos já gravados mantidos em memória por subtipo e worker (descarta a sobreposição das janelas)
+SECURITY_EVENTS_RECENT_IDS = config('SECURITY_EVENTS_RECENT_IDS', default=50000, cast=int)
+
+# Particionamento por data das tabelas de log no PostgreSQL (python manage.py partition_tables):
+# uma partição por mês ou dia, criadas `ahead` períodos à frente pela task maintain_partitions.
+# delete_chunk: linhas por DELETE na retenção fora das partições (ou sem particionamento)
+LOG_PARTITIONS = {
+    'interval': config('LOG_PARTITION_INTERVAL', default='month'),
+    'ahead': config('LOG_PARTITION_AHEAD', default=3, cast=int),
+    'delete_chunk': config('RETENTION_DELETE_CHUNK', default=5000, cast=int),
+}
+
+# Ingestão em lote de eventos de autenticação do AD (NDJSON/JSON, gzip ou zstd): linhas por
+# bulk_create e limite do corpo descomprimido em bytes
+AD_INGEST_CHUNK = config('AD_INGEST_CHUNK', default=1000, cast=int)
+AD_INGEST_MAX_BYTES = config('AD_INGEST_MAX_BYTES', default=200 * 1024 * 1024, cast=int)
+
+# Receptor syslog (python manage.py syslog_receiver): FortiGate/FortiAnalyzer log forwarding em
+# tempo real, gravado em micro-lotes de batch_size linhas ou a cada flush_interval segundos
+SYSLOG_RECEIVER = {
+    'host': config('SYSLOG_HOST', default='0.0.0.0'),
+    'udp_port': config('SYSLOG_UDP_PORT', default=5140, cast=int),
+    'tcp_port': config('SYSLOG_TCP_PORT', default=5140, cast=int),
+    'batch_size': config('SYSLOG_BATCH_SIZE', default=500, cast=int),
+    'flush_interval': config('SYSLOG_FLUSH_INTERVAL', default=0.5, cast=float),
+}
+
+# Payloads brutos comprimidos (integrations.payloads: SecurityEvent.raw_log, VPNLog.raw_data, VPNFailure.raw_data):
+# nível do zstd, tamanho do dicionário treinado e linhas por bloco de python manage.py compress_payloads
+PAYLOAD_COMPRESSION = {
+    'level': config('PAYLOAD_ZSTD_LEVEL', default=6, cast=int),
+    'dictionary_size': config('PAYLOAD_DICTIONARY_SIZE', default=112 * 1024, cast=int),
+    'rewrite_chunk': config('PAYLOAD_REWRITE_CHUNK', default=2000, cast=int),
+}
+
+# Camada fria dos logs (integrations.archive): dias fechados (hoje menos grace_days) exportados para
+# Parquet em path antes da retenção; as estatísticas com intervalo além da janela quente leem via DuckDB
+LOG_ARCHIVE = {
+    'enabled': config('LOG_ARCHIVE_ENABLED', default=False, cast=bool),
+    'path': config('LOG_ARCHIVE_PATH', default=str(BASE_DIR / 'archive')),
+    'grace_days': config('LOG_ARCHIVE_GRACE_DAYS', default=2, cast=int),
+    'row_group_size': config('LOG_ARCHIVE_ROW_GROUP_SIZE', default=100000, cast=int),
+}
+
+# Buffer Redis Streams entre coletores e banco (integrations.streams): com LOG_STREAMS_ENABLED os
+# coletores publicam os registros normalizados e os writers (python manage.py stream_writer) gravam
+LOG_STREAMS = {
+    'enabled': config('LOG_STREAMS_ENABLED', default=False, cast=bool),
+    'url': config('LOG_STREAMS_REDIS_URL', default='redis://redis:6379/2'),
+    'batch_size': config('LOG_STREAMS_BATCH_SIZE', default=2000, cast=int),
+    'claim_idle_ms': config('LOG_STREAMS_CLAIM_IDLE_MS', default=60000, cast=int),
+    'max_deliveries': config('LOG_STREAMS_MAX_DELIVERIES', default=5, cast=int),
+}
+
+# Detecção de força bruta/password spraying na coleta de VPN (janela em minutos e limite por regra):
+# user_ip = falhas do mesmo usuário e IP; spray_ip = usuários distintos por IP; spray_user = IPs distintos por usuário
+BRUTE_FORCE_RULES = {
+    'user_ip': {
+        'window_minutes': config('BRUTE_FORCE_WINDOW_MINUTES', default=5, cast=int),
+        'threshold': config('BRUTE_FORCE_THRESHOLD', default=5, cast=int),
+    },
+    'spray_ip': {
+        'window_minutes': config('SPRAY_IP_WINDOW_MINUTES', default=10, cast=int),
+        'threshold': config('SPRAY_IP_THRESHOLD', default=10, cast=int),
+    },
+    'spray_user': {
+        'window_minutes': config('SPRAY_USER_WINDOW_MINUTES', default=10, cast=int),
+        'threshold': config('SPRAY_USER_THRESHOLD', default=5, cast=int),
+    },
 }
 
 # Cache Configuration (Redis)
@@ -255,6 +358,16 @@ CACHES = {
         }
     }
 }
+
+# Cache em processo das configurações (integrations.config_cache: FortiAnalyzerConfig,
+# ActiveDirectoryConfig, DatabaseConfiguration): validade em segundos (0 desliga) e canal Redis
+# pub/sub pelo qual um save invalida a cópia dos demais processos
+CONFIG_CACHE = {
+    'ttl': config('CONFIG_CACHE_TTL', default=300, cast=int),
+    'redis_url': config('CONFIG_CACHE_REDIS_URL', default=config('REDIS_CACHE_URL', default="redis://redis:6379/1")),
+    'channel': config('CONFIG_CACHE_CHANNEL', default='reportvpn:config'),
+}
+
 # ... existing code ...
 
 # Jazzmin Configuration
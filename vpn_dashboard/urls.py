@@ -11,4 +11,5 @@ urlpatterns = [
     path('security/', include('security_events.urls')),
     path('api/security-events/', include('security_events.api.urls')),  # API routes
     path('api/stats/', views.dashboard_stats_api, name='dashboard_stats_api'),
+    path('api/ingest/streams/', integration_views.stream_lag_api, name='stream_lag_api'),
 ]
@@ -0,0 +1,233 @@
+"""
+Detecção de força bruta e password spraying sobre as falhas de login VPN.
+
+Substitui as três consultas por falha (exists em VPNFailure, count da janela e exists do
+alerta) por índices em memória: listas ordenadas por horário para cada (usuário, IP), cada
+IP e cada usuário, alimentadas uma vez do banco (uma consulta por lote) e atualizadas com as
+falhas novas. Falhas e alertas são gravados com bulk_create.
+
+Os logs chegam do FortiAnalyzer em ordem decrescente de horário, por isso os índices são
+listas ordenadas (bisect) e não filas: cada falha conta os eventos em [t - janela, t]
+independentemente da ordem de chegada.
+
+Regras (settings.BRUTE_FORCE_RULES, cada uma com janela e limite próprios):
+- user_ip    : falhas do mesmo usuário a partir do mesmo IP (regra original, 5 em 5 min)
+- spray_ip   : usuários distintos com falha a partir de um mesmo IP (password spraying)
+- spray_user : IPs distintos com falha para um mesmo usuário (ataque distribuído)
+"""
+from bisect import bisect_left, bisect_right
+from django.conf import settings
+from django.db.models import Q
+from vpn_logs.models import VPNFailure
+import datetime
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES = {
+    'user_ip': {'window_minutes': 5, 'threshold': 5},
+    'spray_ip': {'window_minutes': 10, 'threshold': 10},
+    'spray_user': {'window_minutes': 10, 'threshold': 5},
+}
+
+ATTACK_NAMES = {
+    'user_ip': 'Brute Force Attack Detected',
+    'spray_ip': 'Password Spraying Detected',
+    'spray_user': 'Distributed Brute Force Detected',
+}
+
+
+def get_rules():
+    rules = {name: dict(rule) for name, rule in DEFAULT_RULES.items()}
+    for name, rule in (getattr(settings, 'BRUTE_FORCE_RULES', None) or {}).items():
+        rules.setdefault(name, {}).update(rule)
+    return rules
+
+
+class _TimeIndex:
+    """Eventos por chave, mantidos ordenados por timestamp (listas paralelas de horário e valor)."""
+
+    def __init__(self):
+        self._times = {}
+        self._values = {}
+
+    def add(self, key, timestamp, value=None):
+        times = self._times.setdefault(key, [])
+        pos = bisect_right(times, timestamp)
+        times.insert(pos, timestamp)
+        self._values.setdefault(key, []).insert(pos, value)
+
+    def window(self, key, start, end):
+        """Valores com start <= timestamp <= end."""
+        times = self._times.get(key)
+        if not times:
+            return []
+        return self._values[key][bisect_left(times, start):bisect_right(times, end)]
+
+
+def alert_key(attack_name, username, src_ip):
+    """Chave de supressão: spraying por IP agrupa só pelo IP, o distribuído só pelo usuário."""
+    if attack_name == ATTACK_NAMES['spray_ip']:
+        return (attack_name, '', src_ip)
+    if attack_name == ATTACK_NAMES['spray_user']:
+        return (attack_name, username, '')
+    return (attack_name, username, src_ip)
+
+
+class BruteForceDetector:
+    """Uma instância por execução da coleta; recebe os registros de falha normalizados."""
+
+    def __init__(self, rules=None, chunk_size=300):
+        self.rules = rules or get_rules()
+        self.windows = {name: datetime.timedelta(minutes=rule['window_minutes']) for name, rule in self.rules.items()}
+        self.max_window = max(self.windows.values())
+        self.chunk_size = chunk_size
+
+        self.by_pair = _TimeIndex()
+        self.by_ip = _TimeIndex()
+        self.by_user = _TimeIndex()
+        self.alerts = _TimeIndex()
+        self._seen = set()
+        self._seen_alerts = set()
+        self.stats = {'failures': 0, 'duplicates': 0, 'alerts': 0}
+
+    # --- Índices ---
+
+    def _index_failure(self, user, source_ip, timestamp, reason):
+        identity = (user, source_ip, timestamp, reason)
+        if identity in self._seen:
+            return False
+        self._seen.add(identity)
+        self.by_pair.add((user, source_ip), timestamp)
+        self.by_ip.add(source_ip, timestamp, user)
+        self.by_user.add(user, timestamp, source_ip)
+        return True
+
+    def _index_alert(self, attack_name, username, src_ip, timestamp, pk=None):
+        identity = pk or (attack_name, username, src_ip, timestamp)
+        if identity in self._seen_alerts:
+            return
+        self._seen_alerts.add(identity)
+        self.alerts.add(alert_key(attack_name, username, src_ip), timestamp)
+
+    def _seed(self, records):
+        """
+        Carrega do banco, em uma consulta cada, as falhas e os alertas que podem interagir
+        com o lote: mesmos usuários ou IPs, no intervalo do lote ampliado pela maior janela.
+        """
+        from security_events.models import SecurityEvent
+
+        users = {r.user for r in records}
+        ips = {r.source_ip for r in records}
+        start = min(r.start_time for r in records) - self.max_window
+        end = max(r.start_time for r in records) + self.max_window
+
+        for user, source_ip, timestamp, reason in VPNFailure.objects.filter(
+            timestamp__gte=start, timestamp__lte=end
+        ).filter(Q(user__in=users) | Q(source_ip__in=ips)).values_list('user', 'source_ip', 'timestamp', 'reason'):
+            self._index_failure(user, source_ip, timestamp, reason)
+
+        for pk, attack_name, username, src_ip, timestamp in SecurityEvent.objects.with_details('ips').filter(
+            event_type='ips', attack_name__in=list(ATTACK_NAMES.values()),
+            timestamp__gte=start, timestamp__lte=end
+        ).filter(Q(username__in=users) | Q(src_ip__in=ips)).values_list('id', 'attack_name', 'username', 'src_ip', 'timestamp'):
+            self._index_alert(attack_name, username, src_ip, timestamp, pk=pk)
+
+    # --- Processamento ---
+
+    def process(self, records):
+        """Grava as falhas novas do lote e os alertas disparados. Retorna a quantidade de falhas novas."""
+        if not records:
+            return 0
+        self._seed(records)
+
+        failures = []
+        fresh = []
+        for record in records:
+            log = record.log
+            reason = log.get('reason', record.action)
+            if not self._index_failure(record.user, record.source_ip, record.start_time, reason):
+                self.stats['duplicates'] += 1
+                continue
+            failures.append(VPNFailure(
+                user=record.user,
+                source_ip=record.source_ip,
+                timestamp=record.start_time,
+                reason=reason,
+                city=record.city if record.country_name else '',
+                country_code=record.country_code,
+                raw_data=log
+            ))
+            fresh.append((record, reason, record.raw_country))
+
+        VPNFailure.objects.bulk_create(failures, batch_size=self.chunk_size)
+        self.stats['failures'] += len(failures)
+
+        # Detecção em ordem cronológica: o alerta fica na falha que completou o limite,
+        # seja qual for a ordem em que o FA devolveu o lote
+        alerts = []
+        for record, reason, fa_country_fail in sorted(fresh, key=lambda item: item[0].start_time):
+            alerts.extend(self._detect(record, reason, fa_country_fail))
+        if alerts:
+            from security_events.models import SecurityEvent
+            SecurityEvent.objects.bulk_create(alerts, batch_size=self.chunk_size)
+            self.stats['alerts'] += len(alerts)
+        return len(failures)
+
+    def _detect(self, record, reason, fa_country_fail):
+        user = record.user
+        source_ip = record.source_ip
+        ts = record.start_time
+        alerts = []
+
+        rule = self.rules.get('user_ip')
+        if rule:
+            count = len(self.by_pair.window((user, source_ip), ts - self.windows['user_ip'], ts))
+            if count >= rule['threshold']:
+                alerts.append(self._alert('user_ip', user, source_ip, ts,
+                                          f"Detectadas {count} falhas. Motivo: {reason}", record, fa_country_fail))
+
+        rule = self.rules.get('spray_ip')
+        if rule:
+            users = set(self.by_ip.window(source_ip, ts - self.windows['spray_ip'], ts))
+            if len(users) >= rule['threshold']:
+                alerts.append(self._alert('spray_ip', '', source_ip, ts,
+                                          f"Falhas de {len(users)} usuários distintos a partir de {source_ip}. Motivo: {reason}",
+                                          record, fa_country_fail))
+
+        rule = self.rules.get('spray_user')
+        if rule:
+            ips = set(self.by_user.window(user, ts - self.windows['spray_user'], ts))
+            if len(ips) >= rule['threshold']:
+                # src_ip do alerta: o IP da falha que completou o limite
+                alerts.append(self._alert('spray_user', user, source_ip, ts,
+                                          f"Falhas de {user} a partir de {len(ips)} IPs distintos. Motivo: {reason}",
+                                          record, fa_country_fail))
+        return [alert for alert in alerts if alert is not None]
+
+    def _alert(self, rule_name, username, src_ip, ts, description, record, fa_country_fail):
+        """Um alerta por chave e janela: suprime se já houver outro dentro da janela da regra."""
+        from security_events.models import SecurityEvent
+
+        attack_name = ATTACK_NAMES[rule_name]
+        window = self.windows[rule_name]
+        if self.alerts.window(alert_key(attack_name, username, src_ip), ts - window, ts + window):
+            return None
+        self._index_alert(attack_name, username, src_ip, ts)
+
+        return SecurityEvent(
+            event_id=str(uuid.uuid4()),
+            event_type='ips',
+            date=ts.date(),
+            timestamp=ts,
+            severity='critical',
+            username=username,
+            src_ip=src_ip,
+            dst_ip='0.0.0.0',
+            src_country=fa_country_fail or '',
+            action='block',
+            attack_name=attack_name,
+            url=description,
+            raw_log=str(record.log)
+        )
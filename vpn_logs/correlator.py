@@ -0,0 +1,152 @@
+"""
+Correlação em memória dos heartbeats (tunnel-stats) com as sessões VPN ativas.
+
+As sessões ativas são carregadas uma vez por execução em índices por IP de origem e por
+usuário, ordenados por start_time. Cada heartbeat encontra sua sessão por bisseção (mesma
+regra da consulta antiga: a sessão ativa mais recente iniciada até o horário do heartbeat,
+primeiro pelo IP e depois pelo usuário) e atualiza duração/last_activity em memória;
+só as sessões alteradas são regravadas, em lote, ao fim de cada lote do pipeline, junto com
+o resumo diário (vpn_logs.summary) dos seus usuários/dias.
+"""
+from bisect import bisect_right
+from vpn_logs.models import VPNLog
+from vpn_logs.summary import refresh_summaries, summary_keys
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+SESSION_COLUMNS = ('id', 'session_id', 'user', 'source_ip', 'start_time', 'start_date', 'duration', 'end_time', 'last_activity', 'raw_data', 'raw_data_legacy')
+HEARTBEAT_FIELDS = ['duration', 'end_time', 'last_activity']
+
+
+class _SessionIndex:
+    """Listas por chave, ordenadas por (start_time, id), para busca por bisseção."""
+
+    def __init__(self):
+        self._keys = {}
+        self._items = {}
+
+    def add(self, key, session):
+        entry = (session.start_time, session.id)
+        keys = self._keys.setdefault(key, [])
+        pos = bisect_right(keys, entry)
+        keys.insert(pos, entry)
+        self._items.setdefault(key, []).insert(pos, session)
+
+    def remove(self, key, session):
+        keys = self._keys.get(key)
+        if not keys:
+            return
+        entry = (session.start_time, session.id)
+        pos = bisect_right(keys, entry) - 1
+        if pos >= 0 and keys[pos] == entry:
+            del keys[pos]
+            del self._items[key][pos]
+
+    def latest_before(self, key, timestamp):
+        """Sessão com o maior start_time <= timestamp, ou None."""
+        keys = self._keys.get(key)
+        if not keys:
+            return None
+        # (timestamp, inf) posiciona depois de todas as entradas com start_time == timestamp
+        pos = bisect_right(keys, (timestamp, float('inf'))) - 1
+        return self._items[key][pos] if pos >= 0 else None
+
+
+class SessionCorrelator:
+    """Sessões ativas indexadas por IP e por usuário, com escrita em lote das alteradas."""
+
+    def __init__(self, chunk_size=300):
+        self.chunk_size = chunk_size
+        self.by_ip = _SessionIndex()
+        self.by_user = _SessionIndex()
+        self.sessions = {}
+        self.dirty = {}
+        self.loaded = False
+
+    # --- Carga e sincronização com o que foi gravado ---
+
+    def load(self):
+        """Carrega todas as sessões ativas (uma consulta por execução)."""
+        for session in VPNLog.objects.with_payload().filter(status='active').only(*SESSION_COLUMNS):
+            self._add(session)
+        self.loaded = True
+        logger.info(f"Correlator: {len(self.sessions)} sessões ativas carregadas.")
+
+    def _add(self, session):
+        self.sessions[session.session_id] = session
+        if session.source_ip and session.source_ip != '0.0.0.0':
+            self.by_ip.add(session.source_ip, session)
+        if session.user and session.user not in ['unknown', 'N/A']:
+            self.by_user.add(session.user, session)
+
+    def _discard(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return
+        self.dirty.pop(session.id, None)
+        self.by_ip.remove(session.source_ip, session)
+        self.by_user.remove(session.user, session)
+
+    def track(self, session_ids):
+        """
+        Sincroniza os índices com sessões recém-gravadas pelo writer: recarrega as que
+        continuam ativas e descarta as encerradas (uma consulta por lote).
+        """
+        if not self.loaded:
+            self.load()
+        session_ids = list(session_ids)
+        if not session_ids:
+            return
+        for session_id in session_ids:
+            self._discard(session_id)
+        for session in VPNLog.objects.with_payload().filter(session_id__in=session_ids, status='active').only(*SESSION_COLUMNS):
+            self._add(session)
+
+    # --- Heartbeats ---
+
+    def find(self, source_ip, username, timestamp):
+        session = None
+        if source_ip and source_ip != '0.0.0.0':
+            session = self.by_ip.latest_before(source_ip, timestamp)
+        if session is None and username and username not in ['unknown', 'N/A']:
+            session = self.by_user.latest_before(username, timestamp)
+        return session
+
+    def apply(self, record):
+        """
+        Aplica um tunnel-stats à sessão correspondente, em memória.
+        Retorna False se não houver sessão aberta para o heartbeat.
+        """
+        if not self.loaded:
+            self.load()
+        start_time_log = record.start_time
+        session = self.find(record.source_ip, record.user, start_time_log)
+        if session is None:
+            return False
+
+        # Sessões particionadas na virada do dia carregam a duração já contabilizada
+        raw_data = session.raw_data if isinstance(session.raw_data, dict) else {}
+        offset_duration = int(raw_data.get('_duration_offset', 0))
+        real_duration = record.duration - offset_duration
+        if real_duration < 0: real_duration = 0
+        if real_duration > (session.duration or 0):
+            session.duration = real_duration
+            session.end_time = session.start_time + datetime.timedelta(seconds=real_duration)
+            session.last_activity = start_time_log
+            self.dirty[session.id] = session
+        elif start_time_log > (session.last_activity or session.start_time):
+            session.last_activity = start_time_log
+            self.dirty[session.id] = session
+        return True
+
+    def flush(self):
+        """Grava em lote as sessões alteradas desde o último flush."""
+        if not self.dirty:
+            return 0
+        changed = list(self.dirty.values())
+        VPNLog.objects.bulk_update(changed, HEARTBEAT_FIELDS, batch_size=self.chunk_size)
+        refresh_summaries(summary_keys(changed), chunk_size=self.chunk_size)
+        self.dirty.clear()
+        return len(changed)
@@ -0,0 +1,202 @@
+"""
+Estágios de ingestão dos logs de VPN do FortiAnalyzer.
+
+fetch (gerador de páginas do FA) → normalize → enrich (AD) → persist (VPNLog/VPNFailure).
+Os estágios trabalham sobre lotes e são encadeados por integrations.pipeline, de forma
+que nenhum estágio precisa do conjunto inteiro de resultados em memória.
+
+Com um buffer (integrations.streams.StreamBuffer) o último estágio é publish: os registros
+vão para o stream 'vpn' e persist roda nos writers (python manage.py stream_writer).
+"""
+from collections import Counter
+from django.conf import settings
+from integrations.normalizer import normalize_vpn
+from integrations.pipeline import Stage, run_pipeline
+from vpn_logs.models import VPNLog
+from vpn_logs.writers import VPNLogBulkWriter
+from vpn_logs.summary import deferred_summary_refresh
+from vpn_logs.correlator import SessionCorrelator
+from vpn_logs.bruteforce import BruteForceDetector
+import logging
+
+logger = logging.getLogger(__name__)
+
+SESSION_ACTIONS = ('tunnel-up', 'tunnel-stats', 'tunnel-down')
+FAILURE_ACTIONS = ('negotiate-error', 'auth-failure', 'ssl-login-fail', 'ipsec-login-fail')
+
+DEFAULT_BATCH_SIZES = {'normalize': 500, 'enrich': 200, 'persist': 100, 'write_chunk': 300}
+
+
+def get_batch_sizes(overrides=None):
+    """Tamanhos de lote por estágio: padrão < settings.INGEST_BATCH_SIZES < argumentos da task."""
+    sizes = dict(DEFAULT_BATCH_SIZES)
+    sizes.update(getattr(settings, 'INGEST_BATCH_SIZES', None) or {})
+    sizes.update(overrides or {})
+    return sizes
+
+
+class VPNLogIngestor:
+    """
+    Estágios normalize/enrich/persist da coleta de VPN.
+    Uma instância por execução: o cache de AD vive apenas durante a coleta.
+    """
+
+    def __init__(self, ad_client, batch_sizes=None, buffer=None):
+        self.ad_client = ad_client
+        self.buffer = buffer
+        self.batch_sizes = get_batch_sizes(batch_sizes)
+        self.outcomes = Counter()
+        self.writer = VPNLogBulkWriter(chunk_size=self.batch_sizes['write_chunk'])
+        self.correlator = SessionCorrelator(chunk_size=self.batch_sizes['write_chunk'])
+        self.bruteforce = BruteForceDetector(chunk_size=self.batch_sizes['write_chunk'])
+        self._ad_cache = {}
+
+    def stages(self):
+        return [
+            Stage('normalize', self.normalize, self.batch_sizes['normalize']),
+            Stage('enrich', self.enrich, self.batch_sizes['enrich']),
+            Stage('persist', self.publish if self.buffer else self.persist, self.batch_sizes['persist']),
+        ]
+
+    def run(self, logs):
+        """Consome o gerador de logs do FA até o fim e devolve o contador de resultados."""
+        self.outcomes.update(run_pipeline(logs, self.stages()))
+        return self.outcomes
+
+    # --- Estágios ---
+
+    def normalize(self, batch):
+        records = []
+        for log in batch:
+            try:
+                records.append(normalize_vpn(log))
+            except Exception as e:
+                logger.error(f"Log vpn descartado na normalização: {e}")
+                self.outcomes['invalid'] += 1
+        return records
+
+    def enrich(self, batch):
+        targets = []
+        for record in batch:
+            if record.action not in SESSION_ACTIONS:
+                continue
+            username = record.user
+            if not username or username in ['unknown', 'N/A']:
+                continue
+            targets.append((record, username.split('\\')[-1]))
+
+        # Uma consulta em lote (cache + AD) para os usuários ainda não vistos nesta execução
+        pending = {clean_user for _, clean_user in targets if clean_user not in self._ad_cache}
+        if pending:
+            try:
+                infos = self.ad_client.get_users_info(pending)
+            except Exception as e:
+                logger.error(f"Erro ao consultar AD para {len(pending)} usuários: {e}")
+                infos = {}
+            for clean_user in pending:
+                self._ad_cache[clean_user] = infos.get(clean_user) or {}
+
+        for record, clean_user in targets:
+            record.ad_info = self._ad_cache[clean_user]
+        return batch
+
+    def publish(self, batch):
+        """Acrescenta ao stream 'vpn' os registros que o persist gravaria."""
+        records = [r for r in batch if r.action in SESSION_ACTIONS or r.action in FAILURE_ACTIONS]
+        self.buffer.append('vpn', [record.to_dict() for record in records])
+        return ['queued'] * len(records) + ['ignored'] * (len(batch) - len(records))
+
+    def persist(self, batch):
+        sessions, heartbeats, failures, results = [], [], [], []
+        for record in batch:
+            action = record.action
+            if action == 'tunnel-stats':
+                heartbeats.append(record)
+            elif action in SESSION_ACTIONS:
+                sessions.append(record)
+            elif action in FAILURE_ACTIONS:
+                failures.append(record)
+            else:
+                results.append('ignored')
+
+        if failures:
+            # Falhas gravadas em lote; força bruta/spraying avaliados em memória
+            inserted = self.bruteforce.process(failures)
+            results.extend(['failure'] * inserted + ['duplicate-failure'] * (len(failures) - inserted))
+
+        results.extend(self._write_sessions(sessions))
+        orphans = []
+        for record in heartbeats:
+            if self.correlator.apply(record):
+                results.append('heartbeat')
+            else:
+                # Sem sessão aberta: o heartbeat vira a própria sessão
+                orphans.append(record)
+        self.correlator.flush()
+        results.extend(self._write_sessions(orphans))
+        return results
+
+    def _write_sessions(self, records):
+        """Grava os logs de sessão em lote; se o lote falhar, refaz registro a registro."""
+        if not records:
+            return []
+        try:
+            outcomes = list(self.writer.write(records).values())
+        except Exception as e:
+            logger.warning(f"Gravação em lote de {len(records)} sessões VPN falhou ({e}); gravando individualmente.")
+            # Resumo diário recalculado uma vez para o lote, não a cada save()
+            with deferred_summary_refresh():
+                outcomes = [self._persist_session(record) for record in records]
+        # Mantém os índices do correlator coerentes com as sessões abertas/encerradas agora
+        self.correlator.track({record.session_id for record in records})
+        return outcomes
+
+    # --- Persistência por tipo de ação ---
+
+    def _persist_session(self, record):
+        """Caminho registro a registro (update_or_create), usado quando o lote falha."""
+        log = record.log
+        session_id = record.session_id
+        status = record.status
+        start_time_log = record.start_time
+        ad_info = record.ad_info
+        try:
+            log_entry, created = VPNLog.objects.update_or_create(
+                session_id=session_id,
+                defaults={
+                    'user': record.user,
+                    'source_ip': record.source_ip,
+                    'start_time': start_time_log,
+                    'start_date': start_time_log.date(),
+                    'end_time': record.end_time,
+                    'duration': record.duration,
+                    'bandwidth_in': int(log.get('rcvdbyte', 0)),
+                    'bandwidth_out': int(log.get('sentbyte', 0)),
+                    'status': status,
+                    'raw_data': log,
+                    'ad_department': ad_info.get('department'),
+                    'ad_email': ad_info.get('email'),
+                    'ad_title': ad_info.get('title'),
+                    'ad_display_name': ad_info.get('display_name'),
+                    'is_suspicious': False,
+                    'city': record.city,
+                    'country_name': record.country_name,
+                    'country_code': record.country_code,
+                    'last_activity': start_time_log
+                }
+            )
+            if created:
+                return 'created'
+            if status == 'closed' and log_entry.status != 'closed':
+                log_entry.status = 'closed'
+                log_entry.duration = record.duration
+                log_entry.end_time = record.end_time
+                log_entry.last_activity = start_time_log
+                log_entry.save(update_fields=['status', 'duration', 'end_time', 'last_activity'])
+            elif start_time_log > (log_entry.last_activity or log_entry.start_time):
+                log_entry.last_activity = start_time_log
+                log_entry.save(update_fields=['last_activity'])
+            return 'updated'
+        except Exception as e:
+            logger.error(f"Erro ao processar log vpn {session_id}: {e}")
+            return 'error'
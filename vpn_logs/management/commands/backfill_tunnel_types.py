@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from vpn_logs.models import VPNLog, backfill_tunnel_types
+
+
+class Command(BaseCommand):
+    help = 'Preenche tunnel_type/vpn_type/is_ssl dos logs de VPN gravados antes das colunas (a partir de raw_data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, default=2000, help='Linhas por bloco/transação')
+        parser.add_argument('--status', action='store_true', help='Mostra quantas linhas faltam e encerra')
+
+    def handle(self, *args, **options):
+        pending = VPNLog.objects.filter(tunnel_type__isnull=True).count()
+        if options['status'] or not pending:
+            self.stdout.write(f"{pending} logs sem tunnel_type/vpn_type/is_ssl")
+            return
+        filled = backfill_tunnel_types(chunk=options['chunk'])
+        self.stdout.write(self.style.SUCCESS(f"{filled} logs preenchidos"))
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from vpn_logs.models import VPNLog
+from vpn_logs.models import VPNLog, VPNUserDailySummary
+from integrations.partitions import apply_retention, chunked_delete
+from integrations.tasks import archive_before_retention
 from datetime import timedelta
 
 class Command(BaseCommand):
@@ -27,9 +29,16 @@ class Command(BaseCommand):
             ))
         else:
             if count > 0:
-                deleted, _ = old_logs.delete()
+                # Camada fria (LOG_ARCHIVE): exporta antes de apagar, como cleanup_old_logs
+                if not archive_before_retention(cutoff_date, ['vpn_logs.VPNLog']).get('vpn_logs.VPNLog', True):
+                    self.stdout.write(self.style.ERROR('Archive export failed; no logs were deleted.'))
+                    return
+                # Partições vencidas removidas inteiras; o restante em DELETEs em blocos
+                apply_retention('vpn_logs.VPNLog', cutoff_date)
+                # Resumo diário de VPN acompanha os logs que ficam no banco (como em cleanup_old_logs)
+                summaries = chunked_delete(VPNUserDailySummary.objects.filter(date__lt=cutoff_date.date()))
                 self.stdout.write(self.style.SUCCESS(
-                    f'Successfully deleted {count} logs older than {cutoff_date.date()}.'
+                    f'Successfully deleted {count} logs and {summaries} daily summaries older than {cutoff_date.date()}.'
                 ))
             else:
                 self.stdout.write(self.style.SUCCESS('No logs found specifically older than 6 months.'))
@@ -0,0 +1,37 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from vpn_logs.models import VPNUserDailySummary
+from vpn_logs.summary import DailySummaryBuilder
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o resumo diário por usuário dos logs de VPN (VPNUserDailySummary) a partir de VPNLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Primeiro dia, AAAA-MM-DD (padrão: desde o início)')
+        parser.add_argument('--until', help='Último dia, AAAA-MM-DD (padrão: até hoje)')
+        parser.add_argument('--chunk', type=int, default=500, help='Usuários por consulta e linhas por INSERT')
+        parser.add_argument('--status', action='store_true', help='Mostra o que há no resumo e encerra')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            days = VPNUserDailySummary.objects.order_by().values_list('date', flat=True).distinct()
+            first, last = min(days, default=None), max(days, default=None)
+            self.stdout.write(f"{VPNUserDailySummary.objects.count()} linhas em {len(days)} dias ({first} .. {last})")
+            return
+
+        since = self.parse_day(options['since'], 'since')
+        until = self.parse_day(options['until'], 'until')
+        began = time.monotonic()
+        changed = DailySummaryBuilder(chunk_size=options['chunk']).rebuild(since=since, until=until)
+        self.stdout.write(self.style.SUCCESS(f"{changed} linhas gravadas ou removidas em {time.monotonic() - began:.1f}s"))
+
+    def parse_day(self, value, option):
+        if not value:
+            return None
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Data inválida em --{option}: {value}")
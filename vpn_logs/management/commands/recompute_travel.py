@@ -0,0 +1,41 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from vpn_logs.travel import numpy, recompute_travel
+
+
+class Command(BaseCommand):
+    help = 'Recalcula em lote a viagem impossível das conexões VPN (por usuário e intervalo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', nargs='+', help='Usuários a recalcular (padrão: todos com conexões localizadas no intervalo)')
+        parser.add_argument('--since', help='Primeiro dia, AAAA-MM-DD (padrão: desde o início)')
+        parser.add_argument('--until', help='Último dia, AAAA-MM-DD (padrão: até agora)')
+        parser.add_argument('--user-chunk', type=int, default=1000, help='Usuários por consulta')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Linhas por UPDATE')
+
+    def handle(self, *args, **options):
+        since = self.parse_day(options['since'], 'since')
+        until = self.parse_day(options['until'], 'until')
+        if until is not None:
+            until += datetime.timedelta(days=1)
+
+        if numpy is None:
+            self.stdout.write(self.style.WARNING('NumPy não instalado: cálculo em Python puro (mais lento).'))
+        began = time.monotonic()
+        updated = recompute_travel(
+            options['users'], since=since, until=until,
+            user_chunk=options['user_chunk'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{updated} conexões atualizadas em {time.monotonic() - began:.1f}s"))
+
+    def parse_day(self, value, option):
+        if not value:
+            return None
+        try:
+            day = datetime.date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Data inválida em --{option}: {value}")
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
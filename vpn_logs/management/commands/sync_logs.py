@@ -6,6 +6,7 @@ from django.utils.dateparse import parse_datetime
 from integrations.fortianalyzer import FortiAnalyzerClient
 from integrations.ad import ActiveDirectoryClient
 from vpn_logs.models import VPNLog
+from vpn_logs.summary import deferred_summary_refresh
 
 logger = logging.getLogger(__name__)
 
@@ -50,60 +51,62 @@ class Command(BaseCommand):
         count_created = 0
         count_updated = 0
 
-        for log_entry in logs:
-            session_id = log_entry.get('sessionid') or log_entry.get('logid') # Adapte conforme campo real
+        # Resumo diário recalculado uma vez no fim, não a cada vpn_log.save()
+        with deferred_summary_refresh():
+            for log_entry in logs:
+                session_id = log_entry.get('sessionid') or log_entry.get('logid') # Adapte conforme campo real
             
-            if not session_id:
-                continue
+                if not session_id:
+                    continue
 
-            user = log_entry.get('user')
-            if not user:
-                continue
+                user = log_entry.get('user')
+                if not user:
+                    continue
 
-            # Extração de campos básicos
-            # FA retorna tempo em strings ou timestamps, precisa converter
-            # Exemplo dummy, ajustar parsing
+                # Extração de campos básicos
+                # FA retorna tempo em strings ou timestamps, precisa converter
+                # Exemplo dummy, ajustar parsing
             
-            # Tenta buscar objeto existente
-            vpn_log, created = VPNLog.objects.get_or_create(
-                session_id=session_id,
-                defaults={
-                    'user': user,
-                    'source_ip': log_entry.get('srcip', '0.0.0.0'),
-                    'start_time': make_aware(datetime.datetime.now()), # Placeholder se não tiver data
-                    'raw_data': log_entry
-                }
-            )
+                # Tenta buscar objeto existente
+                vpn_log, created = VPNLog.objects.get_or_create(
+                    session_id=session_id,
+                    defaults={
+                        'user': user,
+                        'source_ip': log_entry.get('srcip', '0.0.0.0'),
+                        'start_time': make_aware(datetime.datetime.now()), # Placeholder se não tiver data
+                        'raw_data': log_entry
+                    }
+                )
 
-            # Se já existe ou acabou de criar, vamos atualizar/enriquecer
-            # Se a sessão fechou, atualizar end_time, duration, bandwidth
+                # Se já existe ou acabou de criar, vamos atualizar/enriquecer
+                # Se a sessão fechou, atualizar end_time, duration, bandwidth
             
-            # Enriquecimento com AD
-            # Otimização: Poderíamos fazer cache local de usuários para não bater no AD a cada log
-            ad_info = ad_client.get_user_info(user)
-            if ad_info:
-                if vpn_log.ad_department != ad_info.get('department'):
-                    vpn_log.ad_department = ad_info.get('department')
-                    vpn_log.ad_email = ad_info.get('email')
+                # Enriquecimento com AD
+                # Otimização: Poderíamos fazer cache local de usuários para não bater no AD a cada log
+                ad_info = ad_client.get_user_info(user)
+                if ad_info:
+                    if vpn_log.ad_department != ad_info.get('department'):
+                        vpn_log.ad_department = ad_info.get('department')
+                        vpn_log.ad_email = ad_info.get('email')
                     
-            # Atualizar outros campos se vierem no log
-            if 'duration' in log_entry:
-                vpn_log.duration = int(log_entry['duration'])
+                # Atualizar outros campos se vierem no log
+                if 'duration' in log_entry:
+                    vpn_log.duration = int(log_entry['duration'])
             
-            if 'rcvdbyte' in log_entry:
-                vpn_log.bandwidth_in = int(log_entry['rcvdbyte'])
+                if 'rcvdbyte' in log_entry:
+                    vpn_log.bandwidth_in = int(log_entry['rcvdbyte'])
                 
-            if 'sentbyte' in log_entry:
-                vpn_log.bandwidth_out = int(log_entry['sentbyte'])
+                if 'sentbyte' in log_entry:
+                    vpn_log.bandwidth_out = int(log_entry['sentbyte'])
 
-            if 'status' in log_entry:
-                vpn_log.status = log_entry['status']
+                if 'status' in log_entry:
+                    vpn_log.status = log_entry['status']
                 
-            vpn_log.save()
+                vpn_log.save()
             
-            if created:
-                count_created += 1
-            else:
-                count_updated += 1
+                if created:
+                    count_created += 1
+                else:
+                    count_updated += 1
 
         self.stdout.write(self.style.SUCCESS(f"Sincronização concluída. Criados: {count_created}, Atualizados: {count_updated}"))
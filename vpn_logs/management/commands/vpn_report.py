@@ -42,7 +42,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS("Carregando dados pré-existentes do banco de dados..."))
 
         # Buscar dados persistidos (Fidelity Only)
-        logs = VPNLog.objects.filter(
+        logs = VPNLog.objects.with_payload().filter(
             start_date=target_date,
             session_id__startswith='fidelity_'
         ).order_by('-bandwidth_in', '-bandwidth_out')
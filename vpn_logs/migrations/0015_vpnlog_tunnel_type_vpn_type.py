@@ -0,0 +1,41 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations, models
+from vpn_logs.models import backfill_tunnel_types
+
+
+def fill_tunnel_types(apps, schema_editor):
+    backfill_tunnel_types(apps.get_model('vpn_logs', 'VPNLog'), using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+    """
+    tunneltype/vpntype do log bruto viram colunas indexadas (o dashboard filtrava por caminho
+    JSON em raw_data). O preenchimento das linhas existentes é feito em blocos, cada um na sua
+    transação; linhas gravadas por workers antigos durante o deploy ficam NULL e são preenchidas
+    por python manage.py backfill_tunnel_types.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('vpn_logs', '0014_vpnfailure_compressed_raw_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vpnlog',
+            name='tunnel_type',
+            field=models.CharField(blank=True, db_index=True, help_text='Tipo de túnel (tunneltype do log)', max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='vpnlog',
+            name='vpn_type',
+            field=models.CharField(blank=True, db_index=True, help_text='Tipo de VPN (vpntype do log)', max_length=50, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='vpnlog',
+            index=models.Index(fields=['user', '-start_time'], name='vpn_logs_vp_user_16e4df_idx'),
+        ),
+        migrations.RunPython(fill_tunnel_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Resumo diário por usuário (vpn_logs.summary), lido pelas telas de VPN no lugar das
+    agregações sobre VPNLog. Preenchido pela migration seguinte, com o índice único já criado.
+    """
+
+    dependencies = [
+        ('vpn_logs', '0015_vpnlog_tunnel_type_vpn_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VPNUserDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user', models.CharField(help_text='Nome de usuário da VPN', max_length=255)),
+                ('date', models.DateField(help_text='Dia (start_date dos logs)')),
+                ('connections', models.IntegerField(default=0, help_text='Conexões no dia')),
+                ('duration', models.BigIntegerField(default=0, help_text='Duração somada em segundos')),
+                ('bandwidth_in', models.BigIntegerField(default=0, help_text='Bytes recebidos no dia')),
+                ('bandwidth_out', models.BigIntegerField(default=0, help_text='Bytes enviados no dia')),
+                ('last_connection', models.DateTimeField(blank=True, help_text='Início da última conexão do dia', null=True)),
+                ('last_source_ip', models.GenericIPAddressField(blank=True, help_text='IP de origem da última conexão', null=True)),
+                ('last_city', models.CharField(blank=True, max_length=100, null=True)),
+                ('last_country_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('last_country_code', models.CharField(blank=True, max_length=10, null=True)),
+                ('last_status', models.CharField(blank=True, max_length=50, null=True)),
+                ('is_online', models.BooleanField(default=False, help_text='Última conexão do dia ainda ativa')),
+                ('is_fidelity', models.BooleanField(default=False, help_text='Calculado a partir do relatório de fidelidade (D-1)')),
+                ('ad_display_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('ad_department', models.CharField(blank=True, max_length=255, null=True)),
+                ('ad_title', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário de VPN',
+                'verbose_name_plural': 'Resumos Diários de VPN',
+                'indexes': [models.Index(fields=['date', '-last_connection'], name='vpn_logs_vp_date_e3575e_idx')],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
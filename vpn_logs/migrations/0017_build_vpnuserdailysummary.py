@@ -0,0 +1,30 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations
+from vpn_logs.summary import DailySummaryBuilder
+
+
+def build_summaries(apps, schema_editor):
+    DailySummaryBuilder(
+        using=schema_editor.connection.alias,
+        log_model=apps.get_model('vpn_logs', 'VPNLog'),
+        summary_model=apps.get_model('vpn_logs', 'VPNUserDailySummary'),
+    ).rebuild()
+
+
+class Migration(migrations.Migration):
+    """
+    Preenche o resumo diário a partir dos logs existentes, dia a dia, cada dia na sua
+    transação. Dias gravados por workers antigos durante o deploy são refeitos por
+    python manage.py rebuild_vpn_summaries (ou pela task diária, para os últimos dias).
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('vpn_logs', '0016_vpnuserdailysummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django on 2026-10-18
+
+import integrations.payloads
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    raw_data de VPNLog passa a ser comprimido (coluna raw_data_z), como já é em VPNFailure.
+    A coluna JSON antiga continua como raw_data_legacy, anulável, e é esvaziada em blocos por
+    python manage.py compress_payloads.
+    """
+
+    dependencies = [
+        ('integrations', '0016_payloaddictionary'),
+        ('vpn_logs', '0017_build_vpnuserdailysummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vpnlog',
+            name='raw_data',
+            field=models.JSONField(blank=True, db_column='raw_data', editable=False, null=True),
+        ),
+        migrations.RenameField(
+            model_name='vpnlog',
+            old_name='raw_data',
+            new_name='raw_data_legacy',
+        ),
+        migrations.AddField(
+            model_name='vpnlog',
+            name='raw_data',
+            field=integrations.payloads.CompressedJSONField(db_column='raw_data_z', default=dict, help_text='Dados brutos do log', legacy_field='raw_data_legacy', null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations, models
+from django.db.models import Max, Min, Q
+
+
+def fill_is_ssl(apps, schema_editor):
+    """is_ssl das linhas existentes a partir das colunas já preenchidas, em faixas de pk (uma transação cada)."""
+    manager = apps.get_model('vpn_logs', 'VPNLog')._base_manager.db_manager(schema_editor.connection.alias)
+    bounds = manager.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return
+    ssl = Q(tunnel_type__startswith='ssl') | Q(vpn_type__icontains='ssl')
+    for start in range(bounds['first'], bounds['last'] + 1, 20000):
+        manager.filter(ssl, pk__gte=start, pk__lt=start + 20000).update(is_ssl=True)
+
+
+class Migration(migrations.Migration):
+    """
+    is_ssl normaliza na gravação a regra de SSL-VPN (tunneltype ssl* ou vpntype contendo ssl):
+    o filtro do dashboard vira uma igualdade indexável em vez de startswith/icontains sobre
+    duas colunas. Linhas ainda sem tunnel_type recebem is_ssl de python manage.py
+    backfill_tunnel_types.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('vpn_logs', '0018_vpnlog_compressed_raw_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vpnlog',
+            name='is_ssl',
+            field=models.BooleanField(db_index=True, default=False, help_text='Conexão SSL-VPN (tunneltype/vpntype do log)'),
+        ),
+        migrations.RunPython(fill_is_ssl, migrations.RunPython.noop),
+    ]
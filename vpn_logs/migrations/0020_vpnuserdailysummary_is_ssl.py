@@ -0,0 +1,27 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    O resumo diário separa SSL-VPN dos demais tipos (uma linha por usuário, dia e is_ssl), para
+    que a listagem HTML e as exportações voltem a contar só SSL-VPN. Recalculado pela migration
+    seguinte, com o novo índice único já criado.
+    """
+
+    dependencies = [
+        ('vpn_logs', '0019_vpnlog_is_ssl'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vpnuserdailysummary',
+            name='is_ssl',
+            field=models.BooleanField(default=False, help_text='Linha dos logs SSL-VPN do dia'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vpnuserdailysummary',
+            unique_together={('user', 'date', 'is_ssl')},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django on 2026-10-18
+
+from django.db import migrations
+from vpn_logs.summary import DailySummaryBuilder
+
+
+def rebuild_summaries(apps, schema_editor):
+    DailySummaryBuilder(
+        using=schema_editor.connection.alias,
+        log_model=apps.get_model('vpn_logs', 'VPNLog'),
+        summary_model=apps.get_model('vpn_logs', 'VPNUserDailySummary'),
+    ).rebuild()
+
+
+class Migration(migrations.Migration):
+    """
+    Refaz o resumo diário com a divisão por is_ssl, dia a dia, cada dia na sua transação (as
+    linhas existentes, todas com is_ssl falso, são substituídas ou removidas).
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('vpn_logs', '0020_vpnuserdailysummary_is_ssl'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_summaries, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from integrations.payloads import CompressedJSONField, PayloadManager
 
 # Create your models here.
 
@@ -35,13 +36,33 @@ class VPNLog(models.Model):
     distance_km = models.FloatField(null=True, blank=True, help_text="Distância calculada entre conexões (km)")
     travel_details = models.JSONField(null=True, blank=True, help_text="Contexto da viagem impossível (locais e tempos)")
 
-    raw_data = models.JSONField(default=dict, help_text="Dados brutos do log")
+    # Log bruto comprimido (integrations.payloads), fora das listagens por padrão; raw_data_legacy
+    # é a coluna JSON antiga, lida até python manage.py compress_payloads reescrever a linha
+    raw_data = CompressedJSONField(db_column='raw_data_z', null=True, default=dict, legacy_field='raw_data_legacy', help_text="Dados brutos do log")
+    raw_data_legacy = models.JSONField(db_column='raw_data', null=True, blank=True, editable=False)
+    # tunneltype/vpntype do log bruto, preenchidos na gravação (filtro SSL sem ler o JSON).
+    # NULL = linha anterior às colunas ainda não preenchida (python manage.py backfill_tunnel_types)
+    tunnel_type = models.CharField(max_length=50, null=True, blank=True, db_index=True, help_text="Tipo de túnel (tunneltype do log)")
+    vpn_type = models.CharField(max_length=50, null=True, blank=True, db_index=True, help_text="Tipo de VPN (vpntype do log)")
+    # SSL-VPN normalizado na gravação (tunneltype ssl* ou vpntype contendo ssl): filtro por igualdade
+    is_ssl = models.BooleanField(default=False, db_index=True, help_text="Conexão SSL-VPN (tunneltype/vpntype do log)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PayloadManager()
+
     def save(self, *args, **kwargs):
         if self.start_time and not self.start_date:
             self.start_date = self.start_time.date()
+
+        # Colunas de tipo derivadas do log bruto sempre que ele é gravado (numa instância com o
+        # payload adiado ele não muda, e lê-lo custaria uma consulta)
+        update_fields = kwargs.get('update_fields')
+        if 'raw_data' in (update_fields or ()) or (update_fields is None and 'raw_data' not in self.get_deferred_fields()):
+            for name, value in tunnel_fields(self.raw_data).items():
+                setattr(self, name, value)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *tunnel_fields(None)}
             
         # Calcular is_suspicious se não for bypassado (para performance em bulk)
         if not getattr(self, 'bypass_suspicious_check', False):
@@ -60,11 +81,41 @@ class VPNLog(models.Model):
             except Exception:
                 pass
             
-            # Impossible Travel Check
-            self._check_impossible_travel()
+            # Impossible Travel Check (fica para uma passada em lote com skip_travel_check ou
+            # dentro de vpn_logs.travel.deferred_travel_check)
+            from vpn_logs.travel import defer_travel_check
+            if not getattr(self, 'skip_travel_check', False) and not defer_travel_check(self):
+                self._check_impossible_travel()
 
         super().save(*args, **kwargs)
 
+        # Resumo diário do usuário (vpn_logs.summary): na hora ou no fim de deferred_summary_refresh,
+        # também a chave de antes quando o save mudou usuário ou dia
+        if not getattr(self, 'skip_summary_refresh', False):
+            from vpn_logs.summary import touch_summary
+            touch_summary(self, using=kwargs.get('using') or self._state.db, previous=self._loaded_summary_key())
+        self._summary_key = (self.user, self.start_date)
+
+    def delete(self, *args, **kwargs):
+        key = self._loaded_summary_key()
+        result = super().delete(*args, **kwargs)
+        # QuerySet.delete() não passa por aqui: quem apaga em lote recalcula as chaves (ou,
+        # na retenção, apaga o resumo junto)
+        from vpn_logs.summary import touch_summary
+        touch_summary(self, using=kwargs.get('using') or self._state.db, previous=key)
+        return result
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Chave do resumo diário como veio do banco (None se usuário ou dia foram adiados)
+        instance._summary_key = (instance.__dict__.get('user'), instance.__dict__.get('start_date'))
+        return instance
+
+    def _loaded_summary_key(self):
+        key = getattr(self, '_summary_key', None)
+        return key if key and all(key) else None
+
     def _check_impossible_travel(self):
         """
         Calcula a distância entre este login e o anterior usando Haversine.
@@ -86,62 +137,7 @@ class VPNLog(models.Model):
         if not previous_log:
             return
 
-        # Mesma localização exata? Possível.
-        if previous_log.latitude == self.latitude and previous_log.longitude == self.longitude:
-            self.impossible_travel = False
-            return
-
-        # Cálculo de Haversine (Distância em KM entre dois pontos)
-        import math
-        R = 6371.0 # Raio da Terra em KM
-        
-        lat1, lon1 = math.radians(previous_log.latitude), math.radians(previous_log.longitude)
-        lat2, lon2 = math.radians(self.latitude), math.radians(self.longitude)
-        
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        
-        a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        distance = R * c
-        
-        # Tempo entre conexões
-        time_diff = (self.start_time - previous_log.start_time).total_seconds() / 3600.0 # Horas
-        
-        if time_diff > 0:
-            speed = distance / time_diff
-            self.travel_speed = round(speed, 2)
-            self.distance_km = round(distance, 2)
-            
-            # Limite: 800 km/h (Avião comercial médio)
-            if speed > 800:
-                self.impossible_travel = True
-                self.travel_details = {
-                    'previous': {
-                        'city': previous_log.city,
-                        'country': previous_log.country_name,
-                        'code': previous_log.country_code,
-                        'time': previous_log.start_time.isoformat(),
-                        'lat': previous_log.latitude,
-                        'lon': previous_log.longitude
-                    },
-                    'current': {
-                        'city': self.city,
-                        'country': self.country_name,
-                        'code': self.country_code,
-                        'time': self.start_time.isoformat(),
-                        'lat': self.latitude,
-                        'lon': self.longitude
-                    },
-                    'distance_km': self.distance_km,
-                    'speed_kmh': self.travel_speed,
-                    'time_diff_hours': round(time_diff, 2)
-                }
-            else:
-                self.impossible_travel = False
-                self.travel_details = None
-        else:
-            self.impossible_travel = False
+        assess_travel(previous_log, self)
 
     class Meta:
         verbose_name = "Log de VPN"
@@ -151,35 +147,164 @@ class VPNLog(models.Model):
             models.Index(fields=['user', 'start_date']),
             models.Index(fields=['is_suspicious', 'start_date']),
             models.Index(fields=['impossible_travel', 'start_date']),
+            # Última conexão do usuário (subconsultas correlacionadas do dashboard)
+            models.Index(fields=['user', '-start_time']),
         ]
 
     def __str__(self):
         return f"{self.user} - {self.start_time}"
 
     def formatted_duration(self):
-        if not self.duration:
-            return "-"
-        seconds = self.duration
-        h = seconds // 3600
-        m = (seconds % 3600) // 60
-        s = seconds % 60
-        return f"{h:02d}:{m:02d}:{s:02d}"
-        
+        return format_duration(self.duration)
+
     def formatted_volume(self):
-        total = (self.bandwidth_in or 0) + (self.bandwidth_out or 0)
-        if total == 0:
-            return "-"
-        # Converter para GB ou MB
-        gb = total / (1024 * 1024 * 1024)
-        if gb >= 1:
-            return f"{gb:.2f} GB"
-        mb = total / (1024 * 1024)
-        return f"{mb:.2f} MB"
+        return format_volume(self.bandwidth_in, self.bandwidth_out)
 
     @property
     def display_name_or_user(self):
         return self.ad_display_name or self.user
 
+
+def format_duration(seconds):
+    """Segundos como HH:MM:SS ('-' sem duração)."""
+    if not seconds:
+        return "-"
+    h = seconds // 3600
+    m = (seconds % 3600) // 60
+    s = seconds % 60
+    return f"{h:02d}:{m:02d}:{s:02d}"
+
+
+def format_volume(bandwidth_in, bandwidth_out):
+    """Bytes recebidos + enviados em GB ou MB ('-' sem tráfego)."""
+    total = (bandwidth_in or 0) + (bandwidth_out or 0)
+    if total == 0:
+        return "-"
+    # Converter para GB ou MB
+    gb = total / (1024 * 1024 * 1024)
+    if gb >= 1:
+        return f"{gb:.2f} GB"
+    mb = total / (1024 * 1024)
+    return f"{mb:.2f} MB"
+
+
+def tunnel_fields(raw_data):
+    """tunnel_type/vpn_type/is_ssl de VPNLog a partir do log bruto ('' quando o log não os traz)."""
+    raw = raw_data if isinstance(raw_data, dict) else {}
+    tunnel_type = str(raw.get('tunneltype') or '')[:50]
+    vpn_type = str(raw.get('vpntype') or '')[:50]
+    return {
+        'tunnel_type': tunnel_type,
+        'vpn_type': vpn_type,
+        'is_ssl': is_ssl_tunnel(tunnel_type, vpn_type),
+    }
+
+
+def is_ssl_tunnel(tunnel_type, vpn_type):
+    """Regra única de SSL-VPN (a mesma do antigo filtro por JSON do dashboard)."""
+    return (tunnel_type or '').startswith('ssl') or 'ssl' in (vpn_type or '').lower()
+
+
+def backfill_tunnel_types(model=None, chunk=2000, using=DEFAULT_DB_ALIAS):
+    """
+    Preenche tunnel_type/vpn_type/is_ssl das linhas ainda NULL, em blocos de chunk linhas pelo pk
+    (uma transação por bloco). model: VPNLog ou o model histórico da migration.
+    Devolve quantas linhas foram preenchidas.
+    """
+    manager = (model or VPNLog)._base_manager.db_manager(using)
+    # A coluna antiga vem junto (o payload cai nela enquanto a linha não foi comprimida)
+    legacy = getattr(manager.model._meta.get_field('raw_data'), 'legacy_field', None)
+    columns = ['pk', 'raw_data'] + ([legacy] if legacy else [])
+    # O model histórico da migration 0015 ainda não tem is_ssl
+    concrete = {field.name for field in manager.model._meta.concrete_fields}
+    names = [name for name in tunnel_fields(None) if name in concrete]
+    last_pk, filled = None, 0
+    while True:
+        queryset = manager.filter(tunnel_type__isnull=True).order_by('pk').only(*columns)
+        if last_pk is not None:
+            queryset = queryset.filter(pk__gt=last_pk)
+        rows = list(queryset[:chunk])
+        if not rows:
+            return filled
+        for row in rows:
+            for name, value in tunnel_fields(row.raw_data).items():
+                setattr(row, name, value)
+        with transaction.atomic(using=using):
+            manager.bulk_update(rows, names)
+        last_pk = rows[-1].pk
+        filled += len(rows)
+
+
+# Limite: 800 km/h (Avião comercial médio)
+IMPOSSIBLE_TRAVEL_SPEED_KMH = 800
+
+
+def assess_travel(previous, current):
+    """
+    Compara a conexão 'current' com a anterior do mesmo usuário ('previous') e preenche
+    impossible_travel, travel_speed, distance_km e travel_details em 'current'.
+    Usado por VPNLog.save(); o cálculo em lote (vpn_logs.travel) usa apply_travel.
+    """
+    # Mesma localização exata? Possível.
+    if previous.latitude == current.latitude and previous.longitude == current.longitude:
+        current.impossible_travel = False
+        return
+
+    # Cálculo de Haversine (Distância em KM entre dois pontos)
+    import math
+    R = 6371.0 # Raio da Terra em KM
+    
+    lat1, lon1 = math.radians(previous.latitude), math.radians(previous.longitude)
+    lat2, lon2 = math.radians(current.latitude), math.radians(current.longitude)
+    
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    
+    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    distance = R * c
+    
+    # Tempo entre conexões
+    time_diff = (current.start_time - previous.start_time).total_seconds() / 3600.0 # Horas
+    apply_travel(previous, current, distance, time_diff)
+
+
+def apply_travel(previous, current, distance, time_diff):
+    """Preenche os campos de viagem de 'current' dada a distância (km) e o intervalo (horas) até 'previous'."""
+    if time_diff > 0:
+        speed = distance / time_diff
+        current.travel_speed = round(speed, 2)
+        current.distance_km = round(distance, 2)
+        
+        if speed > IMPOSSIBLE_TRAVEL_SPEED_KMH:
+            current.impossible_travel = True
+            current.travel_details = {
+                'previous': {
+                    'city': previous.city,
+                    'country': previous.country_name,
+                    'code': previous.country_code,
+                    'time': previous.start_time.isoformat(),
+                    'lat': previous.latitude,
+                    'lon': previous.longitude
+                },
+                'current': {
+                    'city': current.city,
+                    'country': current.country_name,
+                    'code': current.country_code,
+                    'time': current.start_time.isoformat(),
+                    'lat': current.latitude,
+                    'lon': current.longitude
+                },
+                'distance_km': current.distance_km,
+                'speed_kmh': current.travel_speed,
+                'time_diff_hours': round(time_diff, 2)
+            }
+        else:
+            current.impossible_travel = False
+            current.travel_details = None
+    else:
+        current.impossible_travel = False
+
 class VPNFailure(models.Model):
     """Modelo para registrar tentativas de falha de login (Brute Force Analysis)"""
     user = models.CharField(max_length=255, db_index=True, help_text="Usuário tentado")
@@ -200,9 +325,13 @@ class VPNFailure(models.Model):
     ad_title = models.CharField(max_length=255, null=True, blank=True, db_index=True)
     ad_display_name = models.CharField(max_length=255, null=True, blank=True)
     
-    raw_data = models.JSONField(default=dict)
+    # Log bruto comprimido (integrations.payloads), fora das listagens por padrão
+    raw_data = CompressedJSONField(db_column='raw_data_z', null=True, legacy_field='raw_data_legacy')
+    raw_data_legacy = models.JSONField(db_column='raw_data', null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = PayloadManager()
+
     class Meta:
         verbose_name = "Falha de Login VPN"
         verbose_name_plural = "Falhas de Login VPN"
@@ -215,3 +344,59 @@ class VPNFailure(models.Model):
     def __str__(self):
         return f"Falha: {self.user} em {self.timestamp}"
 
+
+
+class VPNUserDailySummary(models.Model):
+    """
+    Resumo por usuário, dia e tipo (SSL-VPN ou não) dos logs de VPN (vpn_logs.summary), lido
+    pelas listagens, estatísticas e exportações do dashboard no lugar das agregações sobre VPNLog.
+    Em dias com relatório de fidelidade, só os logs do relatório contam (is_fidelity).
+    """
+    user = models.CharField(max_length=255, help_text="Nome de usuário da VPN")
+    date = models.DateField(help_text="Dia (start_date dos logs)")
+    # Logs SSL-VPN e os demais em linhas separadas (VPNLog.is_ssl)
+    is_ssl = models.BooleanField(default=False, help_text="Linha dos logs SSL-VPN do dia")
+
+    connections = models.IntegerField(default=0, help_text="Conexões no dia")
+    duration = models.BigIntegerField(default=0, help_text="Duração somada em segundos")
+    bandwidth_in = models.BigIntegerField(default=0, help_text="Bytes recebidos no dia")
+    bandwidth_out = models.BigIntegerField(default=0, help_text="Bytes enviados no dia")
+
+    # Última conexão do dia
+    last_connection = models.DateTimeField(null=True, blank=True, help_text="Início da última conexão do dia")
+    last_source_ip = models.GenericIPAddressField(null=True, blank=True, help_text="IP de origem da última conexão")
+    last_city = models.CharField(max_length=100, null=True, blank=True)
+    last_country_name = models.CharField(max_length=100, null=True, blank=True)
+    last_country_code = models.CharField(max_length=10, null=True, blank=True)
+    last_status = models.CharField(max_length=50, null=True, blank=True)
+    is_online = models.BooleanField(default=False, help_text="Última conexão do dia ainda ativa")
+    is_fidelity = models.BooleanField(default=False, help_text="Calculado a partir do relatório de fidelidade (D-1)")
+
+    # AD da última conexão do dia (filtros por nome, cargo e departamento)
+    ad_display_name = models.CharField(max_length=255, null=True, blank=True)
+    ad_department = models.CharField(max_length=255, null=True, blank=True)
+    ad_title = models.CharField(max_length=255, null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Resumo Diário de VPN"
+        verbose_name_plural = "Resumos Diários de VPN"
+        unique_together = ['user', 'date', 'is_ssl']
+        # O índice único (user, date, is_ssl) atende as consultas por usuário; este, a listagem de um dia
+        indexes = [
+            models.Index(fields=['date', '-last_connection']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.date}: {self.connections} conexões"
+
+    @property
+    def total_volume(self):
+        return (self.bandwidth_in or 0) + (self.bandwidth_out or 0)
+
+    def formatted_duration(self):
+        return format_duration(self.duration)
+
+    def formatted_volume(self):
+        return format_volume(self.bandwidth_in, self.bandwidth_out)
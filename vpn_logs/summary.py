@@ -0,0 +1,328 @@
+"""
+Resumo diário por usuário dos logs de VPN (VPNUserDailySummary).
+
+As telas de VPN agregavam VPNLog inteiro por usuário a cada requisição, com uma subconsulta
+correlacionada por coluna da última conexão (IP, cidade, país, status) e, na listagem HTML,
+uma varredura extra dos dias com relatório de fidelidade. O resumo guarda uma linha por
+(usuário, dia, is_ssl) com os totais e a última conexão do dia; as telas leem só o resumo.
+A listagem HTML e as exportações contam só SSL-VPN (filter_summaries(ssl_only=True)); a API
+e as estatísticas somam os dois tipos.
+
+Manutenção por chave: as chaves (usuário, dia) tocadas por uma gravação são recalculadas a
+partir dos logs daquele usuário naquele dia (índice user/start_date), as linhas SSL e não SSL
+juntas (um log pode mudar de tipo ao ser regravado). Como os logs de
+sessão são cumulativos e regravados, recalcular a chave é o que mantém o resumo exato;
+somar deltas contaria em dobro.
+
+Regra de fidelidade (a da listagem antiga): num dia com relatório de fidelidade
+(session_id 'fidelity_...'), só os logs do relatório contam; as linhas calculadas a partir
+dos logs ao vivo daquele dia são descartadas.
+
+Quem mantém:
+- VPNLogBulkWriter.write e SessionCorrelator.flush: refresh_summaries com as chaves do lote;
+- VPNLog.save()/delete(): touch_summary recalcula a chave (e a de antes, se o save mudou
+  usuário ou dia) na hora ou, dentro de
+  deferred_summary_refresh(), uma vez no fim do bloco (relatório de fidelidade,
+  consolidação da meia-noite, fechamento de sessões expiradas, sync_logs e os scripts de
+  reparo que salvam logs em laço: repair_geoip, repair_geoip_api, sync_ad_retroactive,
+  rollback_midnight);
+- rebuild_vpn_summaries (comando) e a task diária rebuild_vpn_daily_summaries recalculam
+  dias inteiros.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Q, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+from functools import reduce
+from vpn_logs.models import VPNLog, VPNUserDailySummary
+import datetime
+import logging
+import operator
+import threading
+
+logger = logging.getLogger(__name__)
+
+FIDELITY_PREFIX = 'fidelity_'
+
+# Status da última conexão que contam como usuário online
+ONLINE_STATUSES = ('active', 'tunnel-up')
+
+# Colunas da última conexão do dia: VPNLog → VPNUserDailySummary
+LATEST_COLUMNS = {
+    'source_ip': 'last_source_ip',
+    'city': 'last_city',
+    'country_name': 'last_country_name',
+    'country_code': 'last_country_code',
+    'status': 'last_status',
+    'ad_display_name': 'ad_display_name',
+    'ad_department': 'ad_department',
+    'ad_title': 'ad_title',
+}
+
+SUMMARY_FIELDS = [
+    'connections', 'duration', 'bandwidth_in', 'bandwidth_out', 'last_connection',
+    *LATEST_COLUMNS.values(), 'is_online', 'is_fidelity', 'updated_at',
+]
+
+_state = threading.local()
+
+
+class DailySummaryBuilder:
+    """
+    Recalcula linhas de VPNUserDailySummary a partir de VPNLog.
+    chunk_size: usuários por consulta e linhas por INSERT. log_model/summary_model: os
+    models atuais ou os históricos de uma migration.
+    """
+
+    def __init__(self, using=None, chunk_size=500, log_model=None, summary_model=None):
+        self.using = using or DEFAULT_DB_ALIAS
+        self.chunk_size = chunk_size
+        self.summary_model = summary_model or VPNUserDailySummary
+        self.logs = (log_model or VPNLog)._base_manager.db_manager(self.using)
+        self.summaries = self.summary_model._base_manager.db_manager(self.using)
+        self.use_upsert = connections[self.using].features.supports_update_conflicts_with_target
+        # Uma linha por (usuário, is_ssl) no dia; o model histórico da migration 0017 ainda não tem is_ssl
+        concrete = {field.name for field in self.summary_model._meta.concrete_fields}
+        self.group_fields = ('user', 'is_ssl') if 'is_ssl' in concrete else ('user',)
+
+    def refresh(self, keys):
+        """Recalcula as chaves (usuário, dia). Devolve quantas linhas foram gravadas ou removidas."""
+        by_day = defaultdict(set)
+        for user, day in keys:
+            if user and day:
+                by_day[day].add(user)
+        changed = 0
+        for day in sorted(by_day):
+            for users in self._chunks(sorted(by_day[day])):
+                changed += self._refresh_day(day, users)
+        return changed
+
+    def refresh_days(self, days):
+        """Recalcula dias inteiros: todos os usuários com logs ou linhas de resumo no dia."""
+        return sum(self._refresh_day(day) for day in sorted(set(days)))
+
+    def rebuild(self, since=None, until=None):
+        """Recalcula os dias com logs ou resumo entre since e until (datas, inclusive; None = sem limite)."""
+        days = set()
+        for manager, field in ((self.logs, 'start_date'), (self.summaries, 'date')):
+            queryset = manager.filter(**{f'{field}__isnull': False})
+            if since is not None:
+                queryset = queryset.filter(**{f'{field}__gte': since})
+            if until is not None:
+                queryset = queryset.filter(**{f'{field}__lte': until})
+            days.update(queryset.order_by().values_list(field, flat=True).distinct())
+        changed = self.refresh_days(days)
+        logger.info(f"Resumo diário VPN recalculado para {len(days)} dias: {changed} linhas gravadas ou removidas")
+        return changed
+
+    def _chunks(self, items):
+        for start in range(0, len(items), self.chunk_size):
+            yield items[start:start + self.chunk_size]
+
+    def _refresh_day(self, day, users=None):
+        """Recalcula o dia para os usuários informados (todos, se None)."""
+        fidelity = self.logs.filter(start_date=day, session_id__startswith=FIDELITY_PREFIX).exists()
+        day_logs = self.logs.filter(start_date=day)
+        if fidelity:
+            day_logs = day_logs.filter(session_id__startswith=FIDELITY_PREFIX)
+        if users is not None:
+            day_logs = day_logs.filter(user__in=users)
+
+        group = self.group_fields
+        totals = day_logs.order_by().values(*group).annotate(
+            total_connections=Count('id'),
+            total_duration=Coalesce(Sum('duration'), 0),
+            total_in=Coalesce(Sum('bandwidth_in'), 0),
+            total_out=Coalesce(Sum('bandwidth_out'), 0),
+            last_start=Max('start_time'),
+        )
+        latest = {
+            tuple(row[name] for name in group): row
+            for row in day_logs.annotate(
+                position=Window(RowNumber(), partition_by=[F(name) for name in group], order_by=[F('start_time').desc(), F('id').desc()])
+            ).filter(position=1).values(*group, *LATEST_COLUMNS)
+        }
+
+        now = timezone.now()
+        rows = []
+        for total in totals:
+            last = latest.get(tuple(total[name] for name in group), {})
+            rows.append(self.summary_model(
+                **{name: total[name] for name in group}, date=day,
+                connections=total['total_connections'],
+                duration=total['total_duration'],
+                bandwidth_in=total['total_in'],
+                bandwidth_out=total['total_out'],
+                last_connection=total['last_start'],
+                is_online=last.get('status') in ONLINE_STATUSES,
+                is_fidelity=fidelity,
+                updated_at=now,
+                **{target: last.get(source) for source, target in LATEST_COLUMNS.items()},
+            ))
+        key = lambda row: tuple(getattr(row, name) for name in group)
+        rows.sort(key=key)
+
+        existing = self.summaries.filter(date=day)
+        if users is not None:
+            existing = existing.filter(user__in=users)
+        gone = sorted(set(existing.values_list(*group)) - {key(row) for row in rows})
+
+        removed = 0
+        with transaction.atomic(using=self.using):
+            if fidelity:
+                # Linhas dos logs ao vivo não valem mais depois do relatório do dia
+                removed += self.summaries.filter(date=day, is_fidelity=False).delete()[0]
+            for chunk in self._chunks(gone):
+                removed += self.summaries.filter(
+                    reduce(operator.or_, (Q(**dict(zip(group, values))) for values in chunk)), date=day,
+                ).delete()[0]
+            if self.use_upsert:
+                self.summaries.bulk_create(
+                    rows, batch_size=self.chunk_size,
+                    update_conflicts=True, unique_fields=[*group, 'date'], update_fields=SUMMARY_FIELDS,
+                )
+            else:
+                for chunk in self._chunks(sorted({row.user for row in rows})):
+                    self.summaries.filter(date=day, user__in=chunk).delete()
+                self.summaries.bulk_create(rows, batch_size=self.chunk_size)
+        return len(rows) + removed
+
+
+def refresh_summaries(keys, using=None, chunk_size=500):
+    """Recalcula as linhas de resumo das chaves (usuário, dia)."""
+    return DailySummaryBuilder(using=using, chunk_size=chunk_size).refresh(keys)
+
+
+def summary_keys(logs):
+    """Chaves (usuário, dia) de instâncias de VPNLog."""
+    return {(log.user, log.start_date) for log in logs}
+
+
+def touch_summary(log, using=None, previous=None):
+    """
+    Chamado por VPNLog.save()/delete(): recalcula a chave do log (e previous, a chave com que
+    ele foi carregado, quando o save mudou usuário ou dia) na hora ou, dentro de
+    deferred_summary_refresh, registra as chaves para o fim do bloco.
+    """
+    keys = {(log.user, log.start_date)}
+    if previous:
+        keys.add(previous)
+    touch_summary_keys(keys, using=using)
+
+
+def touch_summary_keys(keys, using=None):
+    """Recalcula as chaves (usuário, dia) na hora ou no fim do deferred_summary_refresh em curso."""
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.update(keys)
+        return
+    refresh_summaries(keys, using=using)
+
+
+@contextmanager
+def deferred_summary_refresh(using=None):
+    """
+    Adia o recálculo do resumo dos VPNLog.save() do bloco para uma passada na saída (sem
+    exceção). Blocos aninhados deixam a passada para o externo.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+    _state.pending = set()
+    try:
+        yield
+        pending = _state.pending
+    finally:
+        _state.pending = None
+    if pending:
+        refresh_summaries(pending, using=using)
+
+
+# --- Leitura (dashboard) ---
+
+def user_totals(queryset):
+    """
+    Linhas de resumo (já filtradas) agregadas por usuário: totais, última conexão e
+    online_priority (1 se alguma linha está online), no formato da listagem antiga.
+    """
+    return queryset.order_by().values('user').annotate(
+        total_connections=Sum('connections'),
+        total_duration=Sum('duration'),
+        total_volume=Sum(F('bandwidth_in') + F('bandwidth_out')),
+        last_connection=Max('last_connection'),
+        online_priority=Max(Case(When(is_online=True, then=Value(1)), default=Value(0), output_field=IntegerField())),
+        # Só para ordenar por cargo/departamento (os exibidos vêm de with_latest)
+        title_order=Max('ad_title'),
+        department_order=Max('ad_department'),
+    )
+
+
+def latest_rows(queryset, users):
+    """
+    {usuário: linha de resumo mais recente} dentro do queryset, só para os usuários dados (uma
+    página). No mesmo dia (linhas SSL e não SSL) vale a de conexão mais recente.
+    """
+    return {
+        row.user: row
+        for row in queryset.filter(user__in=list(users)).annotate(
+            position=Window(RowNumber(), partition_by=[F('user')], order_by=[
+                F('date').desc(), F('last_connection').desc(nulls_last=True), F('id').desc(),
+            ])
+        ).filter(position=1)
+    }
+
+
+def with_latest(page, queryset):
+    """
+    Completa as linhas agregadas de user_totals (uma página) com AD, IP, local e status da
+    linha de resumo mais recente de cada usuário, nos nomes usados pelo dashboard.
+    """
+    page = list(page)
+    latest = latest_rows(queryset, {row['user'] for row in page})
+    for row in page:
+        last = latest.get(row['user'])
+        row.update({
+            'ad_display_name': last.ad_display_name if last else None,
+            'ad_department': last.ad_department if last else None,
+            'ad_title': last.ad_title if last else None,
+            'latest_source_ip': last.last_source_ip if last else None,
+            'latest_city': last.last_city if last else None,
+            'latest_country': last.last_country_name if last else None,
+            'latest_country_code': last.last_country_code if last else None,
+            'latest_status': last.last_status if last else None,
+        })
+    return page
+
+
+def filter_summaries(params, with_date=True, ssl_only=False):
+    """
+    Linhas de resumo com os filtros do dashboard: user_q (usuário ou nome), title_q, dept_q,
+    q (usuário, departamento ou nome) e, com with_date, date=AAAA-MM-DD (inválida é ignorada).
+    ssl_only: só as linhas de SSL-VPN (listagem HTML e exportações).
+    """
+    queryset = VPNUserDailySummary.objects.all()
+    if ssl_only:
+        queryset = queryset.filter(is_ssl=True)
+    user_q = params.get('user_q')
+    if user_q:
+        queryset = queryset.filter(Q(user__icontains=user_q) | Q(ad_display_name__icontains=user_q))
+    title_q = params.get('title_q')
+    if title_q:
+        queryset = queryset.filter(ad_title__icontains=title_q)
+    dept_q = params.get('dept_q')
+    if dept_q:
+        queryset = queryset.filter(ad_department__icontains=dept_q)
+    query = params.get('q')
+    if query:
+        queryset = queryset.filter(
+            Q(user__icontains=query) | Q(ad_department__icontains=query) | Q(ad_display_name__icontains=query)
+        )
+    date_str = params.get('date')
+    if with_date and date_str:
+        try:
+            queryset = queryset.filter(date=datetime.datetime.strptime(date_str, '%Y-%m-%d').date())
+        except ValueError:
+            pass
+    return queryset
@@ -1,3 +1,468 @@
-from django.test import TestCase
+import collections
+import datetime
+import types
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from integrations.models import CollectionWatermark
+from integrations.normalizer import FA_CLOCK_SKEW, normalize_vpn
+from vpn_logs.bruteforce import ATTACK_NAMES, BruteForceDetector
+from vpn_logs.correlator import SessionCorrelator
+from vpn_logs.ingest import VPNLogIngestor
+from vpn_logs.models import VPNFailure, VPNLog, VPNUserDailySummary, backfill_tunnel_types
+from vpn_logs.summary import DailySummaryBuilder, filter_summaries, user_totals, with_latest
+from integrations.tests import FakeFAClient
+from vpn_logs.tasks import consolidar_conexoes_virada_dia, fetch_vpn_logs_task
+from vpn_logs.writers import VPNLogBulkWriter
+
+
+def local(*args):
+    """datetime aware no fuso local (TIME_ZONE)."""
+    return timezone.make_aware(datetime.datetime(*args))
+
+
+def fa_log(action, session, user, when, duration=0, rcvd=0, sent=0, ip='200.10.0.1', **extra):
+    """Log bruto de VPN como o FA devolve (relógio do FA adiantado em FA_CLOCK_SKEW)."""
+    stamp = timezone.localtime(when + FA_CLOCK_SKEW)
+    log = {
+        'action': action, 'sessionid': session, 'user': user, 'remip': ip,
+        'date': stamp.strftime('%Y-%m-%d'), 'time': stamp.strftime('%H:%M:%S'),
+        'duration': str(duration), 'rcvdbyte': str(rcvd), 'sentbyte': str(sent),
+        'tunneltype': 'ssl-tunnel', 'srccountry': 'Brazil', 'srccity': 'Sao Paulo',
+    }
+    log.update(extra)
+    return log
+
+
+class StaticADClient:
+    """Cliente AD de teste: os mesmos atributos para qualquer usuário."""
+
+    def get_users_info(self, users):
+        return {user: {'department': 'TI', 'title': 'Analista', 'display_name': user.title(), 'email': f'{user}@corp'} for user in users}
+
+
+DAY = (2026, 3, 10)
+
+SESSION_BATCH = [
+    fa_log('tunnel-up', '101', 'alice', local(*DAY, 8, 0)),
+    fa_log('tunnel-up', '102', 'bob', local(*DAY, 9, 0), ip='200.10.0.2'),
+    fa_log('tunnel-down', '101', 'alice', local(*DAY, 10, 0), duration=7200, rcvd=1000, sent=500),
+    fa_log('tunnel-stats', '102', 'bob', local(*DAY, 9, 30), duration=1800, rcvd=10, sent=5, ip='200.10.0.2'),
+]
+
+
+def session_rows():
+    return list(VPNLog.objects.order_by('session_id').values_list(
+        'session_id', 'user', 'status', 'start_date', 'duration', 'bandwidth_in', 'bandwidth_out', 'ad_department', 'tunnel_type'
+    ))
+
+
+class VPNLogIngestTests(TestCase):
+
+    def ingest(self, logs):
+        return VPNLogIngestor(StaticADClient()).run(iter(logs))
+
+    def test_reingest_same_batch_is_idempotent(self):
+        first = self.ingest(SESSION_BATCH)
+        rows = session_rows()
+        self.assertEqual(first['created'], 2)
+        self.assertEqual(first['heartbeat'], 1)
+        self.assertEqual(rows, [
+            ('101', 'alice', 'closed', datetime.date(*DAY), 7200, 1000, 500, 'TI', 'ssl-tunnel'),
+            ('102', 'bob', 'active', datetime.date(*DAY), 1800, 0, 0, 'TI', 'ssl-tunnel'),
+        ])
+
+        second = self.ingest(SESSION_BATCH)
+        self.assertEqual(second['created'], 0)
+        self.assertEqual(second['updated'], 2)
+        self.assertEqual(VPNLog.objects.count(), 2)
+        self.assertEqual(session_rows(), rows)
+
+    def test_session_logs_in_one_batch_are_merged(self):
+        outcomes = VPNLogBulkWriter().write([normalize_vpn(log) for log in SESSION_BATCH[:3]])
+        self.assertEqual(outcomes, {'101': 'created', '102': 'created'})
+        alice = VPNLog.objects.get(session_id='101')
+        self.assertEqual((alice.status, alice.duration), ('closed', 7200))
+        self.assertEqual(alice.end_time - alice.start_time, datetime.timedelta(seconds=7200))
+
+
+class VPNLogBulkWriterTests(TestCase):
+
+    def write_twice(self, use_upsert):
+        writer = VPNLogBulkWriter(trusted_countries={'BR'})
+        writer.use_upsert = use_upsert
+        created = writer.write([normalize_vpn(log) for log in SESSION_BATCH[:2]])
+        updated = writer.write([normalize_vpn(log) for log in SESSION_BATCH[2:3] + [fa_log('tunnel-up', '103', 'carol', local(*DAY, 11, 0), srccountry='Portugal')]])
+        return created, updated, session_rows(), list(VPNLog.objects.order_by('session_id').values_list('session_id', 'is_suspicious'))
+
+    def test_upsert_and_create_update_paths_agree(self):
+        upsert = self.write_twice(use_upsert=True)
+        VPNLog.objects.all().delete()
+        fallback = self.write_twice(use_upsert=False)
+
+        self.assertEqual(upsert, fallback)
+        created, updated, rows, suspicious = upsert
+        self.assertEqual(created, {'101': 'created', '102': 'created'})
+        self.assertEqual(updated, {'101': 'updated', '103': 'created'})
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0][2:5], ('closed', datetime.date(*DAY), 7200))
+        self.assertEqual(suspicious, [('101', False), ('102', False), ('103', True)])
+
+    def test_is_ssl_is_normalized_on_every_write_path(self):
+        VPNLogBulkWriter().write([
+            normalize_vpn(fa_log('tunnel-up', '301', 'ana', local(*DAY, 8, 0))),
+            normalize_vpn(fa_log('tunnel-up', '302', 'bia', local(*DAY, 8, 0), tunneltype='ipsec', vpntype='ipsecvpn')),
+            normalize_vpn(fa_log('tunnel-up', '303', 'caio', local(*DAY, 8, 0), tunneltype='', vpntype='SSL-VPN')),
+        ])
+        self.assertEqual(
+            list(VPNLog.objects.order_by('session_id').values_list('session_id', 'is_ssl')),
+            [('301', True), ('302', False), ('303', True)],
+        )
+
+        # save(update_fields) com o log bruto recalcula a coluna
+        row = VPNLog.objects.get(session_id='302')
+        row.raw_data = {'tunneltype': 'ssl-web'}
+        row.save(update_fields=['raw_data'])
+        self.assertTrue(VPNLog.objects.get(session_id='302').is_ssl)
+
+        # Linhas gravadas antes das colunas (tunnel_type NULL) recebem is_ssl do backfill
+        VPNLog.objects.update(tunnel_type=None, vpn_type=None, is_ssl=False)
+        self.assertEqual(backfill_tunnel_types(chunk=2), 3)
+        self.assertEqual(VPNLog.objects.filter(is_ssl=True).count(), 3)
+
+
+class MidnightSplitTests(TestCase):
+    """Sessão ativa na virada do dia: parte encerrada no dia e continuação com o offset."""
+
+    def test_active_session_is_split_and_heartbeat_discounts_offset(self):
+        VPNLogIngestor(StaticADClient()).run(iter([fa_log('tunnel-up', '201', 'dave', local(*DAY, 20, 0))]))
+
+        midnight = local(*DAY, 23, 59)
+        with mock.patch('django.utils.timezone.now', return_value=midnight):
+            consolidar_conexoes_virada_dia()
+
+        closed = VPNLog.objects.get(session_id__startswith='201_midnight_')
+        self.assertEqual(closed.status, 'closed')
+        self.assertEqual(closed.duration, 3 * 3600 + 59 * 60)
+        self.assertEqual(closed.end_time, midnight)
+
+        current = VPNLog.objects.get(session_id='201')
+        self.assertEqual((current.status, current.duration, current.start_time), ('active', 0, midnight))
+        self.assertEqual(current.raw_data['_duration_offset'], closed.duration)
+        self.assertEqual(current.ad_department, 'TI')
+
+        # Heartbeat depois da meia-noite: a duração total do túnel menos o que ficou no dia anterior
+        heartbeat = fa_log('tunnel-stats', '201', 'dave', local(2026, 3, 11, 0, 10), duration=closed.duration + 660)
+        outcomes = VPNLogIngestor(StaticADClient()).run(iter([heartbeat]))
+        self.assertEqual(outcomes['heartbeat'], 1)
+        current.refresh_from_db()
+        self.assertEqual(current.duration, 660)
+        self.assertEqual(VPNLog.objects.count(), 2)
+
+
+
+class BruteForceDetectorTests(TestCase):
+    """As três regras com falhas fora de ordem (o FA devolve do mais recente ao mais antigo)."""
+
+    START = local(*DAY, 14, 0)
+
+    def failure(self, user, ip, seconds):
+        return normalize_vpn(fa_log('ssl-login-fail', '0', user, self.START + datetime.timedelta(seconds=seconds), ip=ip, reason='sslvpn_login_unknown_user'))
+
+    def process(self, records):
+        detector = BruteForceDetector()
+        detector.process(records)
+        return detector
+
+    def alerts(self):
+        from security_events.models import SecurityEvent
+        return sorted(SecurityEvent.objects.with_details('ips').values_list('attack_name', 'username', 'src_ip'))
+
+    def test_user_ip_alerts_once_per_window(self):
+        burst = [self.failure('alice', '198.51.100.1', 20 * i) for i in range(12)]
+        later = [self.failure('alice', '198.51.100.1', 1800 + 20 * i) for i in range(6)]
+        detector = self.process(list(reversed(burst + later)))
+
+        self.assertEqual(detector.stats['failures'], 18)
+        self.assertEqual(self.alerts(), [
+            (ATTACK_NAMES['user_ip'], 'alice', '198.51.100.1'),
+            (ATTACK_NAMES['user_ip'], 'alice', '198.51.100.1'),
+        ])
+
+    def test_below_threshold_does_not_alert(self):
+        self.process([self.failure('alice', '198.51.100.1', 60 * i) for i in reversed(range(4))])
+        self.process([self.failure('alice', '198.51.100.1', 400 + 60 * i) for i in reversed(range(4))])
+        self.assertEqual(self.alerts(), [])
+        self.assertEqual(VPNFailure.objects.count(), 8)
+
+    def test_spray_ip_alerts_once_per_ip(self):
+        self.process([self.failure(f'user{i}', '198.51.100.7', 30 * i) for i in reversed(range(14))])
+        self.assertEqual(self.alerts(), [(ATTACK_NAMES['spray_ip'], '', '198.51.100.7')])
+
+    def test_spray_user_alerts_once_per_user(self):
+        self.process([self.failure('bob', f'198.51.100.{i}', 30 * i) for i in reversed(range(1, 9))])
+        self.assertEqual(self.alerts(), [(ATTACK_NAMES['spray_user'], 'bob', '198.51.100.5')])
+
+    def test_later_batches_and_reingest_are_suppressed(self):
+        records = [self.failure('alice', '198.51.100.1', 20 * i) for i in reversed(range(10))]
+        # Dois lotes da mesma execução e, depois, outra execução com o lote inteiro de novo
+        detector = BruteForceDetector()
+        detector.process(records[:5])
+        detector.process(records[5:])
+        again = self.process(records)
+
+        self.assertEqual(again.stats, {'failures': 0, 'duplicates': 10, 'alerts': 0})
+        self.assertEqual(VPNFailure.objects.count(), 10)
+        self.assertEqual(self.alerts(), [(ATTACK_NAMES['user_ip'], 'alice', '198.51.100.1')])
+
+
+def old_heartbeat_lookup(source_ip, username, timestamp):
+    """As consultas por heartbeat que o SessionCorrelator substituiu (empate no horário: maior id)."""
+    session = None
+    if source_ip and source_ip != '0.0.0.0':
+        session = VPNLog.objects.filter(source_ip=source_ip, status='active', start_time__lte=timestamp).order_by('-start_time', '-id').first()
+    if not session and username and username not in ['unknown', 'N/A']:
+        session = VPNLog.objects.filter(user=username, status='active', start_time__lte=timestamp).order_by('-start_time', '-id').first()
+    return session
+
+
+class SessionCorrelatorTests(TestCase):
+
+    def session(self, session_id, user, ip, hour, minute=0, status='active', **fields):
+        return VPNLog.objects.create(
+            session_id=session_id, user=user, source_ip=ip, start_time=local(*DAY, hour, minute),
+            status=status, duration=fields.pop('duration', 0), raw_data=fields.pop('raw_data', {}), **fields
+        )
+
+    def heartbeat(self, user, ip, when, duration):
+        return normalize_vpn(fa_log('tunnel-stats', '0', user, when, duration=duration, ip=ip))
+
+    def setUp(self):
+        self.ip_early = self.session('s1', 'ana', '198.51.100.1', 8)
+        self.ip_late = self.session('s2', 'beto', '198.51.100.1', 9)
+        self.tie = self.session('s3', 'caio', '198.51.100.1', 9)
+        self.closed = self.session('s4', 'ana', '198.51.100.2', 8, 30, status='closed')
+        self.no_ip = self.session('s5', 'duda', '0.0.0.0', 7)
+
+    def test_find_matches_old_queries(self):
+        correlator = SessionCorrelator()
+        correlator.load()
+        cases = [
+            ('198.51.100.1', 'x', local(*DAY, 8, 59), self.ip_early),
+            ('198.51.100.1', 'x', local(*DAY, 9, 0), self.tie),
+            ('198.51.100.1', 'ana', local(*DAY, 7, 59), None),
+            ('198.51.100.1', 'duda', local(*DAY, 7, 59), self.no_ip),
+            ('198.51.100.2', 'ana', local(*DAY, 10), self.ip_early),
+            ('0.0.0.0', 'duda', local(*DAY, 8), self.no_ip),
+            ('203.0.113.9', 'unknown', local(*DAY, 10), None),
+        ]
+        for ip, user, when, expected in cases:
+            with self.subTest(ip=ip, user=user, when=when):
+                found = correlator.find(ip, user, when)
+                self.assertEqual(found and found.pk, expected and expected.pk)
+                old = old_heartbeat_lookup(ip, user, when)
+                self.assertEqual(found and found.pk, old and old.pk)
+
+    def test_heartbeat_discounts_duration_offset_and_never_shrinks(self):
+        carried = self.session('s6', 'eva', '198.51.100.6', 0, raw_data={'_duration_offset': 1000})
+        correlator = SessionCorrelator()
+
+        self.assertTrue(correlator.apply(self.heartbeat('eva', '198.51.100.6', local(*DAY, 0, 10), 1600)))
+        self.assertEqual(correlator.flush(), 1)
+        carried.refresh_from_db()
+        self.assertEqual((carried.duration, carried.end_time), (600, carried.start_time + datetime.timedelta(seconds=600)))
+
+        # Duração menor (ou abaixo do offset) só avança last_activity
+        later = local(*DAY, 0, 20)
+        self.assertTrue(correlator.apply(self.heartbeat('eva', '198.51.100.6', later, 900)))
+        correlator.flush()
+        carried.refresh_from_db()
+        self.assertEqual((carried.duration, carried.last_activity), (600, later))
+
+    def test_heartbeat_without_session_is_not_applied(self):
+        correlator = SessionCorrelator()
+        self.assertFalse(correlator.apply(self.heartbeat('zeca', '203.0.113.9', local(*DAY, 10), 60)))
+        self.assertEqual(correlator.flush(), 0)
+
+    def test_track_drops_sessions_closed_by_the_writer(self):
+        correlator = SessionCorrelator()
+        correlator.apply(self.heartbeat('caio', '198.51.100.1', local(*DAY, 9, 30), 1800))
+        self.assertIn(self.tie.pk, correlator.dirty)
+
+        # tunnel-down gravado pelo writer no mesmo lote: a sessão sai dos índices e do flush
+        VPNLog.objects.filter(pk=self.tie.pk).update(status='closed', duration=7200)
+        correlator.track(['s3'])
+        self.assertEqual(correlator.flush(), 0)
+        self.tie.refresh_from_db()
+        self.assertEqual(self.tie.duration, 7200)
+        self.assertEqual(correlator.find('198.51.100.1', 'caio', local(*DAY, 9, 30)).pk, self.ip_late.pk)
+
+        # Sessão nova ativa gravada pelo writer entra nos índices
+        fresh = self.session('s7', 'caio', '198.51.100.1', 9, 15)
+        correlator.track(['s7'])
+        self.assertEqual(correlator.find('198.51.100.1', 'caio', local(*DAY, 9, 30)).pk, fresh.pk)
+
+
+LATEST_FIELDS = {'latest_source_ip': 'source_ip', 'latest_city': 'city', 'latest_status': 'status'}
+
+
+def old_user_totals(params, ssl_only):
+    """Agregação antiga da listagem sobre VPNLog (fidelidade, filtro SSL e última conexão do conjunto filtrado)."""
+    days_with_fidelity = VPNLog.objects.filter(session_id__startswith='fidelity_').values_list('start_date', flat=True).distinct()
+    queryset = VPNLog.objects.exclude(~Q(session_id__startswith='fidelity_'), start_date__in=days_with_fidelity)
+    if ssl_only:
+        queryset = queryset.filter(Q(tunnel_type__startswith='ssl') | Q(vpn_type__icontains='ssl'))
+    if params.get('user_q'):
+        queryset = queryset.filter(Q(user__icontains=params['user_q']) | Q(ad_display_name__icontains=params['user_q']))
+    if params.get('date'):
+        queryset = queryset.filter(start_date=params['date'])
+    latest = queryset.filter(user=OuterRef('user')).order_by('-start_time', '-id')
+    rows = queryset.order_by().values('user').annotate(
+        total_connections=Count('id'),
+        total_duration=Sum('duration'),
+        total_volume=Sum('bandwidth_in') + Sum('bandwidth_out'),
+        last_connection=Max('start_time'),
+        **{name: Subquery(latest.values(column)[:1]) for name, column in LATEST_FIELDS.items()},
+    )
+    return {row['user']: row for row in rows}
+
+
+class DailySummaryParityTests(TestCase):
+    """O resumo diário reproduz as agregações antigas sobre VPNLog."""
+
+    FIELDS = ('total_connections', 'total_duration', 'total_volume', 'last_connection', *LATEST_FIELDS)
+
+    def log(self, session_id, user, when, tunnel='ssl-tunnel', duration=600, rcvd=1000, sent=100, ip='200.10.0.1', status='closed', city='Sao Paulo'):
+        return VPNLog.objects.create(
+            session_id=session_id, user=user, source_ip=ip, start_time=when, status=status, duration=duration,
+            bandwidth_in=rcvd, bandwidth_out=sent, city=city, country_name='Brazil', country_code='BR',
+            ad_display_name=user.title(), ad_department='TI', raw_data={'tunneltype': tunnel},
+        )
+
+    def setUp(self):
+        # Dia 10: logs ao vivo, SSL e IPsec (o IPsec, gravado antes, é a conexão mais recente de bob)
+        self.log('1', 'alice', local(2026, 3, 10, 8), duration=3600, rcvd=5000)
+        self.log('2', 'alice', local(2026, 3, 10, 14), ip='200.10.0.9', city='Campinas', status='active')
+        self.log('4', 'bob', local(2026, 3, 10, 18), tunnel='ipsec', ip='198.51.100.7', city='Recife')
+        self.log('3', 'bob', local(2026, 3, 10, 9), duration=120)
+        self.log('5', 'carol', local(2026, 3, 10, 7), tunnel='ipsec')
+        # Dia 11: relatório de fidelidade; os logs ao vivo do dia deixam de contar
+        self.log('6', 'alice', local(2026, 3, 11, 9), duration=60)
+        self.log('7', 'dave', local(2026, 3, 11, 10))
+        self.log('fidelity_alice_20260311', 'alice', local(2026, 3, 11, 23, 0), duration=7000, rcvd=9000, sent=900, ip='200.10.0.5', city='Santos')
+        self.log('fidelity_bob_20260311', 'bob', local(2026, 3, 11, 23, 0), duration=300)
+
+    def summary_user_totals(self, params, ssl_only):
+        summaries = filter_summaries(params, ssl_only=ssl_only)
+        rows = with_latest(user_totals(summaries).order_by('user'), summaries)
+        return {row['user']: row for row in rows}
+
+    def assert_parity(self, params, ssl_only):
+        old = old_user_totals(params, ssl_only)
+        new = self.summary_user_totals(params, ssl_only)
+        self.assertEqual(sorted(new), sorted(old), params)
+        for user, row in old.items():
+            self.assertEqual({name: new[user][name] for name in self.FIELDS}, {name: row[name] for name in self.FIELDS}, (params, user))
+
+    def test_totals_match_the_old_aggregation(self):
+        for ssl_only in (True, False):
+            for params in ({}, {'date': '2026-03-10'}, {'date': '2026-03-11'}, {'user_q': 'ali'}):
+                with self.subTest(ssl_only=ssl_only, params=params):
+                    self.assert_parity(params, ssl_only)
+
+        # Fidelidade: no dia 11 só o relatório conta (dave some, alice vale 7000 s)
+        ssl = self.summary_user_totals({'date': '2026-03-11'}, ssl_only=True)
+        self.assertEqual(sorted(ssl), ['alice', 'bob'])
+        self.assertEqual(ssl['alice']['total_duration'], 7000)
+        # SSL-only: carol (só IPsec) fica de fora e a última conexão de bob é a SSL
+        ssl = self.summary_user_totals({'date': '2026-03-10'}, ssl_only=True)
+        self.assertNotIn('carol', ssl)
+        self.assertEqual(ssl['bob']['latest_source_ip'], '200.10.0.1')
+        self.assertEqual(self.summary_user_totals({'date': '2026-03-10'}, ssl_only=False)['bob']['latest_city'], 'Recife')
+
+    def test_incremental_maintenance_matches_a_rebuild(self):
+        # Um log que deixa de ser SSL move a linha de resumo
+        row = VPNLog.objects.get(session_id='3')
+        row.raw_data = {'tunneltype': 'ipsec'}
+        row.save(update_fields=['raw_data'])
+        self.assert_parity({}, ssl_only=True)
+
+        columns = ('user', 'date', 'is_ssl', 'connections', 'duration', 'bandwidth_in', 'bandwidth_out', 'last_connection', 'last_source_ip', 'is_online', 'is_fidelity')
+        incremental = list(VPNUserDailySummary.objects.order_by('user', 'date', 'is_ssl').values_list(*columns))
+        VPNUserDailySummary.objects.all().delete()
+        DailySummaryBuilder().rebuild()
+        self.assertEqual(list(VPNUserDailySummary.objects.order_by('user', 'date', 'is_ssl').values_list(*columns)), incremental)
+        self.assertEqual(VPNUserDailySummary.objects.filter(user='bob', date=datetime.date(2026, 3, 10)).count(), 1)
+
+    def test_summary_formats_like_the_logs(self):
+        summary = VPNUserDailySummary.objects.get(user='alice', date=datetime.date(2026, 3, 10), is_ssl=True)
+        self.assertEqual(summary.formatted_duration(), '01:10:00')
+        self.assertEqual(summary.formatted_volume(), f"{6200 / (1024 * 1024):.2f} MB")
+        self.assertEqual(VPNLog.objects.get(session_id='1').formatted_duration(), '01:00:00')
+        self.assertEqual(VPNUserDailySummary(duration=0).formatted_volume(), '-')
+
+    def test_save_and_delete_refresh_the_old_key(self):
+        def keys():
+            return set(VPNUserDailySummary.objects.values_list('user', 'date'))
+
+        day10, day12 = datetime.date(2026, 3, 10), datetime.date(2026, 3, 12)
+        row = VPNLog.objects.get(session_id='5')
+        row.user = 'erin'
+        row.save()
+        self.assertNotIn(('carol', day10), keys())
+        self.assertIn(('erin', day10), keys())
+
+        row = VPNLog.objects.get(session_id='5')
+        row.start_time, row.start_date = local(2026, 3, 12, 7), day12
+        row.save()
+        self.assertNotIn(('erin', day10), keys())
+        self.assertIn(('erin', day12), keys())
+
+        VPNLog.objects.get(session_id='5').delete()
+        self.assertNotIn(('erin', day12), keys())
+        self.assert_parity({}, ssl_only=False)
+
+    def test_cleanup_logs_trims_the_summary(self):
+        self.log('old', 'frank', timezone.now() - datetime.timedelta(days=200))
+        self.log('recent', 'gina', timezone.now() - datetime.timedelta(days=1))
+        self.assertTrue(VPNUserDailySummary.objects.filter(user='frank').exists())
+
+        call_command('cleanup_logs', stdout=open('/dev/null', 'w'))
+        self.assertFalse(VPNLog.objects.filter(user='frank').exists())
+        self.assertFalse(VPNUserDailySummary.objects.filter(user='frank').exists())
+        self.assertTrue(VPNUserDailySummary.objects.filter(user='gina').exists())
+
+
+class CountingIngestor:
+    """Ingestor de teste: consome o gerador e conta as linhas recebidas."""
+
+    def __init__(self, *args, **kwargs):
+        self.bruteforce = types.SimpleNamespace(stats={})
+
+    def run(self, logs):
+        return collections.Counter(created=sum(1 for _ in logs))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, CONFIG_CACHE={'ttl': 0, 'redis_url': ''})
+class BootstrapCollectionTests(TestCase):
+    """Primeira coleta (sem marca d'água) com mais linhas que o teto da consulta."""
+
+    def test_bootstrap_bisects_instead_of_keeping_only_the_newest_rows(self):
+        now = timezone.now().replace(microsecond=0)
+        recent = [now - datetime.timedelta(seconds=15 * i + 1) for i in range(10000)]
+        old = [now - datetime.timedelta(days=30 + 5 * i) for i in range(50)]
+        client = FakeFAClient(recent + old)
+
+        with mock.patch('vpn_logs.tasks.get_fortianalyzer_client', return_value=client), \
+                mock.patch('vpn_logs.tasks.ActiveDirectoryClient'), \
+                mock.patch('vpn_logs.tasks.VPNLogIngestor', CountingIngestor):
+            self.assertEqual(fetch_vpn_logs_task.apply().get(), 'Imported 10050 logs')
+
+        mark = CollectionWatermark.objects.get(log_type='event', subtype='vpn')
+        self.assertEqual(mark.last_timestamp, recent[0])
+        self.assertAlmostEqual(mark.rows_per_hour, 10050 / (365 * 24), places=0)
+        # A primeira janela (365 dias) passou do teto e foi dividida
+        self.assertGreater(len(client.started), 1)
@@ -0,0 +1,263 @@
+"""
+Viagem impossível em lote (VPNLog.impossible_travel, travel_speed, distance_km, travel_details).
+
+VPNLog.save() compara cada conexão com a anterior localizada do mesmo usuário: uma consulta
+por save() e Haversine linha a linha em Python. recompute_travel faz o mesmo para um
+conjunto de usuários e um intervalo de uma vez: as conexões localizadas vêm numa consulta
+ordenada por (usuário, horário), viram vetores e distância/velocidade de todos os pares
+consecutivos saem de uma só vez com NumPy (sem NumPy, um laço em Python com a mesma conta).
+Só as linhas cujo resultado mudou são regravadas, com bulk_update.
+
+Mesma regra de VPNLog.save()/assess_travel: a anterior é a última conexão localizada do
+usuário com horário estritamente menor; mesma coordenada é possível; acima de
+IMPOSSIBLE_TRAVEL_SPEED_KMH é impossível; sem usuário ou coordenadas (0 inclusive) não é.
+Com since, a anterior de cada usuário ao início do intervalo vem de uma consulta extra
+(ROW_NUMBER() por usuário).
+
+deferred_travel_check(): dentro do bloco VPNLog.save() não faz a verificação por linha e,
+na saída, os usuários salvos passam por recompute_travel (backfills como repair_geoip.py).
+"""
+from contextlib import contextmanager
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from types import SimpleNamespace
+from vpn_logs.models import IMPOSSIBLE_TRAVEL_SPEED_KMH, VPNLog, apply_travel
+import logging
+import math
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+TRAVEL_FIELDS = ['impossible_travel', 'travel_speed', 'distance_km', 'travel_details']
+
+ROW_FIELDS = ['id', 'user', 'start_time', 'latitude', 'longitude', 'city', 'country_name', 'country_code', *TRAVEL_FIELDS]
+
+_state = threading.local()
+
+
+def travel_pairs(users, times, lats, lons):
+    """
+    Vetores ordenados por (usuário, horário) → (anterior, distância em km, intervalo em horas).
+    users: códigos inteiros (iguais = mesmo usuário); times: segundos desde a época.
+    anterior[i] é o índice da conexão anterior do mesmo usuário com horário menor, ou -1
+    (nesse caso distância e intervalo são 0).
+    """
+    if numpy is None:
+        return _travel_pairs_python(users, times, lats, lons)
+
+    users = numpy.asarray(users)
+    times = numpy.asarray(times, dtype=numpy.float64)
+    lats = numpy.radians(numpy.asarray(lats, dtype=numpy.float64))
+    lons = numpy.radians(numpy.asarray(lons, dtype=numpy.float64))
+    index = numpy.arange(len(times))
+
+    # Conexões do mesmo usuário no mesmo horário não se comparam entre si: a anterior de todas
+    # é a última antes do primeiro elemento da sequência
+    run_start = numpy.ones(len(times), dtype=bool)
+    run_start[1:] = (users[1:] != users[:-1]) | (times[1:] != times[:-1])
+    previous = numpy.maximum.accumulate(numpy.where(run_start, index, 0)) - 1
+    has_previous = previous >= 0
+    has_previous[has_previous] = users[previous[has_previous]] == users[has_previous]
+    previous[~has_previous] = -1
+
+    # Sem anterior: compara a linha com ela mesma (distância e intervalo 0)
+    source = numpy.where(has_previous, previous, index)
+    a = (
+        numpy.sin((lats - lats[source]) / 2) ** 2
+        + numpy.cos(lats[source]) * numpy.cos(lats) * numpy.sin((lons - lons[source]) / 2) ** 2
+    )
+    distance = EARTH_RADIUS_KM * 2 * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1 - a))
+    hours = (times - times[source]) / 3600.0
+    return previous, distance, hours
+
+
+def _travel_pairs_python(users, times, lats, lons):
+    previous, distance, hours = [], [], []
+    run_start = 0
+    for i in range(len(times)):
+        if i and (users[i] != users[i - 1] or times[i] != times[i - 1]):
+            run_start = i
+        j = run_start - 1
+        if j < 0 or users[j] != users[i]:
+            previous.append(-1)
+            distance.append(0.0)
+            hours.append(0.0)
+            continue
+        lat1, lon1, lat2, lon2 = map(math.radians, (lats[j], lons[j], lats[i], lons[i]))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        previous.append(j)
+        distance.append(EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)))
+        hours.append((times[i] - times[j]) / 3600.0)
+    return previous, distance, hours
+
+
+def _candidates(rows, previous, distance, hours):
+    """
+    Índices que podem mudar. Com NumPy, descarta em bloco as linhas cujo resultado já está
+    gravado; a decisão final (e o que é gravado) sai de apply_travel, linha a linha.
+    """
+    if numpy is None:
+        return range(len(rows))
+    column = {name: position for position, name in enumerate(ROW_FIELDS)}
+    lats = numpy.fromiter((row[column['latitude']] for row in rows), numpy.float64, len(rows))
+    lons = numpy.fromiter((row[column['longitude']] for row in rows), numpy.float64, len(rows))
+    missing = numpy.fromiter((not row[column['user']] for row in rows), bool, len(rows)) | (lats == 0) | (lons == 0)
+    stored_flag = numpy.fromiter((bool(row[column['impossible_travel']]) for row in rows), bool, len(rows))
+    stored_details = numpy.fromiter((row[column['travel_details']] is not None for row in rows), bool, len(rows))
+    stored_speed, stored_distance = (
+        numpy.fromiter((numpy.nan if row[column[name]] is None else row[column[name]] for row in rows), numpy.float64, len(rows))
+        for name in ('travel_speed', 'distance_km')
+    )
+
+    has_previous = previous >= 0
+    source = numpy.where(has_previous, previous, 0)
+    same_place = has_previous & (lats[source] == lats) & (lons[source] == lons)
+    evaluated = has_previous & ~missing & ~same_place & (hours > 0)
+    speed = distance / numpy.where(hours > 0, hours, 1)
+    flag = evaluated & (speed > IMPOSSIBLE_TRAVEL_SPEED_KMH)
+
+    # Só impossible_travel = False: sem dados, mesma coordenada ou intervalo não positivo
+    cleared = (missing | (has_previous & ~evaluated)) & stored_flag
+    recomputed = evaluated & (
+        (flag != stored_flag) | flag | (~flag & stored_details)
+        | (numpy.round(speed, 2) != stored_speed) | (numpy.round(distance, 2) != stored_distance)
+    )
+    return numpy.flatnonzero(cleared | recomputed).tolist()
+
+
+def assess_rows(rows, previous, distance, hours, reference=()):
+    """
+    Aplica a regra de viagem impossível às linhas (tuplas ROW_FIELDS, na ordem de
+    travel_pairs) e devolve as instâncias de VPNLog (id + TRAVEL_FIELDS) que mudaram.
+    Linhas em reference (índices) só servem de anterior e não são reavaliadas.
+    """
+    changed = []
+    for i in _candidates(rows, previous, distance, hours):
+        if i in reference:
+            continue
+        row = SimpleNamespace(**dict(zip(ROW_FIELDS, rows[i])))
+        before = tuple(getattr(row, name) for name in TRAVEL_FIELDS)
+        if not row.user or not row.latitude or not row.longitude:
+            row.impossible_travel = False
+        elif previous[i] < 0:
+            continue
+        else:
+            prev = SimpleNamespace(**dict(zip(ROW_FIELDS, rows[previous[i]])))
+            if prev.latitude == row.latitude and prev.longitude == row.longitude:
+                row.impossible_travel = False
+            else:
+                apply_travel(prev, row, float(distance[i]), float(hours[i]))
+        after = tuple(getattr(row, name) for name in TRAVEL_FIELDS)
+        if after != before:
+            changed.append(VPNLog(id=row.id, **dict(zip(TRAVEL_FIELDS, after))))
+    return changed
+
+
+def _load_rows(queryset, users, since, until):
+    """
+    Conexões localizadas dos usuários, agrupadas por usuário e em ordem de horário, mais a
+    anterior a since de cada usuário. Devolve (linhas, códigos de usuário, horários,
+    latitudes, longitudes, índices das anteriores a since).
+    """
+    located = queryset.filter(user__in=users, latitude__isnull=False, longitude__isnull=False)
+    seeds = {}
+    if since is not None:
+        seeds = {
+            row[1]: row
+            for row in located.filter(start_time__lt=since).annotate(
+                position=Window(RowNumber(), partition_by=[F('user')], order_by=[F('start_time').desc(), F('id').desc()])
+            ).filter(position=1).values_list(*ROW_FIELDS)
+        }
+        located = located.filter(start_time__gte=since)
+    if until is not None:
+        located = located.filter(start_time__lt=until)
+
+    rows, codes, times, lats, lons, reference = [], [], [], [], [], set()
+    last_user, code = None, -1
+    for row in located.order_by('user', 'start_time', 'id').values_list(*ROW_FIELDS).iterator(chunk_size=20000):
+        batch = [row]
+        if row[1] != last_user:
+            last_user, code = row[1], code + 1
+            if row[1] in seeds:
+                reference.add(len(rows))
+                batch.insert(0, seeds[row[1]])
+        for item in batch:
+            rows.append(item)
+            codes.append(code)
+            times.append(item[2].timestamp())
+            lats.append(item[3])
+            lons.append(item[4])
+    return rows, codes, times, lats, lons, reference
+
+
+def recompute_travel(users=None, since=None, until=None, user_chunk=1000, batch_size=1000, using=None):
+    """
+    Recalcula a viagem impossível das conexões com start_time em [since, until) dos usuários
+    informados (todos com conexões localizadas no intervalo, se None), user_chunk usuários
+    por consulta. Devolve quantas linhas foram regravadas.
+    """
+    queryset = VPNLog.objects.using(using)
+    scope = queryset.all()
+    if since is not None:
+        scope = scope.filter(start_time__gte=since)
+    if until is not None:
+        scope = scope.filter(start_time__lt=until)
+    if users is None:
+        users = scope.order_by().values_list('user', flat=True).distinct()
+    users = sorted(set(users))
+
+    updated = 0
+    for start in range(0, len(users), user_chunk):
+        chunk = users[start:start + user_chunk]
+        # Sem coordenadas nunca é viagem impossível (fora dos vetores)
+        updated += scope.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True), user__in=chunk, impossible_travel=True).update(impossible_travel=False)
+        rows, codes, times, lats, lons, reference = _load_rows(queryset, chunk, since, until)
+        if len(rows) <= len(reference):
+            continue
+        previous, distance, hours = travel_pairs(codes, times, lats, lons)
+        changed = assess_rows(rows, previous, distance, hours, reference)
+        if changed:
+            queryset.bulk_update(changed, TRAVEL_FIELDS, batch_size=batch_size)
+            updated += len(changed)
+    logger.info(f"Viagem impossível recalculada para {len(users)} usuários: {updated} conexões atualizadas")
+    return updated
+
+
+def defer_travel_check(log):
+    """
+    Chamado por VPNLog.save(): dentro de deferred_travel_check registra o usuário para a
+    passada em lote e devolve True (o save() não faz a verificação por linha).
+    """
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        return False
+    if log.user and log.start_time and (log.user not in pending or log.start_time < pending[log.user]):
+        pending[log.user] = log.start_time
+    return True
+
+
+@contextmanager
+def deferred_travel_check(using=None):
+    """
+    Adia a verificação de viagem impossível dos VPNLog.save() do bloco para uma passada de
+    recompute_travel na saída (sem exceção), a partir da conexão salva mais antiga.
+    Blocos aninhados deixam a passada para o externo.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+    _state.pending = {}
+    try:
+        yield
+        pending = _state.pending
+    finally:
+        _state.pending = None
+    if pending:
+        recompute_travel(list(pending), since=min(pending.values()), using=using)
@@ -0,0 +1,158 @@
+"""
+Gravação em lote de VPNLog.
+
+Substitui o update_or_create por registro (3 a 6 idas ao banco cada, todas passando por
+VPNLog.save()) por: um SELECT ... IN com os session_id do lote, mescla em memória,
+bulk_create/bulk_update em blocos (ou upsert nativo quando o banco suporta) e uma
+verificação de país suspeito/viagem impossível feita em conjunto após a gravação, seguida
+do recálculo do resumo diário (vpn_logs.summary) dos usuários/dias do lote.
+"""
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+from integrations.partitions import is_partitioned_cached
+from vpn_logs.models import VPNLog, tunnel_fields
+from vpn_logs.summary import refresh_summaries, summary_keys
+from vpn_logs.travel import recompute_travel
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Campos sobrescritos a cada log de sessão (mesmo conjunto do antigo update_or_create)
+SESSION_FIELDS = [
+    'user', 'source_ip', 'start_time', 'start_date', 'end_time', 'duration',
+    'bandwidth_in', 'bandwidth_out', 'status', 'raw_data',
+    'ad_department', 'ad_email', 'ad_title', 'ad_display_name',
+    'is_suspicious', 'city', 'country_name', 'country_code', 'last_activity',
+    'tunnel_type', 'vpn_type', 'is_ssl',
+]
+
+
+def session_fields(record):
+    """Valores de VPNLog para um registro normalizado de sessão (tunnel-up/stats/down)."""
+    log = record.log
+    ad_info = record.ad_info
+    return {
+        'user': record.user,
+        'source_ip': record.source_ip,
+        'start_time': record.start_time,
+        'start_date': record.start_time.date(),
+        'end_time': record.end_time,
+        'duration': record.duration,
+        'bandwidth_in': int(log.get('rcvdbyte', 0)),
+        'bandwidth_out': int(log.get('sentbyte', 0)),
+        'status': record.status,
+        'raw_data': log,
+        'ad_department': ad_info.get('department'),
+        'ad_email': ad_info.get('email'),
+        'ad_title': ad_info.get('title'),
+        'ad_display_name': ad_info.get('display_name'),
+        'is_suspicious': False,
+        'city': record.city,
+        'country_name': record.country_name,
+        'country_code': record.country_code,
+        'last_activity': record.start_time,
+        **tunnel_fields(log),
+    }
+
+
+def load_trusted_countries():
+    from integrations.models import FortiAnalyzerConfig
+    try:
+        config = FortiAnalyzerConfig.load()
+        return {c.strip().upper() for c in config.trusted_countries.split(',') if c.strip()}
+    except Exception:
+        return None
+
+
+class VPNLogBulkWriter:
+    """
+    Grava lotes de registros de sessão normalizados (ver vpn_logs.ingest).
+    chunk_size: linhas por INSERT/UPDATE.
+    """
+
+    def __init__(self, chunk_size=300, trusted_countries=None):
+        self.chunk_size = chunk_size
+        # Carregado uma vez por execução, em vez de a cada VPNLog.save()
+        self.trusted = trusted_countries if trusted_countries is not None else load_trusted_countries()
+        # Particionada (integrations.partitions), session_id é único só por partição: sem ON CONFLICT (session_id)
+        self.use_upsert = (
+            connection.features.supports_update_conflicts_with_target
+            and not is_partitioned_cached(VPNLog._meta.db_table)
+        )
+
+    def _is_suspicious(self, country_code):
+        if self.trusted is None:
+            return False
+        code = country_code.upper() if country_code else None
+        return bool(code and code not in self.trusted)
+
+    def write(self, records):
+        """
+        Grava os registros e devolve {session_id: 'created' | 'updated'}.
+        Vários logs da mesma sessão no lote são mesclados: o último processado prevalece,
+        como acontecia com os update_or_create sucessivos.
+        """
+        merged = {}
+        for record in records:
+            fields = session_fields(record)
+            fields['is_suspicious'] = self._is_suspicious(fields['country_code'])
+            merged[record.session_id] = fields
+        if not merged:
+            return {}
+
+        existing = {
+            obj.session_id: obj
+            for obj in VPNLog.objects.filter(session_id__in=list(merged)).only('id', 'session_id', 'user', 'start_date', 'latitude', 'longitude')
+        }
+        # Usuário/dia antes e depois da gravação (uma sessão pode mudar de usuário ou de dia)
+        keys = summary_keys(existing.values()) | {(fields['user'], fields['start_date']) for fields in merged.values()}
+        now = timezone.now()
+        to_create, to_update, outcomes = [], [], {}
+        for session_id, fields in merged.items():
+            obj = existing.get(session_id)
+            if obj is None:
+                if not self.use_upsert:
+                    to_create.append(VPNLog(session_id=session_id, **fields))
+                outcomes[session_id] = 'created'
+            else:
+                if not self.use_upsert:
+                    for name, value in fields.items():
+                        setattr(obj, name, value)
+                    obj.updated_at = now
+                    to_update.append(obj)
+                outcomes[session_id] = 'updated'
+
+        with transaction.atomic():
+            if self.use_upsert:
+                # PostgreSQL/SQLite: INSERT ... ON CONFLICT (session_id) DO UPDATE, à prova de corrida.
+                # Instâncias sem pk: o conflito tem de ocorrer em session_id, não no id.
+                VPNLog.objects.bulk_create(
+                    [VPNLog(session_id=sid, **fields) for sid, fields in merged.items()],
+                    batch_size=self.chunk_size,
+                    update_conflicts=True, unique_fields=['session_id'],
+                    update_fields=SESSION_FIELDS + ['updated_at'],
+                )
+            else:
+                VPNLog.objects.bulk_create(to_create, batch_size=self.chunk_size)
+                VPNLog.objects.bulk_update(to_update, SESSION_FIELDS + ['updated_at'], batch_size=self.chunk_size)
+
+        # Só linhas com coordenadas podem ser viagem impossível (mesma regra de VPNLog.save())
+        located = [obj.session_id for obj in existing.values() if obj.latitude and obj.longitude]
+        if located:
+            self.flag_impossible_travel(located)
+        refresh_summaries(keys, chunk_size=self.chunk_size)
+        return outcomes
+
+    def flag_impossible_travel(self, session_ids):
+        """
+        Verificação de viagem impossível em conjunto (vpn_logs.travel): os usuários das
+        sessões a partir da conexão mais antiga do lote, numa passada só; apenas as linhas
+        cujo resultado mudou são regravadas.
+        """
+        scope = VPNLog.objects.filter(session_id__in=session_ids, latitude__isnull=False, longitude__isnull=False)
+        users = set(scope.values_list('user', flat=True))
+        since = scope.aggregate(first=Min('start_time'))['first']
+        if not users:
+            return 0
+        return recompute_travel(users, since=since, batch_size=self.chunk_size)